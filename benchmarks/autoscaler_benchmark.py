@@ -0,0 +1,577 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""End-to-end timing and peak memory of a single Autoscaler.run() on synthetic pools, broken down by phase
+
+The autoscaler runs the real PoolManager and cluster connector, and reloads its spot fleets and its Kubernetes nodes
+and pods (or Mesos agents and tasks) on every run, the same way it does in production; only the APIs behind them are
+in-memory fakes.  The EC2 fake is backed by the simulator's SimulatedSpotFleetResourceGroups, so scaling the pool up or
+down actually launches or terminates (simulated) instances, which then show up as nodes in the scheduler fakes.  The
+signal is also a fake, which fetches its metrics like the ExternalSignal does, but then asks for a fixed fraction of
+the pool's cpus instead of talking to a signal process.
+
+Usage: python -m benchmarks.autoscaler_benchmark [--scheduler {kubernetes,mesos}] [--nodes N ...] [--groups N]
+    [--markets N] [--pods-per-node N] [--scenarios {up,down,steady} ...] [--json FILE]
+"""
+import argparse
+import contextlib
+import functools
+import io
+import itertools
+import json
+import logging
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from unittest import mock
+
+import arrow
+import requests
+import staticconf.testing
+from clusterman_metrics import SYSTEM_METRICS
+from kubernetes.client import V1Container
+from kubernetes.client import V1NodeSpec
+from kubernetes.client import V1NodeStatus
+from kubernetes.client import V1ObjectMeta
+from kubernetes.client import V1Pod
+from kubernetes.client import V1PodSpec
+from kubernetes.client import V1PodStatus
+from kubernetes.client import V1ResourceRequirements
+from kubernetes.client.models.v1_node import V1Node
+from kubernetes.client.models.v1_node_address import V1NodeAddress
+
+from clusterman.autoscaler.autoscaler import Autoscaler
+from clusterman.autoscaler.pool_manager import PoolManager
+from clusterman.aws.spot_fleet_resource_group import SpotFleetResourceGroup
+from clusterman.config import POOL_NAMESPACE
+from clusterman.interfaces.signal import get_metrics_for_signal
+from clusterman.interfaces.signal import Signal
+from clusterman.simulator.simulated_spot_fleet_resource_group import SimulatedSpotFleetResourceGroup
+from clusterman.simulator.simulator import Simulator
+from clusterman.simulator.util import patch_join_delay
+from clusterman.simulator.util import SimulationMetadata
+from clusterman.util import SignalResourceRequest
+
+CLUSTER = "bench"
+POOL = "bench"
+RESOURCE_GROUP_TAG = "clusterman_benchmark"
+INSTANCE_TYPES = ["c5.4xlarge", "m5.4xlarge", "r5.4xlarge"]
+AZS = ["us-west-2a", "us-west-2b", "us-west-2c"]
+CPUS_PER_POD = 1
+MEM_PER_POD = 2048  # MB
+FRAMEWORK_NAMES = ["marathon", "chronos"]
+
+# Requested cpus as a fraction of the cpus in the pool; the setpoint is 0.7, so these scale the pool up by ~40%,
+# down by ~40%, or not at all (the last being within the target capacity margin)
+SCENARIOS = {"up": 1.0, "down": 0.4, "steady": 0.7}
+
+# Each phase is (attribute path from the autoscaler, method name); nested phases are timed inclusively
+PHASES = [
+    ("pool_manager", "reload_state"),
+    ("pool_manager.cluster_connector", "reload_state"),
+    ("pool_manager", "_reload_resource_groups"),
+    ("signal", "evaluate"),
+    ("", "_compute_target_capacity"),
+    ("pool_manager", "terminate_expired_orphan_instances"),
+    ("pool_manager", "modify_target_capacity"),
+    ("pool_manager", "_compute_new_resource_group_targets"),
+    ("pool_manager", "_choose_nodes_to_prune"),
+]
+
+
+class FakeWorkload:
+    """Tracks which of the simulated instances have joined the cluster, and places a random number of pods (or
+    tasks) on each of them; the number of pods on an instance doesn't change across reloads, and some of the instances
+    are always idle
+    """
+
+    def __init__(self, simulator, pods_per_node, rng):
+        self.simulator = simulator
+        self.pods_per_node = pods_per_node
+        self.rng = rng
+        self._num_pods_by_instance_id = {}
+
+    def joined_instances(self):
+        for fleet in self.simulator.aws_clusters:
+            for instance in fleet.instances.values():
+                if instance.join_time <= self.simulator.current_time:
+                    yield instance
+
+    def num_pods(self, instance):
+        if instance.id not in self._num_pods_by_instance_id:
+            max_pods = min(2 * self.pods_per_node, int(instance.resources.cpus // CPUS_PER_POD))
+            self._num_pods_by_instance_id[instance.id] = self.rng.randint(0, max_pods)
+        return self._num_pods_by_instance_id[instance.id]
+
+
+def _instance_id(instance):
+    return f"i-{instance.id:017x}"
+
+
+def _hostname(instance):
+    return f"ip-{str(instance.ip_address).replace('.', '-')}"
+
+
+class FakeEC2:
+    """The parts of the EC2 API used by the SpotFleetResourceGroup, backed by the simulator's spot fleets"""
+
+    def __init__(self, fleets, sfr_configs):
+        self._fleets = {fleet.id: (fleet, sfr_config) for fleet, sfr_config in zip(fleets, sfr_configs)}
+        self._instances = {}  # EC2 instance ID -> (fleet, simulated instance), for every instance we've listed
+
+    def describe_spot_fleet_requests(self, SpotFleetRequestIds=None):
+        fleet_ids = SpotFleetRequestIds or list(self._fleets)
+        return {"SpotFleetRequestConfigs": [self._describe_fleet(fleet_id) for fleet_id in fleet_ids]}
+
+    def get_paginator(self, operation_name):
+        assert operation_name == "describe_spot_fleet_instances"
+        return mock.Mock(paginate=self._describe_spot_fleet_instances)
+
+    def modify_spot_fleet_request(self, SpotFleetRequestId, TargetCapacity, ExcessCapacityTerminationPolicy):
+        fleet, __ = self._fleets[SpotFleetRequestId]
+        fleet.modify_target_capacity(TargetCapacity)
+        return {"Return": True}
+
+    def describe_instances(self, InstanceIds):
+        return {"Reservations": [{"Instances": [self._describe_instance(instance_id) for instance_id in InstanceIds]}]}
+
+    def terminate_instances(self, InstanceIds):
+        ids_by_fleet = defaultdict(list)
+        for instance_id in InstanceIds:
+            fleet, instance = self._instances[instance_id]
+            ids_by_fleet[fleet].append(instance.id)
+        for fleet, ids in ids_by_fleet.items():
+            fleet.terminate_instances_by_id(ids)
+        return {"TerminatingInstances": [{"InstanceId": instance_id} for instance_id in InstanceIds]}
+
+    def _describe_fleet(self, fleet_id):
+        fleet, sfr_config = self._fleets[fleet_id]
+        tags = [{"Key": RESOURCE_GROUP_TAG, "Value": json.dumps({"pool": POOL, "paasta_cluster": CLUSTER})}]
+        return {
+            "SpotFleetRequestId": fleet_id,
+            "SpotFleetRequestState": "active",
+            "SpotFleetRequestConfig": {
+                "FulfilledCapacity": fleet.fulfilled_capacity,
+                "TargetCapacity": fleet.target_capacity,
+                "LaunchSpecifications": [
+                    {**spec, "TagSpecifications": [{"ResourceType": "instance", "Tags": tags}]}
+                    for spec in sfr_config["LaunchSpecifications"]
+                ],
+            },
+        }
+
+    def _describe_spot_fleet_instances(self, SpotFleetRequestId):
+        fleet, __ = self._fleets[SpotFleetRequestId]
+        instances = list(fleet.instances.values())
+        for page_start in range(0, len(instances), 1000):
+            page = instances[page_start : page_start + 1000]
+            self._instances.update((_instance_id(instance), (fleet, instance)) for instance in page)
+            yield {"ActiveInstances": [{"InstanceId": _instance_id(instance)} for instance in page]}
+
+    def _describe_instance(self, instance_id):
+        __, instance = self._instances[instance_id]
+        return {
+            "InstanceId": instance_id,
+            "InstanceType": instance.market.instance,
+            "Placement": {"AvailabilityZone": instance.market.az},
+            "PrivateIpAddress": str(instance.ip_address),
+            "PrivateDnsName": f"{_hostname(instance)}.us-west-2.compute.internal",
+            "State": {"Name": "running" if instance.end_time is None else "terminated"},
+            "LaunchTime": instance.start_time.datetime,
+            "Tags": [],
+        }
+
+
+class FakeCoreV1Api:
+    """Lists the joined instances as Kubernetes nodes, along with the pods running on them
+
+    The node and pod objects for an instance are only built once, like an API server which returns the same
+    resourceVersion for objects that haven't changed.
+    """
+
+    def __init__(self, workload):
+        self.workload = workload
+        self._nodes_by_instance_id = {}
+        self._pods_by_instance_id = {}
+
+    def list_node(self, label_selector=None):
+        return mock.Mock(items=[self._node(instance) for instance in self.workload.joined_instances()])
+
+    def list_pod_for_all_namespaces(self, label_selector=None):
+        return mock.Mock(
+            items=[pod for instance in self.workload.joined_instances() for pod in self._pods(instance)],
+        )
+
+    def _node(self, instance):
+        if instance.id not in self._nodes_by_instance_id:
+            self._nodes_by_instance_id[instance.id] = V1Node(
+                metadata=V1ObjectMeta(
+                    name=_hostname(instance),
+                    uid=f"node-{instance.id}",
+                    resource_version="1",
+                    labels={"clusterman.com/pool": POOL},
+                ),
+                spec=V1NodeSpec(),
+                status=V1NodeStatus(
+                    addresses=[V1NodeAddress(address=str(instance.ip_address), type="InternalIP")],
+                    allocatable={
+                        "cpu": str(instance.resources.cpus),
+                        "memory": f"{int(instance.resources.mem * 1024)}Mi",
+                    },
+                ),
+            )
+        return self._nodes_by_instance_id[instance.id]
+
+    def _pods(self, instance):
+        if instance.id not in self._pods_by_instance_id:
+            self._pods_by_instance_id[instance.id] = [
+                V1Pod(
+                    metadata=V1ObjectMeta(
+                        name=f"pod-{instance.id}-{i}",
+                        namespace="paasta",
+                        uid=f"pod-{instance.id}-{i}",
+                        resource_version="1",
+                        annotations={},
+                        owner_references=[],
+                    ),
+                    spec=V1PodSpec(
+                        containers=[
+                            V1Container(
+                                name="main",
+                                resources=V1ResourceRequirements(
+                                    requests={"cpu": str(CPUS_PER_POD), "memory": f"{MEM_PER_POD}Mi"},
+                                ),
+                            )
+                        ],
+                        node_name=_hostname(instance),
+                    ),
+                    status=V1PodStatus(phase="Running", host_ip=str(instance.ip_address)),
+                )
+                for i in range(self.workload.num_pods(instance))
+            ]
+        return self._pods_by_instance_id[instance.id]
+
+
+class FakeMesosMaster:
+    """Serves the slaves and master/frameworks endpoints for the joined instances; the responses are built (and
+    encoded as JSON) on every request, like the real master does
+    """
+
+    def __init__(self, workload):
+        self.workload = workload
+
+    def post(self, api_endpoint, path, stream=False):
+        if path == "slaves":
+            data = {"slaves": [self._agent(instance) for instance in self.workload.joined_instances()]}
+        else:
+            tasks_by_framework = defaultdict(list)
+            for instance in self.workload.joined_instances():
+                for i in range(self.workload.num_pods(instance)):
+                    tasks_by_framework[FRAMEWORK_NAMES[i % len(FRAMEWORK_NAMES)]].append(
+                        {
+                            "id": f"task-{instance.id}-{i}",
+                            "slave_id": f"agent-{instance.id}",
+                            "state": "TASK_RUNNING",
+                            "resources": {"cpus": CPUS_PER_POD, "mem": MEM_PER_POD, "disk": 0, "gpus": 0},
+                        }
+                    )
+            data = {
+                "frameworks": [
+                    {"id": f"framework-{name}", "name": name, "active": True, "tasks": tasks_by_framework[name]}
+                    for name in FRAMEWORK_NAMES
+                ],
+                "completed_frameworks": [],
+            }
+
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(data).encode()
+        response.raw = io.BytesIO(response._content)
+        return response
+
+    def _agent(self, instance):
+        num_pods = self.workload.num_pods(instance)
+        return {
+            "id": f"agent-{instance.id}",
+            "pid": f"slave(1)@{instance.ip_address}:5051",
+            "hostname": _hostname(instance),
+            "attributes": {"pool": POOL},
+            "resources": {
+                "cpus": instance.resources.cpus,
+                "mem": instance.resources.mem * 1024,
+                "disk": (instance.resources.disk or 0) * 1024,
+                "gpus": instance.resources.gpus,
+            },
+            "used_resources": {"cpus": num_pods * CPUS_PER_POD, "mem": num_pods * MEM_PER_POD, "disk": 0, "gpus": 0},
+        }
+
+
+class FakeMetricsClient:
+    def __init__(self, num_points):
+        self.num_points = num_points
+
+    def get_metric_values(self, metric_query, metric_type, time_start, time_end, **kwargs):
+        step = max(1, (time_end - time_start) // self.num_points)
+        return {metric_query: [(t, 1.0) for t in range(time_start, time_end, step)]}
+
+
+class FakeSignal(Signal):
+    """Fetches its required metrics like the ExternalSignal does, but then asks for a fixed fraction of the pool's
+    cpus instead of talking to a signal process
+    """
+
+    def __init__(self, cluster, pool, scheduler, app, config_namespace, metrics_client, signal_namespace, **kwargs):
+        super().__init__("BenchmarkSignal", cluster, pool, scheduler, app, config_namespace)
+        self.metrics_client = metrics_client
+        self.required_metrics = staticconf.read_list(
+            "autoscale_signal.required_metrics", default=[], namespace=config_namespace
+        )
+        self.pool_manager = kwargs["pool_manager"]
+        self.utilization = kwargs["utilization"]
+
+    def evaluate(self, timestamp, retry_on_broken_pipe=True):
+        get_metrics_for_signal(
+            self.cluster,
+            self.pool,
+            self.scheduler,
+            self.app,
+            self.metrics_client,
+            self.required_metrics,
+            timestamp,
+        )
+        cpus = self.pool_manager.cluster_connector.get_resource_total("cpus")
+        return SignalResourceRequest(cpus=self.utilization * cpus)
+
+
+def _make_configs(num_nodes, num_groups, num_markets):
+    # Every group has 3x as much room as it needs, so that none of them get pinned at their max_capacity
+    main_config = {
+        "aws": {"region": "us-west-2"},
+        "autoscaling": {"setpoint": 0.7, "target_capacity_margin": 0.1, "default_signal_role": "bench"},
+        "autoscale_signal": {"period_minutes": 10},
+        "clusters": {
+            CLUSTER: {
+                "kubeconfig_path": "/nail/etc/kubeconfig",
+                "mesos_master_fqdn": "mesos-bench.local",
+            },
+        },
+        "monitoring_client": "LogMonitoringClient",
+    }
+    pool_config = {
+        "resource_groups": [{"sfr": {"tag": RESOURCE_GROUP_TAG}}],
+        "scaling_limits": {
+            "min_capacity": 0,
+            "max_capacity": 3 * num_nodes,
+            "max_weight_to_add": 3 * num_nodes,
+            "max_weight_to_remove": 3 * num_nodes,
+        },
+        "autoscale_signal": {
+            "name": "BenchmarkSignal",
+            "period_minutes": 10,
+            "required_metrics": [
+                {"name": "cpus_allocated", "type": SYSTEM_METRICS, "minute_range": 10},
+                {"name": "mem_allocated", "type": SYSTEM_METRICS, "minute_range": 10},
+            ],
+        },
+    }
+    markets = list(itertools.product(INSTANCE_TYPES, AZS))[:num_markets]
+    sfr_configs = [
+        {
+            "AllocationStrategy": "diversified",
+            "LaunchSpecifications": [
+                {
+                    "InstanceType": instance_type,
+                    "Placement": {"AvailabilityZone": az},
+                    "SpotPrice": 1.0,
+                    "WeightedCapacity": 1,
+                }
+                for instance_type, az in markets
+            ],
+        }
+        for _ in range(num_groups)
+    ]
+    return main_config, pool_config, sfr_configs
+
+
+@contextlib.contextmanager
+def _fake_backends(scheduler, sfr_configs, pods_per_node, seed):
+    """Set up the simulated spot fleets, and point the EC2 client and the scheduler APIs at them"""
+    with contextlib.redirect_stdout(io.StringIO()):  # the simulator prints a message when it starts up
+        simulator = Simulator(SimulationMetadata("benchmark", CLUSTER, POOL, scheduler), arrow.get(0), arrow.get(3600))
+    simulator.aws_clusters = [SimulatedSpotFleetResourceGroup(sfr_config, simulator) for sfr_config in sfr_configs]
+    workload = FakeWorkload(simulator, pods_per_node, random.Random(seed))
+    ec2 = FakeEC2(simulator.aws_clusters, sfr_configs)
+
+    # The resource groups for a pool are cached by tag, and the fleets are new every time
+    SpotFleetResourceGroup._get_resource_group_tags.cache_clear()
+    with contextlib.ExitStack() as stack:
+        for module in ["client", "aws_resource_group", "spot_fleet_resource_group"]:
+            stack.enter_context(mock.patch(f"clusterman.aws.{module}.ec2", ec2))
+        stack.enter_context(
+            mock.patch(
+                "clusterman.kubernetes.kubernetes_cluster_connector.CachedCoreV1Api",
+                return_value=FakeCoreV1Api(workload),
+            )
+        )
+        stack.enter_context(
+            mock.patch("clusterman.mesos.mesos_cluster_connector.mesos_post", FakeMesosMaster(workload).post)
+        )
+        stack.enter_context(
+            mock.patch("socket.gethostbyaddr", side_effect=lambda ip: (f"ip-{ip.replace('.', '-')}", [], [ip]))
+        )
+        stack.enter_context(patch_join_delay())
+        yield
+
+
+def _make_autoscaler(scheduler, num_nodes, utilization):
+    pool_manager = PoolManager(CLUSTER, POOL, scheduler)
+    pool_manager.modify_target_capacity(num_nodes, force=True, prune=False)
+    pool_manager.reload_state()
+
+    signal = functools.partial(FakeSignal, pool_manager=pool_manager, utilization=utilization)
+    with mock.patch("clusterman.autoscaler.autoscaler.ExternalSignal", signal):
+        return Autoscaler(
+            CLUSTER,
+            POOL,
+            scheduler,
+            [POOL],
+            pool_manager=pool_manager,
+            metrics_client=FakeMetricsClient(num_points=100),
+            monitoring_enabled=False,
+        )
+
+
+def _timed(method, name, timings):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            timings[name] += time.perf_counter() - start
+
+    return wrapper
+
+
+def _instrument(autoscaler, timings):
+    for path, method_name in PHASES:
+        obj = functools.reduce(getattr, path.split("."), autoscaler) if path else autoscaler
+        name = f"{path}.{method_name}" if path else method_name
+        setattr(obj, method_name, _timed(getattr(obj, method_name), name, timings))
+
+
+def _run_once(autoscaler):
+    with mock.patch("clusterman.autoscaler.autoscaler.autoscaling_is_paused", return_value=False), mock.patch(
+        "clusterman.autoscaler.autoscaler.get_capacity_offset", return_value=0
+    ):
+        autoscaler.run(timestamp=arrow.get(0))
+
+
+def run_benchmark(scheduler, node_counts, num_groups, num_markets, pods_per_node, scenarios, seed):
+    results = []
+    print(
+        f"{'nodes':>8} {'scenario':>8} {'target':>15} {'run':>9} {'reload':>9} {'connector':>9} {'groups':>9} "
+        f"{'evaluate':>9} {'orphans':>9} {'modify':>9} {'prune':>9} {'peak mem':>10}"
+    )
+    for num_nodes, scenario in itertools.product(node_counts, scenarios):
+        main_config, pool_config, sfr_configs = _make_configs(num_nodes, num_groups, num_markets)
+        with staticconf.testing.MockConfiguration(main_config), staticconf.testing.MockConfiguration(
+            pool_config, namespace=POOL_NAMESPACE.format(pool=POOL, scheduler=scheduler)
+        ):
+            # Build the pool twice from the same seed: once for timing, and once under tracemalloc (which is too
+            # slow to leave on while we're timing things)
+            with _fake_backends(scheduler, sfr_configs, pods_per_node, seed):
+                autoscaler = _make_autoscaler(scheduler, num_nodes, SCENARIOS[scenario])
+                timings = defaultdict(float)
+                _instrument(autoscaler, timings)
+                orig_target_capacity = autoscaler.pool_manager.target_capacity
+                start = time.perf_counter()
+                _run_once(autoscaler)
+                timings["run"] = time.perf_counter() - start
+                timings = defaultdict(float, timings)  # stop counting, now that the run is over
+                autoscaler.pool_manager.reload_state()  # the resource groups don't see their own changes until then
+                new_target_capacity = autoscaler.pool_manager.target_capacity
+
+            with _fake_backends(scheduler, sfr_configs, pods_per_node, seed):
+                autoscaler = _make_autoscaler(scheduler, num_nodes, SCENARIOS[scenario])
+                tracemalloc.start()
+                _run_once(autoscaler)
+                __, peak_memory = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+        results.append(
+            {
+                "scheduler": scheduler,
+                "nodes": num_nodes,
+                "groups": num_groups,
+                "markets": num_markets,
+                "pods_per_node": pods_per_node,
+                "scenario": scenario,
+                "orig_target_capacity": orig_target_capacity,
+                "new_target_capacity": new_target_capacity,
+                "seconds": dict(timings),
+                "peak_memory_bytes": peak_memory,
+            }
+        )
+        print(
+            f"{num_nodes:>8} {scenario:>8} {f'{orig_target_capacity} -> {new_target_capacity}':>15} "
+            f"{timings['run']:8.3f}s {timings['pool_manager.reload_state']:8.3f}s "
+            f"{timings['pool_manager.cluster_connector.reload_state']:8.3f}s "
+            f"{timings['pool_manager._reload_resource_groups']:8.3f}s {timings['signal.evaluate']:8.3f}s "
+            f"{timings['pool_manager.terminate_expired_orphan_instances']:8.3f}s "
+            f"{timings['pool_manager.modify_target_capacity']:8.3f}s "
+            f"{timings['pool_manager._choose_nodes_to_prune']:8.3f}s {peak_memory / 2**20:8.1f}MB"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scheduler", choices=["kubernetes", "mesos"], default="kubernetes")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--groups", type=int, default=5, help="number of resource groups in the pool")
+    parser.add_argument(
+        "--markets",
+        type=int,
+        default=6,
+        help=f"number of markets per resource group (at most {len(INSTANCE_TYPES) * len(AZS)})",
+    )
+    parser.add_argument("--pods-per-node", type=int, default=8, help="average number of pods running on a node")
+    parser.add_argument("--scenarios", choices=list(SCENARIOS), nargs="+", default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=0, help="random seed for placing pods on nodes")
+    parser.add_argument("--json", metavar="FILE", help="also write the results to FILE as JSON ('-' for stdout)")
+    args = parser.parse_args()
+    logging.getLogger("clusterman").setLevel(logging.ERROR)  # we log a lot of stuff for every node in the pool
+
+    results = run_benchmark(
+        args.scheduler, args.nodes, args.groups, args.markets, args.pods_per_node, args.scenarios, args.seed
+    )
+    if args.json:
+        output = {
+            "benchmark": "autoscaler",
+            "timestamp": arrow.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "results": results,
+        }
+        if args.json == "-":
+            json.dump(output, sys.stdout, indent=2)
+        else:
+            with open(args.json, "w") as f:
+                json.dump(output, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
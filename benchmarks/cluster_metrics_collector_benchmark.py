@@ -0,0 +1,110 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Wall-clock time for one ClusterMetricsCollector round, using fake pools whose reloads are slow
+
+With --hung-pool, the first pool never finishes reloading, so the round has to time it out.
+
+Usage: python -m benchmarks.cluster_metrics_collector_benchmark [--pools N] [--latency SECONDS] [--workers N ...]
+    [--hung-pool]
+"""
+import argparse
+import random
+import threading
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+from clusterman_metrics import SYSTEM_METRICS
+
+from clusterman.batch.cluster_metrics_collector import ClusterMetricsCollector
+from clusterman.batch.cluster_metrics_collector import MetricToWrite
+from clusterman.mesos.metrics_generators import ClusterMetric
+from clusterman.util import All
+
+
+class SlowPoolManager:
+    def __init__(self, pool, latency, hang_until=None):
+        self.pool = pool
+        self.scheduler = "kubernetes"
+        self.latency = latency
+        self.hang_until = hang_until
+
+    def reload_state(self):
+        time.sleep(self.latency)
+        if self.hang_until:
+            self.hang_until.wait()
+
+
+class FakeMetricsClient:
+    def __init__(self):
+        self.datapoints = []
+
+    @contextmanager
+    def get_writer(self, metric_type, aggregate_meteorite_dims=False):
+        yield mock.Mock(send=self.datapoints.append)
+
+
+def generate_metrics(manager, snapshot=None):
+    for resource in ("cpus", "mem", "disk", "gpus"):
+        yield ClusterMetric(f"{resource}_allocated", 1, {"pool": manager.pool})
+
+
+def run_benchmark(num_pools, latency, worker_counts, pool_timeout, hung_pool):
+    rng = random.Random(42)
+    latencies = [rng.uniform(latency / 2, latency * 3 / 2) for __ in range(num_pools)]
+    metrics_to_write = [MetricToWrite(generate_metrics, SYSTEM_METRICS, False, All, ["kubernetes"])]
+
+    print(f"{'workers':>8} {'elapsed':>10} {'pools written':>14} {'timestamps':>11}")
+    for max_workers in worker_counts:
+        release_hung_pool = threading.Event()
+        collector = ClusterMetricsCollector()
+        collector.max_workers = max_workers
+        collector.pool_timeout_seconds = pool_timeout
+        collector._executor = None
+        collector._pool_futures = {}
+        collector._pool_start_times = {}
+        collector.metrics_client = FakeMetricsClient()
+        collector.pool_managers = {
+            f"pool{i}.kubernetes": SlowPoolManager(f"pool{i}", latencies[i]) for i in range(num_pools)
+        }
+        if hung_pool:
+            collector.pool_managers["pool0.kubernetes"].hang_until = release_hung_pool
+
+        with mock.patch("clusterman.batch.cluster_metrics_collector.METRICS_TO_WRITE", metrics_to_write), mock.patch(
+            "clusterman.batch.cluster_metrics_collector.get_pool_metrics_snapshot"
+        ):
+            start = time.perf_counter()
+            collector.write_all_metrics()
+            elapsed = time.perf_counter() - start
+
+        release_hung_pool.set()
+        datapoints = collector.metrics_client.datapoints
+        num_pools_written = len(datapoints) // 4
+        num_timestamps = len({timestamp for __, timestamp, __ in datapoints})
+        print(f"{max_workers:>8} {elapsed:9.2f}s {num_pools_written:>14} {num_timestamps:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pools", type=int, default=40, help="number of pools in the cluster")
+    parser.add_argument("--latency", type=float, default=0.2, help="average time to reload a pool (seconds)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16], help="worker pool sizes")
+    parser.add_argument("--pool-timeout", type=float, default=2, help="per-pool timeout (seconds)")
+    parser.add_argument("--hung-pool", action="store_true", help="make one of the pools hang")
+    args = parser.parse_args()
+    run_benchmark(args.pools, args.latency, args.workers, args.pool_timeout, args.hung_pool)
+
+
+if __name__ == "__main__":
+    main()
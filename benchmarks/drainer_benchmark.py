@@ -0,0 +1,129 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Drain queue throughput (messages/sec) for a backlog of Kubernetes hosts, using an in-memory SQS with fixed latency
+
+Usage: python -m benchmarks.drainer_benchmark [--messages N] [--sqs-latency SECONDS] [--drain-latency SECONDS]
+    [--workers N ...]
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from unittest import mock
+
+import arrow
+import staticconf.testing
+
+from clusterman.draining.queue import DrainingClient
+
+
+class FakeSQS:
+    def __init__(self, latency):
+        self.latency = latency
+        self.queues = {}
+        self._lock = threading.Lock()
+        self._next_receipt_handle = 0
+
+    def send_message(self, QueueUrl, MessageBody, MessageAttributes, DelaySeconds=0):
+        time.sleep(self.latency)
+        with self._lock:
+            self._next_receipt_handle += 1
+            self.queues.setdefault(QueueUrl, []).append(
+                {
+                    "Body": MessageBody,
+                    "MessageAttributes": MessageAttributes,
+                    "ReceiptHandle": str(self._next_receipt_handle),
+                }
+            )
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, **kwargs):
+        time.sleep(self.latency)
+        with self._lock:
+            queue = self.queues.setdefault(QueueUrl, [])
+            messages, self.queues[QueueUrl] = queue[:MaxNumberOfMessages], queue[MaxNumberOfMessages:]
+        return {"Messages": messages} if messages else {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        time.sleep(self.latency)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        time.sleep(self.latency)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+
+def run_benchmark(num_messages, sqs_latency, drain_latency, worker_counts):
+    config = {
+        "clusters": {"bench": {"drain_queue_url": "drain", "termination_queue_url": "terminate"}},
+    }
+    pool_config = {"draining": {"draining_time_threshold_seconds": 3600}}
+
+    def slow_drain(kube_operator_client, node_names, disable_eviction):
+        time.sleep(drain_latency)
+        return {node_name: True for node_name in node_names}
+
+    print(f"{'workers':>8} {'elapsed':>10} {'messages/s':>12}")
+    for max_workers in worker_counts:
+        fake_sqs = FakeSQS(sqs_latency)
+        with staticconf.testing.MockConfiguration(config), staticconf.testing.MockConfiguration(
+            pool_config, namespace="bench.kubernetes_config"
+        ), staticconf.testing.PatchConfiguration({"batches": {"drainer": {"max_workers": max_workers}}}), mock.patch(
+            "clusterman.draining.queue.sqs", fake_sqs
+        ), mock.patch(
+            "clusterman.draining.queue.k8s_drain_nodes", side_effect=slow_drain
+        ):
+            draining_client = DrainingClient("bench")
+            fake_sqs.queues["drain"] = [
+                {
+                    "Body": json.dumps(
+                        {
+                            "instance_id": f"i-{i}",
+                            "hostname": f"host{i}",
+                            "group_id": "asg-1",
+                            "ip": "10.0.0.1",
+                            "agent_id": f"agt{i}",
+                            "pool": "bench",
+                            "scheduler": "kubernetes",
+                            "draining_start_time": arrow.now().for_json(),
+                        }
+                    ),
+                    "MessageAttributes": {"Sender": {"StringValue": "asg"}},
+                    "ReceiptHandle": f"drain-{i}",
+                }
+                for i in range(num_messages)
+            ]
+
+            start = time.perf_counter()
+            while draining_client.process_drain_queue(None, mock.Mock()):
+                pass
+            elapsed = time.perf_counter() - start
+        print(f"{max_workers:>8} {elapsed:9.2f}s {num_messages / elapsed:12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200, help="number of hosts waiting in the drain queue")
+    parser.add_argument("--sqs-latency", type=float, default=0.02, help="simulated SQS round-trip time (seconds)")
+    parser.add_argument(
+        "--drain-latency", type=float, default=0.5, help="simulated time to drain a batch of nodes (seconds)"
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 5, 10, 20])
+    args = parser.parse_args()
+    logging.getLogger("clusterman").setLevel(logging.ERROR)
+    run_benchmark(args.messages, args.sqs_latency, args.drain_latency, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A stand-in for a clusterman_signals signal process, which answers every request with the number of datapoints it
+received; it speaks the original (ACK-based) protocol, and optionally the framed v2 protocol
+
+Usage: python -m benchmarks.echo_signal_server SOCKET_NAME [--protocol-versions N ...] [--encodings E ...]
+    [--timeseries-layouts L ...] [--no-delta-metrics]
+"""
+import argparse
+import socket
+import struct
+
+import simplejson as json
+
+from clusterman.signals.external_signal import ACK
+from clusterman.signals.signal_protocol import choose_protocol
+from clusterman.signals.signal_protocol import ENCODING_JSON
+from clusterman.signals.signal_protocol import from_columnar
+from clusterman.signals.signal_protocol import MetricsWindow
+from clusterman.signals.signal_protocol import recv_frame
+from clusterman.signals.signal_protocol import ResyncRequired
+from clusterman.signals.signal_protocol import send_frame
+from clusterman.signals.signal_protocol import SIGNAL_PROTOCOL_V2
+from clusterman.signals.signal_protocol import TIMESERIES_COLUMNAR
+
+
+def _recv_exactly(conn, num_bytes):
+    data = bytearray()
+    while len(data) < num_bytes:
+        chunk = conn.recv(num_bytes - len(data))
+        if not chunk:
+            raise EOFError
+        data.extend(chunk)
+    return bytes(data)
+
+
+def _echo_response(request):
+    return {"Resources": {"cpus": sum(len(timeseries) for timeseries in request["metrics"].values())}}
+
+
+def _serve_v1(conn):
+    while True:
+        (length,) = struct.unpack(">I", _recv_exactly(conn, 4))
+        conn.sendall(ACK)
+        request = json.loads(_recv_exactly(conn, length))
+        conn.sendall(ACK)
+        conn.sendall(json.dumps(_echo_response(request)).encode())
+
+
+def _serve_v2(conn, protocol):
+    window = MetricsWindow()
+    while True:
+        request = recv_frame(conn)
+        metrics = request.payload["metrics"]
+        if protocol.timeseries_layout == TIMESERIES_COLUMNAR:
+            metrics = from_columnar(metrics)
+        if protocol.delta_metrics:
+            try:
+                metrics = window.apply(request.request_id, request.payload["session"], metrics)
+            except ResyncRequired:
+                send_frame(conn, request.request_id, {"Resync": True}, protocol.encoding)
+                continue
+        send_frame(conn, request.request_id, _echo_response({"metrics": metrics}), protocol.encoding)
+
+
+def serve(socket_name, protocol_versions, encodings=None, timeseries_layouts=None, delta_metrics=True):
+    """Accept connections one at a time on the abstract socket ``\\0{socket_name}`` until killed
+
+    :param protocol_versions: the protocol versions this signal understands; a signal that only knows about version 1
+        ignores the autoscaler's protocol offer, like signals built before version 2 existed
+    :param encodings: if set, only use these payload encodings
+    :param timeseries_layouts: if set, only use these timeseries layouts
+    :param delta_metrics: if False, always ask for the full metrics window
+    """
+    server = socket.socket(socket.AF_UNIX)
+    server.bind(f"\0{socket_name}")
+    server.listen(1)
+    while True:
+        conn, __ = server.accept()
+        with conn:
+            signal_kwargs = json.loads(conn.recv(4096))
+            offer = dict(signal_kwargs.get("protocol", {}))
+            offer["versions"] = [version for version in offer.get("versions", []) if version in protocol_versions]
+            if encodings:
+                offer["encodings"] = [encoding for encoding in offer.get("encodings", []) if encoding in encodings]
+            if timeseries_layouts:
+                offer["timeseries_layouts"] = [
+                    layout for layout in offer.get("timeseries_layouts", []) if layout in timeseries_layouts
+                ]
+
+            offer["delta_metrics"] = offer.get("delta_metrics", False) and delta_metrics
+
+            try:
+                protocol = choose_protocol(offer)
+                if protocol.version == SIGNAL_PROTOCOL_V2:
+                    send_frame(conn, 0, protocol._asdict(), ENCODING_JSON)
+                    _serve_v2(conn, protocol)
+                else:
+                    _serve_v1(conn)
+            except (EOFError, BrokenPipeError, ConnectionResetError):
+                pass  # the autoscaler went away, wait for the next one
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("socket_name", help="e.g. {signal_namespace}-{signal_name}-{app}-socket")
+    parser.add_argument("--protocol-versions", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--encodings", nargs="+")
+    parser.add_argument("--timeseries-layouts", nargs="+")
+    parser.add_argument("--no-delta-metrics", action="store_true", help="always ask for the full metrics window")
+    args = parser.parse_args()
+    serve(
+        args.socket_name,
+        args.protocol_versions,
+        args.encodings,
+        args.timeseries_layouts,
+        delta_metrics=not args.no_delta_metrics,
+    )
+
+
+if __name__ == "__main__":
+    main()
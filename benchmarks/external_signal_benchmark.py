@@ -0,0 +1,93 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Round-trip time of ExternalSignal.evaluate() against a local echo signal, for each version of the signal protocol
+
+Usage: python -m benchmarks.external_signal_benchmark [--metrics N] [--points N] [--evaluations N]
+"""
+import argparse
+import itertools
+import multiprocessing
+import time
+from unittest import mock
+
+import arrow
+import staticconf.testing
+
+from benchmarks.echo_signal_server import serve
+from clusterman.signals.external_signal import ExternalSignal
+from clusterman.signals.signal_protocol import available_encodings
+from clusterman.signals.signal_protocol import TIMESERIES_COLUMNAR
+from clusterman.signals.signal_protocol import TIMESERIES_ROWS
+
+SIGNAL_NAMESPACE = "benchmark"
+SIGNAL_NAME = "EchoSignal"
+APP = "bench"
+
+# (label, protocol versions the signal understands, encodings, timeseries layouts, delta metrics)
+VARIANTS = [("v1", [1], None, None, False)] + [
+    (f"v2 {encoding} {layout}{' delta' if delta else ''}", [1, 2], [encoding], [layout], delta)
+    for encoding in available_encodings()
+    for layout in (TIMESERIES_ROWS, TIMESERIES_COLUMNAR)
+    for delta in (False, True)
+]
+
+
+def run_benchmark(num_metrics, num_points, num_evaluations):
+    # The window slides forward by one datapoint for each evaluation, like it does on every autoscaler tick
+    history = [(t, float(t)) for t in range(num_points + num_evaluations)]
+    socket_name = f"{SIGNAL_NAMESPACE}-{SIGNAL_NAME}-{APP}-socket"
+
+    print(f"{'protocol':<32} {'connect':>10} {'evaluate':>10}")
+    for label, versions, encodings, layouts, delta in VARIANTS:
+        config = {"autoscale_signal": {"name": SIGNAL_NAME, "period_minutes": 10, "protocol_version": max(versions)}}
+        server = multiprocessing.Process(
+            target=serve,
+            args=(socket_name, versions, encodings, layouts, delta),
+            daemon=True,
+        )
+        server.start()
+        windows = (
+            {f"metric{i}": history[tick : tick + num_points] for i in range(num_metrics)} for tick in itertools.count()
+        )
+        try:
+            with staticconf.testing.MockConfiguration(config, namespace="bench_signal"), mock.patch(
+                "clusterman.signals.external_signal.get_metrics_for_signal", side_effect=windows
+            ):
+                start = time.perf_counter()
+                signal = ExternalSignal("bench", "bench", "kubernetes", APP, "bench_signal", None, SIGNAL_NAMESPACE)
+                connect_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                for _ in range(num_evaluations):
+                    resources = signal.evaluate(arrow.get(0))
+                evaluate_time = (time.perf_counter() - start) / num_evaluations
+                assert resources.cpus == num_metrics * num_points
+                signal._signal_conn.close()
+        finally:
+            server.terminate()
+            server.join()
+        print(f"{label:<32} {connect_time * 1000:8.1f}ms {evaluate_time * 1000:8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--metrics", type=int, default=10, help="number of metrics sent to the signal")
+    parser.add_argument("--points", type=int, default=1000, help="number of datapoints per metric")
+    parser.add_argument("--evaluations", type=int, default=100, help="number of times to evaluate the signal")
+    args = parser.parse_args()
+    run_benchmark(args.metrics, args.points, args.evaluations)
+
+
+if __name__ == "__main__":
+    main()
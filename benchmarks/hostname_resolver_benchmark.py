@@ -0,0 +1,59 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Wall-clock time to resolve the hostnames for a pool of instances, using a fake DNS server with fixed latency
+
+Usage: python -m benchmarks.hostname_resolver_benchmark [--instances N] [--latency SECONDS] [--workers N]
+"""
+import argparse
+import socket
+import time
+
+from clusterman.aws.hostname_resolver import HostnameResolver
+
+
+def _timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:<32} {time.perf_counter() - start:8.3f}s")
+    return result
+
+
+def run_benchmark(num_instances, latency, max_workers):
+    ips = [f"10.{i // 65536}.{i // 256 % 256}.{i % 256}" for i in range(num_instances)]
+
+    def fake_gethostbyaddr(ip):
+        time.sleep(latency)
+        if ip.endswith(".0"):  # make a few lookups fail, to exercise the fallback path
+            raise socket.herror("Unknown host")
+        return f"host-{ip}"
+
+    fallbacks = {ip: f"ip-{ip.replace('.', '-')}.ec2.internal" for ip in ips}
+    resolver = HostnameResolver(fake_gethostbyaddr, max_workers=max_workers, timeout=60)
+
+    _timed(f"serial x {num_instances}", lambda: [fake_gethostbyaddr(ip) for ip in ips if not ip.endswith(".0")])
+    _timed(f"resolve_all x {num_instances}", lambda: resolver.resolve_all(ips, fallbacks=fallbacks))
+    _timed(f"resolve_all (cached) x {num_instances}", lambda: resolver.resolve_all(ips, fallbacks=fallbacks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--instances", type=int, default=1000, help="number of instance IPs to resolve")
+    parser.add_argument("--latency", type=float, default=0.01, help="simulated DNS round-trip time (seconds)")
+    parser.add_argument("--workers", type=int, default=32, help="size of the resolver thread pool")
+    args = parser.parse_args()
+    run_benchmark(args.instances, args.latency, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Wall-clock time to drain a batch of Kubernetes nodes, using an in-memory API server with fixed latency
+
+Some of the evictions are rejected by a PodDisruptionBudget a couple of times before they're allowed.
+
+Usage: python -m benchmarks.kubernetes_drain_benchmark [--nodes N] [--pods-per-node N] [--latency SECONDS]
+    [--workers N ...]
+"""
+import argparse
+import logging
+import random
+import threading
+import time
+from unittest import mock
+
+from kubernetes.client import V1NodeSpec
+from kubernetes.client import V1ObjectMeta
+from kubernetes.client import V1Pod
+from kubernetes.client.models.v1_node import V1Node
+from kubernetes.client.rest import ApiException
+
+from clusterman.kubernetes.kubernetes_cluster_connector import KubernetesClusterConnector
+
+
+class FakeCoreV1Api:
+    def __init__(self, nodes, pods_by_node, pdb_rejections, latency):
+        self.nodes = {node.metadata.name: node for node in nodes}
+        self.pods_by_node = pods_by_node
+        self.pdb_rejections = dict(pdb_rejections)
+        self.latency = latency
+        self.removed_pods = 0
+        self._lock = threading.Lock()
+
+    def read_node(self, name):
+        time.sleep(self.latency)
+        return self.nodes[name]
+
+    def patch_node(self, name, body):
+        time.sleep(self.latency)
+
+    def list_pod_for_all_namespaces(self, field_selector):
+        time.sleep(self.latency)
+        return mock.Mock(items=self.pods_by_node[field_selector.split("=")[1]])
+
+    def create_namespaced_pod_eviction(self, name, namespace, body):
+        time.sleep(self.latency)
+        with self._lock:
+            if self.pdb_rejections.get(name, 0) > 0:
+                self.pdb_rejections[name] -= 1
+                raise ApiException(status=429, reason="Too Many Requests")
+            self.removed_pods += 1
+
+
+class BenchmarkClusterConnector(KubernetesClusterConnector):
+    def __init__(self, core_api, max_workers):
+        self._core_api = core_api
+        self._nodes_by_ip = {}
+        self._drain_max_workers = max_workers
+        self._drain_timeout_seconds = 60
+        self._drain_executor = None
+
+
+def run_benchmark(num_nodes, pods_per_node, latency, worker_counts):
+    rng = random.Random(0)
+    nodes = [V1Node(metadata=V1ObjectMeta(name=f"node{i}"), spec=V1NodeSpec()) for i in range(num_nodes)]
+    pods_by_node = {
+        node.metadata.name: [
+            V1Pod(metadata=V1ObjectMeta(name=f"{node.metadata.name}-pod{j}", namespace="paasta"))
+            for j in range(pods_per_node)
+        ]
+        for node in nodes
+    }
+    pod_names = [pod.metadata.name for pods in pods_by_node.values() for pod in pods]
+    pdb_rejections = {name: 2 for name in rng.sample(pod_names, len(pod_names) // 10)}
+    node_names = list(pods_by_node)
+
+    print(f"{'mode':<20} {'workers':>8} {'elapsed':>10} {'pods removed':>13}")
+    with mock.patch("clusterman.kubernetes.kubernetes_cluster_connector.EVICTION_RETRY_BACKOFF_SECONDS", latency):
+        # One node and one pod at a time, like drain_node used to
+        core_api = FakeCoreV1Api(nodes, pods_by_node, pdb_rejections, latency)
+        connector = BenchmarkClusterConnector(core_api, max_workers=1)
+        start = time.perf_counter()
+        for node_name in node_names:
+            connector.drain_node(node_name, False)
+        elapsed = time.perf_counter() - start
+        print(f"{'serial':<20} {1:>8} {elapsed:9.2f}s {core_api.removed_pods:>13}")
+
+        for max_workers in worker_counts:
+            core_api = FakeCoreV1Api(nodes, pods_by_node, pdb_rejections, latency)
+            connector = BenchmarkClusterConnector(core_api, max_workers=max_workers)
+            start = time.perf_counter()
+            drained = connector.drain_nodes(node_names, False)
+            elapsed = time.perf_counter() - start
+            assert all(drained.values())
+            print(f"{'drain_nodes':<20} {max_workers:>8} {elapsed:9.2f}s {core_api.removed_pods:>13}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=20)
+    parser.add_argument("--pods-per-node", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.01, help="API server latency (seconds)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 16, 32], help="worker pool sizes")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    run_benchmark(args.nodes, args.pods_per_node, args.latency, args.workers)
+
+
+if __name__ == "__main__":
+    main()
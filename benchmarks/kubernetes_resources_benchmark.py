@@ -0,0 +1,124 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Microbenchmark for adding up the resource requests of a large number of Kubernetes pods
+
+Usage: python -m benchmarks.kubernetes_resources_benchmark [--pods N] [--containers N] [--seed N]
+"""
+import argparse
+import random
+import re
+import time
+
+from humanfriendly import parse_size
+from kubernetes.client import V1Container
+from kubernetes.client import V1ObjectMeta
+from kubernetes.client import V1Pod
+from kubernetes.client import V1PodSpec
+from kubernetes.client import V1ResourceRequirements
+
+from clusterman.kubernetes.util import allocated_node_resources
+from clusterman.util import ClustermanResources
+
+MILLIBYTE_MATCH_EXPR = re.compile(r"(\d+)m$")
+
+
+def _uncached_pod_resources(pod):
+    # The original implementation, which parses every quantity with humanfriendly on every call
+    def cpus(resources):
+        cpu_str = resources.get("cpu", "100m")
+        return float(cpu_str[:-1]) / 1000 if cpu_str[-1] == "m" else float(cpu_str)
+
+    def mem(resources):
+        memory = resources.get("memory", "200MB")
+        result = MILLIBYTE_MATCH_EXPR.search(memory)
+        if result:
+            memory = str(int(result.group(1)) // 1000)
+        return parse_size(memory) / 1000000
+
+    def disk(resources):
+        return parse_size(resources.get("ephemeral-storage", "0")) / 1000000
+
+    def gpus(resources):
+        return int(resources.get("nvidia.com/gpu", 0))
+
+    containers = pod.spec.containers
+    return ClustermanResources(
+        cpus=sum(cpus(c.resources.requests) for c in containers),
+        mem=sum(mem(c.resources.requests) for c in containers),
+        disk=sum(disk(c.resources.requests) for c in containers),
+        gpus=sum(gpus(c.resources.requests) for c in containers),
+    )
+
+
+def _make_pods(num_pods, num_containers, rng):
+    cpus = ["100m", "250m", "500m", "1", "2", "4"]
+    memory = ["128Mi", "256Mi", "512Mi", "1Gi", "1.5Gi", "4Gi", "500M"]
+    disk = ["1Gi", "5Gi", "10Gi", "20G"]
+    return [
+        V1Pod(
+            metadata=V1ObjectMeta(name=f"pod{i}", uid=f"uid-{i}", resource_version=str(rng.randint(1, 10**6))),
+            spec=V1PodSpec(
+                containers=[
+                    V1Container(
+                        name=f"container{j}",
+                        resources=V1ResourceRequirements(
+                            requests={
+                                "cpu": rng.choice(cpus),
+                                "memory": rng.choice(memory),
+                                "ephemeral-storage": rng.choice(disk),
+                            }
+                        ),
+                    )
+                    for j in range(num_containers)
+                ]
+            ),
+        )
+        for i in range(num_pods)
+    ]
+
+
+def _timed(label, num_pods, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed:8.3f}s  {num_pods / elapsed:12.0f} pods/s")
+    return result
+
+
+def run_benchmark(num_pods, num_containers, seed):
+    pods = _make_pods(num_pods, num_containers, random.Random(seed))
+
+    def uncached_total():
+        total = ClustermanResources()
+        for pod in pods:
+            total += _uncached_pod_resources(pod)
+        return total
+
+    expected = _timed("humanfriendly, uncached", num_pods, uncached_total)
+    first = _timed("first reload (cold cache)", num_pods, lambda: allocated_node_resources(pods))
+    second = _timed("next reload (warm cache)", num_pods, lambda: allocated_node_resources(pods))
+    assert expected == first == second
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pods", type=int, default=50000)
+    parser.add_argument("--containers", type=int, default=2, help="number of containers per pod")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run_benchmark(args.pods, args.containers, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Time and peak memory for MesosClusterConnector.reload_state on a large cluster, served from memory
+
+Compares parsing the full slaves and master/frameworks responses and counting tasks from the parsed dicts (the old
+behaviour) with reload_state, which streams the responses with ijson if it's installed.
+
+Usage: python -m benchmarks.mesos_reload_benchmark [--agents N] [--tasks N] [--seed N]
+"""
+import argparse
+import io
+import json
+import random
+import re
+import time
+import tracemalloc
+from collections import defaultdict
+from unittest import mock
+
+import requests
+
+from clusterman.mesos import mesos_cluster_connector
+from clusterman.mesos.mesos_cluster_connector import MesosClusterConnector
+from clusterman.mesos.util import agent_pid_to_ip
+from clusterman.mesos.util import allocated_agent_resources
+from clusterman.mesos.util import total_agent_resources
+
+FRAMEWORK_NAMES = ["marathon", "marathon-user", "chronos", "jenkins", "tron"]
+NON_BATCH_FRAMEWORK_PREFIXES = ["marathon"]
+
+
+class BenchmarkClusterConnector(MesosClusterConnector):
+    # Skip the staticconf lookups; the responses come from memory instead of the Mesos masters
+    def __init__(self):
+        self.pool = "benchmark"
+        self.api_endpoint = "http://mesos-benchmark:5050/"
+        self.non_batch_framework_prefixes = NON_BATCH_FRAMEWORK_PREFIXES
+        self._non_batch_framework_re = re.compile("marathon")
+
+
+def _make_responses(num_agents, num_tasks, rng):
+    agents = [
+        {
+            "id": f"agent-{i}",
+            "pid": f"slave(1)@10.{i // 65536}.{i // 256 % 256}.{i % 256}:5051",
+            "hostname": f"host{i}",
+            "attributes": {"pool": rng.choice(["benchmark", "other"])},
+            "resources": {"cpus": 32, "mem": 131072, "disk": 500000, "gpus": 0, "ports": "[31000-32000]"},
+            "used_resources": {"cpus": rng.randint(0, 32), "mem": rng.randint(0, 128) * 1024.0, "disk": 0, "gpus": 0},
+        }
+        for i in range(num_agents)
+    ]
+    frameworks = [{"id": f"framework-{name}", "name": name, "active": True, "tasks": []} for name in FRAMEWORK_NAMES]
+    for i in range(num_tasks):
+        framework = rng.choice(frameworks)
+        framework["tasks"].append(
+            {
+                "id": f"service.instance.{i}",
+                "name": f"service.instance.{i}",
+                "framework_id": framework["id"],
+                "slave_id": rng.choice(agents)["id"],
+                "state": rng.choice(["TASK_RUNNING"] * 9 + ["TASK_STAGING"]),
+                "resources": {"cpus": 0.5, "mem": 1024.0, "disk": 0, "gpus": 0, "ports": "[31001-31001]"},
+                "statuses": [
+                    {"state": "TASK_STAGING", "timestamp": 1600000000.0, "container_status": {}},
+                    {"state": "TASK_RUNNING", "timestamp": 1600000001.0, "container_status": {}},
+                ],
+                "labels": [{"key": "tron", "value": "x" * 200}],
+                "discovery": {"visibility": "EXTERNAL", "ports": {"ports": [{"number": 31001, "protocol": "tcp"}]}},
+            }
+        )
+    return {
+        "slaves": json.dumps({"slaves": agents}).encode(),
+        "master/frameworks": json.dumps({"frameworks": frameworks, "completed_frameworks": []}).encode(),
+    }
+
+
+def _old_reload_state(responses):
+    agents_by_ip = {
+        agent_pid_to_ip(agent["pid"]): agent
+        for agent in json.loads(responses["slaves"])["slaves"]
+        if agent.get("attributes", {}).get("pool", "default") == "benchmark"
+    }
+    frameworks = {framework["id"]: framework for framework in json.loads(responses["master/frameworks"])["frameworks"]}
+    tasks = [task for framework in frameworks.values() for task in framework["tasks"]]
+    task_counts = defaultdict(lambda: {"all_tasks": 0, "batch_tasks": 0})
+    for task in tasks:
+        if task["state"] == "TASK_RUNNING":
+            task_counts[task["slave_id"]]["all_tasks"] += 1
+            framework_name = frameworks[task["framework_id"]]["name"]
+            if not any([framework_name.startswith(prefix) for prefix in NON_BATCH_FRAMEWORK_PREFIXES]):
+                task_counts[task["slave_id"]]["batch_tasks"] += 1
+    return {
+        ip: (allocated_agent_resources(agent), total_agent_resources(agent), task_counts[agent["id"]]["all_tasks"])
+        for ip, agent in agents_by_ip.items()
+    }, (agents_by_ip, frameworks, tasks)
+
+
+def _make_response(data):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = data
+    response.raw = io.BytesIO(data)
+    return response
+
+
+def _measured(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+
+    # tracing slows everything down a lot, so the peak memory comes from a second run
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<32} {elapsed:8.3f}s {peak / 2**20:10.1f} MiB")
+    return result
+
+
+def run_benchmark(num_agents, num_tasks, seed):
+    responses = _make_responses(num_agents, num_tasks, random.Random(seed))
+    print(f"response sizes: {', '.join(f'{k}={len(v) / 2**20:.1f} MiB' for k, v in responses.items())}")
+    print(f"{'mode':<32} {'elapsed':>9} {'peak memory':>14}")
+    expected, __ = _measured("full parse (old)", lambda: _old_reload_state(responses))
+
+    connector = BenchmarkClusterConnector()
+    with mock.patch(
+        "clusterman.mesos.mesos_cluster_connector.mesos_post",
+        side_effect=lambda url, endpoint, stream=False: _make_response(responses[endpoint]),
+    ):
+        with mock.patch("clusterman.mesos.mesos_cluster_connector.ijson", None):
+            _measured("reload_state (json)", connector.reload_state)
+        if mesos_cluster_connector.ijson:
+            _measured("reload_state (ijson)", connector.reload_state)
+
+    task_counts = connector._task_count_per_agent
+    actual = {
+        ip: (agent.allocated_resources, agent.total_resources, task_counts[agent.agent_id]["all_tasks"])
+        for ip, agent in connector._agents_by_ip.items()
+    }
+    assert actual == expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--agents", type=int, default=2000)
+    parser.add_argument("--tasks", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run_benchmark(args.agents, args.tasks, args.seed)
+
+
+if __name__ == "__main__":
+    main()
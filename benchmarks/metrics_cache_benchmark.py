@@ -0,0 +1,107 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Replay a day of autoscaler ticks against ClustermanMetricsBotoClient, with and without the local metrics cache
+
+Each tick asks for a week of history for one metric (like Autoscaler._get_historical_weighted_resource_value) and
+the last hour of a few signal metrics.  The datastore is an in-memory stand-in, so the reported datastore time is
+modelled from the number of queries and pages rather than measured.
+
+Usage: python -m benchmarks.metrics_cache_benchmark [--hours N] [--signal-metrics N] [--max-datapoints N]
+"""
+import argparse
+import time
+from bisect import bisect_left
+from bisect import bisect_right
+from collections import defaultdict
+from types import SimpleNamespace
+from unittest import mock
+
+from clusterman_metrics import APP_METRICS
+from clusterman_metrics import ClustermanMetricsBotoClient
+from clusterman_metrics.boto_client import _CACHE_MAX_DATAPOINTS
+
+APP = "bench"
+QUERY_LATENCY = 0.02  # seconds per round-trip to the datastore
+PAGE_SIZE = 5000  # datapoints per page of query results
+WEEK = 7 * 24 * 60 * 60
+
+
+class InMemoryMetricsClient(ClustermanMetricsBotoClient):
+    def __init__(self, timeseries, **kwargs):
+        with mock.patch("clusterman_metrics.boto_client.get_metrics_session"):
+            super().__init__("us-west-2", app_identifier=APP, ttl_days=-1, **kwargs)
+        self.timeseries = timeseries
+        self.num_queries = 0
+        self.num_datapoints = 0
+
+    def _get_new_metric_values(self, key_prefix, metric_query, metric_type, time_start, time_end, *args, **kwargs):
+        metric_key = key_prefix + metric_query
+        timestamps, values = self.timeseries[metric_key]
+        first, last = bisect_left(timestamps, time_start), bisect_right(timestamps, time_end)
+        self.num_queries += 1 + (last - first) // PAGE_SIZE
+        self.num_datapoints += last - first
+        new_data = defaultdict(list)
+        new_data[metric_key] = list(zip(timestamps[first:last], values[first:last]))
+        return new_data
+
+
+def run_benchmark(hours, num_signal_metrics, max_datapoints):
+    end_time = 1600000000
+    start_time = end_time - hours * 3600
+    metric_names = ["non_orphan_fulfilled_capacity"] + [f"signal_metric_{i}" for i in range(num_signal_metrics)]
+    timeseries = {
+        f"{APP},{name}": (
+            list(range(start_time - WEEK, end_time + 1, 60)),
+            [i % 100 for i in range(start_time - WEEK, end_time + 1, 60)],
+        )
+        for name in metric_names
+    }
+
+    print(f"{'cache':<10} {'queries':>8} {'datapoints':>12} {'datastore time':>15} {'client time':>12}")
+    for use_cache in (False, True):
+        client = InMemoryMetricsClient(timeseries, cache_max_datapoints=max_datapoints)
+        clock = SimpleNamespace(time=lambda: now)
+        elapsed = 0.0
+        with mock.patch("clusterman_metrics.boto_client.time", clock):
+            for now in range(start_time, end_time, 60):
+                tick_start = time.perf_counter()
+                client.get_metric_values(metric_names[0], APP_METRICS, now - WEEK, now, use_cache=use_cache)
+                for name in metric_names[1:]:
+                    client.get_metric_values(name, APP_METRICS, now - 3600, now, use_cache=use_cache)
+                elapsed += time.perf_counter() - tick_start
+
+        datastore_time = client.num_queries * QUERY_LATENCY
+        label = "on" if use_cache else "off"
+        print(
+            f"{label:<10} {client.num_queries:>8} {client.num_datapoints:>12} "
+            f"{datastore_time:>14.1f}s {elapsed:>11.2f}s"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hours", type=int, default=24, help="hours of autoscaler ticks (one minute apart) to replay")
+    parser.add_argument("--signal-metrics", type=int, default=4, help="number of hourly signal metrics per tick")
+    parser.add_argument(
+        "--max-datapoints",
+        type=int,
+        default=_CACHE_MAX_DATAPOINTS,
+        help="size limit for the local cache (set this low to see the effect of evictions)",
+    )
+    args = parser.parse_args()
+    run_benchmark(args.hours, args.signal_metrics, args.max_datapoints)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Time and peak memory for loading simulator metrics files, in the old compressed JSON and the columnar formats
+
+The generated data looks like a month of minutely per-market metrics for one pool: a spot price timeseries for each
+market, a fulfilled capacity timeseries with one value per market, and the allocated CPUs.
+
+Usage: python -m benchmarks.metrics_file_benchmark [--days N] [--markets N] [--seed N]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from clusterman_metrics import METADATA
+from clusterman_metrics import SYSTEM_METRICS
+
+from clusterman.simulator.io import read_metrics_file
+from clusterman.simulator.io import read_object_from_compressed_json
+from clusterman.simulator.io import write_metrics_file
+from clusterman.simulator.io import write_object_to_compressed_json
+
+START_TIMESTAMP = 1500000000
+
+
+def _make_metrics(days, num_markets, rng):
+    timestamps = range(START_TIMESTAMP, START_TIMESTAMP + days * 86400, 60)
+    markets = [f"c5.{size}xlarge,us-west-2{az}" for size in range(1, num_markets + 1) for az in "abc"][:num_markets]
+    metrics = {METADATA: {}, SYSTEM_METRICS: {}}
+    for market in markets:
+        instance_type, az = market.split(",")
+        key = f"spot_prices|aws_availability_zone={az},aws_instance_type={instance_type}"
+        metrics[METADATA][key] = [(ts, rng.uniform(0.1, 1)) for ts in timestamps]
+    metrics[METADATA]["fulfilled_capacity|cluster=benchmark,pool=default"] = [
+        (ts, {market: rng.randint(0, 100) for market in rng.sample(markets, rng.randint(1, len(markets)))})
+        for ts in timestamps
+    ]
+    metrics[SYSTEM_METRICS]["cpus_allocated|cluster=benchmark,pool=default"] = [
+        (ts, rng.uniform(0, 1000)) for ts in timestamps
+    ]
+    return metrics
+
+
+def _read_all(filename):
+    # touch every timeseries, like the simulation metrics client does
+    metrics = read_metrics_file(filename)
+    return {metric_type: dict(timeseries_by_key) for metric_type, timeseries_by_key in metrics.items()}
+
+
+def _read_one(filename):
+    return read_metrics_file(filename)[SYSTEM_METRICS]["cpus_allocated|cluster=benchmark,pool=default"]
+
+
+def _measured(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+
+    # tracing slows everything down a lot, so the peak memory comes from a second run
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<32} {elapsed:8.3f}s {peak / 2**20:10.1f} MiB")
+    return result
+
+
+def run_benchmark(days, num_markets, seed):
+    metrics = _make_metrics(days, num_markets, random.Random(seed))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        old_filename, new_filename = os.path.join(tmpdir, "metrics.json.gz"), os.path.join(tmpdir, "metrics.npz")
+        write_object_to_compressed_json(metrics, old_filename)
+        write_metrics_file(metrics, new_filename)
+        print(f"old file: {os.path.getsize(old_filename) / 2**20:.1f} MiB")
+        print(f"new file: {os.path.getsize(new_filename) / 2**20:.1f} MiB")
+
+        print(f"{'mode':<32} {'elapsed':>9} {'peak memory':>14}")
+        expected = _measured("compressed JSON (old)", lambda: read_object_from_compressed_json(old_filename, True))
+        actual = _measured("columnar, every timeseries", lambda: _read_all(new_filename))
+        _measured("columnar, one timeseries", lambda: _read_one(new_filename))
+
+    for metric_type, timeseries_by_key in expected.items():
+        for key, timeseries in timeseries_by_key.items():
+            assert [tuple(point) for point in timeseries] == actual[metric_type][key], key
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--markets", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run_benchmark(args.days, args.markets, args.seed)
+
+
+if __name__ == "__main__":
+    main()
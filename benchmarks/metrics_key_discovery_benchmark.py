@@ -0,0 +1,138 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Wall-clock time to discover the keys for a regex metric query on each autoscaler tick, using an in-memory stand-in
+for the metrics_key_lookup index with fixed latency per query
+
+Usage: python -m benchmarks.metrics_key_discovery_benchmark [--keys N] [--ticks N] [--latency SECONDS]
+"""
+import argparse
+import re
+import time
+from unittest import mock
+
+from boto3.dynamodb.conditions import Key
+from clusterman_metrics import APP_METRICS
+from clusterman_metrics import ClustermanMetricsBotoClient
+from clusterman_metrics.boto_client import _GSI_PARTITIONS
+from clusterman_metrics.boto_client import GSI_NAME
+from clusterman_metrics.boto_client import GSI_PK
+from clusterman_metrics.boto_client import GSI_SORT
+
+APP = "bench"
+KEY_PREFIX = f"{APP},"
+PAGE_SIZE = 1000
+
+
+class FakeIndexTable:
+    """Just enough of a DynamoDB table (or client) to answer paginated queries against the metrics_key_lookup index"""
+
+    def __init__(self, items, latency):
+        self.items_by_partition = {}
+        for item in items:
+            self.items_by_partition.setdefault(item[GSI_PK], []).append(item)
+        for partition_items in self.items_by_partition.values():
+            partition_items.sort(key=lambda item: item[GSI_SORT])
+        self.latency = latency
+        self.num_queries = 0
+
+    def query(self, IndexName, KeyConditionExpression, FilterExpression=None, ExclusiveStartKey=None, TableName=None):
+        assert IndexName == GSI_NAME
+        time.sleep(self.latency)
+        self.num_queries += 1
+        partition_condition, sort_condition = KeyConditionExpression.get_expression()["values"]
+        partition = partition_condition.get_expression()["values"][1]
+        __, low, high = sort_condition.get_expression()["values"]
+        matches = [
+            item for item in self.items_by_partition.get(partition, []) if low <= item[GSI_SORT] <= high
+        ]
+
+        start = ExclusiveStartKey or 0
+        response = {"Items": matches[start : start + PAGE_SIZE]}
+        if start + PAGE_SIZE < len(matches):
+            response["LastEvaluatedKey"] = start + PAGE_SIZE
+        if FilterExpression is not None:
+            expression = FilterExpression.get_expression()
+            literal = expression["values"][1]
+            if expression["operator"] == "begins_with":
+                response["Items"] = [item for item in response["Items"] if item["key"].startswith(literal)]
+            else:
+                response["Items"] = [item for item in response["Items"] if literal in item["key"]]
+        return response
+
+
+def _serial_get_keys(table, metric_query, time_start, time_end):
+    # The original implementation: query each partition one after the other, and filter the keys client-side
+    metric_keys = set()
+    for i in range(_GSI_PARTITIONS):
+        query_condition = Key(GSI_PK).eq(i) & Key(GSI_SORT).between(
+            KEY_PREFIX + str(time_start), KEY_PREFIX + str(time_end)
+        )
+        query_kwargs = {"IndexName": GSI_NAME, "KeyConditionExpression": query_condition}
+        while True:
+            response = table.query(**query_kwargs)
+            metric_keys |= {item["key"] for item in response["Items"] if re.search(metric_query, item["key"])}
+            if "LastEvaluatedKey" not in response:
+                break
+            query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    return metric_keys
+
+
+def run_benchmark(num_keys, num_ticks, latency):
+    # one datapoint per key per minute, spread over the partitions like the writer does; the replayed ticks end an
+    # hour ago so that none of the data is too recent to be cached
+    end_time = int(time.time()) // 60 * 60 - 3600
+    window = 3600
+    items = [
+        {"key": f"{KEY_PREFIX}{name}_{i}", GSI_PK: (i + t) % _GSI_PARTITIONS, GSI_SORT: f"{KEY_PREFIX}{t}"}
+        for t in range(end_time - window - 60 * num_ticks, end_time + 1, 60)
+        for i in range(num_keys)
+        for name in ("cpus_requested", "mem_requested")
+    ]
+    table = FakeIndexTable(items, latency)
+    metric_query = "cpus_requested_.*"
+
+    with mock.patch("clusterman_metrics.boto_client.get_metrics_session") as mock_session:
+        mock_session.return_value.resource.return_value.meta.client = table
+        client = ClustermanMetricsBotoClient("us-west-2", app_identifier=APP, ttl_days=-1)
+    table_name = client._get_table_name(APP_METRICS)
+
+    print(f"{'implementation':<16} {'queries':>8} {'elapsed':>10}")
+    for label, get_keys in [
+        ("serial", lambda start, end: _serial_get_keys(table, metric_query, start, end)),
+        (
+            "concurrent",
+            lambda start, end: client._get_keys_from_query(KEY_PREFIX, metric_query, start, end, table_name),
+        ),
+    ]:
+        table.num_queries = 0
+        start_time = time.perf_counter()
+        for tick in range(num_ticks):
+            time_end = end_time - 60 * (num_ticks - tick)
+            keys = get_keys(time_end - window, time_end)
+        elapsed = time.perf_counter() - start_time
+        assert len(keys) == num_keys, f"{label} found {len(keys)} keys"
+        print(f"{label:<16} {table.num_queries:>8} {elapsed:9.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=50, help="number of distinct keys matching the query")
+    parser.add_argument("--ticks", type=int, default=20, help="number of autoscaler ticks (one minute apart)")
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated round-trip time per query (seconds)")
+    args = parser.parse_args()
+    run_benchmark(args.keys, args.ticks, args.latency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Throughput of ClustermanMetricsBotoClient.get_writer against an in-memory DynamoDB with fixed request latency
+
+Every run writes the same stream of datapoints (for a few metric types, with some repeated keys), and some of the
+items are left unprocessed, so the numbers include de-duplication and retries; the tests for that logic are in
+tests/metrics/boto_client_test.py.
+
+Usage: python -m benchmarks.metrics_writer_benchmark [--items N] [--workers N ...] [--unprocessed FRACTION]
+"""
+import argparse
+import functools
+import random
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from clusterman_metrics import APP_METRICS
+from clusterman_metrics import ClustermanMetricsBotoClient
+from clusterman_metrics import METADATA
+from clusterman_metrics import SYSTEM_METRICS
+from clusterman_metrics.boto_client import MetricsBatchWriter
+
+
+class FakeDynamoDB:
+    """Just enough of the DynamoDB service resource (and its client) to handle BatchWriteItem"""
+
+    def __init__(self, latency, unprocessed_fraction, seed):
+        self.meta = SimpleNamespace(client=self)
+        self.latency = latency
+        self.unprocessed_fraction = unprocessed_fraction
+        self.random = random.Random(seed)
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def batch_write_item(self, RequestItems):
+        requests = [
+            (table_name, request) for table_name, table_requests in RequestItems.items() for request in table_requests
+        ]
+        assert len(requests) <= 25, "too many items in one BatchWriteItem request"
+        items = [(table_name, request["PutRequest"]["Item"]) for table_name, request in requests]
+        item_ids = [(table_name, item["key"], item["timestamp"]) for table_name, item in items]
+        assert len(set(item_ids)) == len(item_ids), "duplicate keys in one BatchWriteItem request"
+
+        time.sleep(self.latency)
+        unprocessed = {}
+        with self.lock:
+            for item_id, (table_name, request) in zip(item_ids, requests):
+                if self.random.random() < self.unprocessed_fraction:
+                    unprocessed.setdefault(table_name, []).append(request)
+                else:
+                    self.tables.setdefault(table_name, {})[item_id[1:]] = request["PutRequest"]["Item"]
+        return {"UnprocessedItems": unprocessed}
+
+
+def run_benchmark(num_items, worker_counts, latency, unprocessed_fraction, seed):
+    rng = random.Random(seed)
+    num_keys = max(num_items // 10, 1)
+    metric_types = [SYSTEM_METRICS, APP_METRICS, METADATA]
+    datapoints = [
+        (rng.choice(metric_types), f"metric_{rng.randrange(num_keys)}", 1600000000 + rng.randrange(10), rng.random())
+        for __ in range(num_items)
+    ]
+
+    print(f"{'workers':>8} {'elapsed':>9} {'items/s':>9} {'batches':>8} {'dedup':>7} {'retries':>8}")
+    for workers in worker_counts:
+        ddb = FakeDynamoDB(latency, unprocessed_fraction, seed)
+        with mock.patch("clusterman_metrics.boto_client.get_metrics_session") as mock_session, mock.patch(
+            "clusterman_metrics.boto_client.MetricsBatchWriter",
+            functools.partial(MetricsBatchWriter, max_workers=workers),
+        ), mock.patch("clusterman_metrics.boto_client._WRITE_BACKOFF_SECONDS", latency / 10):
+            mock_session.return_value.resource.return_value = ddb
+            client = ClustermanMetricsBotoClient("us-west-2", app_identifier="bench", ttl_days=-1)
+
+            start_time = time.perf_counter()
+            with client.get_writer(SYSTEM_METRICS) as system_writer, client.get_writer(
+                APP_METRICS
+            ) as app_writer, client.get_writer(METADATA) as metadata_writer:
+                writers = {SYSTEM_METRICS: system_writer, APP_METRICS: app_writer, METADATA: metadata_writer}
+                for metric_type, metric_name, timestamp, value in datapoints:
+                    writers[metric_type].send((metric_name, timestamp, value))
+            elapsed = time.perf_counter() - start_time
+
+        stats = system_writer.stats
+
+        print(
+            f"{workers:>8} {elapsed:>8.2f}s {num_items / elapsed:>9.0f} {stats.batches_written:>8} "
+            f"{stats.items_deduplicated:>7} {stats.retries:>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=5000, help="number of datapoints to write")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="writer thread pool sizes")
+    parser.add_argument("--latency", type=float, default=0.01, help="simulated BatchWriteItem latency (seconds)")
+    parser.add_argument(
+        "--unprocessed", type=float, default=0.05, help="fraction of items DynamoDB leaves unprocessed per request"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run_benchmark(args.items, args.workers, args.latency, args.unprocessed, args.seed)
+
+
+if __name__ == "__main__":
+    main()
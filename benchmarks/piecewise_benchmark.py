@@ -0,0 +1,81 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Microbenchmark for PiecewiseConstantFunction on large curves
+
+Usage: python -m benchmarks.piecewise_benchmark [--breakpoints N] [--queries N] [--seed N]
+"""
+import argparse
+import random
+import time
+
+from clusterman.math.piecewise import PiecewiseConstantFunction
+from clusterman.math.piecewise_array import PiecewiseConstantArray
+
+
+def _timed(label, num_ops, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed:8.3f}s  {num_ops / elapsed:12.0f} ops/s")
+    return result
+
+
+def run_benchmark(num_breakpoints, num_queries, seed):
+    rng = random.Random(seed)
+    xvals = [rng.randint(0, num_breakpoints * 100) for _ in range(num_breakpoints)]
+    deltas = [rng.choice([-1, 1]) * rng.randint(1, 64) for _ in range(num_breakpoints)]
+    query_xvals = [rng.randint(0, num_breakpoints * 100) for _ in range(num_queries)]
+    fn = PiecewiseConstantFunction()
+
+    def add_deltas():
+        for xval, delta in zip(xvals, deltas):
+            fn.add_delta(xval, delta)
+
+    def add_breakpoints():
+        for xval in query_xvals:
+            fn.add_breakpoint(xval, xval % 64)
+
+    def calls():
+        for xval in query_xvals:
+            fn.call(xval)
+
+    def integrals():
+        for xval in query_xvals:
+            fn.integral(xval, xval + 100)
+
+    _timed(f"add_delta x {num_breakpoints}", num_breakpoints, add_deltas)
+    _timed(f"call x {num_queries}", num_queries, calls)
+    _timed(f"add_breakpoint x {num_queries}", num_queries, add_breakpoints)
+    _timed(f"integral x {num_queries}", num_queries, integrals)
+    _timed("values (full range)", len(fn.breakpoints), lambda: fn.values(0, num_breakpoints * 100, 1000))
+
+    curve_size, max_xval = len(fn.breakpoints), num_breakpoints * 100
+    array_fn = _timed("to array", curve_size, lambda: PiecewiseConstantArray.from_piecewise(fn))
+    _timed("array values (full range)", curve_size, lambda: array_fn.values(0, max_xval, 1000))
+    _timed("array integrals (full range)", curve_size, lambda: array_fn.integrals(0, max_xval, 1000))
+    _timed("combine (fn - fn)", curve_size, lambda: fn - fn)
+    _timed("array combine (fn - fn)", curve_size, lambda: array_fn - array_fn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--breakpoints", type=int, default=10**6, help="number of breakpoints to add with add_delta")
+    parser.add_argument("--queries", type=int, default=10**5, help="number of point queries/updates to time")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for generating the curve")
+    args = parser.parse_args()
+    run_benchmark(args.breakpoints, args.queries, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Time spent generating the metrics for one large Kubernetes pool after it's been reloaded
+
+Compares building the full agent metadata for every node to find the non-orphan capacity (the old behaviour) with
+just looking up each node's state, and the per-resource getters with a single shared snapshot.
+
+Usage: python -m benchmarks.pool_metrics_benchmark [--nodes N] [--pods-per-node N] [--orphans N] [--seed N]
+"""
+import argparse
+import random
+import time
+
+from kubernetes.client import V1Container
+from kubernetes.client import V1NodeAddress
+from kubernetes.client import V1NodeStatus
+from kubernetes.client import V1ObjectMeta
+from kubernetes.client import V1Pod
+from kubernetes.client import V1PodSpec
+from kubernetes.client import V1ResourceRequirements
+
+from clusterman.autoscaler.pool_manager import AWS_RUNNING_STATES
+from clusterman.autoscaler.pool_manager import PoolManager
+from clusterman.interfaces.types import AgentState
+from clusterman.interfaces.types import InstanceMetadata
+from clusterman.kubernetes.kubernetes_cluster_connector import KubernetesClusterConnector
+from clusterman.kubernetes.util import allocatable_node_resources
+from clusterman.kubernetes.util import allocated_node_resources
+from clusterman.kubernetes.util import KubernetesNode
+from clusterman.mesos.metrics_generators import generate_kubernetes_metrics
+from clusterman.mesos.metrics_generators import generate_simple_metadata
+from clusterman.mesos.metrics_generators import generate_system_metrics
+from clusterman.mesos.metrics_generators import get_pool_metrics_snapshot
+from clusterman.util import ClustermanResources
+
+
+class BenchmarkClusterConnector(KubernetesClusterConnector):
+    # Skip the kubeconfig and the staticconf lookups; the state is filled in by _make_pool instead of reload_state
+    safe_to_evict_key = "clusterman.com/safe_to_evict"
+
+    def __init__(self, nodes_by_ip, pods_by_ip):
+        self.cluster, self.pool = "kube-benchmark", "benchmark"
+        self._safe_to_evict_annotation = "cluster-autoscaler.kubernetes.io/safe-to-evict"
+        self._nodes_by_ip = nodes_by_ip
+        self._pods_by_ip = pods_by_ip
+        self._excluded_pods = []
+        self._excluded_pods_resources = ClustermanResources()
+        self._unschedulable_pods = []
+        self._unschedulable_pods_resources = ClustermanResources()
+        self._allocated_pods_resources = allocated_node_resources([pod for pods in pods_by_ip.values() for pod in pods])
+        self._total_resources = sum(
+            (allocatable_node_resources(node) for node in nodes_by_ip.values()), ClustermanResources()
+        )
+
+
+class FakeResourceGroup:
+    def __init__(self, instance_metadatas):
+        self.instance_metadatas = instance_metadatas
+        self.target_capacity = len(instance_metadatas)
+        self.is_stale = False
+        self.market_capacities = {"market-1": len(instance_metadatas)}
+
+    def get_instance_metadatas(self, state_filter=None):
+        return self.instance_metadatas
+
+
+def _make_pool(num_nodes, pods_per_node, num_orphans, rng):
+    nodes_by_ip, pods_by_ip, instance_metadatas = {}, {}, []
+    for i in range(num_nodes + num_orphans):
+        ip = f"10.{i // 65536}.{i // 256 % 256}.{i % 256}"
+        instance_metadatas.append(InstanceMetadata(market="market-1", weight=1, ip_address=ip, state="running"))
+        if i >= num_nodes:
+            continue  # the instance is running, but it never joined the cluster
+
+        nodes_by_ip[ip] = KubernetesNode(
+            metadata=V1ObjectMeta(name=f"node{i}"),
+            status=V1NodeStatus(
+                allocatable={"cpu": "16", "memory": "64Gi"},
+                addresses=[V1NodeAddress(type="InternalIP", address=ip)],
+            ),
+        )
+        pods_by_ip[ip] = [
+            V1Pod(
+                metadata=V1ObjectMeta(
+                    name=f"pod{i}-{j}",
+                    uid=f"uid-{i}-{j}",
+                    annotations={"cluster-autoscaler.kubernetes.io/safe-to-evict": rng.choice(["true", "false"])},
+                ),
+                spec=V1PodSpec(
+                    containers=[
+                        V1Container(
+                            name="main",
+                            resources=V1ResourceRequirements(
+                                requests={"cpu": rng.choice(["250m", "1", "2"]), "memory": rng.choice(["1Gi", "4Gi"])}
+                            ),
+                        )
+                    ]
+                ),
+            )
+            for j in range(rng.randint(0, pods_per_node))
+        ]
+
+    manager = PoolManager.__new__(PoolManager)
+    manager.cluster, manager.pool, manager.scheduler = "kube-benchmark", "benchmark", "kubernetes"
+    manager.cluster_connector = BenchmarkClusterConnector(nodes_by_ip, pods_by_ip)
+    manager.resource_groups = {
+        f"rg-{i}": FakeResourceGroup(instance_metadatas[i::10]) for i in range(min(10, len(instance_metadatas)))
+    }
+    return manager
+
+
+def _timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:<44} {time.perf_counter() - start:8.3f}s")
+    return result
+
+
+def run_benchmark(num_nodes, pods_per_node, num_orphans, seed):
+    manager = _make_pool(num_nodes, pods_per_node, num_orphans, random.Random(seed))
+    connector = manager.cluster_connector
+
+    def full_metadata_capacity():
+        return sum(
+            node_metadata.instance.weight
+            for node_metadata in manager.get_node_metadatas(AWS_RUNNING_STATES)
+            if node_metadata.agent.state not in (AgentState.ORPHANED, AgentState.UNKNOWN)
+        )
+
+    expected = _timed("non-orphan capacity (full agent metadata)", full_metadata_capacity)
+    actual = _timed("non-orphan capacity (agent state only)", manager._calculate_non_orphan_fulfilled_capacity)
+    assert expected == actual == num_nodes
+    manager.non_orphan_fulfilled_capacity = actual
+
+    def per_resource_getters():
+        return [
+            [getattr(connector, getter)(resource) for resource in ClustermanResources._fields]
+            for getter in ("get_resource_allocation", "get_resource_total", "get_resource_pending")
+        ]
+
+    _timed("resource totals (one call per resource)", per_resource_getters)
+    snapshot = _timed("resource totals (shared snapshot)", lambda: get_pool_metrics_snapshot(manager))
+    assert list(snapshot.allocated) == per_resource_getters()[0]
+
+    def generate_all():
+        for generator in (generate_system_metrics, generate_simple_metadata, generate_kubernetes_metrics):
+            list(generator(manager, snapshot))
+
+    _timed("generate all metrics from the snapshot", generate_all)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--pods-per-node", type=int, default=30, help="maximum number of pods on each node")
+    parser.add_argument("--orphans", type=int, default=50, help="number of instances that aren't in the cluster")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run_benchmark(args.nodes, args.pods_per_node, args.orphans, args.seed)
+
+
+if __name__ == "__main__":
+    main()
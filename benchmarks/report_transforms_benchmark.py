@@ -0,0 +1,75 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark for the report heatmap and trend transforms on a quarter of minutely data
+
+Usage: python -m benchmarks.report_transforms_benchmark [--days N] [--interval-seconds N] [--seed N]
+"""
+import argparse
+import random
+import time
+
+import arrow
+from sortedcontainers import SortedDict
+
+from clusterman.math.piecewise import PiecewiseConstantFunction
+from clusterman.math.piecewise_array import PiecewiseConstantArray
+from clusterman.reports.data_transforms import transform_heatmap_data
+from clusterman.reports.data_transforms import transform_trend_data
+from clusterman.reports.report_types import DEFAULT_TREND_ROLLUP
+from clusterman.simulator.util import timestamp_micros
+
+
+def _timed(label, num_points, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed:8.3f}s  {num_points / elapsed:12.0f} points/s")
+    return result
+
+
+def run_benchmark(num_days, interval_seconds, seed):
+    rng = random.Random(seed)
+    tz = arrow.parser.TzinfoParser.parse("US/Pacific")
+    start = arrow.get("2018-01-01").replace(tzinfo=tz)
+    end = start.shift(days=num_days)
+    months = list(arrow.Arrow.span_range("month", start, end))
+    # like the simulator's timeseries, the data is keyed by UTC timestamps
+    utc_start = start.to("utc")
+    data = SortedDict(
+        (utc_start.shift(seconds=i), rng.uniform(0, 100)) for i in range(0, num_days * 86400, interval_seconds)
+    )
+
+    threshold = PiecewiseConstantFunction(50)
+    for day in range(num_days):
+        threshold.add_delta(start.shift(days=day), rng.uniform(-1, 1))
+    threshold_array = PiecewiseConstantArray.from_piecewise(threshold, timestamp_micros)
+
+    def heatmap():
+        return transform_heatmap_data(data, lambda x, y: y > threshold_array.call(x), months, tz)
+
+    _timed(f"heatmap x {len(data)}", len(data), heatmap)
+    _timed(f"trend x {len(data)}", len(data), lambda: transform_trend_data(data, months, DEFAULT_TREND_ROLLUP, tz))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=90, help="number of days of data to transform")
+    parser.add_argument("--interval-seconds", type=int, default=60, help="seconds between data points")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for generating the data")
+    args = parser.parse_args()
+    run_benchmark(args.days, args.interval_seconds, args.seed)
+
+
+if __name__ == "__main__":
+    main()
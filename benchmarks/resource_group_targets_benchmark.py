@@ -0,0 +1,106 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark for PoolManager._compute_new_resource_group_targets over a grid of capacity deltas and group counts
+
+Usage: python -m benchmarks.resource_group_targets_benchmark [--deltas N ...] [--groups N ...] [--max-reference-steps N]
+"""
+import argparse
+import logging
+import math
+import random
+import time
+from types import SimpleNamespace
+
+from clusterman.autoscaler.pool_manager import PoolManager
+
+
+def _one_step_at_a_time(pool_manager, new_target_capacity):
+    # The original implementation, which moves capacity one unit at a time
+    non_stale_groups = [group for group in pool_manager.resource_groups.values() if not group.is_stale]
+    coeff = -1 if new_target_capacity < pool_manager.target_capacity else 1
+    targets = {g.id: g.target_capacity for g in non_stale_groups}
+
+    def is_constrained(group):
+        if coeff > 0:
+            return targets[group.id] + coeff > group.max_capacity
+        else:
+            return targets[group.id] + coeff < group.min_capacity
+
+    while sum(targets.values()) * coeff < math.ceil(new_target_capacity) * coeff:
+        unconstrained_groups = [g for g in non_stale_groups if not is_constrained(g)]
+        if not unconstrained_groups:
+            break
+        group = sorted(unconstrained_groups, key=lambda g: (coeff * targets[g.id], g.id))[0]
+        targets[group.id] += coeff
+    return targets
+
+
+def _make_pool_manager(num_groups, rng):
+    pool_manager = PoolManager.__new__(PoolManager)  # skip __init__, we don't need any config or AWS access
+    pool_manager.resource_groups = {
+        f"sfr-{i}": SimpleNamespace(
+            id=f"sfr-{i}",
+            target_capacity=rng.randint(0, 100),
+            is_stale=False,
+            min_capacity=0,
+            max_capacity=rng.choice([float("inf"), rng.randint(100, 10000)]),
+        )
+        for i in range(num_groups)
+    }
+    return pool_manager
+
+
+def _timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def run_benchmark(deltas, group_counts, max_reference_steps, seed):
+    rng = random.Random(seed)
+    print(f"{'groups':>8} {'delta':>8} {'water-fill':>12} {'one-at-a-time':>14}")
+    for num_groups in group_counts:
+        pool_manager = _make_pool_manager(num_groups, rng)
+        for delta in deltas:
+            new_target_capacity = pool_manager.target_capacity + delta
+            elapsed, targets = _timed(lambda: pool_manager._compute_new_resource_group_targets(new_target_capacity), 10)
+            reference = "skipped"
+            if abs(delta) * num_groups <= max_reference_steps:
+                reference_elapsed, reference_targets = _timed(
+                    lambda: _one_step_at_a_time(pool_manager, new_target_capacity), 1
+                )
+                assert targets == reference_targets
+                reference = f"{reference_elapsed * 1000:12.2f}ms"
+            print(f"{num_groups:>8} {delta:>8} {elapsed * 1000:10.2f}ms {reference:>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--deltas", type=int, nargs="+", default=[10, 100, 1000, 10000, -10, -100, -1000])
+    parser.add_argument("--groups", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument(
+        "--max-reference-steps",
+        type=int,
+        default=10**5,
+        help="skip the one-at-a-time implementation when delta * groups is larger than this",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed for generating the resource groups")
+    args = parser.parse_args()
+    logging.getLogger("clusterman").setLevel(logging.ERROR)  # don't log every time we can't reach the target
+    run_benchmark(args.deltas, args.groups, args.max_reference_steps, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Wall-clock time to fetch the metrics for a signal, using a fake metrics client with fixed latency per query
+
+Usage: python -m benchmarks.signal_metrics_benchmark [--metrics N] [--points N] [--latency SECONDS] [--workers N ...]
+"""
+import argparse
+import time
+
+import arrow
+from clusterman_metrics import APP_METRICS
+from clusterman_metrics import SYSTEM_METRICS
+
+from clusterman.interfaces.signal import get_metrics_for_signal
+
+
+class FakeMetricsClient:
+    def __init__(self, num_points, latency):
+        self.num_points = num_points
+        self.latency = latency
+
+    def get_metric_values(self, metric_query, metric_type, time_start, time_end, **kwargs):
+        time.sleep(self.latency)
+        # old and new system metrics interleave, so the merge has some work to do
+        offset = 0 if kwargs["extra_dimensions"].get("pool", "").endswith(".mesos") else 1
+        return {metric_query: [(2 * i + offset, float(i)) for i in range(self.num_points)]}
+
+
+def run_benchmark(num_metrics, num_points, latency, worker_counts):
+    required_metrics = [
+        {"name": f"metric{i}", "type": SYSTEM_METRICS if i % 2 else APP_METRICS, "minute_range": 10}
+        for i in range(num_metrics)
+    ]
+    metrics_client = FakeMetricsClient(num_points, latency)
+    end_time = arrow.get(10**6)
+
+    print(f"{'workers':>8} {'elapsed':>10}")
+    for max_workers in worker_counts:
+        start = time.perf_counter()
+        get_metrics_for_signal(
+            "cluster", "pool", "mesos", "app", metrics_client, required_metrics, end_time, max_workers=max_workers
+        )
+        print(f"{max_workers:>8} {time.perf_counter() - start:9.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--metrics", type=int, default=20, help="number of metrics required by the signal")
+    parser.add_argument("--points", type=int, default=10000, help="number of datapoints returned per query")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated round-trip time per query (seconds)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+    run_benchmark(args.metrics, args.points, args.latency, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark for a large simulated spot fleet over a simulated month
+
+Every step (10 simulated minutes), some random instances are terminated (and replaced by the spot fleet), and the
+fleet's capacity and resource totals are read, like the autoscaler does.  The simulator itself is replaced by a minimal
+stand-in, so that the costs of the simulated cluster aren't hidden by the cost and price bookkeeping.
+
+Usage: python -m benchmarks.simulated_fleet_benchmark [--instances N] [--days N] [--churn N] [--seed N]
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+import arrow
+
+from clusterman.math.piecewise import PiecewiseConstantFunction
+from clusterman.simulator.simulated_spot_fleet_resource_group import SimulatedSpotFleetResourceGroup
+
+INSTANCE_TYPES = ["c5.4xlarge", "m5.4xlarge", "r5.4xlarge", "m4.4xlarge", "c3.4xlarge"]
+AVAILABILITY_ZONES = ["us-west-2a", "us-west-2b"]
+STEP_MINUTES = 10
+
+
+def _make_spot_fleet():
+    simulator = SimpleNamespace(
+        current_time=arrow.get(0),
+        instance_prices=defaultdict(lambda: PiecewiseConstantFunction(0.5)),
+        add_instance=lambda instance: None,
+        remove_instance=lambda instance: None,
+    )
+    config = {
+        "AllocationStrategy": "diversified",
+        "LaunchSpecifications": [
+            {
+                "InstanceType": instance_type,
+                "Placement": {"AvailabilityZone": az},
+                "SpotPrice": 1.0,
+                "WeightedCapacity": 1,
+            }
+            for instance_type in INSTANCE_TYPES
+            for az in AVAILABILITY_ZONES
+        ],
+    }
+    return SimulatedSpotFleetResourceGroup(config, simulator)
+
+
+def run_benchmark(num_instances, days, churn, seed):
+    rng = random.Random(seed)
+    spot_fleet = _make_spot_fleet()
+    spot_fleet.modify_target_capacity(num_instances)
+    num_steps = days * 24 * 60 // STEP_MINUTES
+
+    start = time.perf_counter()
+    for step in range(num_steps):
+        spot_fleet.simulator.current_time = arrow.get(step * STEP_MINUTES * 60)
+        spot_fleet.terminate_instances_by_id(rng.sample(spot_fleet.instance_ids, churn))
+        spot_fleet.fulfilled_capacity, spot_fleet.market_capacities
+        spot_fleet.cpus, spot_fleet.mem, spot_fleet.disk
+    elapsed = time.perf_counter() - start
+
+    assert len(spot_fleet) == spot_fleet.fulfilled_capacity == num_instances
+    print(f"{num_steps} steps, {num_instances} instances: {elapsed:8.3f}s  {num_steps / elapsed:10.0f} steps/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--instances", type=int, default=10000, help="number of instances in the fleet")
+    parser.add_argument("--days", type=int, default=30, help="number of simulated days")
+    parser.add_argument("--churn", type=int, default=100, help="number of instances to terminate each step")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for choosing instances to terminate")
+    args = parser.parse_args()
+    run_benchmark(args.instances, args.days, args.churn, args.seed)
+
+
+if __name__ == "__main__":
+    main()
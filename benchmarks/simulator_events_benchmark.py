@@ -0,0 +1,120 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Time and peak memory for running the simulator on spot price changes, with every event added to the queue up
+front (one event per price point per market) and with a lazy, coalesced event source
+
+Usage: python -m benchmarks.simulator_events_benchmark [--days N] [--markets N] [--seed N]
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+import tracemalloc
+
+import arrow
+
+from clusterman.aws.markets import EC2_INSTANCE_TYPES
+from clusterman.aws.markets import InstanceMarket
+from clusterman.cli.simulate import _populate_price_changes
+from clusterman.simulator.event import InstancePriceChangeEvent
+from clusterman.simulator.simulator import Simulator
+from clusterman.simulator.util import SimulationMetadata
+from clusterman.util import setup_logging
+
+START_TIMESTAMP = 1500000000
+
+
+class _PriceMetricsClient:
+    def __init__(self, prices):
+        self.prices = prices
+
+    def get_metric_values(self, metric_name, metric_type, time_start, time_end, use_cache, extra_dimensions):
+        market = InstanceMarket(extra_dimensions["aws_instance_type"], extra_dimensions["aws_availability_zone"])
+        return {metric_name: self.prices[market]}
+
+
+def _make_prices(days, num_markets, rng):
+    # spot prices for every market are collected at the same time, once a minute
+    timestamps = range(START_TIMESTAMP, START_TIMESTAMP + days * 86400, 60)
+    markets = [InstanceMarket(instance, az) for instance in EC2_INSTANCE_TYPES for az in ("us-west-2a", "us-west-2b")]
+    return {market: [(ts, rng.uniform(0.1, 1)) for ts in timestamps] for market in markets[:num_markets]}
+
+
+def _make_simulator(prices, days):
+    simulator = Simulator(
+        SimulationMetadata("benchmark", "benchmark", "default", "mesos"),
+        arrow.get(START_TIMESTAMP),
+        arrow.get(START_TIMESTAMP + days * 86400),
+        metrics_client=_PriceMetricsClient(prices),
+    )
+    simulator.markets = set(prices)
+    return simulator
+
+
+def _run_up_front(prices, days):
+    simulator = _make_simulator(prices, days)
+    for market, market_prices in prices.items():
+        for timestamp, price in market_prices:
+            simulator.add_event(InstancePriceChangeEvent(arrow.get(timestamp), {market: price}))
+    simulator.run()
+    return simulator
+
+
+def _run_lazy(prices, days):
+    simulator = _make_simulator(prices, days)
+    _populate_price_changes(simulator, simulator.start_time, simulator.end_time, None)
+    simulator.run()
+    return simulator
+
+
+def _measured(label, num_points, fn):
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+
+        # tracing slows everything down a lot, so the peak memory comes from a second run
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    print(f"{label:<32} {elapsed:8.3f}s {peak / 2**20:10.1f} MiB {num_points / elapsed:12.0f} prices/s")
+    return result
+
+
+def run_benchmark(days, num_markets, seed):
+    setup_logging("warning")
+    prices = _make_prices(days, num_markets, random.Random(seed))
+    num_points = sum(len(market_prices) for market_prices in prices.values())
+
+    print(f"{'mode':<32} {'elapsed':>9} {'peak memory':>14}")
+    expected = _measured("every event up front (old)", num_points, lambda: _run_up_front(prices, days))
+    actual = _measured("lazy coalesced event source", num_points, lambda: _run_lazy(prices, days))
+
+    for market in prices:
+        assert expected.instance_prices[market].breakpoints == actual.instance_prices[market].breakpoints, market
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--markets", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run_benchmark(args.days, args.markets, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -194,6 +194,7 @@ def get_parser(description=""):  # pragma: no cover
     from clusterman.cli.manage import add_manager_parser
     from clusterman.cli.status import add_status_parser
     from clusterman.cli.simulate import add_simulate_parser
+    from clusterman.cli.simulate import add_simulate_sweep_parser
     from clusterman.cli.toggle import add_cluster_disable_parser
     from clusterman.cli.toggle import add_cluster_enable_parser
     from clusterman.cli.migrate import add_migration_parser
@@ -219,6 +220,7 @@ def get_parser(description=""):  # pragma: no cover
     add_status_parser(subparser)
     add_manager_parser(subparser)
     add_simulate_parser(subparser)
+    add_simulate_sweep_parser(subparser)
     add_migration_parser(subparser)
     add_migration_stop_parser(subparser)
 
@@ -31,6 +31,8 @@ import staticconf
 from kubernetes.client.models.v1_pod import V1Pod as KubernetesPod
 
 from clusterman.aws.aws_resource_group import AWSResourceGroup
+from clusterman.aws.hostname_resolver import HostnameResolver
+from clusterman.aws.instance_snapshot import InstanceSnapshot
 from clusterman.aws.markets import InstanceMarket
 from clusterman.aws.util import RESOURCE_GROUPS
 from clusterman.config import POOL_NAMESPACE
@@ -44,6 +46,7 @@ from clusterman.interfaces.cluster_connector import ClusterConnector
 from clusterman.interfaces.resource_group import ResourceGroup
 from clusterman.interfaces.types import AgentState
 from clusterman.interfaces.types import ClusterNodeMetadata
+from clusterman.interfaces.types import InstanceMetadata
 from clusterman.kubernetes.kubernetes_cluster_connector import KubernetesClusterConnector
 from clusterman.kubernetes.util import total_pod_resources
 from clusterman.monitoring_lib import get_monitoring_client
@@ -89,6 +92,9 @@ class PoolManager:
         monitoring_info = {"cluster": cluster, "pool": pool}
         self.killable_nodes_counter = get_monitoring_client().create_counter(SFX_KILLABLE_NODES_COUNT, monitoring_info)
 
+        # Unlike the instance snapshot, the hostname resolver (and its cache) lives across reloads
+        self.hostname_resolver = HostnameResolver()
+
         if fetch_state:
             self.reload_state()
 
@@ -105,6 +111,13 @@ class PoolManager:
         logger.info("Recalculating non-orphan fulfilled capacity")
         self.non_orphan_fulfilled_capacity = self._calculate_non_orphan_fulfilled_capacity()
 
+    def close(self) -> None:
+        """Stop the pool manager's background threads (i.e., the hostname resolver's lookups)
+
+        Lookups that are still running aren't waited for, so a hung DNS query doesn't hold up the caller.
+        """
+        self.hostname_resolver.shutdown(wait=False)
+
     def get_num_removed_nodes_before_last_reload(self) -> int:
         if not isinstance(self.cluster_connector, KubernetesClusterConnector):
             logger.warning("get_num_removed_nodes_since_last_reload is only supported for Kubernetes clusters")
@@ -241,6 +254,12 @@ class PoolManager:
                 self.cluster_connector.get_agent_metadata(instance_metadata.ip_address),
                 instance_metadata,
             )
+            for instance_metadata in self._get_instance_metadatas(state_filter)
+        ]
+
+    def _get_instance_metadatas(self, state_filter: Optional[Collection[str]] = None) -> Sequence[InstanceMetadata]:
+        return [
+            instance_metadata
             for group in self.resource_groups.values()
             for instance_metadata in group.get_instance_metadatas(state_filter)
         ]
@@ -304,6 +323,9 @@ class PoolManager:
         return filtered_options
 
     def _reload_resource_groups(self) -> None:
+        # All of the resource groups share one snapshot of the EC2 instance data, which is fetched with a
+        # single DescribeInstances call and then re-used by every resource group until the next reload
+        self.instance_snapshot = InstanceSnapshot()
         resource_groups: MutableMapping[str, ResourceGroup] = {}
         for resource_group_conf in self.pool_config.read_list("resource_groups"):
             if not isinstance(resource_group_conf, dict) or len(resource_group_conf) != 1:
@@ -320,6 +342,8 @@ class PoolManager:
                     cluster=self.cluster,
                     pool=self.pool,
                     config=list(resource_group_conf.values())[0],
+                    instance_snapshot=self.instance_snapshot,
+                    hostname_resolver=self.hostname_resolver,
                 )
             )
         self.resource_groups = resource_groups
@@ -488,6 +512,10 @@ class PoolManager:
     def _compute_new_resource_group_targets(self, new_target_capacity: float) -> Mapping[str, float]:
         """Compute a balanced distribution of target capacities for the resource groups in the cluster
 
+        Capacity is added (or removed) one unit at a time, always to the group with the lowest (or highest) target
+        capacity that isn't at its max (or min) capacity, with ties broken by group ID.  Rather than simulating this
+        step-by-step, we compute how many steps each group would get directly; see _water_fill for details.
+
         :param new_target_capacity: the desired new target capacity that needs to be distributed
         :returns: A list of target_capacity values, sorted in order of resource groups
         """
@@ -503,30 +531,30 @@ class PoolManager:
         for stale_group in stale_groups:
             targets[stale_group.id] = 0
 
-        def is_constrained(group):
-            if coeff > 0:
-                return targets[group.id] + coeff > group.max_capacity
-            else:
-                return targets[group.id] + coeff < group.min_capacity
+        num_steps = max(0, math.ceil(coeff * (math.ceil(new_target_capacity) - sum(targets.values()))))
+        if not num_steps:
+            return targets
 
-        while sum(targets.values()) * coeff < math.ceil(new_target_capacity) * coeff:
-            try:
-                group = sorted(
-                    [g for g in non_stale_groups if not is_constrained(g)],
-                    key=lambda g: (coeff * targets[g.id], g.id),
-                )[0]
-            except IndexError:
-                logger.warning(
-                    " ".join(
-                        [
-                            "All resource groups are stale or constrained.",
-                            f"The closest we could get to {new_target_capacity} is {sum(targets.values())}",
-                        ]
-                    )
+        groups = sorted(non_stale_groups, key=lambda g: g.id)
+        levels = [coeff * targets[g.id] for g in groups]
+        step_limits = [
+            _max_steps(level, coeff * (g.max_capacity if coeff > 0 else g.min_capacity))
+            for level, g in zip(levels, groups)
+        ]
+        is_constrained = sum(step_limits) < num_steps
+        steps = step_limits if is_constrained else _water_fill(levels, step_limits, num_steps)
+        for group, group_steps in zip(groups, steps):
+            targets[group.id] += coeff * group_steps
+
+        if is_constrained:
+            logger.warning(
+                " ".join(
+                    [
+                        "All resource groups are stale or constrained.",
+                        f"The closest we could get to {new_target_capacity} is {sum(targets.values())}",
+                    ]
                 )
-                break
-
-            targets[group.id] += coeff
+            )
 
         return targets
 
@@ -602,10 +630,12 @@ class PoolManager:
         )
 
     def _calculate_non_orphan_fulfilled_capacity(self) -> float:
+        # Only the agent state matters here, so don't build the full metadata for every node
         return sum(
-            node_metadata.instance.weight
-            for node_metadata in self.get_node_metadatas(AWS_RUNNING_STATES)
-            if node_metadata.agent.state not in (AgentState.ORPHANED, AgentState.UNKNOWN)
+            instance_metadata.weight
+            for instance_metadata in self._get_instance_metadatas(AWS_RUNNING_STATES)
+            if self.cluster_connector.get_agent_state(instance_metadata.ip_address)
+            not in (AgentState.ORPHANED, AgentState.UNKNOWN)
         )
 
     def is_node_still_in_pool(self, node_metadata: ClusterNodeMetadata) -> bool:
@@ -656,3 +686,46 @@ class PoolManager:
         be greater than or equal to the target capacity.
         """
         return sum(group.fulfilled_capacity for group in self.resource_groups.values())
+
+
+def _max_steps(level: float, bound: float) -> float:
+    """How many unit steps can be added to level without going over bound"""
+    if math.isinf(bound):
+        return bound if bound > 0 else 0
+    return max(0, math.floor(bound - level))
+
+
+def _water_fill(levels: Sequence[float], step_limits: Sequence[float], num_steps: int) -> List[int]:
+    """Hand out num_steps unit steps one at a time, each to the lowest level that can still take a step (ties go to
+    the earliest level in the list), and return how many steps each level got
+
+    Doing this one step at a time costs O(num_steps * n log n); but since each level's candidate values (level,
+    level + 1, ..., level + step_limit - 1) are increasing, the steps that get handed out are just the num_steps
+    smallest candidates across all levels.  So we binary search for the integer x such that fewer than num_steps
+    candidates are below x but at least num_steps are below x + 1, and then break ties within [x, x + 1), where each
+    level has at most one candidate.  This costs O(n log(num_steps + max(levels) - min(levels)) + n log n).
+
+    :param levels: the starting value for each level
+    :param step_limits: the maximum number of steps each level can take
+    :param num_steps: the number of steps to hand out; must be no more than sum(step_limits)
+    """
+
+    def steps_below(x: int) -> List[int]:
+        return [int(min(limit, max(0, math.ceil(x - level)))) for level, limit in zip(levels, step_limits)]
+
+    # Invariant: sum(steps_below(lo)) <= num_steps < sum(steps_below(hi))
+    lo = math.floor(min(levels))
+    hi = math.floor(max(levels)) + num_steps + 1
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if sum(steps_below(mid)) <= num_steps:
+            lo = mid
+        else:
+            hi = mid
+
+    steps = steps_below(lo)
+    remaining_steps = num_steps - sum(steps)
+    next_candidates = sorted((level + steps[i], i) for i, level in enumerate(levels) if steps[i] < step_limits[i])
+    for __, i in next_candidates[:remaining_steps]:
+        steps[i] += 1
+    return steps
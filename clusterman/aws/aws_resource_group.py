@@ -14,8 +14,6 @@
 from abc import ABCMeta
 from abc import abstractmethod
 from abc import abstractproperty
-from collections import defaultdict
-from socket import gethostbyaddr
 from typing import Any
 from typing import cast
 from typing import Collection
@@ -32,6 +30,8 @@ from clusterman.aws.client import cached_s3_get_object
 from clusterman.aws.client import ec2
 from clusterman.aws.client import ec2_describe_instances
 from clusterman.aws.client import InstanceDict
+from clusterman.aws.hostname_resolver import get_default_hostname_resolver
+from clusterman.aws.instance_snapshot import InstanceSnapshot
 from clusterman.aws.markets import get_instance_market
 from clusterman.aws.markets import InstanceMarket
 from clusterman.aws.markets import MarketDict
@@ -79,20 +79,45 @@ class AWSResourceGroup(ResourceGroup, metaclass=ABCMeta):
         # AWS data once and store them so we don't run into AWS request limits
         #
         # This is expected to populate self.instance_ids, which has to be done _before_
-        # we populate the instances by market
+        # we register the instances with the snapshot.  If the snapshot is shared with other
+        # resource groups (as it is in the PoolManager), the instances for all of the groups
+        # are described together the first time any of them are needed.
         self._reload_resource_group()
-        self._instances_by_market = self._get_instances_by_market()
+        self._instance_snapshot = kwargs.get("instance_snapshot") or InstanceSnapshot()
+        self._instance_snapshot.register_group(self.group_id, self.instance_ids)
+        self._hostname_resolver = kwargs.get("hostname_resolver") or get_default_hostname_resolver()
+
+    def reload(self) -> None:
+        """Reload the resource group's data from AWS
+
+        The group is registered with its instance snapshot again, so that the snapshot picks up any instances that
+        have joined the group, and describes the group's instances again the next time they're needed.
+        """
+        self._reload_resource_group()
+        self._instance_snapshot.register_group(self.group_id, self.instance_ids, refresh=True)
 
     def get_instance_metadatas(self, state_filter: Optional[Collection[str]] = None) -> Sequence[InstanceMetadata]:
+        instance_dicts = [
+            instance_dict
+            for instance_dict in self._instance_snapshot.get_instances(self.group_id)
+            if not state_filter or instance_dict["State"]["Name"] in state_filter
+        ]
+
+        # Resolve all of the hostnames at once; if DNS doesn't give us an answer in time, fall back to the
+        # private DNS name that EC2 knows about
+        private_dns_names = {
+            instance_dict["PrivateIpAddress"]: instance_dict.get("PrivateDnsName") or None
+            for instance_dict in instance_dicts
+            if instance_dict.get("PrivateIpAddress")
+        }
+        hostnames = self._hostname_resolver.resolve_all(private_dns_names.keys(), fallbacks=private_dns_names)
+
         instance_metadatas = []
-        for instance_dict in ec2_describe_instances(instance_ids=self.instance_ids):
+        for instance_dict in instance_dicts:
             aws_state = instance_dict["State"]["Name"]
-            if state_filter and aws_state not in state_filter:
-                continue
-
             instance_market = get_instance_market(cast(MarketDict, instance_dict))
             instance_ip = instance_dict.get("PrivateIpAddress")
-            hostname = gethostbyaddr(instance_ip)[0] if instance_ip else None
+            hostname = hostnames.get(instance_ip) if instance_ip else None
             is_cordoned = self._is_instance_cordoned(instance_dict)
 
             metadata = InstanceMetadata(
@@ -204,12 +229,13 @@ class AWSResourceGroup(ResourceGroup, metaclass=ABCMeta):
             return 0
         return self._target_capacity
 
-    def _get_instances_by_market(self):
-        """Responses from this API call are cached to prevent hitting any AWS request limits"""
-        instance_dict: Mapping[InstanceMarket, List[Mapping]] = defaultdict(list)
-        for instance in ec2_describe_instances(self.instance_ids):
-            instance_dict[get_instance_market(cast(MarketDict, instance))].append(instance)
-        return instance_dict
+    @property
+    def _instances_by_market(self) -> Mapping[InstanceMarket, List[InstanceDict]]:
+        return self._get_instances_by_market()
+
+    def _get_instances_by_market(self) -> Mapping[InstanceMarket, List[InstanceDict]]:
+        """Responses from this API call are cached in the snapshot to prevent hitting any AWS request limits"""
+        return self._instance_snapshot.get_instances_by_market(self.group_id)
 
     @abstractproperty
     def _target_capacity(self):  # pragma: no cover
@@ -0,0 +1,188 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+import threading
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Mapping
+from typing import MutableMapping
+from typing import Optional
+
+import cachetools
+import colorlog
+
+
+logger = colorlog.getLogger(__name__)
+DEFAULT_MAX_WORKERS = 32
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_NEGATIVE_TTL_SECONDS = 30
+DEFAULT_TIMEOUT_SECONDS = 10
+_default_resolver: Optional["HostnameResolver"] = None
+_default_resolver_lock = threading.Lock()
+
+
+def _gethostbyaddr(ip: str) -> str:
+    # look this up at call time so that socket.gethostbyaddr can be patched in tests
+    return socket.gethostbyaddr(ip)[0]
+
+
+class HostnameResolver:
+    def __init__(
+        self,
+        resolve_fn: Callable[[str], str] = _gethostbyaddr,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        ttl: float = DEFAULT_TTL_SECONDS,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL_SECONDS,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+    ) -> None:
+        """Reverse-DNS lookups for instance IP addresses, with caching and a bounded amount of concurrency
+
+        Successful lookups are cached for `ttl` seconds, and failed lookups are cached for `negative_ttl` seconds so
+        that an IP address without a PTR record doesn't cost us a DNS timeout on every autoscaler run.
+
+        :param resolve_fn: a function mapping an IP address to a hostname, raising socket.error on failure
+        :param max_workers: the maximum number of lookups to run at once in resolve_all
+        :param cache_size: the maximum number of IP addresses to cache results for
+        :param ttl: how long (in seconds) to cache a successful lookup
+        :param negative_ttl: how long (in seconds) to cache a failed lookup
+        :param timeout: the default deadline (in seconds) for each call to resolve_all
+        """
+        self._resolve_fn = resolve_fn
+        self._max_workers = max_workers
+        self._timeout = timeout
+        self._hostnames: MutableMapping[str, str] = cachetools.TTLCache(maxsize=cache_size, ttl=ttl)
+        self._failures: MutableMapping[str, bool] = cachetools.TTLCache(maxsize=cache_size, ttl=negative_ttl)
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def resolve(self, ip: str) -> Optional[str]:
+        """Look up the hostname for a single IP address
+
+        :returns: the hostname, or None if the lookup failed
+        """
+        with self._lock:
+            if ip in self._hostnames:
+                return self._hostnames[ip]
+            elif ip in self._failures:
+                return None
+
+        try:
+            hostname = self._resolve_fn(ip)
+        except socket.error as e:
+            logger.warning(f"Couldn't derive hostname from IP via DNS for {ip}: {e}")
+            with self._lock:
+                self._failures[ip] = True
+            return None
+
+        with self._lock:
+            self._hostnames[ip] = hostname
+        return hostname
+
+    def resolve_all(
+        self,
+        ips: Iterable[str],
+        fallbacks: Optional[Mapping[str, Optional[str]]] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Optional[str]]:
+        """Look up the hostnames for many IP addresses in parallel
+
+        Any lookups that fail, or which haven't finished by the deadline, use the hostname from `fallbacks` (e.g., the
+        PrivateDnsName from EC2) instead.  Lookups that miss the deadline keep running in the background and their
+        results are cached for the next call.
+
+        :param ips: the IP addresses to look up
+        :param fallbacks: a mapping from IP address to the hostname to use if the lookup doesn't succeed
+        :param timeout: the deadline (in seconds) for the whole batch of lookups; defaults to the resolver's timeout
+        :returns: a mapping from IP address to hostname (or None, if the lookup failed and there was no fallback)
+        """
+        fallbacks = fallbacks or {}
+        timeout = self._timeout if timeout is None else timeout
+        hostnames: Dict[str, Optional[str]] = {}
+        futures: Dict[str, Future] = {}
+        with self._lock:
+            for ip in ips:
+                if ip in hostnames or ip in futures:
+                    continue
+                elif ip in self._hostnames:
+                    hostnames[ip] = self._hostnames[ip]
+                elif ip in self._failures:
+                    hostnames[ip] = fallbacks.get(ip)
+                else:
+                    # if a lookup from an earlier call is still running, wait for it instead of starting another one
+                    futures[ip] = self._in_flight.get(ip) or self._submit(ip)
+
+        if futures:
+            __, not_done = wait(futures.values(), timeout=timeout)
+            if not_done:
+                logger.warning(f"Timed out after {timeout}s waiting for {len(not_done)} reverse-DNS lookups")
+            for ip, future in futures.items():
+                hostnames[ip] = future.result() if future not in not_done else None
+                if hostnames[ip] is None:
+                    hostnames[ip] = fallbacks.get(ip)
+
+        return hostnames
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the lookup threads once they've finished the lookups they're working on
+
+        The cache is kept, and the resolver can still be used afterwards (it starts new threads when it needs them).
+
+        :param wait: if True, block until the lookups that are still running have finished
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=wait)
+
+    def __enter__(self) -> "HostnameResolver":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.shutdown()
+
+    def _submit(self, ip: str) -> Future:
+        # Must be called with self._lock held
+        if not self._executor:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="hostname_resolver")
+
+        future = self._executor.submit(self._resolve_in_flight, ip)
+        self._in_flight[ip] = future
+        return future
+
+    def _resolve_in_flight(self, ip: str) -> Optional[str]:
+        try:
+            return self.resolve(ip)
+        finally:
+            with self._lock:
+                self._in_flight.pop(ip, None)
+
+
+def get_default_hostname_resolver() -> HostnameResolver:
+    """Get the resolver used by everything that isn't given a resolver of its own
+
+    Sharing one resolver means sharing its cache, and keeps each caller from starting its own lookup threads.
+    """
+    global _default_resolver
+    with _default_resolver_lock:
+        if _default_resolver is None:
+            _default_resolver = HostnameResolver()
+        return _default_resolver
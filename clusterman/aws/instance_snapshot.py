@@ -0,0 +1,96 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from collections import defaultdict
+from typing import cast
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Sequence
+
+import colorlog
+
+from clusterman.aws.client import ec2_describe_instances
+from clusterman.aws.client import InstanceDict
+from clusterman.aws.markets import get_instance_market
+from clusterman.aws.markets import InstanceMarket
+from clusterman.aws.markets import MarketDict
+
+
+logger = colorlog.getLogger(__name__)
+
+
+class InstanceSnapshot:
+    """A point-in-time view of the EC2 instances in one or more resource groups
+
+    Resource groups register their instance IDs when they are loaded; the first time any instance data is requested,
+    every registered instance that hasn't been seen yet is fetched with a single (paginated) DescribeInstances call.
+    The results are indexed by instance ID, resource group, and market, and are re-used until the snapshot is thrown
+    away (the PoolManager creates a new one on every reload), so the number of EC2 API calls per autoscaler run does
+    not depend on the number of resource groups or on how many times the instance data is read.
+    """
+
+    def __init__(self) -> None:
+        self._instances_by_id: Dict[str, InstanceDict] = {}
+        self._instance_ids_by_group: Dict[str, Sequence[str]] = {}
+        self._instances_by_group_and_market: Dict[str, Mapping[InstanceMarket, List[InstanceDict]]] = {}
+        self._pending_instance_ids: Dict[str, None] = {}  # a dict instead of a set so that the order is preserved
+
+    def register_group(self, group_id: str, instance_ids: Sequence[str], refresh: bool = False) -> None:
+        """Record the instances belonging to a resource group; they will be described the next time data is read
+
+        A group can be registered again (e.g., when it's reloaded) to replace its list of instances.
+
+        :param group_id: the ID of the resource group
+        :param instance_ids: the instance IDs belonging to the group
+        :param refresh: if True, instances that have already been described are described again too
+        """
+        if refresh:
+            for instance_id in instance_ids:
+                self._instances_by_id.pop(instance_id, None)
+        self._instance_ids_by_group[group_id] = list(instance_ids)
+        self._instances_by_group_and_market.pop(group_id, None)
+        self._pending_instance_ids.update(
+            (instance_id, None) for instance_id in instance_ids if instance_id not in self._instances_by_id
+        )
+
+    def get_instances(self, group_id: str) -> List[InstanceDict]:
+        """Get the EC2 data for each instance in a resource group, in the order they were registered
+
+        Instances that DescribeInstances didn't return any data for are skipped.
+        """
+        self._describe_pending_instances()
+        return [
+            self._instances_by_id[instance_id]
+            for instance_id in self._instance_ids_by_group.get(group_id, [])
+            if instance_id in self._instances_by_id
+        ]
+
+    def get_instances_by_market(self, group_id: str) -> Mapping[InstanceMarket, List[InstanceDict]]:
+        """Get the EC2 data for each instance in a resource group, grouped by market"""
+        if group_id not in self._instances_by_group_and_market:
+            instances_by_market: Mapping[InstanceMarket, List[InstanceDict]] = defaultdict(list)
+            for instance in self.get_instances(group_id):
+                instances_by_market[get_instance_market(cast(MarketDict, instance))].append(instance)
+            self._instances_by_group_and_market[group_id] = instances_by_market
+        return self._instances_by_group_and_market[group_id]
+
+    def _describe_pending_instances(self) -> None:
+        if not self._pending_instance_ids:
+            return
+
+        instance_ids = list(self._pending_instance_ids)
+        logger.debug(f"Describing {len(instance_ids)} instances for {len(self._instance_ids_by_group)} groups")
+        for instance in ec2_describe_instances(instance_ids):
+            self._instances_by_id[instance["InstanceId"]] = instance
+        self._pending_instance_ids.clear()
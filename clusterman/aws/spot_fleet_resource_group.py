@@ -159,12 +159,13 @@ class SpotFleetResourceGroup(AWSResourceGroup):
         :param config: An spot fleet config
         :returns: A dictionary of spot fleet resource groups, indexed by the id
         """
-        tagged_resource_groups = super().load(cluster, pool, config)
+        tagged_resource_groups = super().load(cluster, pool, config, **kwargs)
         if "s3" in config:
             s3_resource_groups = load_spot_fleets_from_s3(
                 config["s3"]["bucket"],
                 config["s3"]["prefix"],
                 pool=pool,
+                **kwargs,
             )
             logger.info(f"SFRs loaded from s3: {list(s3_resource_groups)}")
         else:
@@ -213,7 +214,12 @@ class SpotFleetResourceGroup(AWSResourceGroup):
         raise NotImplementedError()
 
 
-def load_spot_fleets_from_s3(bucket: str, prefix: str, pool: str = None) -> Mapping[str, SpotFleetResourceGroup]:
+def load_spot_fleets_from_s3(
+    bucket: str,
+    prefix: str,
+    pool: str = None,
+    **kwargs: Any,
+) -> Mapping[str, SpotFleetResourceGroup]:
     prefix = prefix.rstrip("/") + "/"
     object_list = s3.list_objects_v2(Bucket=bucket, Prefix=prefix)
     spot_fleets = {}
@@ -226,6 +232,6 @@ def load_spot_fleets_from_s3(bucket: str, prefix: str, pool: str = None) -> Mapp
             if pool and resource["pool"] != pool:
                 continue
 
-            spot_fleets[resource["id"]] = SpotFleetResourceGroup(resource["id"])
+            spot_fleets[resource["id"]] = SpotFleetResourceGroup(resource["id"], **kwargs)
 
     return spot_fleets
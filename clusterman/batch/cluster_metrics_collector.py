@@ -12,16 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import argparse
+import math
 import socket
 import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from contextlib import ExitStack
 from traceback import format_exc
 from typing import Callable
 from typing import cast
+from typing import Dict
 from typing import Generator
 from typing import List
 from typing import Mapping
 from typing import MutableMapping
 from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
 from typing import Type
 from typing import Union
 
@@ -50,6 +59,8 @@ from clusterman.mesos.metrics_generators import ClusterMetric
 from clusterman.mesos.metrics_generators import generate_kubernetes_metrics
 from clusterman.mesos.metrics_generators import generate_simple_metadata
 from clusterman.mesos.metrics_generators import generate_system_metrics
+from clusterman.mesos.metrics_generators import get_pool_metrics_snapshot
+from clusterman.mesos.metrics_generators import PoolMetricsSnapshot
 from clusterman.tools.rookout import enable_rookout
 from clusterman.util import All
 from clusterman.util import get_pool_name_list
@@ -58,10 +69,12 @@ from clusterman.util import setup_logging
 from clusterman.util import splay_event_time
 
 logger = colorlog.getLogger(__name__)
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_POOL_TIMEOUT_SECONDS = 60
 
 
 class MetricToWrite(NamedTuple):
-    generator: Callable[[PoolManager], Generator[ClusterMetric, None, None]]
+    generator: Callable[[PoolManager, Optional[PoolMetricsSnapshot]], Generator[ClusterMetric, None, None]]
     type: str
     aggregate_meteorite_dims: bool
     pools: Union[Type[All], List["str"]]
@@ -121,6 +134,14 @@ class ClusterMetricsCollector(BatchDaemon, BatchLoggingMixin, BatchRunningSentin
         self.logger = logger
         self.region = staticconf.read_string("aws.region")
         self.run_interval = staticconf.read_int("batches.cluster_metrics.run_interval_seconds")
+        self.max_workers = staticconf.read_int("batches.cluster_metrics.max_workers", default=DEFAULT_MAX_WORKERS)
+        self.pool_timeout_seconds = staticconf.read_int(
+            "batches.cluster_metrics.pool_timeout_seconds",
+            default=DEFAULT_POOL_TIMEOUT_SECONDS,
+        )
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pool_futures: Dict[str, "Future[List[List[ClusterMetric]]]"] = {}
+        self._pool_start_times: Dict[str, float] = {}
         self.metrics_client = ClustermanMetricsBotoClient(region_name=self.region)
 
     def load_pool_managers(self) -> None:
@@ -135,6 +156,16 @@ class ClusterMetricsCollector(BatchDaemon, BatchLoggingMixin, BatchRunningSentin
                     logger.exception(e)
                     continue
 
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """The pool collector threads.  These are not daemon threads: concurrent.futures joins them when the
+        interpreter exits, so a pool reload that never returns will hold up the exit until it does (see
+        shutdown_executor).
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="cluster_metrics")
+        return self._executor
+
     @suppress_request_limit_exceeded()
     def run(self) -> None:
         self.load_pool_managers()  # Load the pools on the first run; do it here so we get logging
@@ -150,11 +181,6 @@ class ClusterMetricsCollector(BatchDaemon, BatchLoggingMixin, BatchRunningSentin
                     )
                 )
 
-                for pool, manager in self.pool_managers.items():
-                    logger.info(f"Reloading state for pool manager for pool {pool}")
-                    manager.reload_state()
-                    logger.info(f"Done reloading state for pool {pool}")
-
                 successful = self.write_all_metrics()
 
                 # Report successful run to Sensu.
@@ -172,48 +198,142 @@ class ClusterMetricsCollector(BatchDaemon, BatchLoggingMixin, BatchRunningSentin
         except Exception:
             # yelp_batch doesn't show the whole traceback when something fails
             self.logger.exception("cluster metrics collector failed")
+        finally:
+            self.shutdown_executor()
+
+    def shutdown_executor(self) -> None:
+        """Stop the collector threads without waiting for them.  Pools that are still being collected can't be
+        interrupted, so they're logged; the process won't exit until they finish.
+        """
+        if self._executor is None:
+            return
+
+        hung_pools = sorted(pool for pool, future in self._pool_futures.items() if not future.done())
+        if hung_pools:
+            logger.warning(f"Exit will wait for metrics collection to finish for pools: {', '.join(hung_pools)}")
+        self._executor.shutdown(wait=False)
+        self._executor = None
+        self._pool_futures = {}
 
     def write_all_metrics(self) -> bool:
+        # Every metric from this round gets the same timestamp, no matter how long each pool takes to collect
+        timestamp = int(time.time())
+        pool_metrics, successful = self.collect_all_metrics()
+
+        # Open the writers for all the metric types at once, so that their items can share batches; everything is
+        # flushed when the last writer is closed
+        try:
+            with ExitStack() as stack:
+                writers = [
+                    stack.enter_context(
+                        self.metrics_client.get_writer(metric_to_write.type, metric_to_write.aggregate_meteorite_dims)
+                    )
+                    for metric_to_write in METRICS_TO_WRITE
+                ]
+                for cluster_metrics_by_type in pool_metrics.values():
+                    for writer, cluster_metrics in zip(writers, cluster_metrics_by_type):
+                        self.write_metrics(writer, cluster_metrics, timestamp)
+        except socket.timeout:
+            # Try again on the next round, but make sure we know this failed
+            logger.warning(f"Timed out writing cluster metric data:\n\n{format_exc()}")
+            successful = False
+        except Exception:
+            logger.exception("Failed to write cluster metric data")
+            successful = False
+
+        return successful
+
+    def collect_all_metrics(self) -> Tuple[Dict[str, List[List[ClusterMetric]]], bool]:
+        """Reload every pool and generate its metrics on the worker pool
+
+        A pool that fails, or that takes longer than pool_timeout_seconds once it starts, doesn't hold up the others;
+        it's just left out of this round.  A pool that's still running from an earlier round is skipped until it
+        finishes.
+
+        :returns: a tuple of (mapping from pool -> metrics for each entry in METRICS_TO_WRITE, True if every pool
+            was collected successfully)
+        """
         successful = True
+        pending: Dict["Future[List[List[ClusterMetric]]]", str] = {}
+        for pool, manager in self.pool_managers.items():
+            previous_future = self._pool_futures.get(pool)
+            if previous_future and not previous_future.done():
+                logger.warning(f"Still collecting metrics for {pool} from an earlier run; skipping it this time")
+                successful = False
+                continue
 
-        for metric_to_write in METRICS_TO_WRITE:
-            with self.metrics_client.get_writer(
-                metric_to_write.type, metric_to_write.aggregate_meteorite_dims
-            ) as writer:
+            self._pool_start_times.pop(pool, None)
+            future = self.executor.submit(self.collect_pool_metrics, pool, manager)
+            self._pool_futures[pool] = future
+            pending[future] = pool
+
+        # Each pool's timeout starts when a worker picks it up, but if some workers are stuck on hung pools the rest
+        # might never get started; so give up on anything that hasn't finished by the time the whole round should
+        # have, even if every pool took the full timeout
+        round_deadline = time.monotonic() + self.pool_timeout_seconds * math.ceil(len(pending) / self.max_workers)
+        pool_metrics: Dict[str, List[List[ClusterMetric]]] = {}
+        while pending:
+            deadlines = {future: self._get_pool_deadline(pool, round_deadline) for future, pool in pending.items()}
+            wait_seconds = max(min(deadlines.values()) - time.monotonic(), 0)
+            done, __ = wait(pending, timeout=wait_seconds, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                pool = pending.pop(future)
                 try:
-                    self.write_metrics(
-                        writer,
-                        metric_to_write.generator,
-                        metric_to_write.pools,
-                        metric_to_write.schedulers,
-                    )
+                    pool_metrics[pool] = future.result()
                 except socket.timeout:
                     # Try to get metrics for the rest of the clusters, but make sure we know this failed
-                    logger.warn(f"Timed out getting cluster metric data:\n\n{format_exc()}")
+                    logger.warning(f"Timed out getting cluster metric data for {pool}:\n\n{format_exc()}")
+                    successful = False
+                except Exception:
+                    logger.exception(f"Failed to collect metrics for {pool}")
                     successful = False
-                    continue
 
-        return successful
+            now = time.monotonic()
+            for future, pool in list(pending.items()):
+                if now >= deadlines[future]:
+                    logger.warning(f"Collecting metrics for {pool} took too long; leaving it out of this run")
+                    future.cancel()  # does nothing if it's already running
+                    del pending[future]
+                    successful = False
 
-    def write_metrics(
-        self,
-        writer,
-        metric_generator: Callable[[PoolManager], Generator[ClusterMetric, None, None]],
-        pools: Union[Type[All], List[str]],
-        schedulers: List["str"],
-    ) -> None:
-        for pool, manager in self.pool_managers.items():
-            if manager.scheduler not in schedulers:
-                continue
-            if pools != All and pool not in cast(List[str], pools):
-                continue
+        return pool_metrics, successful
+
+    def _get_pool_deadline(self, pool: str, round_deadline: float) -> float:
+        if pool in self._pool_start_times:
+            return min(self._pool_start_times[pool] + self.pool_timeout_seconds, round_deadline)
+        return round_deadline
+
+    def collect_pool_metrics(self, pool: str, manager: PoolManager) -> List[List[ClusterMetric]]:
+        """Reload a single pool's state and generate all of the metrics for it
+
+        :returns: a list of the pool's metrics for each entry in METRICS_TO_WRITE (empty if it doesn't apply)
+        """
+        self._pool_start_times[pool] = time.monotonic()
+        logger.info(f"Reloading state for pool manager for pool {pool}")
+        manager.reload_state()
+        logger.info(f"Done reloading state for pool {pool}")
+
+        # All of the generators read from the same snapshot of the pool, so the connector and resource groups only get
+        # walked once per reload, no matter how many metrics we write
+        snapshot = get_pool_metrics_snapshot(manager)
+        cluster_metrics_by_type: List[List[ClusterMetric]] = []
+        for metric_to_write in METRICS_TO_WRITE:
+            cluster_metrics: List[ClusterMetric] = []
+            if manager.scheduler in metric_to_write.schedulers and (
+                metric_to_write.pools == All or pool in cast(List[str], metric_to_write.pools)
+            ):
+                cluster_metrics = list(metric_to_write.generator(manager, snapshot))
+            cluster_metrics_by_type.append(cluster_metrics)
+        return cluster_metrics_by_type
 
-            for cluster_metric in metric_generator(manager):
-                metric_name = generate_key_with_dimensions(cluster_metric.metric_name, cluster_metric.dimensions)
-                data = (metric_name, int(time.time()), cluster_metric.value)
-                logger.info(f"Writing value {cluster_metric.value} for metric {metric_name} to metric store")
+    def write_metrics(self, writer, cluster_metrics: List[ClusterMetric], timestamp: int) -> None:
+        for cluster_metric in cluster_metrics:
+            metric_name = generate_key_with_dimensions(cluster_metric.metric_name, cluster_metric.dimensions)
+            data = (metric_name, timestamp, cluster_metric.value)
+            logger.info(f"Writing value {cluster_metric.value} for metric {metric_name} to metric store")
 
-                writer.send(data)
+            writer.send(data)
 
 
 if __name__ == "__main__":
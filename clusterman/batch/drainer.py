@@ -79,7 +79,7 @@ class NodeDrainerBatch(BatchDaemon, BatchLoggingMixin, BatchRunningSentinelMixin
             except Exception:
                 self.logger.error("Cluster specified is kubernetes specific. Skipping mesos operator")
 
-        self.logger.info("Polling SQS for messages every 5s")
+        self.logger.info(f"Polling SQS for messages, waiting {self.run_interval}s between passes when queues are empty")
         while self.running:
             if kube_operator_client:
                 kube_operator_client.reload_client()
@@ -93,7 +93,8 @@ class NodeDrainerBatch(BatchDaemon, BatchLoggingMixin, BatchRunningSentinelMixin
                 mesos_operator_client=mesos_operator_client,
                 kube_operator_client=kube_operator_client,
             )
-            # sleep five seconds only if all queues are empty OR feature flag is enabled
+            # messages are received in batches and long-polled, so when there's a backlog we go straight back for
+            # more; sleep only if all queues are empty OR feature flag is enabled (the default)
             if always_delay_drain_processing or (not warning_result and not draining_result and not termination_result):
                 time.sleep(self.run_interval)
 
@@ -20,7 +20,7 @@ import yaml
 from clusterman_metrics import ClustermanMetricsBotoClient
 
 from clusterman.args import subparser
-from clusterman.simulator.io import write_object_to_compressed_json
+from clusterman.simulator.io import write_metrics_file
 from clusterman.util import parse_time_interval_seconds
 from clusterman.util import parse_time_string
 
@@ -158,7 +158,7 @@ def main(args):
     random.seed(args.seed)
 
     metrics_data = load_experimental_design(args.input)
-    write_object_to_compressed_json(metrics_data, args.output)
+    write_metrics_file(metrics_data, args.output)
 
 
 @subparser(
@@ -177,7 +177,7 @@ def add_generate_data_parser(subparser, required_named_args, optional_named_args
     required_named_args.add_argument(
         "-o",
         "--output",
-        default="metrics.json.gz",
+        default="metrics.npz",
         metavar="filename",
         help="output file for generated data",
     )
@@ -12,32 +12,52 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import argparse
+import heapq
+import itertools
+import json
+import multiprocessing
 import operator
+import os
+import random
+import time
+from collections import ChainMap
 from collections import defaultdict
+from concurrent.futures import as_completed
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy
 
 import arrow
 import colorlog
 import staticconf
+import yaml
 from clusterman_metrics import ClustermanMetricsSimulationClient
 from clusterman_metrics import METADATA
 from clusterman_metrics import SYSTEM_METRICS
+from staticconf.testing import PatchConfiguration
 
 from clusterman.args import add_branch_or_tag_arg
 from clusterman.args import add_cluster_arg
 from clusterman.args import add_cluster_config_directory_arg
+from clusterman.args import add_json_arg
 from clusterman.args import add_pool_arg
 from clusterman.args import add_scheduler_arg
 from clusterman.args import add_start_end_args
 from clusterman.args import subparser
 from clusterman.aws.markets import get_market_resources
 from clusterman.aws.markets import InstanceMarket
+from clusterman.config import POOL_NAMESPACE
 from clusterman.reports.report_types import REPORT_TYPES
 from clusterman.simulator.event import AutoscalingEvent
 from clusterman.simulator.event import InstancePriceChangeEvent
 from clusterman.simulator.event import ModifyClusterSizeEvent
-from clusterman.simulator.io import read_object_from_compressed_json
-from clusterman.simulator.io import write_object_to_compressed_json
+from clusterman.simulator.io import read_metrics_file
+from clusterman.simulator.io import read_simulation_file
+from clusterman.simulator.io import write_simulation_file
+from clusterman.simulator.simulator import fetch_signals
 from clusterman.simulator.simulator import Simulator
+from clusterman.simulator.sweep import format_sweep_results
+from clusterman.simulator.sweep import get_sweep_variants
+from clusterman.simulator.sweep import summarize_simulation
 from clusterman.simulator.util import SimulationMetadata
 from clusterman.util import get_cluster_dimensions
 from clusterman.util import parse_time_string
@@ -45,6 +65,7 @@ from clusterman.util import splay_event_time
 
 logger = colorlog.getLogger(__name__)
 colorlog.getLogger("clusterman_metrics")
+_sweep_metrics_client = None  # the metrics for simulate-sweep, inherited by each worker process
 
 try:
     # this currently fails for our paasta docker image
@@ -58,21 +79,31 @@ except ImportError as e:
         logger.error("Unable to generate report due to missing imports")
 
 
-def _load_metrics(metrics_data_files, pool):
-    metrics = defaultdict(dict)
+def _load_metrics(metrics_data_files, pool, preload=False):
+    # Chaining the files' timeseries together (instead of copying them into one dict) keeps the ones from columnar
+    # files from being read until they're used (unless preload is set); later files take precedence, like they would
+    # with dict.update
+    metrics = defaultdict(ChainMap)
     for metrics_file in metrics_data_files or []:
         try:
-            data = read_object_from_compressed_json(metrics_file, raw_timestamps=True)
+            data = read_metrics_file(metrics_file)
             for metric_type, values in data.items():
-                metrics[metric_type].update(values)
+                metrics[metric_type].maps.insert(0, values)
         except OSError as e:
             logger.warn(f"{str(e)}: no metrics loaded")
     region_name = staticconf.read_string("aws.region")
     metrics_client = ClustermanMetricsSimulationClient(metrics, region_name=region_name, app_identifier=pool)
+    # clients that don't have load_generated_metrics read and validate all the timeseries when they're created
+    if preload and hasattr(metrics_client, "load_generated_metrics"):
+        metrics_client.load_generated_metrics()
     return metrics_client
 
 
 def _populate_autoscaling_events(simulator, start_time, end_time):
+    simulator.add_event_source(_autoscaling_events(simulator, start_time, end_time))
+
+
+def _autoscaling_events(simulator, start_time, end_time):
     current_time = start_time.shift(
         seconds=splay_event_time(
             simulator.autoscaler.run_frequency,
@@ -81,7 +112,7 @@ def _populate_autoscaling_events(simulator, start_time, end_time):
         )
     )
     while current_time < end_time:
-        simulator.add_event(AutoscalingEvent(current_time))
+        yield AutoscalingEvent(current_time)
         current_time = current_time.shift(
             seconds=splay_event_time(
                 simulator.autoscaler.run_frequency,
@@ -104,15 +135,22 @@ def _populate_cluster_size_events(simulator, start_time, end_time):
             simulator.metadata.scheduler,
         ),
     )
-    for i, (timestamp, data) in enumerate(capacity_metrics["fulfilled_capacity"]):
+    # The price changes are read for every market in the cluster, so we need to know the markets up front
+    for __, data in capacity_metrics["fulfilled_capacity"]:
+        simulator.markets |= {InstanceMarket.parse(market_str) for market_str in data}
+    simulator.add_event_source(_cluster_size_events(capacity_metrics["fulfilled_capacity"]))
+
+
+def _cluster_size_events(capacities):
+    cpus_per_weight = staticconf.read_int("cpus_per_weight")
+    for i, (timestamp, data) in enumerate(capacities):
         market_data = {}
         for market_str, value in data.items():
             market = InstanceMarket.parse(market_str)
-            weight = get_market_resources(market).cpus // staticconf.read_int("cpus_per_weight")
+            weight = get_market_resources(market).cpus // cpus_per_weight
             market_data[market] = int(value) // weight
-        simulator.markets |= set(market_data.keys())
         use_join_delay = i != 0  # Want to start the cluster out at the expected capacity
-        simulator.add_event(ModifyClusterSizeEvent(arrow.get(timestamp), market_data, use_join_delay))
+        yield ModifyClusterSizeEvent(arrow.get(timestamp), market_data, use_join_delay)
 
 
 def _populate_allocated_resources(simulator, start_time, end_time):
@@ -138,6 +176,7 @@ def _populate_allocated_resources(simulator, start_time, end_time):
 
 
 def _populate_price_changes(simulator, start_time, end_time, discount):
+    price_changes = []
     for market in simulator.markets:
         market_prices = simulator.metrics_client.get_metric_values(
             "spot_prices",
@@ -150,32 +189,49 @@ def _populate_price_changes(simulator, start_time, end_time, discount):
                 "aws_instance_type": market.instance,
             },
         )
-        for timestamp, price in market_prices["spot_prices"]:
-            price = float(price) * (discount or 1.0)
-            simulator.add_event(
-                InstancePriceChangeEvent(
-                    arrow.get(timestamp),
-                    {market: price},
-                )
-            )
+        price_changes.append(_market_price_changes(market, market_prices["spot_prices"], discount))
+
+    # Merge the (sorted) prices for each market, and change the prices for every market that has a new price at the
+    # same time in a single event
+    all_price_changes = heapq.merge(*price_changes, key=operator.itemgetter(0))
+    simulator.add_event_source(
+        InstancePriceChangeEvent(arrow.get(timestamp), {market: price for __, market, price in prices})
+        for timestamp, prices in itertools.groupby(all_price_changes, key=operator.itemgetter(0))
+    )
+
+
+def _market_price_changes(market, prices, discount):
+    for timestamp, price in prices:
+        yield timestamp, market, float(price) * (discount or 1.0)
 
 
-def _run_simulation(args, metrics_client):
+def _run_simulation(args, metrics_client, fetch_signals=True, stop_signals=False):
     metadata = SimulationMetadata(args.name, args.cluster, args.pool, args.scheduler)
-    simulator = Simulator(metadata, args.start_time, args.end_time, args.autoscaler_config, metrics_client)
-    if simulator.autoscaler:
-        _populate_autoscaling_events(simulator, args.start_time, args.end_time)
-    else:
-        _populate_cluster_size_events(simulator, args.start_time, args.end_time)
+    simulator = Simulator(
+        metadata,
+        args.start_time,
+        args.end_time,
+        args.autoscaler_config,
+        metrics_client,
+        fetch_signals=fetch_signals,
+    )
+    try:
+        if simulator.autoscaler:
+            _populate_autoscaling_events(simulator, args.start_time, args.end_time)
+        else:
+            _populate_cluster_size_events(simulator, args.start_time, args.end_time)
 
-    _populate_allocated_resources(simulator, args.start_time, args.end_time)
-    _populate_price_changes(simulator, args.start_time, args.end_time, args.discount)
+        _populate_allocated_resources(simulator, args.start_time, args.end_time)
+        _populate_price_changes(simulator, args.start_time, args.end_time, args.discount)
 
-    simulator.run()
+        simulator.run()
+    finally:
+        if stop_signals:
+            simulator.stop_signals()
     return simulator
 
 
-def main(args):
+def _setup_simulation_config(args):
     args.start_time = parse_time_string(args.start_time)
     args.end_time = parse_time_string(args.end_time)
 
@@ -187,6 +243,11 @@ def main(args):
             "ebs_volume_size": args.ebs_volume_size,
         }
     )
+
+
+def main(args):
+    _setup_simulation_config(args)
+
     # We can provide up to two simulation objects to compare.  If we load two simulator objects to compare,
     # we don't need to run a simulation here.  If the user specifies --compare but only gives one object,
     # then we need to run a simulation now, and use that to compare to the saved sim
@@ -194,10 +255,10 @@ def main(args):
     if args.compare:
         if len(args.compare) > 2:
             raise argparse.ArgumentError(None, f"Cannot compare more than two simulations: {args.compare}")
-        sims = [read_object_from_compressed_json(sim_file) for sim_file in args.compare]
+        sims = [read_simulation_file(sim_file) for sim_file in args.compare]
 
     if len(sims) < 2:
-        metrics_client = _load_metrics(args.metrics_data_files, args.pool)
+        metrics_client = _load_metrics(args.metrics_data_files, args.pool, preload=True)
         simulator = _run_simulation(args, metrics_client)
         sims.insert(0, simulator)
 
@@ -208,7 +269,7 @@ def main(args):
         final_simulator = sims[0]
 
     if args.simulation_result_file:
-        write_object_to_compressed_json(final_simulator, args.simulation_result_file)
+        write_simulation_file(final_simulator, args.simulation_result_file)
 
     if hasattr(args, "reports"):
         if "all" in args.reports:
@@ -224,8 +285,71 @@ def main(args):
             )
 
 
-@subparser("simulate", "simulate the behavior of a cluster", main)
-def add_simulate_parser(subparser, required_named_args, optional_named_args):  # pragma: no cover
+def _init_sweep_worker(metrics_client):
+    # the workers are forked, so the metrics are shared with the parent process instead of being copied to each worker
+    global _sweep_metrics_client
+    _sweep_metrics_client = metrics_client
+
+
+def _run_sweep_variant(args, index, variant):
+    sim_args = copy(args)
+    sim_args.name = variant.name
+    pool_namespace = POOL_NAMESPACE.format(pool=args.pool, scheduler=args.scheduler)
+
+    # every variant starts from the same random state, no matter which worker runs it, so the results are
+    # reproducible and the differences between variants come from their configs
+    random.seed(args.seed)
+    start = time.time()
+    with PatchConfiguration(variant.overrides, namespace=pool_namespace), PatchConfiguration(
+        {"signal_socket_suffix": f"-sweep{index}"}
+    ):
+        simulator = _run_simulation(sim_args, _sweep_metrics_client, fetch_signals=False, stop_signals=True)
+    return summarize_simulation(variant, simulator, time.time() - start)
+
+
+def main_sweep(args):
+    _setup_simulation_config(args)
+    if args.seed is None:
+        args.seed = int(time.time())
+
+    with open(args.sweep_config) as f:
+        variants = get_sweep_variants(yaml.safe_load(f))
+    if args.autoscaler_config:
+        fetch_signals(args.pool, args.scheduler)  # once, instead of once per variant
+    # the timeseries are read and validated before the workers are forked, so that they're shared by all the workers
+    metrics_client = _load_metrics(args.metrics_data_files, args.pool, preload=True)
+
+    max_workers = min(args.max_workers or os.cpu_count() or 1, len(variants))
+    print(f"Running {len(variants)} simulations with {max_workers} workers (random seed: {args.seed})")
+    results, failed = [], []
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_sweep_worker,
+        initargs=(metrics_client,),
+    ) as executor:
+        futures = {executor.submit(_run_sweep_variant, args, i, variant): variant for i, variant in enumerate(variants)}
+        for num_completed, future in enumerate(as_completed(futures), start=1):
+            variant = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.exception(f"Simulation {variant.name} failed: {e}")
+                failed.append(variant.name)
+                continue
+            results.append(result)
+            progress = f"[{num_completed}/{len(variants)}]"
+            print(f"{progress} {variant.name}: ${result.cost:,.2f} in {result.elapsed_seconds:.1f}s")
+
+    if args.json:
+        print(json.dumps([result._asdict() for result in results]))
+    else:
+        print(format_sweep_results(results))
+    if failed:
+        logger.error(f"{len(failed)} simulation(s) failed: {', '.join(failed)}")
+
+
+def _add_simulation_args(required_named_args, optional_named_args):  # pragma: no cover
     add_start_end_args(
         required_named_args,
         "simulation start time",
@@ -236,23 +360,11 @@ def add_simulate_parser(subparser, required_named_args, optional_named_args):  #
     add_scheduler_arg(required_named_args)
     add_cluster_config_directory_arg(optional_named_args)
     add_branch_or_tag_arg(optional_named_args)
-    required_named_args.add_argument(
-        "--name",
-        default="simulation",
-        help="Name for the simulation (helpful when comparing two simulations)",
-    )
     optional_named_args.add_argument(
         "--autoscaler-config",
         default=None,
         help="file containing the spot fleet request JSON data for the autoscaler",
     )
-    optional_named_args.add_argument(
-        "--reports",
-        nargs="+",
-        choices=list(REPORT_TYPES.keys()) + ["all"],
-        default=[],
-        help="type(s) of reports to generate from the simulation",
-    )
     optional_named_args.add_argument(
         "--metrics-data-files",
         metavar="filename",
@@ -287,6 +399,23 @@ def add_simulate_parser(subparser, required_named_args, optional_named_args):  #
         default=[0, 0],
         help="parameters to control long to wait before a host joins the cluster (normally distributed)",
     )
+
+
+@subparser("simulate", "simulate the behavior of a cluster", main)
+def add_simulate_parser(subparser, required_named_args, optional_named_args):  # pragma: no cover
+    _add_simulation_args(required_named_args, optional_named_args)
+    required_named_args.add_argument(
+        "--name",
+        default="simulation",
+        help="Name for the simulation (helpful when comparing two simulations)",
+    )
+    optional_named_args.add_argument(
+        "--reports",
+        nargs="+",
+        choices=list(REPORT_TYPES.keys()) + ["all"],
+        default=[],
+        help="type(s) of reports to generate from the simulation",
+    )
     optional_named_args.add_argument(
         "--output-prefix",
         default="",
@@ -309,3 +438,27 @@ def add_simulate_parser(subparser, required_named_args, optional_named_args):  #
         default="truediv",
         help="operation to use for comparing simulations; valid choices are binary functions from the operator module",
     )
+
+
+@subparser("simulate-sweep", "simulate the behavior of a cluster with several different pool configs", main_sweep)
+def add_simulate_sweep_parser(subparser, required_named_args, optional_named_args):  # pragma: no cover
+    _add_simulation_args(required_named_args, optional_named_args)
+    required_named_args.add_argument(
+        "--sweep-config",
+        metavar="filename",
+        required=True,
+        help="YAML file with the variants and/or grid of pool config overrides to simulate",
+    )
+    optional_named_args.add_argument(
+        "--max-workers",
+        type=int,
+        default=None,
+        help="maximum number of simulations to run at once; None means one per CPU",
+    )
+    optional_named_args.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="seed value for the random number generator in every simulation; None means the current time",
+    )
+    add_json_arg(optional_named_args)
@@ -1,4 +1,6 @@
+from typing import Dict
 from typing import Optional
+from typing import Sequence
 
 import colorlog
 
@@ -22,6 +24,23 @@ def drain(connector: Optional[KubernetesClusterConnector], node_name: str, disab
         return False
 
 
+def drain_nodes(
+    connector: Optional[KubernetesClusterConnector], node_names: Sequence[str], disable_eviction: bool
+) -> Dict[str, bool]:
+    """Cordons and evicts/deletes all tasks from a batch of nodes at once.
+    :param node_names: the node names to drain (as would be passed to kubectl drain)
+    :param connector: a kubernetes connector to connect kubernetes API
+    :param disable_eviction: Force drain to use delete (ignoring PDBs)
+    :returns: whether each node was drained
+    """
+    if connector:
+        log.info(f"Preparing to drain {', '.join(node_names)}...")
+        return connector.drain_nodes(node_names, disable_eviction)
+    else:
+        log.info(f"Unable to drain {', '.join(node_names)} (no Kubernetes connector configured)")
+        return {node_name: False for node_name in node_names}
+
+
 def uncordon(connector: Optional[KubernetesClusterConnector], node_name: str) -> bool:
     """Cordons and safely evicts all tasks from a given node.
     :param node_name: a single node name to uncordon (as would be passed to kubectl uncordon)
@@ -18,18 +18,31 @@ import json
 import os
 from collections import namedtuple
 from socket import gethostbyname
+from threading import Lock
+from typing import Dict
+from typing import Tuple
+from urllib.parse import urljoin
+from urllib.parse import urlsplit
 
 import colorlog
 from requests import Request
 from requests import Session
+from requests.exceptions import ConnectionError as RequestsConnectionError
 from requests.exceptions import HTTPError
 from requests.exceptions import Timeout
 from retry import retry
 
 Hostname = namedtuple("Hostname", ["host", "ip"])
 MESOS_MASTER_PORT = 5050
+MAX_LEADER_REDIRECTS = 3
 Credentials = namedtuple("Credentials", ["file", "principal", "secret"])
 log = colorlog.getLogger(__name__)
+_credentials_cache: Dict[str, Tuple[int, Credentials]] = {}  # path -> (mtime, credentials)
+_credentials_lock = Lock()
+# Drains read the whole maintenance schedule, change it and write it back, so concurrent drains (e.g., from the
+# drainer's worker threads) would overwrite each other's windows unless they take turns; MesosOperatorClient.drain
+# has its own lock, but drains through any other operator client use this one
+_maintenance_schedule_lock = Lock()
 
 
 def get_principal(mesos_secret_path):
@@ -37,7 +50,7 @@ def get_principal(mesos_secret_path):
     :param mesos_secret_paths: specifying the path to the file containing the mesos-slave credentials
     :returns: a string containing the principal/username
     """
-    return load_credentials(mesos_secret_path).principal
+    return get_credentials(mesos_secret_path).principal
 
 
 def get_secret(mesos_secret_path):
@@ -45,7 +58,7 @@ def get_secret(mesos_secret_path):
     :param mesos_secret_paths: argument specifying the path to the file containing the mesos-slave credentials
     :returns: a string containing the secret/password
     """
-    return load_credentials(mesos_secret_path).secret
+    return get_credentials(mesos_secret_path).secret
 
 
 def load_credentials(mesos_secret_path):
@@ -75,6 +88,29 @@ def load_credentials(mesos_secret_path):
     return Credentials(file=mesos_secret_path, principal=username, secret=password)
 
 
+def get_credentials(mesos_secret_path):
+    """Like load_credentials, but the file is only read again if it has been modified since the last call
+    :param mesos_secret_paths: argument specifying the path to the file containing the mesos-slave credentials
+    :returns: a tuple of the form (username, password)
+    """
+    if not mesos_secret_path:
+        return load_credentials(mesos_secret_path)
+    try:
+        mtime = os.stat(mesos_secret_path).st_mtime_ns
+    except OSError:
+        return load_credentials(mesos_secret_path)  # this will log and raise the actual error
+
+    with _credentials_lock:
+        cached = _credentials_cache.get(mesos_secret_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    credentials = load_credentials(mesos_secret_path)
+    with _credentials_lock:
+        _credentials_cache[mesos_secret_path] = (mtime, credentials)
+    return credentials
+
+
 def base_api(mesos_master_fqdn, mesos_secret_path):
     """Helper function for making all API requests
     :returns: a function that can be called to make a request
@@ -100,16 +136,114 @@ def base_api(mesos_master_fqdn, mesos_secret_path):
 
 
 def operator_api(mesos_master_fqdn, mesos_secret_path):
-    def execute_operator_api_request(**kwargs):
-        base_api_client = base_api(mesos_master_fqdn, mesos_secret_path)
-        if "headers" in kwargs:
-            kwargs["headers"]["Content-Type"] = "application/json"
-        else:
-            kwargs["headers"] = {"Content-Type": "application/json"}
+    return MesosOperatorClient(mesos_master_fqdn, mesos_secret_path)
+
+
+class _PendingDrain:
+    def __init__(self, machine_ids, start, duration):
+        self.machine_ids = machine_ids
+        self.window = {
+            "machine_ids": machine_ids,
+            "unavailability": {
+                "start": {"nanoseconds": int(start)},
+                "duration": {"nanoseconds": int(duration)},
+            },
+        }
+        self.done = False
+        self.output = None
+        self.error = None
+
+
+class MesosOperatorClient:
+    """Client for the Mesos operator API, meant to be shared by everything that talks to the same cluster
+
+    Requests go over a single keep-alive session to the leading master; the leader is found by following the redirect
+    from mesos_master_fqdn, and is only looked up again if it stops answering or redirects us somewhere else.
+
+    Calling the client works the same way as calling the function that operator_api used to return.
+    """
+
+    def __init__(self, mesos_master_fqdn, mesos_secret_path, port=MESOS_MASTER_PORT):
+        self.master_url = "http://%s:%d" % (mesos_master_fqdn, port)
+        self.mesos_secret_path = mesos_secret_path
+        self.leader_url = None
+        self._session = Session()
+        self._pending_drains = []
+        self._pending_lock = Lock()
+        self._schedule_lock = Lock()
+
+    def __call__(self, **kwargs):
+        kwargs["headers"] = dict(kwargs.get("headers", {}), **{"Content-Type": "application/json"})
         data = kwargs.pop("data")
-        return base_api_client("POST", "/api/v1", data=json.dumps(data), **kwargs)
+        return self.request("POST", "/api/v1", data=json.dumps(data), **kwargs)
+
+    def request(self, method, endpoint, timeout=(3, 1), **kwargs):
+        base_url = self.leader_url or self.master_url
+        try:
+            resp = self._send(method, base_url + endpoint, timeout, **kwargs)
+        except RequestsConnectionError:
+            if base_url == self.master_url:
+                raise
+            log.info("Lost the connection to the Mesos leader at %s, looking it up again" % base_url)
+            self.leader_url = None
+            resp = self._send(method, self.master_url + endpoint, timeout, **kwargs)
 
-    return execute_operator_api_request
+        try:
+            resp.raise_for_status()
+            return resp
+        except HTTPError:
+            raise HTTPError("Error executing API request calling %s." % resp.url)
+
+    def drain(self, hostnames, start, duration):
+        """Schedule a maintenance window for the hosts, merged with any other drains that are waiting on the schedule
+
+        Every schedule update has to read the whole schedule and write it back, so only one can be in flight at a time;
+        whichever caller goes next applies all of the drains that are queued up by then in a single update.
+        :returns: the response from the schedule update
+        """
+        pending = _PendingDrain(get_machine_ids(hostnames), start, duration)
+        with self._pending_lock:
+            self._pending_drains.append(pending)
+
+        with self._schedule_lock:
+            if not pending.done:
+                with self._pending_lock:
+                    batch, self._pending_drains = self._pending_drains, []
+                log.info("Updating the maintenance schedule for %d drain(s)" % len(batch))
+                try:
+                    payload = build_schedule_update_payload(self, [(p.machine_ids, p.window) for p in batch])
+                    output = self(data=payload).text
+                    for p in batch:
+                        p.output = output
+                except Exception as e:
+                    for p in batch:
+                        p.error = e
+                finally:
+                    for p in batch:
+                        p.done = True
+
+        if pending.error:
+            raise pending.error
+        return pending.output
+
+    def _send(self, method, url, timeout, **kwargs):
+        # Redirects are followed by hand: requests drops the credentials when it's redirected to a different host,
+        # and we want to remember where the leader is anyway
+        credentials = get_credentials(self.mesos_secret_path)
+        for __ in range(MAX_LEADER_REDIRECTS + 1):
+            resp = self._session.send(
+                self._session.prepare_request(
+                    Request(method, url, auth=(credentials.principal, credentials.secret), **kwargs)
+                ),
+                timeout=timeout,
+                allow_redirects=False,
+            )
+            if not resp.is_redirect:
+                self.leader_url = "%s://%s" % urlsplit(resp.url)[:2]
+                return resp
+            url = urljoin(url, resp.headers["location"])
+            log.info("Redirected to the Mesos leader at %s" % url)
+        raise HTTPError("Too many redirects looking for the Mesos leader (last tried %s)" % url)
 
 
 @retry(exceptions=Timeout, tries=5, delay=5)
@@ -151,9 +285,14 @@ def drain(operator_client, hostnames, start, duration):
     :returns: None
     """
     log.info("Draining: %s" % hostnames)
-    payload = build_maintenance_schedule_payload(operator_client, hostnames, start, duration, drain=True)
     try:
-        drain_output = operator_client(data=payload).text
+        if isinstance(operator_client, MesosOperatorClient):
+            # concurrent drains share a single schedule update
+            drain_output = operator_client.drain(hostnames, start, duration)
+        else:
+            with _maintenance_schedule_lock:
+                payload = build_maintenance_schedule_payload(operator_client, hostnames, start, duration, drain=True)
+                drain_output = operator_client(data=payload).text
     except HTTPError:
         raise HTTPError("Error performing maintenance drain.")
     return drain_output
@@ -167,39 +306,38 @@ def build_maintenance_schedule_payload(operator_client, hostnames, start=None, d
     :param drain: boolean to note whether we are draining (True) the specified hosts or undraining (False) them
     :returns: a dictionary that can be sent to Mesos to (un)schedule maintenance
     """
-    schedule = get_maintenance_schedule(operator_client).json()["get_maintenance_schedule"]["schedule"]
     machine_ids = get_machine_ids(hostnames)
-
+    window = None
     if drain:
         unavailability = {
             "start": {"nanoseconds": int(start)},
             "duration": {"nanoseconds": int(duration)},
         }
         window = {"machine_ids": machine_ids, "unavailability": unavailability}
+    return build_schedule_update_payload(operator_client, [(machine_ids, window)])
 
-    if schedule:
-        for existing_window in schedule["windows"]:
-            for existing_machine_id in existing_window["machine_ids"]:
-                # If we already have a maintenance window scheduled for one of the hosts,
-                # replace it with the new window.
-                if existing_machine_id in machine_ids:
-                    existing_window["machine_ids"].remove(existing_machine_id)
-                    if not existing_window["machine_ids"]:
-                        schedule["windows"].remove(existing_window)
-        if drain:
-            windows = schedule["windows"] + [window]
-        else:
-            windows = schedule["windows"]
-    elif drain:
-        windows = [window]
-    else:
-        windows = []
 
-    payload = {"windows": windows}
+def build_schedule_update_payload(operator_client, updates):
+    """Creates the JSON payload needed to apply several (un)scheduling operations with one schedule update.
+    :param updates: a list of (machine_ids, window) pairs, applied in order; the machines are removed from any existing
+        windows, and then the new window (if it's not None) is added to the schedule
+    :returns: a dictionary that can be sent to Mesos to update the maintenance schedule
+    """
+    schedule = get_maintenance_schedule(operator_client).json()["get_maintenance_schedule"]["schedule"]
+    windows = schedule["windows"] if schedule else []
+    for machine_ids, window in updates:
+        # If we already have a maintenance window scheduled for one of the hosts,
+        # replace it with the new window.
+        remaining_windows = []
+        for existing_window in windows:
+            remaining_machine_ids = [m for m in existing_window["machine_ids"] if m not in machine_ids]
+            if remaining_machine_ids:
+                remaining_windows.append(dict(existing_window, machine_ids=remaining_machine_ids))
+        windows = remaining_windows + ([window] if window else [])
 
     return {
         "type": "UPDATE_MAINTENANCE_SCHEDULE",
-        "update_maintenance_schedule": {"schedule": payload},
+        "update_maintenance_schedule": {"schedule": {"windows": windows}},
     }
 
 
@@ -13,10 +13,17 @@
 # limitations under the License.
 import enum
 import json
-import socket
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from typing import Any
 from typing import Callable
 from typing import Dict
 from typing import Hashable
+from typing import List
+from typing import Mapping
 from typing import MutableMapping
 from typing import NamedTuple
 from typing import Optional
@@ -34,11 +41,13 @@ from clusterman.aws.auto_scaling_resource_group import AutoScalingResourceGroup
 from clusterman.aws.aws_resource_group import AWSResourceGroup
 from clusterman.aws.client import ec2_describe_instances
 from clusterman.aws.client import sqs
+from clusterman.aws.hostname_resolver import get_default_hostname_resolver
+from clusterman.aws.hostname_resolver import HostnameResolver
 from clusterman.aws.spot_fleet_resource_group import SpotFleetResourceGroup
 from clusterman.aws.util import RESOURCE_GROUPS
 from clusterman.aws.util import RESOURCE_GROUPS_REV
 from clusterman.config import POOL_NAMESPACE
-from clusterman.draining.kubernetes import drain as k8s_drain
+from clusterman.draining.kubernetes import drain_nodes as k8s_drain_nodes
 from clusterman.draining.kubernetes import uncordon as k8s_uncordon
 from clusterman.draining.mesos import down
 from clusterman.draining.mesos import drain as mesos_drain
@@ -56,6 +65,10 @@ DEFAULT_FORCE_TERMINATION = False
 DEFAULT_PROCESS_SPOT_WARNINGS = True
 DEFAULT_GLOBAL_REDRAINING_DELAY_SECONDS = 15
 DEFAULT_DRAINING_TIME_THRESHOLD_SECONDS = 1800
+DEFAULT_MAX_WORKERS = 10
+DEFAULT_RECEIVE_WAIT_TIME_SECONDS = 1
+DEFAULT_VISIBILITY_TIMEOUT_SECONDS = 60
+SQS_MAX_BATCH_SIZE = 10  # the most messages SQS will receive, delete, or change the visibility of in one call
 EC2_ASG_TAG_KEY = "aws:autoscaling:groupName"
 EC2_IDENTIFIER_TAG_KEY = "puppet:role::kube"
 EC2_TAG_GROUP_KEYS = {
@@ -102,6 +115,17 @@ class DrainingClient:
         self.drain_queue_url = staticconf.read_string(f"clusters.{cluster_name}.drain_queue_url")
         self.termination_queue_url = staticconf.read_string(f"clusters.{cluster_name}.termination_queue_url")
         self.draining_host_ttl_cache: Dict[str, arrow.Arrow] = {}
+        self.hostname_resolver = get_default_hostname_resolver()
+        self.max_workers = staticconf.read_int("batches.drainer.max_workers", default=DEFAULT_MAX_WORKERS)
+        self.receive_wait_time_seconds = staticconf.read_int(
+            "batches.drainer.receive_wait_time_seconds",
+            default=DEFAULT_RECEIVE_WAIT_TIME_SECONDS,
+        )
+        self.visibility_timeout_seconds = staticconf.read_int(
+            "batches.drainer.visibility_timeout_seconds",
+            default=DEFAULT_VISIBILITY_TIMEOUT_SECONDS,
+        )
+        self._executor: Optional[ThreadPoolExecutor] = None
         self.warning_queue_url = staticconf.read_string(
             f"clusters.{cluster_name}.warning_queue_url",
             default=None,
@@ -122,6 +146,7 @@ class DrainingClient:
             maxsize=1,
             ttl=asg_groups_cache_ttl,
         )
+        self.auto_scaling_resource_groups_lock = threading.Lock()
         monitoring_info = {"cluster": cluster_name}
         self.expiration_counter = get_monitoring_client().create_counter(SFX_EXPIRATION_COUNT, monitoring_info)
         self.draining_counter = get_monitoring_client().create_counter(SFX_DRAINING_COUNT, monitoring_info)
@@ -221,247 +246,326 @@ class DrainingClient:
             ),
         )
 
-    def get_host_to_drain(self) -> Optional[Host]:
-        messages = self.client.receive_message(
-            QueueUrl=self.drain_queue_url,
+    def _receive_messages(self, queue_url: str) -> List[Dict[str, Any]]:
+        return self.client.receive_message(
+            QueueUrl=queue_url,
             MessageAttributeNames=["Sender"],
-            MaxNumberOfMessages=1,
+            MaxNumberOfMessages=SQS_MAX_BATCH_SIZE,
+            WaitTimeSeconds=self.receive_wait_time_seconds,
+            VisibilityTimeout=self.visibility_timeout_seconds,
         ).get("Messages", [])
-        if messages:
-            host_data = json.loads(messages[0]["Body"])
-            return Host(
-                sender=messages[0]["MessageAttributes"]["Sender"]["StringValue"],
-                receipt_handle=messages[0]["ReceiptHandle"],
-                **host_data,
-            )
-        return None
 
-    def get_warned_host(self) -> Optional[Host]:
+    def get_hosts_to_drain(self) -> List[Host]:
+        return [_host_from_message(message) for message in self._receive_messages(self.drain_queue_url)]
+
+    def get_warned_hosts(self) -> List[Host]:
         if self.warning_queue_url is None:
-            return None
-        messages = self.client.receive_message(
-            QueueUrl=self.warning_queue_url,
-            MessageAttributeNames=["Sender"],
-            MaxNumberOfMessages=1,
-        ).get("Messages", [])
-        if messages:
-            event_data = json.loads(messages[0]["Body"])
-            host = host_from_instance_id(
-                receipt_handle=messages[0]["ReceiptHandle"],
-                instance_id=event_data["detail"]["instance-id"],
+            return []
+        messages = self._receive_messages(self.warning_queue_url)
+        if not messages:
+            return []
+
+        # each of these does an EC2 API call and a DNS lookup, so look them all up at once
+        hosts = list(
+            self.executor.map(
+                lambda message: host_from_instance_id(
+                    receipt_handle=message["ReceiptHandle"],
+                    instance_id=json.loads(message["Body"])["detail"]["instance-id"],
+                    hostname_resolver=self.hostname_resolver,
+                ),
+                messages,
             )
-            # if we couldn't derive the host data from the instance id
-            # then we just delete the message so we don't get stuck
-            # worse case AWS will just terminate the box for us...
+        )
+
+        # if we couldn't derive the host data from the instance id
+        # then we just delete the message so we don't get stuck
+        # worse case AWS will just terminate the box for us...
+        underivable_receipt_handles = []
+        for message, host in zip(messages, hosts):
             if not host:
                 logger.warning(
-                    "Couldn't derive host data from instance id {} skipping".format(event_data["detail"]["instance-id"])
-                )
-                self.client.delete_message(
-                    QueueUrl=self.warning_queue_url,
-                    ReceiptHandle=messages[0]["ReceiptHandle"],
+                    "Couldn't derive host data from instance id {} skipping".format(
+                        json.loads(message["Body"])["detail"]["instance-id"]
+                    )
                 )
-            else:
-                return host
-        return None
-
-    def get_host_to_terminate(self) -> Optional[Host]:
-        messages = self.client.receive_message(
-            QueueUrl=self.termination_queue_url,
-            MessageAttributeNames=["Sender"],
-            MaxNumberOfMessages=1,
-        ).get("Messages", [])
-        if messages:
-            host_data = json.loads(messages[0]["Body"])
-            return Host(
-                sender=messages[0]["MessageAttributes"]["Sender"]["StringValue"],
-                receipt_handle=messages[0]["ReceiptHandle"],
-                **host_data,
+                underivable_receipt_handles.append(message["ReceiptHandle"])
+        self._delete_messages(self.warning_queue_url, underivable_receipt_handles)
+        return [host for host in hosts if host]
+
+    def get_hosts_to_terminate(self) -> List[Host]:
+        return [_host_from_message(message) for message in self._receive_messages(self.termination_queue_url)]
+
+    def _delete_messages(self, queue_url: str, receipt_handles: Sequence[str]) -> None:
+        for start in range(0, len(receipt_handles), SQS_MAX_BATCH_SIZE):
+            response = self.client.delete_message_batch(
+                QueueUrl=queue_url,
+                Entries=[
+                    {"Id": str(i), "ReceiptHandle": receipt_handle}
+                    for i, receipt_handle in enumerate(receipt_handles[start : start + SQS_MAX_BATCH_SIZE])
+                ],
             )
-        return None
+            for failure in response.get("Failed", []):
+                logger.warning(f"Failed to delete message from {queue_url}: {failure}")
+
+    def _extend_visibility_timeouts(self, queue_url: str, hosts: Sequence[Host]) -> None:
+        for start in range(0, len(hosts), SQS_MAX_BATCH_SIZE):
+            response = self.client.change_message_visibility_batch(
+                QueueUrl=queue_url,
+                Entries=[
+                    {
+                        "Id": str(i),
+                        "ReceiptHandle": host.receipt_handle,
+                        "VisibilityTimeout": self.visibility_timeout_seconds,
+                    }
+                    for i, host in enumerate(hosts[start : start + SQS_MAX_BATCH_SIZE])
+                ],
+            )
+            for failure in response.get("Failed", []):
+                logger.warning(f"Failed to extend visibility timeout for message in {queue_url}: {failure}")
 
     def delete_drain_messages(self, hosts: Sequence[Host]) -> None:
-        for host in hosts:
-            self.client.delete_message(
-                QueueUrl=self.drain_queue_url,
-                ReceiptHandle=host.receipt_handle,
-            )
+        self._delete_messages(self.drain_queue_url, [host.receipt_handle for host in hosts])
 
     def delete_terminate_messages(self, hosts: Sequence[Host]) -> None:
-        for host in hosts:
-            self.client.delete_message(
-                QueueUrl=self.termination_queue_url,
-                ReceiptHandle=host.receipt_handle,
-            )
+        self._delete_messages(self.termination_queue_url, [host.receipt_handle for host in hosts])
 
     def delete_warning_messages(self, hosts: Sequence[Host]) -> None:
         if self.warning_queue_url is None:
             return
-        for host in hosts:
-            self.client.delete_message(
-                QueueUrl=self.warning_queue_url,
-                ReceiptHandle=host.receipt_handle,
-            )
+        self._delete_messages(self.warning_queue_url, [host.receipt_handle for host in hosts])
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="drainer")
+        return self._executor
+
+    def _process_concurrently(
+        self, queue_url: str, hosts: Sequence[Host], process_fn: Callable[[Host], bool]
+    ) -> List[Host]:
+        """Run process_fn for each host on the worker pool, keeping their messages invisible until they're done
+
+        :param queue_url: the queue the hosts' messages were received from
+        :param hosts: the hosts to process
+        :param process_fn: returns True if the host's message should be deleted from the queue
+        :returns: the hosts whose messages should be deleted; if process_fn raised an exception for a host, its message
+            is left on the queue so that it's retried once the visibility timeout expires
+        """
+        futures = {self.executor.submit(process_fn, host): host for host in hosts}
+        self._wait_for_hosts(queue_url, {future: [host] for future, host in futures.items()})
+
+        processed_hosts = []
+        for future, host in futures.items():
+            try:
+                if future.result():
+                    processed_hosts.append(host)
+            except Exception as e:
+                logger.exception(f"Failed to process {host.instance_id}: {e}")
+        return processed_hosts
+
+    def _wait_for_hosts(self, queue_url: str, futures: Mapping[Future, Sequence[Host]]) -> None:
+        """Wait for the futures to finish, keeping the messages of the hosts they're working on invisible until then"""
+        pending = set(futures)
+        while pending:
+            __, pending = wait(pending, timeout=self.visibility_timeout_seconds / 2)
+            if pending:
+                self._extend_visibility_timeouts(queue_url, [host for future in pending for host in futures[future]])
 
     def process_termination_queue(
         self,
         mesos_operator_client: Optional[Callable[..., Callable[[str], Callable[..., None]]]],
         kube_operator_client: Optional[KubernetesClusterConnector],
     ) -> bool:
-        message_exist = False
-        host_to_terminate = self.get_host_to_terminate()
-        if host_to_terminate:
-            message_exist = True
-            # as for draining if it has a hostname we should down + up around the termination
-            if host_to_terminate.scheduler == "mesos":
-                logger.info(f"Mesos hosts to down+terminate+up: {host_to_terminate}")
-                hostname_ip = f"{host_to_terminate.hostname}|{host_to_terminate.ip}"
-                try:
-                    down(mesos_operator_client, [hostname_ip])
-                except Exception as e:
-                    logger.error(f"Failed to down {hostname_ip} continuing to terminate anyway: {e}")
-                self.terminate_host(host_to_terminate)
-                try:
-                    up(mesos_operator_client, [hostname_ip])
-                except Exception as e:
-                    logger.error(f"Failed to up {hostname_ip} continuing to terminate anyway: {e}")
-            elif host_to_terminate.scheduler == "kubernetes":
-                logger.info(f"Kubernetes host to delete k8s node and terminate: {host_to_terminate}")
-                try:
-                    self.terminate_host(host_to_terminate)
-                    terminating_time_milliseconds = self._get_spent_time_milliseconds(host_to_terminate)
-                    logger.info(
-                        f"terminating took {terminating_time_milliseconds} "
-                        f"milliseconds for {host_to_terminate.instance_id}"
-                    )
-                    self.terminating_timer.record(
-                        terminating_time_milliseconds,
-                        {
-                            "pool": host_to_terminate.pool,
-                            "reason": host_to_terminate.termination_reason,
-                        },
-                    )
-                except Exception as e:
-                    logger.exception(f"Failed to terminate {host_to_terminate.instance_id}: {e}")
-                    # we should stop here so as not to delete message from queue
-                    return message_exist
-            else:
-                logger.info(f"Host to terminate immediately: {host_to_terminate}")
+        hosts_to_terminate = self.get_hosts_to_terminate()
+        terminated_hosts = self._process_concurrently(
+            self.termination_queue_url,
+            hosts_to_terminate,
+            lambda host: self._terminate_queued_host(mesos_operator_client, host),
+        )
+        if terminated_hosts:
+            self.delete_terminate_messages(terminated_hosts)
+        return bool(hosts_to_terminate)
+
+    def _terminate_queued_host(
+        self,
+        mesos_operator_client: Optional[Callable[..., Callable[[str], Callable[..., None]]]],
+        host_to_terminate: Host,
+    ) -> bool:
+        # as for draining if it has a hostname we should down + up around the termination
+        if host_to_terminate.scheduler == "mesos":
+            logger.info(f"Mesos hosts to down+terminate+up: {host_to_terminate}")
+            hostname_ip = f"{host_to_terminate.hostname}|{host_to_terminate.ip}"
+            try:
+                down(mesos_operator_client, [hostname_ip])
+            except Exception as e:
+                logger.error(f"Failed to down {hostname_ip} continuing to terminate anyway: {e}")
+            self.terminate_host(host_to_terminate)
+            try:
+                up(mesos_operator_client, [hostname_ip])
+            except Exception as e:
+                logger.error(f"Failed to up {hostname_ip} continuing to terminate anyway: {e}")
+        elif host_to_terminate.scheduler == "kubernetes":
+            logger.info(f"Kubernetes host to delete k8s node and terminate: {host_to_terminate}")
+            try:
                 self.terminate_host(host_to_terminate)
-            self.delete_terminate_messages([host_to_terminate])
-        return message_exist
+                terminating_time_milliseconds = self._get_spent_time_milliseconds(host_to_terminate)
+                logger.info(
+                    f"terminating took {terminating_time_milliseconds} "
+                    f"milliseconds for {host_to_terminate.instance_id}"
+                )
+                self.terminating_timer.record(
+                    terminating_time_milliseconds,
+                    {
+                        "pool": host_to_terminate.pool,
+                        "reason": host_to_terminate.termination_reason,
+                    },
+                )
+            except Exception as e:
+                logger.exception(f"Failed to terminate {host_to_terminate.instance_id}: {e}")
+                # we should stop here so as not to delete message from queue
+                return False
+        else:
+            logger.info(f"Host to terminate immediately: {host_to_terminate}")
+            self.terminate_host(host_to_terminate)
+        return True
 
     def process_drain_queue(
         self,
         mesos_operator_client: Optional[Callable[..., Callable[[str], Callable[..., None]]]],
         kube_operator_client: Optional[KubernetesClusterConnector],
     ) -> bool:
-        message_exist = False
-        host_to_process = self.get_host_to_drain()
-        if host_to_process and (
-            host_to_process.instance_id not in self.draining_host_ttl_cache
-            or host_to_process.attempt > 1  # re-draining shouldn't be avoided due to caching
-            # We may have instance in the cache for different reasons. But we have to process force draining
-            # if we receive spot interruption
-            or host_to_process.termination_reason == TerminationReason.SPOT_INTERRUPTION.value
-        ):
-            self.draining_host_ttl_cache[host_to_process.instance_id] = arrow.now().shift(seconds=DRAIN_CACHE_SECONDS)
-            message_exist = True
-            if host_to_process.scheduler == "mesos":
-                logger.info(f"Mesos host to drain and submit for termination: {host_to_process}")
-                try:
-                    mesos_drain(
-                        mesos_operator_client,
-                        [f"{host_to_process.hostname}|{host_to_process.ip}"],
-                        arrow.now().timestamp * 1000000000,
-                        staticconf.read_int("mesos_maintenance_timeout_seconds", default=600) * 1000000000,
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to drain {host_to_process.hostname} continuing to terminate anyway: {e}")
-                finally:
-                    self.submit_host_for_termination(host_to_process)
-            elif host_to_process.scheduler == "kubernetes":
-                self._emit_draining_metrics(host_to_process)
-                logger.info(f"Kubernetes host to drain and submit for termination: {host_to_process}")
-                spent_time_milliseconds = self._get_spent_time_milliseconds(host_to_process)
-                pool_config = staticconf.NamespaceReaders(
-                    POOL_NAMESPACE.format(pool=host_to_process.pool, scheduler="kubernetes")
-                )
-                force_terminate = pool_config.read_bool("draining.force_terminate", DEFAULT_FORCE_TERMINATION)
-                draining_time_threshold_seconds = pool_config.read_int(
-                    "draining.draining_time_threshold_seconds",
-                    default=DEFAULT_DRAINING_TIME_THRESHOLD_SECONDS,
+        hosts_to_drain = self.get_hosts_to_drain()
+        hosts_to_process, duplicate_hosts = [], []
+        # check the cache before handing anything to the workers, so that duplicates within a batch are caught too
+        for host in hosts_to_drain:
+            if (
+                host.instance_id not in self.draining_host_ttl_cache
+                or host.attempt > 1  # re-draining shouldn't be avoided due to caching
+                # We may have instance in the cache for different reasons. But we have to process force draining
+                # if we receive spot interruption
+                or host.termination_reason == TerminationReason.SPOT_INTERRUPTION.value
+            ):
+                self.draining_host_ttl_cache[host.instance_id] = arrow.now().shift(seconds=DRAIN_CACHE_SECONDS)
+                hosts_to_process.append(host)
+            else:
+                logger.warning(f"Host: {host.hostname} already being processed, skipping...")
+                duplicate_hosts.append(host)
+                self.duplicate_counter.count(
+                    1,
+                    {
+                        "pool": host.pool,
+                        "reason": host.termination_reason,
+                    },
                 )
-                redraining_delay_seconds = pool_config.read_int(
-                    "draining.redraining_delay_seconds",
-                    default=self.global_redraining_delay_seconds,
+
+        # Kubernetes hosts that are ready to be drained are collected here, so that they can be drained together
+        k8s_hosts_to_drain: List[Host] = []
+        processed_hosts = self._process_concurrently(
+            self.drain_queue_url,
+            hosts_to_process,
+            lambda host: self._drain_queued_host(mesos_operator_client, kube_operator_client, host, k8s_hosts_to_drain),
+        )
+        processed_hosts += self._drain_k8s_hosts(kube_operator_client, k8s_hosts_to_drain)
+
+        # a host whose worker or batch failed keeps its message, which will be redelivered with the same attempt; it
+        # mustn't stay in the cache, or the retry would be discarded as a duplicate
+        processed_receipt_handles = {host.receipt_handle for host in processed_hosts}
+        for host in hosts_to_process:
+            if host.receipt_handle not in processed_receipt_handles:
+                self.draining_host_ttl_cache.pop(host.instance_id, None)
+
+        if duplicate_hosts or processed_hosts:
+            self.delete_drain_messages(duplicate_hosts + processed_hosts)
+        return bool(hosts_to_drain)
+
+    def _drain_queued_host(
+        self,
+        mesos_operator_client: Optional[Callable[..., Callable[[str], Callable[..., None]]]],
+        kube_operator_client: Optional[KubernetesClusterConnector],
+        host_to_process: Host,
+        k8s_hosts_to_drain: List[Host],
+    ) -> bool:
+        """Drain a host, or submit it for termination or re-draining, depending on its state
+
+        :param k8s_hosts_to_drain: Kubernetes hosts that should be drained are added to this list instead, so that they
+            can all be drained at once by _drain_k8s_hosts
+        :returns: True if the host's message should be deleted from the queue
+        """
+        if host_to_process.scheduler == "mesos":
+            logger.info(f"Mesos host to drain and submit for termination: {host_to_process}")
+            try:
+                mesos_drain(
+                    mesos_operator_client,
+                    [f"{host_to_process.hostname}|{host_to_process.ip}"],
+                    arrow.now().timestamp * 1000000000,
+                    staticconf.read_int("mesos_maintenance_timeout_seconds", default=600) * 1000000000,
                 )
-                disable_eviction = host_to_process.termination_reason == TerminationReason.SPOT_INTERRUPTION.value
-                # Try to drain node; there are a few different possibilities:
-                #  0) host is orphan, getting host information from AWS
-                #       a) host doesn't exist, don't need any action
-                #       b) host doesn't have agent_id (PrivateDnsName), submit it for termination
-                #       c) host exists, submit for draining as non-orphan
-                #  1) threshold expired, it should be terminated since force_terminate is true
-                #  2) threshold expired, it should be uncordoned since force_terminate is false
-                #  3) threshold not expired, drain and terminate node, if it can't submit it for re-draining.
-
-                if not host_to_process.agent_id:  # case 0
-                    logger.info(f"Host doesn't have agent_id, it may be orphan: {host_to_process.instance_id}")
-                    host_to_process_fresh = host_from_instance_id(
-                        host_to_process.receipt_handle,
-                        host_to_process.instance_id,
-                        host_to_process.pool,
-                        host_to_process.termination_reason,
-                    )
-                    if not host_to_process_fresh:  # case 0a
-                        logger.info(f"Host doesn't exist: {host_to_process.instance_id}")
-                    elif not host_to_process_fresh.agent_id:  # case 0b
-                        logger.info(f"Host doesn't have agent_id: {host_to_process.instance_id}")
-                        self.submit_host_for_termination(host_to_process, delay=0)
-                    else:  # case 0c
-                        logger.info(f"Sending host to drain: {host_to_process.instance_id}")
-                        self.submit_host_for_draining(host_to_process_fresh, attempt=host_to_process.attempt + 1)
-                elif spent_time_milliseconds / 1000 > draining_time_threshold_seconds:
-                    self.expiration_counter.count(
-                        1,
-                        {
-                            "pool": host_to_process.pool,
-                            "force_terminate": force_terminate,
-                            "reason": host_to_process.termination_reason,
-                        },
-                    )
-                    logger.info(f"Draining expired for: {host_to_process.instance_id}")
-                    if force_terminate:  # case 1
-                        self.submit_host_for_termination(host_to_process, delay=0)
-                    else:  # case 2
-                        k8s_uncordon(kube_operator_client, host_to_process.agent_id)
-                        #  removing instance_id from cache to avoid unnecessary blocking by cache
-                        self.draining_host_ttl_cache.pop(host_to_process.instance_id, None)
-                elif not self._drain_k8s_host(kube_operator_client, host_to_process, disable_eviction):  # case 3
-                    logger.info(
-                        f"Delaying re-draining {host_to_process.instance_id} for {redraining_delay_seconds} seconds"
-                    )
-                    self.submit_host_for_draining(
-                        host_to_process, redraining_delay_seconds, host_to_process.attempt + 1
-                    )
-            else:
-                logger.info(f"Host to submit for termination immediately: {host_to_process}")
-                self.submit_host_for_termination(host_to_process, delay=0)
-            self.delete_drain_messages([host_to_process])
-
-        elif host_to_process:
-            logger.warning(f"Host: {host_to_process.hostname} already being processed, skipping...")
-            self.delete_drain_messages([host_to_process])
-            message_exist = True
-            self.duplicate_counter.count(
-                1,
-                {
-                    "pool": host_to_process.pool,
-                    "reason": host_to_process.termination_reason,
-                },
+            except Exception as e:
+                logger.error(f"Failed to drain {host_to_process.hostname} continuing to terminate anyway: {e}")
+            finally:
+                self.submit_host_for_termination(host_to_process)
+        elif host_to_process.scheduler == "kubernetes":
+            self._emit_draining_metrics(host_to_process)
+            logger.info(f"Kubernetes host to drain and submit for termination: {host_to_process}")
+            spent_time_milliseconds = self._get_spent_time_milliseconds(host_to_process)
+            pool_config = staticconf.NamespaceReaders(
+                POOL_NAMESPACE.format(pool=host_to_process.pool, scheduler="kubernetes")
+            )
+            force_terminate = pool_config.read_bool("draining.force_terminate", DEFAULT_FORCE_TERMINATION)
+            draining_time_threshold_seconds = pool_config.read_int(
+                "draining.draining_time_threshold_seconds",
+                default=DEFAULT_DRAINING_TIME_THRESHOLD_SECONDS,
             )
-        return message_exist
+            # Try to drain node; there are a few different possibilities:
+            #  0) host is orphan, getting host information from AWS
+            #       a) host doesn't exist, don't need any action
+            #       b) host doesn't have agent_id (PrivateDnsName), submit it for termination
+            #       c) host exists, submit for draining as non-orphan
+            #  1) threshold expired, it should be terminated since force_terminate is true
+            #  2) threshold expired, it should be uncordoned since force_terminate is false
+            #  3) threshold not expired, drain and terminate node, if it can't submit it for re-draining (this happens
+            #     in _drain_k8s_hosts, once the rest of the batch is ready to drain too).
+
+            if not host_to_process.agent_id:  # case 0
+                logger.info(f"Host doesn't have agent_id, it may be orphan: {host_to_process.instance_id}")
+                host_to_process_fresh = host_from_instance_id(
+                    host_to_process.receipt_handle,
+                    host_to_process.instance_id,
+                    host_to_process.pool,
+                    host_to_process.termination_reason,
+                    hostname_resolver=self.hostname_resolver,
+                )
+                if not host_to_process_fresh:  # case 0a
+                    logger.info(f"Host doesn't exist: {host_to_process.instance_id}")
+                elif not host_to_process_fresh.agent_id:  # case 0b
+                    logger.info(f"Host doesn't have agent_id: {host_to_process.instance_id}")
+                    self.submit_host_for_termination(host_to_process, delay=0)
+                else:  # case 0c
+                    logger.info(f"Sending host to drain: {host_to_process.instance_id}")
+                    self.submit_host_for_draining(host_to_process_fresh, attempt=host_to_process.attempt + 1)
+            elif spent_time_milliseconds / 1000 > draining_time_threshold_seconds:
+                self.expiration_counter.count(
+                    1,
+                    {
+                        "pool": host_to_process.pool,
+                        "force_terminate": force_terminate,
+                        "reason": host_to_process.termination_reason,
+                    },
+                )
+                logger.info(f"Draining expired for: {host_to_process.instance_id}")
+                if force_terminate:  # case 1
+                    self.submit_host_for_termination(host_to_process, delay=0)
+                else:  # case 2
+                    k8s_uncordon(kube_operator_client, host_to_process.agent_id)
+                    #  removing instance_id from cache to avoid unnecessary blocking by cache
+                    self.draining_host_ttl_cache.pop(host_to_process.instance_id, None)
+            else:  # case 3
+                k8s_hosts_to_drain.append(host_to_process)
+                return False
+        else:
+            logger.info(f"Host to submit for termination immediately: {host_to_process}")
+            self.submit_host_for_termination(host_to_process, delay=0)
+        return True
 
     def clean_processing_hosts_cache(self) -> None:
         hosts_to_remove = []
@@ -472,10 +576,8 @@ class DrainingClient:
             del self.draining_host_ttl_cache[host]
 
     def process_warning_queue(self) -> bool:
-        message_exist = False
-        host_to_process = self.get_warned_host()
-        if host_to_process:
-            message_exist = True
+        warned_hosts = self.get_warned_hosts()
+        for host_to_process in warned_hosts:
             logger.info(f"Processing spot warning for {host_to_process.hostname}")
 
             pool_config = staticconf.NamespaceReaders(
@@ -500,14 +602,59 @@ class DrainingClient:
                 self.submit_host_for_draining(host_to_process)
             else:
                 logger.info(f"Ignoring warned host because not in our target group: {host_to_process.hostname}")
-            self.delete_warning_messages([host_to_process])
-        return message_exist
+        if warned_hosts:
+            self.delete_warning_messages(warned_hosts)
+        return bool(warned_hosts)
+
+    def _drain_k8s_hosts(
+        self, kube_operator_client: Optional[KubernetesClusterConnector], hosts_to_drain: Sequence[Host]
+    ) -> List[Host]:
+        """Drain the hosts' nodes in batches, and submit each host for termination or, if it couldn't be drained, for
+        re-draining
+
+        Spot interruptions are drained in their own batch, since their pods are deleted instead of evicted.
+
+        :returns: the hosts whose messages should be deleted; if draining a batch raised an exception, its hosts'
+            messages are left on the queue so that they're retried once the visibility timeout expires
+        """
+        hosts_by_disable_eviction: Dict[bool, List[Host]] = defaultdict(list)
+        for host in hosts_to_drain:
+            disable_eviction = host.termination_reason == TerminationReason.SPOT_INTERRUPTION.value
+            hosts_by_disable_eviction[disable_eviction].append(host)
+
+        futures = {
+            self.executor.submit(
+                k8s_drain_nodes, kube_operator_client, [host.agent_id for host in hosts], disable_eviction
+            ): hosts
+            for disable_eviction, hosts in hosts_by_disable_eviction.items()
+        }
+        self._wait_for_hosts(self.drain_queue_url, futures)
+
+        processed_hosts = []
+        for future, hosts in futures.items():
+            try:
+                drained = future.result()
+            except Exception as e:
+                logger.exception(f"Failed to drain {', '.join(host.instance_id for host in hosts)}: {e}")
+                continue
+
+            for host in hosts:
+                if drained.get(host.agent_id):
+                    self._submit_drained_k8s_host(host)
+                else:
+                    pool_config = staticconf.NamespaceReaders(
+                        POOL_NAMESPACE.format(pool=host.pool, scheduler="kubernetes")
+                    )
+                    redraining_delay_seconds = pool_config.read_int(
+                        "draining.redraining_delay_seconds",
+                        default=self.global_redraining_delay_seconds,
+                    )
+                    logger.info(f"Delaying re-draining {host.instance_id} for {redraining_delay_seconds} seconds")
+                    self.submit_host_for_draining(host, redraining_delay_seconds, host.attempt + 1)
+                processed_hosts.append(host)
+        return processed_hosts
 
-    def _drain_k8s_host(
-        self, kube_operator_client: Optional[KubernetesClusterConnector], host_to_process: Host, disable_eviction: bool
-    ) -> bool:
-        if not k8s_drain(kube_operator_client, host_to_process.agent_id, disable_eviction):
-            return False
+    def _submit_drained_k8s_host(self, host_to_process: Host) -> None:
         draining_time_milliseconds = self._get_spent_time_milliseconds(host_to_process)
         self.submit_host_for_termination(host_to_process, delay=0)
         logger.info(
@@ -521,7 +668,6 @@ class DrainingClient:
                 "reason": host_to_process.termination_reason,
             },
         )
-        return True
 
     def _emit_draining_metrics(self, host: Host):
         self.draining_counter.count(
@@ -548,12 +694,16 @@ class DrainingClient:
 
     def terminate_host(self, host: Host) -> None:
         logger.info(f"Terminating: {host.instance_id}")
-        if self.is_asg_cache_enabled and host.group_id in self.auto_scaling_resource_groups:
+        resource_group = None
+        if self.is_asg_cache_enabled:
             # possibly take advantage of EC2 API caching for ASGs;
-            # avoids re-listing all groups if the local ASG caching is disabled
-            resource_group = self.auto_scaling_resource_groups[host.group_id]
-            resource_group._reload_resource_group()
-        else:
+            # avoids re-listing all groups if the local ASG caching is disabled.
+            # Hosts are terminated concurrently, so make sure only one thread at a time touches the cached groups
+            with self.auto_scaling_resource_groups_lock:
+                resource_group = self.auto_scaling_resource_groups.get(host.group_id)
+                if resource_group is not None:
+                    resource_group.reload()
+        if resource_group is None:
             resource_group_class = RESOURCE_GROUPS[host.sender]
             resource_group = resource_group_class(host.group_id)
         resource_group.terminate_instances_by_id([host.instance_id])
@@ -587,11 +737,20 @@ class DrainingClient:
         return self._list_resource_groups("kubernetes", AutoScalingResourceGroup)
 
 
+def _host_from_message(message: Dict[str, Any]) -> Host:
+    return Host(
+        sender=message["MessageAttributes"]["Sender"]["StringValue"],
+        receipt_handle=message["ReceiptHandle"],
+        **json.loads(message["Body"]),
+    )
+
+
 def host_from_instance_id(
     receipt_handle: str,
     instance_id: str,
     pool: Optional[str] = None,
     termination_reason: Optional[str] = None,
+    hostname_resolver: Optional[HostnameResolver] = None,
 ) -> Optional[Host]:
     try:
         instance_data = ec2_describe_instances(instance_ids=[instance_id])
@@ -625,10 +784,8 @@ def host_from_instance_id(
         agent_id = instance_data[0]["PrivateDnsName"]
     except KeyError:
         logger.warning(f"No DNS name found for {instance_id} - continuing to proceed anyway")
-    try:
-        hostnames = socket.gethostbyaddr(ip)
-    except socket.error:
-        logger.warning(f"Couldn't derive hostname from IP via DNS for {ip}")
+    hostname = (hostname_resolver or get_default_hostname_resolver()).resolve(ip)
+    if not hostname:
         return None
     try:
         pool_from_ec2 = ""
@@ -643,7 +800,7 @@ def host_from_instance_id(
         sender=sender,
         receipt_handle=receipt_handle,
         instance_id=instance_id,
-        hostname=hostnames[0],
+        hostname=hostname,
         group_id=group_ids[0],
         ip=ip,
         pool=pool if pool else pool_from_ec2,  # getting pool from client and ec2 temporary, parameter will be deleted
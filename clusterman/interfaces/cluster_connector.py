@@ -19,6 +19,7 @@ import staticconf
 
 from clusterman.config import POOL_NAMESPACE
 from clusterman.interfaces.types import AgentMetadata
+from clusterman.interfaces.types import AgentState
 from clusterman.util import ClustermanResources
 
 
@@ -46,6 +47,15 @@ class ClusterConnector(metaclass=ABCMeta):
             return AgentMetadata()
         return self._get_agent_metadata(ip_address)
 
+    def get_agent_state(self, ip_address: Optional[str]) -> AgentState:
+        """Get just the state of a cluster agent given an IP address
+
+        Connectors can override this if the state is much cheaper to compute than the rest of the agent metadata.
+
+        :param ip_address: the IP address of the agent in question (or None, for an UNKNOWN agent)
+        """
+        return self.get_agent_metadata(ip_address).state
+
     @abstractmethod
     def get_resource_allocation(self, resource_name: str) -> float:  # pragma: no cover
         """Get the total amount of the given resource currently allocated for this pool.
@@ -11,11 +11,18 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import heapq
 from abc import ABCMeta
 from abc import abstractmethod
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+from typing import Any
+from typing import DefaultDict
 from typing import Dict
 from typing import List
+from typing import NamedTuple
+from typing import Tuple
 from typing import Union
 
 import arrow
@@ -32,6 +39,8 @@ from clusterman.exceptions import SignalValidationError
 from clusterman.util import get_cluster_dimensions
 from clusterman.util import SignalResourceRequest
 
+DEFAULT_METRICS_QUERY_WORKERS = 8
+
 
 class MetricsConfigDict(TypedDict):
     name: str
@@ -103,18 +112,28 @@ class Signal(metaclass=ABCMeta):
         pass
 
 
-def get_metrics_for_signal(
+class MetricQuery(NamedTuple):
+    metric_name: str
+    metric_type: str
+    time_start: int
+    time_end: int
+    is_regex: bool
+    extra_dimensions: Tuple[Tuple[str, str], ...]  # a tuple instead of a dict so that queries can be deduplicated
+
+
+def plan_metric_queries(
     cluster: str,
     pool: str,
     scheduler: str,
-    app: str,
-    metrics_client: ClustermanMetricsBotoClient,
     required_metrics: List[MetricsConfigDict],
     end_time: arrow.Arrow,
-) -> MetricsValuesDict:
-    """Get the metrics required for a signal"""
+) -> List[MetricQuery]:
+    """Turn a signal's required metrics into the list of distinct queries needed to fetch them
 
-    metrics: MetricsValuesDict = defaultdict(list)
+    Old (non-scheduler-aware) mesos system metrics are queried before the new ones, and identical queries (e.g., from
+    the same metric being listed twice) are only included once.
+    """
+    queries: Dict[MetricQuery, None] = {}  # a dict instead of a set so that we preserve the order of the queries
     for metric_dict in required_metrics:
         if metric_dict["type"] not in (SYSTEM_METRICS, APP_METRICS):
             raise MetricsError(f"Metrics of type {metric_dict['type']} cannot be queried by signals.")
@@ -136,18 +155,65 @@ def get_metrics_for_signal(
 
         start_time = end_time.shift(minutes=-metric_dict["minute_range"])
         for dims in dims_list:
-            query_results = metrics_client.get_metric_values(
+            query = MetricQuery(
                 metric_dict["name"],
                 metric_dict["type"],
                 start_time.timestamp,
                 end_time.timestamp,
-                is_regex=metric_dict["regex"],
-                extra_dimensions=dims,
-                app_identifier=app,
+                metric_dict["regex"],
+                tuple(dims.items()),
             )
-            for metric_name, timeseries in query_results.items():
-                metrics[metric_name].extend(timeseries)
-                # safeguard; the metrics _should_ already be sorted since we inserted the old
-                # (non-scheduler-aware) metrics before the new metrics above, so this should be fast
-                metrics[metric_name].sort()
+            queries[query] = None
+    return list(queries)
+
+
+def get_metrics_for_signal(
+    cluster: str,
+    pool: str,
+    scheduler: str,
+    app: str,
+    metrics_client: ClustermanMetricsBotoClient,
+    required_metrics: List[MetricsConfigDict],
+    end_time: arrow.Arrow,
+    max_workers: int = DEFAULT_METRICS_QUERY_WORKERS,
+) -> MetricsValuesDict:
+    """Get the metrics required for a signal
+
+    The queries are run concurrently (at most max_workers at a time), so a signal with many required metrics only
+    waits about as long as its slowest query.  The worker threads all share metrics_client, so this only happens if
+    the client advertises that it's safe to use from several threads (with a truthy thread_safe attribute); otherwise
+    the queries are run one at a time.
+    """
+
+    def run_query(query: MetricQuery) -> MetricsValuesDict:
+        return metrics_client.get_metric_values(
+            query.metric_name,
+            query.metric_type,
+            query.time_start,
+            query.time_end,
+            is_regex=query.is_regex,
+            extra_dimensions=dict(query.extra_dimensions),
+            app_identifier=app,
+        )
+
+    queries = plan_metric_queries(cluster, pool, scheduler, required_metrics, end_time)
+    if not getattr(metrics_client, "thread_safe", False):
+        max_workers = 1
+    if len(queries) <= 1 or max_workers <= 1:
+        query_results = [run_query(query) for query in queries]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(queries))) as executor:
+            query_results = list(executor.map(run_query, queries))
+
+    # Several queries can return the same metric (e.g., for old and new system metrics); each timeseries comes back
+    # sorted, so we can merge them instead of re-sorting.  Results are merged in query order, so that for identical
+    # timestamps the old (non-scheduler-aware) metrics come first
+    timeseries_by_metric: DefaultDict[str, List[List[Tuple[int, Any]]]] = defaultdict(list)
+    for query_result in query_results:
+        for metric_name, timeseries in query_result.items():
+            timeseries_by_metric[metric_name].append(timeseries)
+
+    metrics: MetricsValuesDict = defaultdict(list)
+    for metric_name, timeseries_list in timeseries_by_metric.items():
+        metrics[metric_name] = list(heapq.merge(*timeseries_list, key=itemgetter(0)))
     return metrics
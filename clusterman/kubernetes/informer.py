@@ -0,0 +1,221 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import Iterable
+from typing import List
+from typing import Mapping
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+
+import colorlog
+import kubernetes
+from kubernetes.client.rest import ApiException
+
+
+logger = colorlog.getLogger(__name__)
+WATCH_TIMEOUT_SECONDS = 300
+WATCH_RETRY_BACKOFF_SECONDS = 5
+RESOURCE_VERSION_EXPIRED_STATUS = 410  # "410 Gone": the resourceVersion we're watching from has been compacted away
+
+Indexer = Callable[[Any], Optional[Hashable]]
+WatchFn = Callable[..., Iterable[Mapping[str, Any]]]
+
+
+class ResourceVersionExpired(Exception):
+    pass
+
+
+class InformerSnapshot(NamedTuple):
+    resource_version: Optional[str]
+    indexes: Mapping[str, Mapping[Hashable, List[Any]]]
+
+
+def _default_watch(list_fn: Callable, **kwargs: Any) -> Iterable[Mapping[str, Any]]:
+    return kubernetes.watch.Watch().stream(list_fn, **kwargs)
+
+
+def _object_key(obj: Any) -> str:
+    if obj.metadata.namespace:
+        return f"{obj.metadata.namespace}/{obj.metadata.name}"
+    return obj.metadata.name
+
+
+class ResourceInformer:
+    def __init__(
+        self,
+        list_fn: Callable,
+        indexers: Mapping[str, Indexer],
+        watch_fn: WatchFn = _default_watch,
+        watch_timeout_seconds: int = WATCH_TIMEOUT_SECONDS,
+        label_selector: str = "",
+    ) -> None:
+        """A local cache of a Kubernetes resource that is kept up-to-date with a watch stream
+
+        The informer lists every object once, and from then on follows a watch stream (starting from the list's
+        resourceVersion) on a background thread, so the API server only has to send us the objects that changed.  If
+        the resourceVersion we're watching from expires, we re-list.
+
+        Objects are grouped into indexes (e.g., pods by node IP); each indexer maps an object to the index value it
+        belongs under, or None to leave it out of that index.  Snapshots of the indexes are rebuilt incrementally, so
+        taking a snapshot only costs as much as the number of index values that changed since the last one.
+
+        :param list_fn: the CoreV1Api list function for the resource (e.g., list_node)
+        :param indexers: a mapping from index name to indexer function
+        :param watch_fn: a function with the same interface as kubernetes.watch.Watch().stream
+        :param watch_timeout_seconds: how long the API server should keep each watch stream open
+        :param label_selector: only list/watch objects matching this label selector
+        """
+        self._list_fn = list_fn
+        self._name = getattr(list_fn, "__name__", "resource")
+        self._indexers = indexers
+        self._watch_fn = watch_fn
+        self._watch_timeout_seconds = watch_timeout_seconds
+        self._label_selector = label_selector
+        self._list_kwargs = {"label_selector": label_selector} if label_selector else {}
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._resource_version: Optional[str] = None
+        self._index_values: Dict[str, Dict[str, Hashable]] = {}
+        self._buckets: Dict[str, Dict[Hashable, Dict[str, Any]]] = {name: {} for name in indexers}
+        self._dirty: Dict[str, Set[Hashable]] = {name: set() for name in indexers}
+        self._published: Dict[str, Dict[Hashable, List[Any]]] = {name: {} for name in indexers}
+
+    @property
+    def label_selector(self) -> str:
+        return self._label_selector
+
+    def start(self) -> None:
+        """List the resource (blocking until it's done) and then start following the watch stream"""
+        self.relist()
+        self._thread = threading.Thread(target=self._run, name=f"informer-{self._name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = False) -> None:
+        """Stop following the watch stream after the current event (or when the current stream times out)"""
+        self._stop_event.set()
+        if wait and self._thread:
+            self._thread.join()
+
+    def is_alive(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def snapshot(self) -> InformerSnapshot:
+        """Get a point-in-time copy of the indexes; the returned mappings and lists are never modified afterwards"""
+        with self._lock:
+            for name, dirty_values in self._dirty.items():
+                if not dirty_values:
+                    continue
+
+                published = dict(self._published[name])
+                for value in dirty_values:
+                    bucket = self._buckets[name].get(value)
+                    if bucket:
+                        published[value] = list(bucket.values())
+                    else:
+                        published.pop(value, None)
+                dirty_values.clear()
+                self._published[name] = published
+
+            return InformerSnapshot(self._resource_version, dict(self._published))
+
+    def relist(self) -> None:
+        response = self._list_fn(**self._list_kwargs)
+        with self._lock:
+            for key in list(self._index_values):
+                self._remove(key)
+            for obj in response.items:
+                self._add(obj)
+            self._resource_version = response.metadata.resource_version
+        logger.info(f"Listed {len(response.items)} objects with {self._name}")
+
+    def watch(self) -> None:
+        """Apply the events from a single watch stream; this returns when the API server closes the stream
+
+        :raises ResourceVersionExpired: if we need to re-list before we can watch again
+        """
+        try:
+            for event in self._watch_fn(
+                self._list_fn,
+                resource_version=self._resource_version,
+                timeout_seconds=self._watch_timeout_seconds,
+                **self._list_kwargs,
+            ):
+                self._apply_event(event)
+                if self._stop_event.is_set():
+                    break
+        except ApiException as e:
+            if e.status == RESOURCE_VERSION_EXPIRED_STATUS:
+                raise ResourceVersionExpired(e.reason) from e
+            raise
+
+    def _run(self) -> None:
+        needs_relist = False
+        while not self._stop_event.is_set():
+            try:
+                if needs_relist:
+                    self.relist()
+                    needs_relist = False
+                self.watch()
+            except ResourceVersionExpired as e:
+                logger.info(f"Watch for {self._name} expired ({e}); re-listing")
+                needs_relist = True
+            except Exception as e:
+                logger.exception(f"Watch for {self._name} failed ({e}); re-listing")
+                needs_relist = True
+                self._stop_event.wait(WATCH_RETRY_BACKOFF_SECONDS)
+
+    def _apply_event(self, event: Mapping[str, Any]) -> None:
+        if event["type"] == "ERROR":
+            status = event.get("raw_object") or {}
+            if status.get("code") == RESOURCE_VERSION_EXPIRED_STATUS:
+                raise ResourceVersionExpired(status.get("message"))
+            raise ApiException(status=status.get("code"), reason=status.get("message"))
+
+        obj = event["object"]
+        with self._lock:
+            if event["type"] in ("ADDED", "MODIFIED"):
+                self._remove(_object_key(obj))
+                self._add(obj)
+            elif event["type"] == "DELETED":
+                self._remove(_object_key(obj))
+            # BOOKMARK events (and everything else) just move the resourceVersion forward
+            self._resource_version = obj.metadata.resource_version
+
+    def _add(self, obj: Any) -> None:
+        # Must be called with self._lock held
+        key = _object_key(obj)
+        self._index_values[key] = {}
+        for name, indexer in self._indexers.items():
+            value = indexer(obj)
+            if value is None:
+                continue
+            self._index_values[key][name] = value
+            self._buckets[name].setdefault(value, {})[key] = obj
+            self._dirty[name].add(value)
+
+    def _remove(self, key: str) -> None:
+        # Must be called with self._lock held
+        for name, value in self._index_values.pop(key, {}).items():
+            bucket = self._buckets[name][value]
+            del bucket[key]
+            if not bucket:
+                del self._buckets[name][value]
+            self._dirty[name].add(value)
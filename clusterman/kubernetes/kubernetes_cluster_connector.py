@@ -11,12 +11,17 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import copy
 import os
+import time
 from collections import defaultdict
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from typing import cast
+from typing import Dict
 from typing import List
 from typing import Mapping
 from typing import Optional
+from typing import Sequence
 from typing import Set
 from typing import Tuple
 
@@ -34,13 +39,16 @@ from kubernetes.client.rest import ApiException
 from clusterman.interfaces.cluster_connector import ClusterConnector
 from clusterman.interfaces.types import AgentMetadata
 from clusterman.interfaces.types import AgentState
+from clusterman.kubernetes.informer import Indexer
+from clusterman.kubernetes.informer import ResourceInformer
+from clusterman.kubernetes.util import allocatable_node_resources
 from clusterman.kubernetes.util import allocated_node_resources
 from clusterman.kubernetes.util import CachedCoreV1Api
 from clusterman.kubernetes.util import ConciseCRDApi
 from clusterman.kubernetes.util import get_node_ip
 from clusterman.kubernetes.util import get_node_kernel_version
 from clusterman.kubernetes.util import get_node_lsbrelease
-from clusterman.kubernetes.util import total_node_resources
+from clusterman.kubernetes.util import KubeApiClientWrapper
 from clusterman.kubernetes.util import total_pod_resources
 from clusterman.migration.constants import MIGRATION_CRD_ATTEMPTS_LABEL
 from clusterman.migration.constants import MIGRATION_CRD_GROUP
@@ -58,10 +66,16 @@ logger = colorlog.getLogger(__name__)
 KUBERNETES_SCHEDULED_PHASES = {"Pending", "Running"}
 CLUSTERMAN_TERMINATION_TAINT_KEY = "clusterman.yelp.com/terminating"
 NOT_FOUND_STATUS = 404
+CONFLICT_STATUS = 409
+TOO_MANY_REQUESTS_STATUS = 429  # the eviction would violate a PodDisruptionBudget right now
 # we don't want to block on eviction/deletion as we're potentially evicting/deleting a ton of pods
 # AND there's a delay before we go ahead and terminate
 # AND at Yelp we run a script on shutdown that will also try to drain one final time.
 PROPAGATION_POLICY = "Background"
+DEFAULT_DRAIN_MAX_WORKERS = 16
+DEFAULT_DRAIN_TIMEOUT_SECONDS = 120
+EVICTION_RETRY_BACKOFF_SECONDS = 1
+EVICTION_RETRY_BACKOFF_MAX_SECONDS = 10
 
 
 class KubernetesClusterConnector(ClusterConnector):
@@ -74,9 +88,16 @@ class KubernetesClusterConnector(ClusterConnector):
     _unschedulable_pods: List[KubernetesPod]
     _excluded_pods: List[KubernetesPod]
     _pods_by_ip: Mapping[str, List[KubernetesPod]]
+    _pods_loaded: bool
     _label_selectors: List[str]
     _unschedulable_pods_resources: ClustermanResources
     _allocated_pods_resources: ClustermanResources
+    _excluded_pods_resources: ClustermanResources
+    _total_resources: ClustermanResources
+    _informer_api: Optional[KubeApiClientWrapper]
+    _node_informer: Optional[ResourceInformer]
+    _pod_informer: Optional[ResourceInformer]
+    _drain_executor: Optional[ThreadPoolExecutor]
 
     def __init__(self, cluster: str, pool: Optional[str], init_crd: bool = False) -> None:
         super().__init__(cluster, pool)
@@ -91,7 +112,11 @@ class KubernetesClusterConnector(ClusterConnector):
         )
         self._unschedulable_pods_resources = ClustermanResources()
         self._allocated_pods_resources = ClustermanResources()
+        self._excluded_pods_resources = ClustermanResources()
+        self._total_resources = ClustermanResources()
         self._nodes_by_ip = {}
+        self._pods_by_ip = {}
+        self._pods_loaded = False
         self._init_crd_client = init_crd
         self._label_selectors = []
         if self.pool:
@@ -99,6 +124,27 @@ class KubernetesClusterConnector(ClusterConnector):
             node_label_selector = self.pool_config.read_string("node_label_key", default="clusterman.com/pool")
             self._label_selectors.append(f"{node_label_selector}={self.pool}")
 
+        # If informers are enabled, nodes and pods are listed once and then kept up-to-date with watch streams
+        # (see clusterman.kubernetes.informer), instead of being re-listed on every reload
+        self._informers_enabled = staticconf.read_bool(
+            f"clusters.{cluster}.kubernetes_informers_enabled",
+            default=False,
+        )
+        self._informer_api = None
+        self._node_informer = None
+        self._pod_informer = None
+
+        # Cordons, pod listings, and evictions for drain_nodes all share one bounded pool of API calls
+        self._drain_max_workers = staticconf.read_int(
+            f"clusters.{cluster}.drain_max_workers",
+            default=DEFAULT_DRAIN_MAX_WORKERS,
+        )
+        self._drain_timeout_seconds = staticconf.read_int(
+            f"clusters.{cluster}.drain_timeout_seconds",
+            default=DEFAULT_DRAIN_TIMEOUT_SECONDS,
+        )
+        self._drain_executor = None
+
     def reload_state(self, load_pods_info: bool = True) -> None:
         """Reload information from cluster/pool
 
@@ -109,10 +155,12 @@ class KubernetesClusterConnector(ClusterConnector):
 
         self.reload_client()
 
-        # store the previous _nodes_by_ip for use in get_removed_nodes_before_last_reload()
-        self._prev_nodes_by_ip = copy.deepcopy(self._nodes_by_ip)
+        # store the previous _nodes_by_ip for use in get_removed_nodes_before_last_reload(); we always build a new
+        # mapping on reload, so there's no need to copy the old one
+        self._prev_nodes_by_ip = self._nodes_by_ip
         self._nodes_by_ip = self._get_nodes_by_ip()
         logger.info(f"Successfully reloaded {len(self._nodes_by_ip)} nodes.")
+        self._pods_loaded = load_pods_info
 
         if load_pods_info:
             logger.info("Reloading pods")
@@ -138,6 +186,13 @@ class KubernetesClusterConnector(ClusterConnector):
                 [],
             )
 
+        # the resources for each node and pod are cached (see clusterman.kubernetes.util), so after the first reload
+        # this is mostly just adding up the nodes that are already there
+        self._excluded_pods_resources = allocated_node_resources(self._excluded_pods)
+        self._total_resources = ClustermanResources()
+        for node in self._nodes_by_ip.values():
+            self._total_resources += allocatable_node_resources(node) - self._excluded_pods_resources
+
     def reload_client(self) -> None:
         self._core_api = CachedCoreV1Api(self.kubeconfig_path)
         self._migration_crd_api = (
@@ -179,44 +234,129 @@ class KubernetesClusterConnector(ClusterConnector):
     def get_resource_total(self, resource_name: str) -> float:
         if self._excluded_pods:
             logger.info(f"Excluded {self.get_resource_excluded(resource_name)} {resource_name} from daemonset pods")
-        return sum(
-            getattr(
-                total_node_resources(node, self._excluded_pods),
-                resource_name,
-            )
-            for node_ip, node in self._nodes_by_ip.items()
-        )
+        return getattr(self._total_resources, resource_name)
 
     def get_resource_excluded(self, resource_name: str) -> float:
-        return getattr(allocated_node_resources(self._excluded_pods), resource_name) * len(self._nodes_by_ip)
+        return getattr(self._excluded_pods_resources, resource_name) * len(self._nodes_by_ip)
+
+    # The cluster-wide totals are all added up once in reload_state, so we can hand them out directly instead of
+    # going through the per-resource getters
+    def get_cluster_allocated_resources(self) -> ClustermanResources:
+        return self._allocated_pods_resources
+
+    def get_cluster_total_resources(self) -> ClustermanResources:
+        if self._excluded_pods:
+            logger.info(f"Excluded {self._excluded_pods_resources * len(self._nodes_by_ip)} from daemonset pods")
+        return self._total_resources
+
+    def get_cluster_pending_resources(self) -> ClustermanResources:
+        return self._unschedulable_pods_resources
+
+    def get_agent_state(self, ip_address: Optional[str]) -> AgentState:
+        # Same logic as _get_agent_metadata, without adding up the resources and checking every pod on the node
+        if not ip_address:
+            return AgentState.UNKNOWN
+        elif ip_address not in self._nodes_by_ip:
+            return AgentState.ORPHANED
+        return AgentState.RUNNING if self._pods_by_ip[ip_address] else AgentState.IDLE
 
     def get_unschedulable_pods(self) -> List[KubernetesPod]:
         return self._unschedulable_pods
 
     def drain_node(self, node_name: str, disable_eviction: bool) -> bool:
-        try:
-            logger.info(f"Cordoning {node_name}...")
-            self.cordon_node(node_name)
-        except Exception:
-            logger.exception(f"Failed to cordon {node_name} - continuing to proceed anyway.")
-        try:
+        return self.drain_nodes([node_name], disable_eviction)[node_name]
+
+    def drain_nodes(
+        self,
+        node_names: Sequence[str],
+        disable_eviction: bool,
+        pods_by_node: Optional[Mapping[str, List[KubernetesPod]]] = None,
+    ) -> Dict[str, bool]:
+        """Cordon a batch of nodes and evict (or delete) all of their non-daemonset pods concurrently
+
+        Evictions that are rejected because of a PodDisruptionBudget are retried with backoff until the node's
+        deadline (drain_timeout_seconds after its pods were submitted); whatever is left after that is reported as
+        not drained, so that the caller can try again later.
+
+        :param node_names: the names of the nodes to drain
+        :param disable_eviction: delete the pods instead of evicting them (this ignores PodDisruptionBudgets)
+        :param pods_by_node: the pods on each node, if the caller has already loaded them; defaults to the pods from
+            the last reload_state.  Any nodes that aren't in here have their pods listed from the API server
+        :returns: whether each node was completely drained
+        """
+        # Nodes from the last reload let us skip reading them again before cordoning
+        loaded_nodes = {node.metadata.name: node for node in self._nodes_by_ip.values()}
+        if pods_by_node is None:
+            # Only the pool's pods are indexed, which is everything that gets scheduled on its nodes; pods that land on
+            # a node between the last reload and its cordon aren't in the index, so reload shortly before draining
+            pods_by_node = (
+                {node.metadata.name: self._pods_by_ip.get(ip, []) for ip, node in self._nodes_by_ip.items()}
+                if self._pods_loaded
+                else {}
+            )
+
+        def cordon_and_list_pods(node_name: str) -> List[KubernetesPod]:
+            try:
+                logger.info(f"Cordoning {node_name}...")
+                self.cordon_node(node_name, loaded_nodes.get(node_name))
+            except Exception:
+                logger.exception(f"Failed to cordon {node_name} - continuing to proceed anyway.")
+            pods = pods_by_node[node_name] if node_name in pods_by_node else self._list_all_pods_on_node(node_name)
+            return [pod for pod in pods if not self._pod_belongs_to_daemonset(pod)]
+
+        action_name = "deleted" if disable_eviction else "evicted"
+        drained: Dict[str, bool] = {}
+        pod_futures: Dict[str, List[Future]] = {}
+        list_futures = {
+            node_name: self.drain_executor.submit(cordon_and_list_pods, node_name) for node_name in node_names
+        }
+        for node_name, list_future in list_futures.items():
+            try:
+                pods_on_node = list_future.result()
+            except Exception as e:
+                logger.warning(f"Failed to drain {node_name}: {e}")
+                drained[node_name] = False
+                continue
+
             logger.info(f"Evicting/Deleting pods on {node_name}...")
-            pods_on_node = [
-                pod for pod in self._list_all_pods_on_node(node_name) if not self._pod_belongs_to_daemonset(pod)
+            logger.info(f"{len(pods_on_node)} pods being {action_name} on {node_name}")
+            deadline = time.monotonic() + self._drain_timeout_seconds
+            pod_futures[node_name] = [
+                self.drain_executor.submit(self._evict_or_delete_pod, node_name, pod, disable_eviction, deadline)
+                for pod in pods_on_node
             ]
-            if not self._evict_or_delete_pods(node_name, pods_on_node, disable_eviction):
+
+        for node_name, futures in pod_futures.items():
+            all_done = True
+            for future in futures:
+                try:
+                    all_done &= future.result()
+                except Exception as e:
+                    logger.warning(f"Failed to drain {node_name}: {e}")
+                    all_done = False
+
+            if all_done:
+                logger.info(f"Drained {node_name}")
+            else:
                 logger.info(f"Some pods couldn't be evicted/deleted on {node_name}")
-                return False
-            logger.info(f"Drained {node_name}")
-            return True
-        except Exception as e:
-            logger.warning(f"Failed to drain {node_name}: {e}")
-            return False
+            drained[node_name] = all_done
+
+        return {node_name: drained[node_name] for node_name in node_names}
+
+    def cordon_node(self, node_name: str, loaded_node: Optional[KubernetesNode] = None) -> bool:
+        """Add the clusterman termination taint to a node
+
+        The taints are a plain list as far as patches are concerned, so we have to send the whole thing.  If we
+        already have the node from the last reload, the patch is made conditional on its resourceVersion instead of
+        reading the node again; if something else has changed the node since then, we fall back to reading it.
 
-    def cordon_node(self, node_name: str) -> bool:
+        :param node_name: the name of the node to cordon
+        :param loaded_node: the node object, if it's already been loaded
+        """
         now = str(arrow.now().timestamp)
+        use_loaded_node = bool(loaded_node and loaded_node.metadata.resource_version)
         try:
-            node = self._core_api.read_node(node_name)
+            node = loaded_node if use_loaded_node else self._core_api.read_node(node_name)
             if not node:
                 logger.warning(f"Node doesn't exist: {node_name}")
                 return False
@@ -226,9 +366,15 @@ class KubernetesClusterConnector(ClusterConnector):
                 else []
             )
             taints.append({"effect": "NoSchedule", "key": CLUSTERMAN_TERMINATION_TAINT_KEY, "value": now})
-            self._core_api.patch_node(name=node_name, body={"spec": {"taints": taints}})
+            body: Dict[str, Dict] = {"spec": {"taints": taints}}
+            if use_loaded_node:
+                body["metadata"] = {"resourceVersion": node.metadata.resource_version}
+            self._core_api.patch_node(name=node_name, body=body)
             return True
         except ApiException as e:
+            if use_loaded_node and e.status == CONFLICT_STATUS:
+                logger.info(f"{node_name} has changed since it was loaded, reading it again")
+                return self.cordon_node(node_name)
             logger.warning(f"Failed to cordon {node_name}: {e.status} - {e.reason}")
             return False
 
@@ -324,26 +470,40 @@ class KubernetesClusterConnector(ClusterConnector):
         """
         return not any(self.get_unschedulable_pods())
 
-    def _evict_or_delete_pods(self, node_name: str, pods: List[KubernetesPod], disable_eviction: bool) -> bool:
-        all_done = True
+    @property
+    def drain_executor(self) -> ThreadPoolExecutor:
+        if self._drain_executor is None:
+            self._drain_executor = ThreadPoolExecutor(
+                max_workers=self._drain_max_workers,
+                thread_name_prefix="k8s-drain",
+            )
+        return self._drain_executor
+
+    def _evict_or_delete_pod(self, node_name: str, pod: KubernetesPod, disable_eviction: bool, deadline: float) -> bool:
         action_name = "deleted" if disable_eviction else "evicted"
-        logger.info(f"{len(pods)} pods being {action_name} on {node_name}")
-        for pod in pods:
+        backoff = EVICTION_RETRY_BACKOFF_SECONDS
+        while True:
             try:
                 if disable_eviction:
                     self._delete_pod(pod)
                 else:
                     self._evict_pod(pod)
                 logger.info(f"{pod.metadata.name} ({pod.metadata.namespace}) was {action_name} on {node_name}")
+                return True
             except ApiException as e:
+                # Once some of the other pods covered by the same PodDisruptionBudget have been rescheduled, the
+                # eviction will be allowed, so keep trying until we run out of time for this node
+                if e.status == TOO_MANY_REQUESTS_STATUS and time.monotonic() + backoff < deadline:
+                    logger.info(f"{pod.metadata.name} ({pod.metadata.namespace}) can't be {action_name} yet, retrying")
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, EVICTION_RETRY_BACKOFF_MAX_SECONDS)
+                    continue
+
                 logger.warning(
                     f"{pod.metadata.name} ({pod.metadata.namespace}) couldn't be {action_name} on {node_name}"
                     f":{e.status}-{e.reason}"
                 )
-                if e.status != NOT_FOUND_STATUS:
-                    all_done = False
-
-        return all_done
+                return e.status == NOT_FOUND_STATUS
 
     def _delete_pod(self, pod: KubernetesPod):
         self._core_api.delete_namespaced_pod(
@@ -391,7 +551,7 @@ class KubernetesClusterConnector(ClusterConnector):
             priority=self.get_node_priority(node_ip),
             state=(AgentState.RUNNING if self._pods_by_ip[node_ip] else AgentState.IDLE),
             task_count=len(self._pods_by_ip[node_ip]),
-            total_resources=total_node_resources(node, self._excluded_pods),
+            total_resources=allocatable_node_resources(node) - self._excluded_pods_resources,
             kernel=get_node_kernel_version(node),
             lsbrelease=get_node_lsbrelease(node),
         )
@@ -415,10 +575,90 @@ class KubernetesClusterConnector(ClusterConnector):
         return True
 
     def _get_nodes_by_ip(self) -> Mapping[str, KubernetesNode]:
+        if self._informers_enabled:
+            self._node_informer = self._get_informer(
+                self._node_informer,
+                "list_node",
+                {"ip": get_node_ip},
+                label_selector=",".join(self._label_selectors),
+            )
+            nodes_by_ip = self._node_informer.snapshot().indexes["ip"]
+            return {cast(str, ip): nodes[0] for ip, nodes in nodes_by_ip.items()}
+
         kwargs = {"label_selector": ",".join(self._label_selectors)} if self._label_selectors else {}
         pool_nodes = self._core_api.list_node(**kwargs).items
         return {get_node_ip(node): node for node in pool_nodes}
 
+    def _get_informer(
+        self,
+        informer: Optional[ResourceInformer],
+        list_fn_name: str,
+        indexers: Mapping[str, Indexer],
+        label_selector: str,
+    ) -> ResourceInformer:
+        # Informers outlive reloads; we only need a new one if the selector has changed or the old one died
+        if informer and informer.is_alive() and informer.label_selector == label_selector:
+            return informer
+        elif informer:
+            informer.stop()
+
+        if not self._informer_api:
+            # this client is shared by the informers' watch threads, so it can't go through the CachedCoreV1Api
+            self._informer_api = KubeApiClientWrapper(self.kubeconfig_path, kubernetes.client.CoreV1Api)
+        informer = ResourceInformer(getattr(self._informer_api, list_fn_name), indexers, label_selector=label_selector)
+        informer.start()
+        return informer
+
+    def _get_pods_info_from_informer(
+        self,
+        label_selector: str,
+        exclude_daemonset_pods: bool,
+    ) -> Tuple[Mapping[str, List[KubernetesPod]], List[KubernetesPod], ClustermanResources, ClustermanResources,]:
+        def scheduled_pod_ip(pod: KubernetesPod) -> Optional[str]:
+            if pod.status.phase == "Running" or self._is_recently_scheduled(pod):
+                return pod.status.host_ip
+            return None
+
+        def is_unschedulable(pod: KubernetesPod) -> Optional[bool]:
+            if scheduled_pod_ip(pod) is None and self._is_unschedulable(pod):
+                return True
+            return None
+
+        # The indexers are evaluated as the watch events come in, for as long as the informer lives, so they don't
+        # look at exclude_daemonset_pods; daemonset pods are filtered out of the snapshot below instead, so that
+        # changes to the setting apply on the next reload
+        self._pod_informer = self._get_informer(
+            self._pod_informer,
+            "list_pod_for_all_namespaces",
+            {"scheduled_pod_ip": scheduled_pod_ip, "unschedulable": is_unschedulable},
+            label_selector=label_selector,
+        )
+        snapshot = self._pod_informer.snapshot()
+        scheduled_pods_by_ip = cast(Mapping[str, List[KubernetesPod]], snapshot.indexes["scheduled_pod_ip"])
+        unschedulable_pods = snapshot.indexes["unschedulable"].get(True, [])
+        if exclude_daemonset_pods:
+            scheduled_pods_by_ip = {
+                ip: [pod for pod in pods if not self._pod_belongs_to_daemonset(pod)]
+                for ip, pods in scheduled_pods_by_ip.items()
+            }
+            unschedulable_pods = [pod for pod in unschedulable_pods if not self._pod_belongs_to_daemonset(pod)]
+        pods_by_ip: Mapping[str, List[KubernetesPod]] = defaultdict(list, scheduled_pods_by_ip)
+
+        allocated_pods_resources = ClustermanResources()
+        for pods in pods_by_ip.values():
+            for pod in pods:
+                allocated_pods_resources += total_pod_resources(pod)
+        unschedulable_pods_resources = ClustermanResources()
+        for pod in unschedulable_pods:
+            unschedulable_pods_resources += total_pod_resources(pod)
+
+        return (
+            pods_by_ip,
+            unschedulable_pods,
+            unschedulable_pods_resources,
+            allocated_pods_resources,
+        )
+
     def _get_pods_info_with_label(
         self,
     ) -> Tuple[Mapping[str, List[KubernetesPod]], List[KubernetesPod], ClustermanResources, ClustermanResources,]:
@@ -433,6 +673,8 @@ class KubernetesClusterConnector(ClusterConnector):
             default=staticconf.read_bool("exclude_daemonset_pods", default=False),
         )
         label_selector = f"{self.pool_label_key}={self.pool}"
+        if self._informers_enabled:
+            return self._get_pods_info_from_informer(label_selector, exclude_daemonset_pods)
 
         for pod in self._core_api.list_pod_for_all_namespaces(label_selector=label_selector).items:
             if exclude_daemonset_pods and self._pod_belongs_to_daemonset(pod):
@@ -14,15 +14,22 @@
 import os
 import re
 import socket
+import threading
+from functools import lru_cache
 from functools import partial
 from typing import Any
+from typing import Callable
 from typing import Hashable
 from typing import List
 from typing import MutableMapping
+from typing import Optional
+from typing import Tuple
 from typing import Type
+from typing import Union
 
 import colorlog
 import kubernetes
+from cachetools import LRUCache
 from cachetools import TTLCache
 from cachetools.keys import hashkey
 from humanfriendly import parse_size
@@ -49,6 +56,12 @@ KUBERNETES_API_CACHE: MutableMapping[Hashable, Any] = TTLCache(
 )
 VERSION_MATCH_EXPR = re.compile(r"(\W|^)(?P<release>\d+\.\d+(\.\d+)?)(\W|$)")
 MILLIBYTE_MATCH_EXPR = re.compile(r"(\d+)m$")
+QUANTITY_MATCH_EXPR = re.compile(r"(\d+(?:\.\d+)?)(?:([kKMGTPE])[iB]?)?$")
+DECIMAL_SUFFIX_MULTIPLIERS = {"K": 10**3, "M": 10**6, "G": 10**9, "T": 10**12, "P": 10**15, "E": 10**18}
+QUANTITY_CACHE_SIZE = 1024
+RESOURCES_CACHE_SIZE = 100000
+_RESOURCES_CACHE: MutableMapping[Tuple[str, str], ClustermanResources] = LRUCache(maxsize=RESOURCES_CACHE_SIZE)
+_RESOURCES_CACHE_LOCK = threading.Lock()
 logger = colorlog.getLogger(__name__)
 
 
@@ -99,6 +112,9 @@ class CachedCoreV1Api(KubeApiClientWrapper):
 
             def decorator(f):
                 def wrapper(*args, **kwargs):
+                    if kwargs.get("watch"):
+                        return f(*args, **kwargs)  # watch streams can't be cached
+
                     k = hashkey(attr, *args, **kwargs)
                     try:
                         return KUBERNETES_API_CACHE[k]
@@ -132,31 +148,47 @@ class ConciseCRDApi(KubeApiClientWrapper):
         )
 
 
+@lru_cache(maxsize=QUANTITY_CACHE_SIZE)
+def _parse_cpus(cpu_str: str) -> float:
+    if cpu_str[-1] == "m":
+        return float(cpu_str[:-1]) / 1000
+    else:
+        return float(cpu_str)
+
+
+@lru_cache(maxsize=QUANTITY_CACHE_SIZE)
+def _parse_bytes(size_str: str) -> int:
+    # Almost every quantity we see is an integer (or decimal) with an optional single-letter suffix, like 512Mi;
+    # these are parsed by hand, and we get the same answers that humanfriendly would give us.  Everything else is
+    # handed off to humanfriendly
+    match = QUANTITY_MATCH_EXPR.match(size_str)
+    if match:
+        number_str, suffix = match.groups()
+        number = float(number_str) if "." in number_str else int(number_str)
+        return int(number * DECIMAL_SUFFIX_MULTIPLIERS[suffix.upper()]) if suffix else int(number)
+
+    # CLUSTERMAN-729 temporary fix while adding milli-byte support to humanfriendly
+    result = MILLIBYTE_MATCH_EXPR.search(size_str)
+    if result:
+        size_str = str(int(result.group(1)) // 1000)
+    return parse_size(size_str)
+
+
 class ResourceParser:
     @staticmethod
     def cpus(resources):
         resources = resources or {}
-        cpu_str = resources.get("cpu", DEFAULT_KUBERNETES_CPU_REQUEST)
-        if cpu_str[-1] == "m":
-            return float(cpu_str[:-1]) / 1000
-        else:
-            return float(cpu_str)
+        return _parse_cpus(resources.get("cpu", DEFAULT_KUBERNETES_CPU_REQUEST))
 
     @staticmethod
     def mem(resources):
         resources = resources or {}
-        # CLUSTERMAN-729 temporary fix while adding milli-byte support to humanfriendly
-        memory = resources.get("memory", DEFAULT_KUBERNETES_MEMORY_REQUEST)
-        result = MILLIBYTE_MATCH_EXPR.search(memory)
-        if result:
-            memory = result.group(1)
-            memory = str(int(memory) // 1000)
-        return parse_size(memory) / 1000000
+        return _parse_bytes(resources.get("memory", DEFAULT_KUBERNETES_MEMORY_REQUEST)) / 1000000
 
     @staticmethod
     def disk(resources):
         resources = resources or {}
-        return parse_size(resources.get("ephemeral-storage", DEFAULT_KUBERNETES_DISK_REQUEST)) / 1000000
+        return _parse_bytes(resources.get("ephemeral-storage", DEFAULT_KUBERNETES_DISK_REQUEST)) / 1000000
 
     @staticmethod
     def gpus(resources):
@@ -164,20 +196,37 @@ class ResourceParser:
         return int(resources.get("nvidia.com/gpu", 0))
 
 
+def _resources_cache_key(obj: Union[KubernetesNode, KubernetesPod]) -> Optional[Tuple[str, str]]:
+    # Any change to an object bumps its resourceVersion, so (uid, resourceVersion) identifies the exact
+    # version of the object, and the resources we computed for it can't go stale
+    metadata = obj.metadata
+    if metadata and metadata.uid and metadata.resource_version:
+        return (metadata.uid, metadata.resource_version)
+    return None
+
+
+def _cached_resources(
+    obj: Union[KubernetesNode, KubernetesPod],
+    compute_fn: Callable[[Any], ClustermanResources],
+) -> ClustermanResources:
+    key = _resources_cache_key(obj)
+    if key is None:
+        return compute_fn(obj)
+
+    with _RESOURCES_CACHE_LOCK:
+        resources = _RESOURCES_CACHE.get(key)
+    if resources is None:
+        resources = compute_fn(obj)
+        with _RESOURCES_CACHE_LOCK:
+            _RESOURCES_CACHE[key] = resources
+    return resources
+
+
 def allocated_node_resources(pods: List[KubernetesPod]) -> ClustermanResources:
-    cpus = mem = disk = gpus = 0
+    allocated_resources = ClustermanResources()
     for pod in pods:
-        cpus += sum(ResourceParser.cpus(c.resources.requests) for c in pod.spec.containers)
-        mem += sum(ResourceParser.mem(c.resources.requests) for c in pod.spec.containers)
-        disk += sum(ResourceParser.disk(c.resources.requests) for c in pod.spec.containers)
-        gpus += sum(ResourceParser.gpus(c.resources.requests) for c in pod.spec.containers)
-
-    return ClustermanResources(
-        cpus=cpus,
-        mem=mem,
-        disk=disk,
-        gpus=gpus,
-    )
+        allocated_resources += total_pod_resources(pod)
+    return allocated_resources
 
 
 def get_node_ip(node: KubernetesNode) -> str:
@@ -207,18 +256,24 @@ def get_node_lsbrelease(node: KubernetesNode) -> str:
     return m.group("release") if m else ""
 
 
-def total_node_resources(node: KubernetesNode, excluded_pods: List[KubernetesPod]) -> ClustermanResources:
-    base_total = ClustermanResources(
+def _allocatable_node_resources(node: KubernetesNode) -> ClustermanResources:
+    return ClustermanResources(
         cpus=ResourceParser.cpus(node.status.allocatable),
         mem=ResourceParser.mem(node.status.allocatable),
         disk=ResourceParser.disk(node.status.allocatable),
         gpus=ResourceParser.gpus(node.status.allocatable),
     )
-    excluded_resources = allocated_node_resources(excluded_pods)
-    return base_total - excluded_resources
 
 
-def total_pod_resources(pod: KubernetesPod) -> ClustermanResources:
+def allocatable_node_resources(node: KubernetesNode) -> ClustermanResources:
+    return _cached_resources(node, _allocatable_node_resources)
+
+
+def total_node_resources(node: KubernetesNode, excluded_pods: List[KubernetesPod]) -> ClustermanResources:
+    return allocatable_node_resources(node) - allocated_node_resources(excluded_pods)
+
+
+def _total_pod_resources(pod: KubernetesPod) -> ClustermanResources:
     return ClustermanResources(
         cpus=sum(ResourceParser.cpus(c.resources.requests) for c in pod.spec.containers),
         mem=sum(ResourceParser.mem(c.resources.requests) for c in pod.spec.containers),
@@ -227,6 +282,10 @@ def total_pod_resources(pod: KubernetesPod) -> ClustermanResources:
     )
 
 
+def total_pod_resources(pod: KubernetesPod) -> ClustermanResources:
+    return _cached_resources(pod, _total_pod_resources)
+
+
 def selector_term_matches_requirement(
     selector_terms: List[V1NodeSelectorTerm],
     selector_requirement: V1NodeSelectorRequirement,
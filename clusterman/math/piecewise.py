@@ -15,11 +15,17 @@ import datetime
 import math
 from functools import lru_cache
 from heapq import merge
+from itertools import accumulate
+from itertools import islice
 from itertools import zip_longest
+from typing import Any
 from typing import Callable
 from typing import cast
+from typing import Dict
 from typing import Generic
 from typing import Iterable
+from typing import Iterator
+from typing import List
 from typing import Optional
 from typing import Tuple
 from typing import TypeVar
@@ -31,6 +37,9 @@ from clusterman.math.piecewise_types import XValueDiff
 
 
 _LRU_CACHE_SIZE = 5
+_DELTA_BLOCK_SIZE = 1000
+# Integer values up to this size can be summed exactly, in any order, as long as there are fewer than 2 ** 21 of them
+_MAX_EXACT_VALUE = 2**32
 T = TypeVar("T")
 
 
@@ -44,20 +53,197 @@ def piecewise_breakpoint_generator(breakpoints, start_time, end_time):
     yield end_time
 
 
+def _is_exactly_summable(value: float) -> bool:
+    """Check whether the value is an integer small enough that floating-point sums involving it are exact"""
+    return isinstance(value, (int, float)) and float(value).is_integer() and abs(value) <= _MAX_EXACT_VALUE
+
+
+class _FenwickTree:
+    """A binary indexed tree over a fixed-length sequence of numbers
+
+    Supports point updates and prefix sums in O(log n) time; see https://en.wikipedia.org/wiki/Fenwick_tree
+    """
+
+    def __init__(self, values: Iterable[float]) -> None:
+        self._tree: List[float] = [0]
+        self._tree.extend(values)
+        for i in range(1, len(self._tree)):
+            parent = i + (i & -i)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[i]
+
+    def add(self, index: int, delta: float) -> None:
+        """Add delta to the (0-indexed) element at index"""
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, count: int) -> float:
+        """Compute the sum of the first count elements"""
+        total: float = 0
+        i = count
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def search(self, target: float) -> Tuple[int, float]:
+        """Find the largest count such that prefix_sum(count) <= target; all elements must be non-negative
+
+        :returns: (count, target - prefix_sum(count))
+        """
+        count, step = 0, 1 << (len(self._tree).bit_length() - 1)
+        while step:
+            if count + step < len(self._tree) and self._tree[count + step] <= target:
+                count += step
+                target -= self._tree[count]
+            step >>= 1
+        return count, target
+
+
+class _DeltaList:
+    """A list of numbers supporting O(log n) insertion, point updates, and cumulative sums
+
+    The elements are stored in blocks of roughly _DELTA_BLOCK_SIZE (much like a sortedcontainers.SortedList), and a
+    pair of Fenwick trees over the block lengths and block totals let us find an element or a cumulative sum without
+    walking every block.  The Fenwick trees are rebuilt whenever a block is split, which happens infrequently enough
+    that the amortized cost of an insertion stays logarithmic.
+    """
+
+    def __init__(self, values: Iterable[float] = ()) -> None:
+        values = list(values)
+        self._len = len(values)
+        self._blocks: List[List[float]] = [
+            values[i : i + _DELTA_BLOCK_SIZE] for i in range(0, len(values), _DELTA_BLOCK_SIZE)
+        ]
+        self._rebuild()
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _rebuild(self) -> None:
+        self._lengths = _FenwickTree(len(block) for block in self._blocks)
+        self._totals = _FenwickTree(sum(block) for block in self._blocks)
+
+    def _locate(self, index: int) -> Tuple[int, int]:
+        if index >= self._len:
+            return len(self._blocks) - 1, len(self._blocks[-1])
+        block_index, offset = self._lengths.search(index)
+        return block_index, int(offset)
+
+    def insert(self, index: int, value: float) -> None:
+        """Insert value before the element at index (or at the end, if index == len(self))"""
+        if not self._blocks:
+            self._blocks.append([value])
+            self._len = 1
+            self._rebuild()
+            return
+
+        block_index, offset = self._locate(index)
+        block = self._blocks[block_index]
+        block.insert(offset, value)
+        self._len += 1
+        if len(block) > 2 * _DELTA_BLOCK_SIZE:
+            self._blocks[block_index : block_index + 1] = [block[:_DELTA_BLOCK_SIZE], block[_DELTA_BLOCK_SIZE:]]
+            self._rebuild()
+        else:
+            self._lengths.add(block_index, 1)
+            self._totals.add(block_index, value)
+
+    def add(self, index: int, delta: float) -> None:
+        """Add delta to the element at index"""
+        block_index, offset = self._locate(index)
+        self._blocks[block_index][offset] += delta
+        self._totals.add(block_index, delta)
+
+    def cumulative_sum(self, index: int) -> float:
+        """Compute the sum of all the elements up to and including the element at index
+
+        The summation order is the same as in cumulative_sums, so both methods give identical results for an element
+        """
+        block_index, offset = self._locate(index)
+        return self._totals.prefix_sum(block_index) + sum(self._blocks[block_index][: offset + 1])
+
+    def cumulative_sums(self, index: int = 0) -> Iterator[float]:
+        """Iterate through the cumulative sums of the list, starting with the element at index"""
+        if index >= self._len:
+            return
+
+        first_block_index, offset = self._locate(index)
+        for block_index in range(first_block_index, len(self._blocks)):
+            base = self._totals.prefix_sum(block_index)
+            partial_sums: Iterable[float] = accumulate(self._blocks[block_index])
+            if block_index == first_block_index:
+                partial_sums = islice(partial_sums, offset, None)
+            for partial_sum in partial_sums:
+                yield base + partial_sum
+
+
 class PiecewiseConstantFunction(Generic[T]):
     def __init__(self, initial_value: float = 0) -> None:
         """Initialize the constant function to a particular value
 
+        Internally, the value at each breakpoint is a base value (stored in self._breakpoints) plus the sum of every
+        delta at or before that breakpoint (stored in self._deltas); this lets add_delta shift the whole tail of the
+        function in O(log n) time instead of rewriting every subsequent breakpoint.  Functions that are only modified
+        with add_breakpoint never allocate self._deltas, so their values are stored exactly as given.
+
+        The delta encoding adds up the deltas in a different order than rewriting the breakpoints one delta at a time
+        does, so it's only used while every value and delta is an integer (whose sums don't depend on the order).  As
+        soon as any other value is added, the breakpoints are materialized and every later add_delta rewrites the
+        tail of the function, so that the results are bit-for-bit the same as they've always been.
+
         :param initial_value: the starting value for the function
         """
-        self.breakpoints = SortedDict()
+        self._breakpoints = SortedDict()
+        self._deltas: Optional[_DeltaList] = None
+        self._materialized_breakpoints: Optional[SortedDict] = None
         self._initial_value: float = initial_value
+        self._exactly_summable = _is_exactly_summable(initial_value)
+
+    @property
+    def breakpoints(self) -> "SortedDict[XValue[T], float]":
+        """A SortedDict mapping each breakpoint to the value of the function at that breakpoint
+
+        If the function has been modified with add_delta, this is computed in linear time and cached until the next
+        modification, so callers should treat the result as read-only.
+        """
+        if self._deltas is None:
+            return self._breakpoints
+        if self._materialized_breakpoints is None:
+            self._materialized_breakpoints = SortedDict(self._iter_breakpoints(0))
+        return self._materialized_breakpoints
+
+    @breakpoints.setter
+    def breakpoints(self, breakpoints: "SortedDict[XValue[T], float]") -> None:
+        self._breakpoints = breakpoints
+        self._deltas = None
+        self._materialized_breakpoints = None
+        self._exactly_summable = _is_exactly_summable(self._initial_value) and all(
+            _is_exactly_summable(value) for value in breakpoints.values()
+        )
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Keep the serialized form the same as it was before the delta encoding was introduced
+        return {"breakpoints": self.breakpoints, "_initial_value": self._initial_value}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self._initial_value = state["_initial_value"]
+        self.breakpoints = state["breakpoints"]
+
+    def _check_exactly_summable(self, value: float) -> None:
+        """Stop using the delta encoding (see __init__) if value isn't an integer"""
+        if self._exactly_summable and not _is_exactly_summable(value):
+            if self._deltas is not None:
+                self.breakpoints = SortedDict(self._iter_breakpoints(0))
+            self._exactly_summable = False
 
     def add_breakpoint(self, xval: XValue[T], yval: float, squash: bool = True) -> None:
         """Add a breakpoint to the function and update the value
 
         Let f(x) be the original function, and next_bp be the first breakpoint > xval; after calling
-        this method, the function will be modified to f'(x) = yval for x \in [xval, next_bp)
+        this method, the function will be modified to f'(x) = yval for x \\in [xval, next_bp)
 
         :param xval: the x-position of the breakpoint to add/modify
         :param yval: the value to set the function to at xval
@@ -65,7 +251,19 @@ class PiecewiseConstantFunction(Generic[T]):
         """
         if squash and self.call(xval) == yval:
             return
-        self.breakpoints[xval] = yval
+
+        self._check_exactly_summable(yval)
+        if self._deltas is None:
+            self._breakpoints[xval] = yval
+            return
+
+        index = self._breakpoints.bisect_left(xval)
+        if xval in self._breakpoints:
+            self._breakpoints[xval] = yval - self._deltas.cumulative_sum(index)
+        else:
+            self._breakpoints[xval] = yval - (self._deltas.cumulative_sum(index - 1) if index > 0 else 0)
+            self._deltas.insert(index, 0)
+        self._materialized_breakpoints = None
 
     def add_delta(self, xval: XValue[T], delta: float) -> None:
         """Modify the function value for x >= xval
@@ -79,12 +277,29 @@ class PiecewiseConstantFunction(Generic[T]):
         if delta == 0:
             return
 
-        if xval not in self.breakpoints:
-            self.breakpoints[xval] = self.call(xval)
+        self._check_exactly_summable(delta)
+        if not self._exactly_summable:
+            if xval not in self._breakpoints:
+                self._breakpoints[xval] = self.call(xval)
+            for x in self._breakpoints.irange(xval):
+                self._breakpoints[x] += delta
+            self.values.cache_clear()
+            self.integrals.cache_clear()
+            return
 
-        for x in self.breakpoints.irange(xval):
-            self.breakpoints[x] += delta
+        if self._deltas is None:
+            self._deltas = _DeltaList([0] * len(self._breakpoints))
+
+        index = self._breakpoints.bisect_left(xval)
+        if xval in self._breakpoints:
+            self._deltas.add(index, delta)
+        else:
+            # The new breakpoint shares its base value with the previous breakpoint, so the only difference
+            # between f(xval) and f'(xval) is the new delta
+            self._breakpoints[xval] = self._breakpoints.peekitem(index - 1)[1] if index > 0 else self._initial_value
+            self._deltas.insert(index, delta)
 
+        self._materialized_breakpoints = None
         self.values.cache_clear()
         self.integrals.cache_clear()
 
@@ -94,27 +309,23 @@ class PiecewiseConstantFunction(Generic[T]):
         :param xval: the x-position to compute
         :returns: f(xval)
         """
-        if len(self.breakpoints) == 0 or xval < self.breakpoints.keys()[0]:
+        index = self._breakpoints.bisect(xval) - 1
+        if index < 0:
             return self._initial_value
-        else:
-            lower_index = self.breakpoints.bisect(xval) - 1
-            return self.breakpoints.values()[lower_index]
 
-    def _breakpoint_info(self, index: Optional[int]) -> Tuple[Optional[int], Optional[XValue[T]], float]:
-        """Helper function for computing breakpoint information
+        value = self._breakpoints.peekitem(index)[1]
+        if self._deltas is not None:
+            value += self._deltas.cumulative_sum(index)
+        return value
 
-        :param index: index of the breakpoint to compute
-        :returns: (index, breakpoint, value)
-          * index is the breakpoint index (if it exists), or None if we're off the end
-          * breakpoint is the x-value of the breakpoint, or None if we're off the end
-          * value is f(breakpoint), or f(last_breakpoint) if we're off the end
-        """
-        try:
-            breakpoint, value = self.breakpoints.peekitem(index)
-        except IndexError:
-            index = None
-            breakpoint, value = None, self.breakpoints.values()[-1]
-        return (index, breakpoint, value)
+    def _iter_breakpoints(self, index: int) -> Iterator[Tuple[XValue[T], float]]:
+        """Iterate through the (breakpoint, value) pairs of the function, starting with the breakpoint at index"""
+        if self._deltas is None:
+            for xval in self._breakpoints.islice(index):
+                yield xval, self._breakpoints[xval]
+        else:
+            for xval, delta_sum in zip(self._breakpoints.islice(index), self._deltas.cumulative_sums(index)):
+                yield xval, self._breakpoints[xval] + delta_sum
 
     @lru_cache(maxsize=_LRU_CACHE_SIZE)  # cache results of calls to this function
     def values(self, start: XValue[T], stop: XValue[T], step: XValueDiff[T]) -> "SortedDict[XValue[T], float]":
@@ -132,13 +343,14 @@ class PiecewiseConstantFunction(Generic[T]):
         """
 
         step = step or (stop - start)
-        if len(self.breakpoints) == 0:
+        if len(self._breakpoints) == 0:
             num_values = int(math.ceil((stop - start) / step))
             return SortedDict([(start + step * i, self._initial_value) for i in range(num_values)])
 
         curr_xval = start
         curr_value = self.call(start)
-        next_index, next_breakpoint, next_value = self._breakpoint_info(self.breakpoints.bisect(start))
+        next_breakpoints = self._iter_breakpoints(self._breakpoints.bisect(start))
+        next_breakpoint, next_value = next(next_breakpoints, (None, 0.0))
 
         sequence = SortedDict()
         while curr_xval < stop:
@@ -146,9 +358,8 @@ class PiecewiseConstantFunction(Generic[T]):
 
             next_xval = min(stop, curr_xval + step)
             while next_breakpoint and next_xval >= next_breakpoint:
-                assert next_index is not None  # if next_breakpoint is set, next_index should also be set
                 curr_value = next_value
-                next_index, next_breakpoint, next_value = self._breakpoint_info(next_index + 1)
+                next_breakpoint, next_value = next(next_breakpoints, (None, 0.0))
             curr_xval = next_xval
 
         return sequence
@@ -171,7 +382,7 @@ class PiecewiseConstantFunction(Generic[T]):
             each integral has a range of size `step`, and the key-value is the left endpoint of the chunk
         """
         step = step or (stop - start)
-        if len(self.breakpoints) == 0:
+        if len(self._breakpoints) == 0:
             # If there are no breakpoints, just split up the range into even widths and compute
             # (width * self._initial_value) for each chunk.
             step_width = transform(step)
@@ -186,10 +397,12 @@ class PiecewiseConstantFunction(Generic[T]):
                 sequence[start + step * num_full_chunks] = range_width % step_width * self._initial_value
             return sequence
 
-        # Set up starting loop parameters
+        # Set up starting loop parameters; only the breakpoints inside [start, stop) are visited, so computing the
+        # integrals takes O(log n + k) time, where k is the number of breakpoints in the range
         curr_xval = start
         curr_value = self.call(start)
-        next_index, next_breakpoint, next_value = self._breakpoint_info(self.breakpoints.bisect(start))
+        next_breakpoints = self._iter_breakpoints(self._breakpoints.bisect(start))
+        next_breakpoint, next_value = next(next_breakpoints, (None, 0.0))
 
         # Loop through the entire range and compute the integral of each chunk
         sequence = SortedDict()
@@ -200,11 +413,10 @@ class PiecewiseConstantFunction(Generic[T]):
             # For each breakpoint in [curr_xval, next_xval), compute the area of that sub-chunk
             next_integral: float = 0
             while next_breakpoint and next_xval >= next_breakpoint:
-                assert next_index is not None  # if next_breakpoint is set, next_index should also be set
                 next_integral += transform(next_breakpoint - curr_xval) * curr_value
                 curr_xval = next_breakpoint
                 curr_value = next_value
-                next_index, next_breakpoint, next_value = self._breakpoint_info(next_index + 1)
+                next_breakpoint, next_value = next(next_breakpoints, (None, 0.0))
 
             # Handle any remaining width between the last breakpoint and the end of the chunk
             next_integral += transform(next_xval - curr_xval) * curr_value
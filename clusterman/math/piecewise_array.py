@@ -0,0 +1,149 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from typing import Any
+from typing import Callable
+from typing import Tuple
+
+import numpy as np
+from sortedcontainers import SortedDict
+
+from clusterman.math.piecewise import PiecewiseConstantFunction
+
+
+ArrayFn = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+
+class PiecewiseConstantArray:
+    def __init__(self, xvals: Any, yvals: Any, initial_value: float = 0) -> None:
+        """An array-backed, immutable representation of a PiecewiseConstantFunction
+
+        The breakpoints are stored as a sorted int64 array of x-values and a parallel float64 array of function values,
+        so that evaluating the function over a grid or combining two functions takes a single vectorized pass instead
+        of one add_breakpoint/call per point.
+
+        :param xvals: the (sorted, unique) x-positions of the breakpoints
+        :param yvals: the function value at each breakpoint
+        :param initial_value: the value of the function before the first breakpoint
+        """
+        self.xvals = np.asarray(xvals, dtype=np.int64)
+        self.yvals = np.asarray(yvals, dtype=np.float64)
+        self.initial_value = initial_value
+
+    @classmethod
+    def from_piecewise(
+        cls,
+        fn: PiecewiseConstantFunction,
+        x_to_int: Callable[[Any], int] = int,
+    ) -> "PiecewiseConstantArray":
+        """Convert a PiecewiseConstantFunction to its array representation
+
+        :param fn: the function to convert
+        :param x_to_int: a function mapping the x-values of fn to integers (must be monotonic and invertible)
+        """
+        breakpoints = fn.breakpoints
+        xvals = np.fromiter((x_to_int(x) for x in breakpoints.keys()), dtype=np.int64, count=len(breakpoints))
+        yvals = np.fromiter(breakpoints.values(), dtype=np.float64, count=len(breakpoints))
+        return cls(xvals, yvals, fn._initial_value)
+
+    def to_piecewise(self, int_to_x: Callable[[int], Any] = int) -> PiecewiseConstantFunction:
+        """Convert the array representation back to a PiecewiseConstantFunction
+
+        :param int_to_x: the inverse of the x_to_int function used in from_piecewise
+        """
+        fn: PiecewiseConstantFunction = PiecewiseConstantFunction(self.initial_value)
+        fn.breakpoints = SortedDict(zip(map(int_to_x, self.xvals.tolist()), self.yvals.tolist()))
+        return fn
+
+    def __len__(self) -> int:
+        return len(self.xvals)
+
+    def call(self, xvals: Any) -> np.ndarray:
+        """Compute the output of the function at every point in an array
+
+        :param xvals: the x-positions to compute
+        :returns: an array of f(x) for each x in xvals
+        """
+        xvals = np.asarray(xvals, dtype=np.int64)
+        if len(self.xvals) == 0:
+            return np.full(xvals.shape, self.initial_value, dtype=np.float64)
+
+        indices = np.searchsorted(self.xvals, xvals, side="right") - 1
+        return np.where(indices >= 0, self.yvals[np.maximum(indices, 0)], self.initial_value)
+
+    def values(self, start: int, stop: int, step: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Compute a sequence of values of the function; see PiecewiseConstantFunction.values
+
+        :returns: a pair of arrays (x-values, f(x)) for x in [start, stop) with spacing `step`
+        """
+        step = step or (stop - start)
+        grid = np.arange(start, stop, step, dtype=np.int64)
+        return grid, self.call(grid)
+
+    def integrals(
+        self,
+        start: int,
+        stop: int,
+        step: int,
+        transform: Callable[[np.ndarray], np.ndarray] = lambda x: x,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Compute a sequence of integrals of the function; see PiecewiseConstantFunction.integrals
+
+        :param transform: function to apply to (an array of) x-widths before computing the integral
+        :returns: a pair of arrays (left endpoint of each chunk, integral of each chunk)
+        """
+        step = step or (stop - start)
+        edges = np.append(np.arange(start, stop, step, dtype=np.int64), np.int64(stop))
+        inner_breakpoints = self.xvals[(self.xvals > start) & (self.xvals < stop)]
+
+        # Split the range at every chunk edge and breakpoint, compute the area of each piece, and then add up
+        # the pieces belonging to each chunk
+        points = np.union1d(edges, inner_breakpoints)
+        areas = transform(np.diff(points)) * self.call(points[:-1])
+        return edges[:-1], np.add.reduceat(areas, np.searchsorted(points, edges[:-1]))
+
+    def integral(self, start: int, stop: int, transform: Callable[[np.ndarray], np.ndarray] = lambda x: x) -> float:
+        return float(self.integrals(start, stop, stop - start, transform)[1][0])
+
+    def _combine(self, other: "PiecewiseConstantArray", op: ArrayFn, initial_value: float) -> "PiecewiseConstantArray":
+        xvals = np.union1d(self.xvals, other.xvals)
+        yvals = op(self.call(xvals), other.call(xvals))
+
+        # Drop any breakpoints that don't change the value of the function, to match add_breakpoint(squash=True)
+        changed = yvals != np.concatenate(([initial_value], yvals))[:-1]
+        return PiecewiseConstantArray(xvals[changed], yvals[changed], initial_value)
+
+    def __add__(self, other: "PiecewiseConstantArray") -> "PiecewiseConstantArray":
+        return self._combine(other, np.add, self.initial_value + other.initial_value)
+
+    def __sub__(self, other: "PiecewiseConstantArray") -> "PiecewiseConstantArray":
+        return self._combine(other, np.subtract, self.initial_value - other.initial_value)
+
+    def __mul__(self, other: "PiecewiseConstantArray") -> "PiecewiseConstantArray":
+        return self._combine(other, np.multiply, self.initial_value * other.initial_value)
+
+    def __truediv__(self, other: "PiecewiseConstantArray") -> "PiecewiseConstantArray":
+        try:
+            initial_value = self.initial_value / other.initial_value
+        except ZeroDivisionError:
+            initial_value = 0
+        return self._combine(other, _divide_or_zero, initial_value)
+
+
+def piecewise_array_max(fn0: PiecewiseConstantArray, fn1: PiecewiseConstantArray) -> PiecewiseConstantArray:
+    return fn0._combine(fn1, np.maximum, max(fn0.initial_value, fn1.initial_value))
+
+
+def _divide_or_zero(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    # Like PiecewiseConstantFunction.__truediv__, division by zero gives zero
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=(denominator != 0))
@@ -11,14 +11,20 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import re
+from collections import Counter
 from collections import defaultdict
-from typing import List
+from contextlib import closing
+from typing import Any
+from typing import Iterable
+from typing import Iterator
 from typing import Mapping
 from typing import MutableMapping
-from typing import Sequence
+from typing import NamedTuple
 from typing import Tuple
 
 import colorlog
+import requests
 import staticconf
 from mypy_extensions import TypedDict
 
@@ -29,20 +35,38 @@ from clusterman.mesos.util import agent_pid_to_ip
 from clusterman.mesos.util import allocated_agent_resources
 from clusterman.mesos.util import mesos_post
 from clusterman.mesos.util import MesosAgentDict
-from clusterman.mesos.util import MesosAgents
-from clusterman.mesos.util import MesosFrameworkDict
-from clusterman.mesos.util import MesosFrameworks
-from clusterman.mesos.util import MesosTaskDict
 from clusterman.mesos.util import total_agent_resources
+from clusterman.util import ClustermanResources
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 logger = colorlog.getLogger(__name__)
 
+# The only parts of the master/frameworks response we look at when streaming it; everything else is skipped
+_FRAMEWORK = "frameworks.item"
+_FRAMEWORK_NAME = "frameworks.item.name"
+_TASK = "frameworks.item.tasks.item"
+_TASK_STATE = "frameworks.item.tasks.item.state"
+_TASK_AGENT_ID = "frameworks.item.tasks.item.slave_id"
+_FRAMEWORK_PREFIXES = {_FRAMEWORK, _FRAMEWORK_NAME, _TASK, _TASK_STATE, _TASK_AGENT_ID}
+
 
 class TaskCount(TypedDict):
     all_tasks: int
     batch_tasks: int
 
 
+class MesosAgent(NamedTuple):
+    """The parts of a Mesos agent's state that we need; the rest of the (large) agent dict isn't kept around"""
+
+    agent_id: str
+    allocated_resources: ClustermanResources
+    total_resources: ClustermanResources
+
+
 class MesosClusterConnector(ClusterConnector):
     SCHEDULER = "mesos"
 
@@ -53,6 +77,11 @@ class MesosClusterConnector(ClusterConnector):
             "non_batch_framework_prefixes",
             default=["marathon"],
         )
+        self._non_batch_framework_re = (
+            re.compile("|".join(re.escape(prefix) for prefix in self.non_batch_framework_prefixes))
+            if self.non_batch_framework_prefixes
+            else None
+        )
         self.api_endpoint = f"http://{mesos_master_fqdn}:5050/"
         logger.info(f"Connecting to Mesos masters at {self.api_endpoint}")
 
@@ -64,65 +93,118 @@ class MesosClusterConnector(ClusterConnector):
         self._agents_by_ip = self._get_agents_by_ip()
 
         logger.info("Reloading frameworks and tasks")
-        self._tasks, self._frameworks = self._get_tasks_and_frameworks()
         self._task_count_per_agent = self._count_tasks_per_agent()
 
     def get_resource_allocation(self, resource_name: str) -> float:
-        return sum(getattr(allocated_agent_resources(agent), resource_name) for agent in self._agents_by_ip.values())
+        return sum(getattr(agent.allocated_resources, resource_name) for agent in self._agents_by_ip.values())
 
     def get_resource_total(self, resource_name: str) -> float:
-        return sum(getattr(total_agent_resources(agent), resource_name) for agent in self._agents_by_ip.values())
+        return sum(getattr(agent.total_resources, resource_name) for agent in self._agents_by_ip.values())
+
+    def get_cluster_allocated_resources(self) -> ClustermanResources:
+        # one pass over the agents, instead of one for each resource
+        allocated_resources = ClustermanResources()
+        for agent in self._agents_by_ip.values():
+            allocated_resources += agent.allocated_resources
+        return allocated_resources
+
+    def get_cluster_total_resources(self) -> ClustermanResources:
+        total_resources = ClustermanResources()
+        for agent in self._agents_by_ip.values():
+            total_resources += agent.total_resources
+        return total_resources
 
     def _get_agent_metadata(self, instance_ip: str) -> AgentMetadata:
-        agent_dict = self._agents_by_ip.get(instance_ip)
-        if not agent_dict:
+        agent = self._agents_by_ip.get(instance_ip)
+        if not agent:
             return AgentMetadata(state=AgentState.ORPHANED)
 
-        allocated_resources = allocated_agent_resources(agent_dict)
         return AgentMetadata(
-            agent_id=agent_dict["id"],
-            allocated_resources=allocated_agent_resources(agent_dict),
-            batch_task_count=self._task_count_per_agent[agent_dict["id"]]["batch_tasks"],
-            state=(AgentState.RUNNING if any(allocated_resources) else AgentState.IDLE),
-            task_count=self._task_count_per_agent[agent_dict["id"]]["all_tasks"],
-            total_resources=total_agent_resources(agent_dict),
+            agent_id=agent.agent_id,
+            allocated_resources=agent.allocated_resources,
+            batch_task_count=self._task_count_per_agent[agent.agent_id]["batch_tasks"],
+            state=(AgentState.RUNNING if any(agent.allocated_resources) else AgentState.IDLE),
+            task_count=self._task_count_per_agent[agent.agent_id]["all_tasks"],
+            total_resources=agent.total_resources,
         )
 
     def _count_tasks_per_agent(self) -> Mapping[str, TaskCount]:
-        """Given a list of mesos tasks, return a count of tasks per agent"""
+        """Count the running tasks (and running batch tasks) on each of the agents in the pool"""
         instance_id_to_task_count: MutableMapping[str, TaskCount] = defaultdict(
             lambda: TaskCount(all_tasks=0, batch_tasks=0),
         )
 
-        for task in self._tasks:
-            if task["state"] == "TASK_RUNNING":
-                instance_id_to_task_count[task["slave_id"]]["all_tasks"] += 1
-                framework_name = self._frameworks[task["framework_id"]]["name"]
-                if self._is_batch_framework(framework_name):
-                    instance_id_to_task_count[task["slave_id"]]["batch_tasks"] += 1
+        pool_agent_ids = {agent.agent_id for agent in self._agents_by_ip.values()}
+        for framework_name, running_tasks_per_agent in self._get_running_tasks_per_framework():
+            is_batch_framework = self._is_batch_framework(framework_name)
+            for agent_id, running_tasks in running_tasks_per_agent.items():
+                if agent_id not in pool_agent_ids:
+                    continue
+                instance_id_to_task_count[agent_id]["all_tasks"] += running_tasks
+                if is_batch_framework:
+                    instance_id_to_task_count[agent_id]["batch_tasks"] += running_tasks
         return instance_id_to_task_count
 
-    def _get_agents_by_ip(self) -> Mapping[str, MesosAgentDict]:
-        response: MesosAgents = mesos_post(self.api_endpoint, "slaves").json()
-        return {
-            agent_pid_to_ip(agent_dict["pid"]): agent_dict
-            for agent_dict in response["slaves"]
-            if agent_dict.get("attributes", {}).get("pool", "default") == self.pool
-        }
-
-    def _get_tasks_and_frameworks(
-        self,
-    ) -> Tuple[Sequence[MesosTaskDict], Mapping[str, MesosFrameworkDict]]:
-        response: MesosFrameworks = mesos_post(self.api_endpoint, "master/frameworks").json()
-        running_frameworks = {framework["id"]: framework for framework in response["frameworks"]}
-
-        tasks: List[MesosTaskDict] = []
-        for framework in running_frameworks.values():
-            tasks.extend(framework["tasks"])
-
-        return tasks, running_frameworks
+    def _get_agents_by_ip(self) -> Mapping[str, MesosAgent]:
+        with closing(mesos_post(self.api_endpoint, "slaves", stream=ijson is not None)) as response:
+            agent_dicts: Iterable[MesosAgentDict] = (
+                ijson.items(_response_stream(response), "slaves.item", use_float=True)
+                if ijson
+                else response.json()["slaves"]
+            )
+            return {
+                agent_pid_to_ip(agent_dict["pid"]): MesosAgent(
+                    agent_id=agent_dict["id"],
+                    allocated_resources=allocated_agent_resources(agent_dict),
+                    total_resources=total_agent_resources(agent_dict),
+                )
+                for agent_dict in agent_dicts
+                if agent_dict.get("attributes", {}).get("pool", "default") == self.pool
+            }
+
+    def _get_running_tasks_per_framework(self) -> Iterator[Tuple[str, Counter]]:
+        """:returns: the name of each running framework, along with how many of its tasks are running on each agent"""
+        with closing(mesos_post(self.api_endpoint, "master/frameworks", stream=ijson is not None)) as response:
+            if ijson:
+                yield from _stream_running_tasks_per_framework(_response_stream(response))
+                return
+
+            for framework in response.json()["frameworks"]:
+                yield framework["name"], Counter(
+                    task["slave_id"] for task in framework["tasks"] if task["state"] == "TASK_RUNNING"
+                )
 
     def _is_batch_framework(self, framework_name: str) -> bool:
         """If the framework matches any of the prefixes in self.non_batch_framework_prefixes
         this will return False, otherwise we assume the task to be a batch task"""
-        return not any([framework_name.startswith(prefix) for prefix in self.non_batch_framework_prefixes])
+        return not (self._non_batch_framework_re and self._non_batch_framework_re.match(framework_name))
+
+
+def _response_stream(response: requests.Response) -> Any:
+    response.raw.decode_content = True  # un-gzip the body as it's read
+    return response.raw
+
+
+def _stream_running_tasks_per_framework(stream: Any) -> Iterator[Tuple[str, Counter]]:
+    """Parse the master/frameworks response as it's read, keeping only the framework names and the state and agent
+    of each task, so that the task dicts (which make up nearly all of the response) are never built"""
+    framework_name = ""
+    running_tasks_per_agent: Counter = Counter()
+    task_state = task_agent_id = None
+    for prefix, event, value in ijson.parse(stream):
+        if prefix not in _FRAMEWORK_PREFIXES:
+            continue
+
+        if prefix == _TASK_STATE:
+            task_state = value
+        elif prefix == _TASK_AGENT_ID:
+            task_agent_id = value
+        elif prefix == _FRAMEWORK_NAME:
+            framework_name = value
+        elif event == "end_map" and prefix == _TASK:
+            if task_state == "TASK_RUNNING":
+                running_tasks_per_agent[task_agent_id] += 1
+            task_state = task_agent_id = None
+        elif event == "end_map" and prefix == _FRAMEWORK:
+            yield framework_name, running_tasks_per_agent
+            framework_name, running_tasks_per_agent = "", Counter()
@@ -15,39 +15,52 @@ from typing import Dict
 from typing import Generator
 from typing import Mapping
 from typing import NamedTuple
+from typing import Optional
 from typing import Union
 
 import colorlog
 
 from clusterman.autoscaler.pool_manager import PoolManager
+from clusterman.exceptions import AllResourceGroupsAreStaleError
 from clusterman.exceptions import NoResourceGroupsFoundError
+from clusterman.kubernetes.kubernetes_cluster_connector import KubernetesClusterConnector
+from clusterman.util import ClustermanResources
 from clusterman.util import get_cluster_dimensions
 
 logger = colorlog.getLogger(__name__)
 
+
+class PoolMetricsSnapshot(NamedTuple):
+    allocated: ClustermanResources
+    total: ClustermanResources
+    pending: ClustermanResources  # only available for Kubernetes pools
+    unschedulable_pods: int  # only available for Kubernetes pools
+    target_capacity: Optional[float]  # None if the pool doesn't have any (non-stale) resource groups
+    market_capacities: Mapping[str, float]
+    non_orphan_fulfilled_capacity: float
+
+
 SYSTEM_METRICS = {
-    "cpus_allocated": lambda manager: manager.cluster_connector.get_resource_allocation("cpus"),
-    "mem_allocated": lambda manager: manager.cluster_connector.get_resource_allocation("mem"),
-    "disk_allocated": lambda manager: manager.cluster_connector.get_resource_allocation("disk"),
-    "gpus_allocated": lambda manager: manager.cluster_connector.get_resource_allocation("gpus"),
+    "cpus_allocated": lambda snapshot: snapshot.allocated.cpus,
+    "mem_allocated": lambda snapshot: snapshot.allocated.mem,
+    "disk_allocated": lambda snapshot: snapshot.allocated.disk,
+    "gpus_allocated": lambda snapshot: snapshot.allocated.gpus,
 }
 SIMPLE_METADATA = {
-    "cpus_total": lambda manager: manager.cluster_connector.get_resource_total("cpus"),
-    "mem_total": lambda manager: manager.cluster_connector.get_resource_total("mem"),
-    "disk_total": lambda manager: manager.cluster_connector.get_resource_total("disk"),
-    "gpus_total": lambda manager: manager.cluster_connector.get_resource_total("gpus"),
-    "target_capacity": lambda manager: manager.target_capacity,
-    "fulfilled_capacity": lambda manager: {
-        str(market): value for market, value in manager.get_market_capacities().items()
-    },
-    "non_orphan_fulfilled_capacity": lambda manager: manager.non_orphan_fulfilled_capacity,
+    "cpus_total": lambda snapshot: snapshot.total.cpus,
+    "mem_total": lambda snapshot: snapshot.total.mem,
+    "disk_total": lambda snapshot: snapshot.total.disk,
+    "gpus_total": lambda snapshot: snapshot.total.gpus,
+    "target_capacity": lambda snapshot: snapshot.target_capacity,
+    "fulfilled_capacity": lambda snapshot: snapshot.market_capacities,
+    "non_orphan_fulfilled_capacity": lambda snapshot: snapshot.non_orphan_fulfilled_capacity,
 }
 KUBERNETES_METRICS = {
-    "unschedulable_pods": lambda manager: len(manager.cluster_connector.get_unschedulable_pods()),
-    "cpus_pending": lambda manager: manager.cluster_connector.get_resource_pending("cpus"),
-    "mem_pending": lambda manager: manager.cluster_connector.get_resource_pending("mem"),
-    "disk_pending": lambda manager: manager.cluster_connector.get_resource_pending("disk"),
-    "gpus_pending": lambda manager: manager.cluster_connector.get_resource_pending("gpus"),
+    "unschedulable_pods": lambda snapshot: snapshot.unschedulable_pods,
+    "cpus_pending": lambda snapshot: snapshot.pending.cpus,
+    "mem_pending": lambda snapshot: snapshot.pending.mem,
+    "disk_pending": lambda snapshot: snapshot.pending.disk,
+    "gpus_pending": lambda snapshot: snapshot.pending.gpus,
 }
 
 
@@ -57,22 +70,54 @@ class ClusterMetric(NamedTuple):
     dimensions: Dict[str, str]  # clusterman_metrics wants a Dict here
 
 
+def get_pool_metrics_snapshot(manager: PoolManager) -> PoolMetricsSnapshot:
+    """Read everything the metrics generators need from a (freshly-reloaded) pool at once
+
+    The cluster connector adds up the allocated, total, and pending resources for the whole pool in one go, instead of
+    once per resource per metric; the generators below then just pick values out of the snapshot.  The snapshot is
+    only valid until the next time the pool is reloaded.
+    """
+    connector = manager.cluster_connector
+    pending, unschedulable_pods = ClustermanResources(), 0
+    if isinstance(connector, KubernetesClusterConnector):
+        pending = connector.get_cluster_pending_resources()
+        unschedulable_pods = len(connector.get_unschedulable_pods())
+
+    try:
+        target_capacity: Optional[float] = manager.target_capacity
+    except (NoResourceGroupsFoundError, AllResourceGroupsAreStaleError):
+        target_capacity = None
+
+    return PoolMetricsSnapshot(
+        allocated=connector.get_cluster_allocated_resources(),
+        total=connector.get_cluster_total_resources(),
+        pending=pending,
+        unschedulable_pods=unschedulable_pods,
+        target_capacity=target_capacity,
+        market_capacities={str(market): value for market, value in manager.get_market_capacities().items()},
+        non_orphan_fulfilled_capacity=manager.non_orphan_fulfilled_capacity,
+    )
+
+
 def generate_system_metrics(
     manager: PoolManager,
+    snapshot: Optional[PoolMetricsSnapshot] = None,
 ) -> Generator[ClusterMetric, None, None]:
+    snapshot = snapshot or get_pool_metrics_snapshot(manager)
     dimensions = get_cluster_dimensions(manager.cluster, manager.pool, manager.scheduler)
     for metric_name, value_method in SYSTEM_METRICS.items():
-        yield ClusterMetric(metric_name, value_method(manager), dimensions=dimensions)
+        yield ClusterMetric(metric_name, value_method(snapshot), dimensions=dimensions)
 
 
 def generate_simple_metadata(
     manager: PoolManager,
+    snapshot: Optional[PoolMetricsSnapshot] = None,
 ) -> Generator[ClusterMetric, None, None]:
+    snapshot = snapshot or get_pool_metrics_snapshot(manager)
     dimensions = get_cluster_dimensions(manager.cluster, manager.pool, manager.scheduler)
     for metric_name, value_method in SIMPLE_METADATA.items():
-        try:
-            result = value_method(manager)
-        except NoResourceGroupsFoundError:
+        result = value_method(snapshot)
+        if result is None:
             logger.warning(f"Resources for metric {metric_name} cluster {manager.cluster} not found")
             continue
 
@@ -81,7 +126,9 @@ def generate_simple_metadata(
 
 def generate_kubernetes_metrics(
     manager: PoolManager,
+    snapshot: Optional[PoolMetricsSnapshot] = None,
 ) -> Generator[ClusterMetric, None, None]:
+    snapshot = snapshot or get_pool_metrics_snapshot(manager)
     dimensions = get_cluster_dimensions(manager.cluster, manager.pool, manager.scheduler)
     for metric_name, value_method in KUBERNETES_METRICS.items():
-        yield ClusterMetric(metric_name, value_method(manager), dimensions=dimensions)
+        yield ClusterMetric(metric_name, value_method(snapshot), dimensions=dimensions)
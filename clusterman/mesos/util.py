@@ -12,8 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import re
+import threading
 from typing import Any
+from typing import Dict
 from typing import Mapping
+from typing import NoReturn
+from typing import Optional
 from typing import Sequence
 
 import colorlog
@@ -24,6 +28,11 @@ from clusterman.exceptions import PoolConnectionError
 from clusterman.util import ClustermanResources
 
 logger = colorlog.getLogger(__name__)
+_HEADERS = {"user-agent": "clusterman"}
+# Each thread gets its own session (requests doesn't promise that sessions are thread-safe), which is re-used by every
+# mesos_post call on that thread so that the connections to the masters are kept alive
+_sessions = threading.local()
+_leader_urls: Dict[str, str] = {}  # master url -> leader url
 
 
 class MesosAgentDict(TypedDict):
@@ -81,26 +90,65 @@ def allocated_agent_resources(agent_dict: MesosAgentDict) -> ClustermanResources
     )
 
 
-def mesos_post(url: str, endpoint: str) -> requests.Response:
-    master_url = url if endpoint == "redirect" else mesos_post(url, "redirect").url + "/"
-    request_url = master_url + endpoint
-    response = None
+def _get_session() -> requests.Session:
+    if not hasattr(_sessions, "session"):
+        _sessions.session = requests.Session()
+    return _sessions.session
+
+
+def mesos_post(url: str, endpoint: str, stream: bool = False) -> requests.Response:
+    """POST to an endpoint on the leading Mesos master
+
+    The leader is found by following the redirect from url, and then cached until it stops answering or redirects us
+    to a different master, so most calls only take a single request (over a keep-alive connection).
+
+    :param stream: if True, the body isn't downloaded up front (see requests' streaming mode); the caller has to read
+        response.raw and close the response
+    """
+    if endpoint == "redirect":
+        return _post(url + endpoint)
+
+    leader_url = _leader_urls.get(url)
+    if leader_url:
+        try:
+            response = _get_session().post(
+                leader_url + endpoint, headers=_HEADERS, allow_redirects=False, stream=stream
+            )
+            if not response.is_redirect:
+                return _check_response(response, leader_url + endpoint)
+            response.close()
+        except requests.ConnectionError:
+            pass
+        logger.info(f"Mesos leader at {leader_url} is gone, looking it up again")
+
+    leader_url = _leader_urls[url] = _post(url + "redirect").url + "/"
+    return _post(leader_url + endpoint, stream)
+
+
+def _post(request_url: str, stream: bool = False) -> requests.Response:
     try:
-        response = requests.post(
-            request_url,
-            headers={"user-agent": "clusterman"},
-        )
-        response.raise_for_status()
+        response = _get_session().post(request_url, headers=_HEADERS, stream=stream)
     except Exception as e:  # there's no one exception class to check for problems with the request :(
-        log_message = f"Mesos is unreachable:\n\n" f"{str(e)}\n" f"Querying Mesos URL: {request_url}\n"
-        if response is not None:
-            log_message += f"Response Code: {response.status_code}\n" f"Response Text: {response.text}\n"
-        logger.critical(log_message)
-        raise PoolConnectionError("Mesos master unreachable: check the logs for details") from e
+        _log_unreachable(request_url, e, None)
+    return _check_response(response, request_url)
 
+
+def _check_response(response: requests.Response, request_url: str) -> requests.Response:
+    try:
+        response.raise_for_status()
+    except Exception as e:
+        _log_unreachable(request_url, e, response)
     return response
 
 
+def _log_unreachable(request_url: str, e: Exception, response: Optional[requests.Response]) -> NoReturn:
+    log_message = f"Mesos is unreachable:\n\n" f"{str(e)}\n" f"Querying Mesos URL: {request_url}\n"
+    if response is not None:
+        log_message += f"Response Code: {response.status_code}\n" f"Response Text: {response.text}\n"
+    logger.critical(log_message)
+    raise PoolConnectionError("Mesos master unreachable: check the logs for details") from e
+
+
 def total_agent_resources(agent: MesosAgentDict) -> ClustermanResources:
     resources = agent.get("resources", {})
     return ClustermanResources(
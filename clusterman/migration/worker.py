@@ -212,6 +212,7 @@ def uptime_migration_worker(
     node_selector = lambda node: node.instance.uptime.total_seconds() > uptime_seconds  # noqa
     if not manager.draining_client:
         logger.warning(f"Draining client not set up for {cluster}:{pool}, giving up")
+        manager.close()
         return
     try:
         while True:
@@ -233,6 +234,8 @@ def uptime_migration_worker(
     except Exception as e:
         logger.error(f"Issue while running uptime worker: {e}")
         raise
+    finally:
+        manager.close()
 
 
 def event_migration_worker(migration_event: MigrationEvent, worker_setup: WorkerSetup, pool_lock: LockBase) -> None:
@@ -293,6 +296,7 @@ def event_migration_worker(migration_event: MigrationEvent, worker_setup: Worker
         logger.error(f"Issue while processing migration event {migration_event}: {e}")
         raise
     finally:
+        manager.close()
         if pool_lock_acquired:
             pool_lock.release()
         # we do not reset the pool target capacity in case of direct capacity changes
@@ -11,84 +11,168 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import arrow
+import datetime
+
 import numpy as np
 
+from clusterman.simulator.util import timestamp_micros
+
+MICROSECONDS_PER_SECOND = 10**6
+MICROSECONDS_PER_DAY = 86400 * MICROSECONDS_PER_SECOND
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
 
 def transform_heatmap_data(data, error_threshold_fn, months, tz):
     """Transform input data into positions and values for heatmap plotting
 
     :param data: a SortedDict mapping from timestamp -> value
-    :param error_threshold_fn: a function that takes an (x, y) pair and returns True if y is outside the threshold at x
+    :param error_threshold_fn: a function that takes an array of timestamps (in microseconds since the epoch) and an
+        array of values, and returns a boolean array that is True wherever the value is outside the threshold
     :param months: a list of (mstart, mend) tuples for grouping the output data
     :param tz: what timezone the output data should be interpreted as
-    :returns: a dict of month -> [<x-data>, <y-data>, <values>] lists, as well as the p5/p95 values
+    :returns: a dict of month -> [<x-data>, <y-data>, <values>] arrays, as well as the p5/p95 values
         (the p5/p95 values are used to set the min/max color range of the heatmap)
     """
+    timestamps, values = timeseries_to_arrays(data)
+    local_days, local_times = np.divmod(timestamps + utc_offsets(timestamps, tz), MICROSECONDS_PER_DAY)
+
+    # We want the y-axis to just be a date (year-month-day) and the x-axis to just be a time (hour-minute-second)
+    # However, the matplotlib DatetimeFormatter won't take just date or time objects; so to get a canonical
+    # datetime we use the time of day on the beginning UNIX epoch date, and midnight on the correct date (both in tz)
+    epoch_offset = _utc_offset_at_local_midnight(0, tz)
+    times_of_day = (local_times - epoch_offset).astype("datetime64[us]")
+    unique_days, day_indices = np.unique(local_days, return_inverse=True)
+    midnights = np.array([day * MICROSECONDS_PER_DAY - _utc_offset_at_local_midnight(day, tz) for day in unique_days])
+    dates = midnights.astype(np.int64)[day_indices].astype("datetime64[us]")
+    errors = error_threshold_fn(timestamps, values)
+
     data_by_month = {}
     error_data_by_month = {}
     min_val, max_val = float("inf"), float("-inf")
     for mstart, mend in months:
-        mstart_index = data.bisect_left(mstart)
-        mend_index = data.bisect_right(mend)
-
-        # We want the y-axis to just be a date (year-month-day) and the x-axis to just be a time (hour-minute-second)
-        # However, the matplotlib DatetimeFormatter won't take just date or time objects; so to get a canonical
-        # datetime object we use the beginning UNIX epoch time and then replace the date/time with the correct values
-
-        mdates, mtimes, mvals = [], [], []
-        edates, etimes, evals = [], [], []
-        for i in range(mstart_index, mend_index):
-            utc_k, v = data.keys()[i], data.values()[i]
-            k = utc_k.to(tz)
-            date = k.replace(year=1970, month=1, day=1).datetime
-            time = k.replace(hour=0, minute=0, second=0, microsecond=0).datetime
-            if error_threshold_fn(utc_k, v):
-                edates.append(date), etimes.append(time), evals.append(v)
-            else:
-                mdates.append(date), mtimes.append(time), mvals.append(v)
-        p5, p95 = np.percentile([data.values()[i] for i in range(mstart_index, mend_index)], [5, 95])
-        min_val = min(min_val, p5)
-        max_val = max(max_val, p95)
-        data_by_month[mstart] = (mdates, mtimes, mvals)
-        error_data_by_month[mstart] = (edates, etimes, evals)
+        month = _month_slice(timestamps, mstart, mend)
+        valid, invalid = ~errors[month], errors[month]
+        mtimes, mdates, mvals = times_of_day[month], dates[month], values[month]
+        if len(mvals):
+            p5, p95 = np.percentile(mvals, [5, 95])
+            min_val = min(min_val, p5)
+            max_val = max(max_val, p95)
+        data_by_month[mstart] = (mtimes[valid], mdates[valid], mvals[valid])
+        error_data_by_month[mstart] = (mtimes[invalid], mdates[invalid], mvals[invalid])
     return data_by_month, error_data_by_month, min_val, max_val
 
 
-def transform_trend_data(data, months, trend_rollup):
+def transform_trend_data(data, months, trend_rollup, tz):
     """Transform input data into (x,y) values aggregated over each day of the month
 
     :param data: a SortedDict mapping from timestamp -> value
     :param months: a list of (mstart, mend) tuples for grouping the output data
-    :param trend_rollup: a function accepting a list of data points to aggregate data per-day;
-        this function should return a tuple q1, q2, q3, where the points defined by the q2's describe the
-        solid line of the trend plot, and points in the range [q1, q3] are filled in on the trend plot.
-        (many trend_rollups will want to return the mean and interquartile range, hence the variable names; however,
-        this interpretation is not required)
-    :returns: a dict of month -> [<day-of-month>, <lower-range>, <aggregated-value>, <upper-range>] lists,
+    :param trend_rollup: a function accepting an array of data points and the index of the first point for each day, to
+        aggregate data per-day; this function should return a tuple of arrays q1, q2, q3, where the points defined by
+        the q2's describe the solid line of the trend plot, and points in the range [q1, q3] are filled in on the trend
+        plot.  (many trend_rollups will want to return the mean and interquartile range, hence the variable names;
+        however, this interpretation is not required)
+    :param tz: what timezone the days should be interpreted in
+    :returns: a dict of month -> [<day-of-month>, <lower-range>, <aggregated-value>, <upper-range>] arrays,
         as well as the min/max aggregated values for the trend rollup
         (the min/max values sets the range for the trend plot)
     """
+    timestamps, values = timeseries_to_arrays(data)
+    local_days = (timestamps + utc_offsets(timestamps, tz)) // MICROSECONDS_PER_DAY
+
     data_by_month = {}
-    min_val, max_val = (
-        0,
-        0,
-    )  # min_val sets the minimum y-value of the plot axis, which should always be 0 or less
+    min_val, max_val = 0, 0  # min_val sets the minimum y-value of the plot axis, which should always be 0 or less
     for mstart, mend in months:
-        aggregated_daily_data = []
-
-        # For each day in the month aggregate the data according to the chosen method
-        for dstart, dend in arrow.Arrow.span_range("day", mstart, mend):
-            dstart_index = data.bisect_left(dstart)
-            dend_index = data.bisect_right(dend)
-            day_slice = data.values()[dstart_index:dend_index]
-            if not day_slice:  # if there's no data for a given day, np.percentile will fail
-                continue
-
-            q1, q2, q3 = trend_rollup(day_slice)
-            min_val = min(v for v in (min_val, q1, q2, q3) if v is not None)
-            max_val = max(v for v in (max_val, q2, q2, q3) if v is not None)
-            aggregated_daily_data.append((dstart.day, q1, q2, q3))
-
-        data_by_month[mstart] = zip(*aggregated_daily_data)
+        # Aggregate the data for each day in the month (that has any data) according to the chosen method
+        month = _month_slice(timestamps, mstart, mend)
+        month_days = local_days[month]
+        day_starts = np.flatnonzero(np.diff(month_days, prepend=month_days[:1] - 1))
+        q1, q2, q3 = trend_rollup(values[month], day_starts)
+        if len(day_starts):
+            min_val = min(min_val, np.min(q1), np.min(q2), np.min(q3))
+            max_val = max(max_val, np.max(q2), np.max(q3))
+
+        dates = month_days[day_starts].astype("datetime64[D]")
+        days_of_month = (dates - dates.astype("datetime64[M]")).astype(np.int64) + 1
+        data_by_month[mstart] = (days_of_month, q1, q2, q3)
     return data_by_month, min_val, max_val
+
+
+def grouped_percentiles(values, group_starts, percentiles):
+    """Compute percentiles for each group of consecutive values at once (with linear interpolation, like np.percentile)
+
+    :param values: an array of data points
+    :param group_starts: the (sorted) index of the first data point in each group; every group must be non-empty
+    :param percentiles: a list of the percentiles to compute, between 0 and 100
+    :returns: a list of arrays, one for each percentile, with the value of that percentile for each group
+    """
+    group_sizes = np.diff(np.append(group_starts, len(values)))
+    group_ids = np.repeat(np.arange(len(group_starts)), group_sizes)
+    sorted_values = values[np.lexsort((values, group_ids))]
+
+    results = []
+    for percentile in percentiles:
+        positions = (group_sizes - 1) * (percentile / 100)
+        below = np.floor(positions).astype(np.int64)
+        above = np.ceil(positions).astype(np.int64)
+        low, high = sorted_values[group_starts + below], sorted_values[group_starts + above]
+        results.append(low + (high - low) * (positions - below))
+    return results
+
+
+def timeseries_to_arrays(data):
+    """:returns: arrays of the timestamps (in microseconds since the epoch) and values in a SortedDict"""
+    timestamps = np.fromiter((timestamp_micros(timestamp) for timestamp in data.keys()), np.int64, len(data))
+    values = np.fromiter(data.values(), np.float64, len(data))
+    return timestamps, values
+
+
+def utc_offsets(timestamps, tz):
+    """Compute the UTC offset of a timezone at every timestamp
+
+    Instead of converting every timestamp, this looks up the offset once a day and, on days where it changes (e.g.,
+    for daylight saving time), searches for the second at which it changed; so it assumes the offset of tz changes at
+    most once a day, and only on a whole second.
+
+    :param timestamps: a sorted array of timestamps, in microseconds since the epoch
+    :param tz: a tzinfo object
+    :returns: an array of the UTC offset of tz at each timestamp, in microseconds
+    """
+    if len(timestamps) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    first_day, last_day = timestamps[0] // MICROSECONDS_PER_DAY, timestamps[-1] // MICROSECONDS_PER_DAY
+    change_seconds, change_offsets = [], []
+    prev_offset = None
+    for day in range(int(first_day), int(last_day) + 2):
+        seconds = day * 86400
+        offset = _utc_offset(seconds, tz)
+        if offset != prev_offset:
+            if prev_offset is not None:
+                low = seconds - 86400  # binary search for the first second with the new offset
+                while seconds - low > 1:
+                    mid = (low + seconds) // 2
+                    low, seconds = (mid, seconds) if _utc_offset(mid, tz) == prev_offset else (low, mid)
+            change_seconds.append(seconds)
+            change_offsets.append(offset)
+            prev_offset = offset
+
+    indices = np.searchsorted(np.array(change_seconds) * MICROSECONDS_PER_SECOND, timestamps, side="right") - 1
+    return np.array(change_offsets, dtype=np.int64)[np.maximum(indices, 0)]
+
+
+def _utc_offset(seconds, tz):
+    """:returns: the UTC offset of tz at a time (in seconds since the epoch), in microseconds"""
+    return datetime.datetime.fromtimestamp(seconds, tz).utcoffset() // datetime.timedelta(microseconds=1)
+
+
+def _utc_offset_at_local_midnight(day, tz):
+    """:returns: the UTC offset of tz at midnight (local time) on a day (in days since the epoch), in microseconds"""
+    midnight = datetime.datetime.combine(datetime.date.fromordinal(_EPOCH_ORDINAL + int(day)), datetime.time(tzinfo=tz))
+    return midnight.utcoffset() // datetime.timedelta(microseconds=1)
+
+
+def _month_slice(timestamps, mstart, mend):
+    first = np.searchsorted(timestamps, timestamp_micros(mstart), side="left")
+    last = np.searchsorted(timestamps, timestamp_micros(mend), side="right")
+    return slice(first, last)
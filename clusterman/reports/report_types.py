@@ -15,6 +15,8 @@ from collections import namedtuple
 
 import numpy as np
 
+from clusterman.reports.data_transforms import grouped_percentiles
+
 ReportProperties = namedtuple(
     "ReportProperties",
     [
@@ -29,8 +31,8 @@ ReportProperties = namedtuple(
 )
 
 
-def DEFAULT_TREND_ROLLUP(data):
-    return np.percentile(data, [25, 50, 75])
+def DEFAULT_TREND_ROLLUP(data, day_starts):
+    return grouped_percentiles(data, day_starts, [25, 50, 75])
 
 
 REPORT_TYPES = {
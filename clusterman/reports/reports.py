@@ -15,11 +15,13 @@ from datetime import timedelta
 from datetime import tzinfo
 
 import arrow
+import numpy as np
 from matplotlib.cm import get_cmap
 from matplotlib.figure import Figure
 from matplotlib.lines import Line2D
 from matplotlib.patches import Patch
 
+from clusterman.math.piecewise_array import PiecewiseConstantArray
 from clusterman.reports.constants import AXIS_DIMENSION_INCHES
 from clusterman.reports.constants import COLORMAP
 from clusterman.reports.constants import ERROR_COLOR
@@ -33,11 +35,12 @@ from clusterman.reports.data_transforms import transform_trend_data
 from clusterman.reports.plots import generate_heatmap_trend_grid
 from clusterman.reports.plots import PlotStruct
 from clusterman.reports.report_types import REPORT_TYPES
+from clusterman.simulator.util import timestamp_micros
 
 
 def _get_error_threshold_function(error_threshold, simulator):
-    """Returns a boolean-valued function that indicates whether a particular (x,y) pair is
-    outside a specified threshold
+    """Returns a function that takes an array of timestamps (in microseconds since the epoch) and an array of values,
+    and returns a boolean array indicating whether each (x,y) pair is outside a specified threshold
 
     :param error_threshold: can be None or a string; if this is a string, the first character MAY be '+' or '-', to
         indicate whether values above or below the threshold (respectively) are considered "bad".  If nothing is
@@ -52,10 +55,10 @@ def _get_error_threshold_function(error_threshold, simulator):
           * 'cost_per_hour' => values above the simulator's cost_per_hour function exceed the threshold
           * '-cpus' => values below the simulator's cpu function exceed the threshold
     :param simulator: a Simulator object
-    :returns: a boolean-valued threshold function
+    :returns: a vectorized threshold function
     """
     if not error_threshold:
-        return lambda x, y: False
+        return lambda x, y: np.zeros(len(y), dtype=bool)
 
     reverse = False
     if error_threshold[0] in ("-", "+"):
@@ -65,7 +68,7 @@ def _get_error_threshold_function(error_threshold, simulator):
         constant = float(error_threshold)
         return lambda x, y: ((y > constant) if not reverse else (y < constant))
     except ValueError:
-        piecewise = getattr(simulator, error_threshold)
+        piecewise = PiecewiseConstantArray.from_piecewise(getattr(simulator, error_threshold), timestamp_micros)
         return lambda x, y: ((y > piecewise.call(x)) if not reverse else (y < piecewise.call(x)))
 
 
@@ -164,14 +167,14 @@ def make_report(name, simulator, start_time, end_time, output_prefix="", tz="US/
     local_start = start_time.to(tz)
     local_end = end_time.to(tz)
 
-    months = arrow.Arrow.span_range("month", local_start, local_end)
+    months = list(arrow.Arrow.span_range("month", local_start, local_end))
     fig = Figure(figsize=(AXIS_DIMENSION_INCHES[0], AXIS_DIMENSION_INCHES[1] * len(months)))
     _make_report_title(fig, report, simulator.metadata, months)
 
     error_threshold_fn = _get_error_threshold_function(report.error_threshold, simulator)
 
     heatmap_data, error_data, *heatmap_range = transform_heatmap_data(report_data, error_threshold_fn, months, tz)
-    trend_data, *trend_range = transform_trend_data(report_data, months, report.trend_rollup)
+    trend_data, *trend_range = transform_trend_data(report_data, months, report.trend_rollup, tz)
 
     heatmap = PlotStruct(
         heatmap_data,
@@ -14,8 +14,9 @@
 import os
 import socket
 import struct
-import time
+from typing import Any
 from typing import Callable
+from typing import Dict
 from typing import List
 from typing import Mapping
 from typing import Tuple
@@ -26,6 +27,7 @@ import colorlog
 import simplejson as json
 import staticconf
 from clusterman_metrics import ClustermanMetricsBotoClient
+from clusterman_metrics import MetricsValuesDict
 from retry import retry
 from simplejson.errors import JSONDecodeError
 from staticconf.errors import ConfigurationError
@@ -36,6 +38,20 @@ from clusterman.exceptions import NoSignalConfiguredException
 from clusterman.exceptions import SignalConnectionError
 from clusterman.interfaces.signal import get_metrics_for_signal
 from clusterman.interfaces.signal import Signal
+from clusterman.signals.signal_protocol import available_encodings
+from clusterman.signals.signal_protocol import ENCODING_JSON
+from clusterman.signals.signal_protocol import MAX_REQUEST_ID
+from clusterman.signals.signal_protocol import MetricsSession
+from clusterman.signals.signal_protocol import protocol_offer
+from clusterman.signals.signal_protocol import ProtocolOptions
+from clusterman.signals.signal_protocol import recv_frame
+from clusterman.signals.signal_protocol import send_frame
+from clusterman.signals.signal_protocol import SIGNAL_PROTOCOL_V1
+from clusterman.signals.signal_protocol import SIGNAL_PROTOCOL_V2
+from clusterman.signals.signal_protocol import SUPPORTED_TIMESERIES_LAYOUTS
+from clusterman.signals.signal_protocol import TIMESERIES_COLUMNAR
+from clusterman.signals.signal_protocol import TIMESERIES_ROWS
+from clusterman.signals.signal_protocol import to_columnar
 from clusterman.util import SignalResourceRequest
 
 logger = colorlog.getLogger(__name__)
@@ -81,9 +97,16 @@ class ExternalSignal(Signal):
             raise NoSignalConfiguredException from e
         super().__init__(signal_name, cluster, pool, scheduler, app, config_namespace)
         self.required_metrics: list = reader.read_list("autoscale_signal.required_metrics", default=[])
+        # Signals built before the v2 protocol existed never answer the protocol offer, so we only make one (and wait
+        # for the answer) if the signal is configured to use v2
+        self.protocol_version = reader.read_int("autoscale_signal.protocol_version", default=SIGNAL_PROTOCOL_V1)
 
         self.metrics_client: ClustermanMetricsBotoClient = metrics_client
         self.signal_namespace = signal_namespace
+        # Until we've heard otherwise from the signal, assume it only understands the original protocol
+        self._protocol = ProtocolOptions()
+        self._request_id = 0
+        self._metrics_session = MetricsSession()
         self._signal_conn: socket.socket = self._connect_to_signal_process()
 
     def evaluate(
@@ -110,42 +133,83 @@ class ExternalSignal(Signal):
         )
 
         try:
-            # First send the length of the metrics data
-            metric_bytes = json.dumps({"metrics": metrics, "timestamp": timestamp.timestamp}).encode()
-            len_metrics = struct.pack(">I", len(metric_bytes))  # bytes representation of the length, packed big-endian
-            self._signal_conn.send(len_metrics)
-            response = self._signal_conn.recv(SOCKET_MESG_SIZE)
-            if response != ACK:
-                raise SignalConnectionError(f"Error occurred sending metric length to signal (response={response!r})")
-
-            # Then send the actual metrics data, broken up into chunks
-            for i in range(0, len(metric_bytes), SOCKET_MESG_SIZE):
-                self._signal_conn.send(metric_bytes[i : i + SOCKET_MESG_SIZE])
-            response = self._signal_conn.recv(SOCKET_MESG_SIZE)
-            ack_bit = response[:1]
-            if ack_bit != ACK:
-                raise SignalConnectionError(f"Error occurred sending metric data to signal (response={response!r})")
-
-            # Sometimes the signal sends the ack and the reponse "too quickly" so when we call
-            # recv above it gets both values.  This should handle that case, or call recv again
-            # if there's no more data in the previous message
-            response = response[1:] or self._signal_conn.recv(SOCKET_MESG_SIZE)
-            logger.info(response)
-
-            return SignalResourceRequest(**json.loads(response)["Resources"])
+            if self._protocol.version == SIGNAL_PROTOCOL_V2:
+                return self._evaluate_v2(metrics, timestamp)
+            return self._evaluate_v1(metrics, timestamp)
 
         except JSONDecodeError as e:
             raise ClustermanSignalError("Signal evaluation failed") from e
         except BrokenPipeError as e:
             if retry_on_broken_pipe:
                 logger.error("Signal connection failed; reloading the signal and trying again")
-                time.sleep(5)  # give supervisord some time to restart the signal
+                self._signal_conn.close()
                 self._signal_conn = self._connect_to_signal_process()
                 return self.evaluate(timestamp, retry_on_broken_pipe=False)
             else:
                 raise ClustermanSignalError("Signal evaluation failed") from e
 
-    @retry(exceptions=ConnectionRefusedError, tries=3, delay=5)  # retry signal connection in case it's slow to start
+    def _evaluate_v1(self, metrics: MetricsValuesDict, timestamp: arrow.Arrow) -> SignalResourceRequest:
+        # First send the length of the metrics data
+        metric_bytes = json.dumps({"metrics": metrics, "timestamp": timestamp.timestamp}).encode()
+        len_metrics = struct.pack(">I", len(metric_bytes))  # bytes representation of the length, packed big-endian
+        self._signal_conn.send(len_metrics)
+        response = self._signal_conn.recv(SOCKET_MESG_SIZE)
+        if response != ACK:
+            raise SignalConnectionError(f"Error occurred sending metric length to signal (response={response!r})")
+
+        # Then send the actual metrics data, broken up into chunks
+        for i in range(0, len(metric_bytes), SOCKET_MESG_SIZE):
+            self._signal_conn.send(metric_bytes[i : i + SOCKET_MESG_SIZE])
+        response = self._signal_conn.recv(SOCKET_MESG_SIZE)
+        ack_bit = response[:1]
+        if ack_bit != ACK:
+            raise SignalConnectionError(f"Error occurred sending metric data to signal (response={response!r})")
+
+        # Sometimes the signal sends the ack and the reponse "too quickly" so when we call
+        # recv above it gets both values.  This should handle that case, or call recv again
+        # if there's no more data in the previous message
+        response = response[1:] or self._signal_conn.recv(SOCKET_MESG_SIZE)
+        logger.info(response)
+
+        return SignalResourceRequest(**json.loads(response)["Resources"])
+
+    def _evaluate_v2(
+        self,
+        metrics: MetricsValuesDict,
+        timestamp: arrow.Arrow,
+        allow_resync: bool = True,
+    ) -> SignalResourceRequest:
+        # No ACKs here: the whole request goes out in one frame, and the response comes back in another
+        self._request_id = self._request_id % MAX_REQUEST_ID + 1
+        request: Dict[str, Any] = {"timestamp": timestamp.timestamp}
+        metrics_to_send: Mapping[str, Any]
+        if self._protocol.delta_metrics:
+            request["session"], metrics_to_send = self._metrics_session.build_request(self._request_id, metrics)
+        else:
+            metrics_to_send = metrics
+        if self._protocol.timeseries_layout == TIMESERIES_COLUMNAR:
+            metrics_to_send = to_columnar(metrics_to_send)
+        request["metrics"] = metrics_to_send
+        send_frame(self._signal_conn, self._request_id, request, self._protocol.encoding)
+
+        # If an earlier evaluation was interrupted, its response may still be sitting in the socket
+        response = recv_frame(self._signal_conn)
+        while response.request_id != self._request_id:
+            logger.warning(f"Discarding signal response for stale request {response.request_id}")
+            response = recv_frame(self._signal_conn)
+        logger.info(response.payload)
+
+        if isinstance(response.payload, dict) and response.payload.get("Resync") and allow_resync:
+            logger.warning("Signal could not apply the metrics update; sending all metrics again")
+            self._metrics_session.reset()
+            return self._evaluate_v2(metrics, timestamp, allow_resync=False)
+        if not isinstance(response.payload, dict) or "Resources" not in response.payload:
+            raise ClustermanSignalError(f"Signal evaluation failed: {response.payload}")
+        self._metrics_session.acknowledge(self._request_id)
+        return SignalResourceRequest(**response.payload["Resources"])
+
+    # retry signal connection in case it's slow to (re)start, backing off exponentially (0.5s, 1s, 2s, ...)
+    @retry(exceptions=ConnectionRefusedError, tries=6, delay=0.5, backoff=2, max_delay=8)
     def _connect_to_signal_process(self) -> socket.socket:
         """Create a connection to the specified signal over a unix socket
 
@@ -153,14 +217,47 @@ class ExternalSignal(Signal):
         """
         # this creates an abstract namespace socket which is auto-cleaned on program exit
         signal_conn = socket.socket(socket.AF_UNIX)
-        signal_conn.connect(f"\0{self.signal_namespace}-{self.name}-{self.app}-socket")
+        signal_conn.connect(f"\0{self.signal_namespace}-{self.name}-{self.app}{_signal_socket_suffix()}-socket")
 
-        signal_kwargs = json.dumps({"parameters": self.parameters})
-        signal_conn.send(signal_kwargs.encode())
-        logger.info(f"Connected to signal {self.name} from {self.signal_namespace}")
+        signal_kwargs: Dict[str, Any] = {"parameters": self.parameters}
+        if self.protocol_version == SIGNAL_PROTOCOL_V2:
+            signal_kwargs["protocol"] = protocol_offer(versions=[SIGNAL_PROTOCOL_V2])
+        signal_conn.send(json.dumps(signal_kwargs).encode())
+        self._protocol = self._negotiate_protocol(signal_conn) if "protocol" in signal_kwargs else ProtocolOptions()
+        self._metrics_session.reset()  # a new connection might be to a new signal process, which has no metrics yet
+        logger.info(
+            f"Connected to signal {self.name} from {self.signal_namespace} (protocol version {self._protocol.version})"
+        )
 
         return signal_conn
 
+    def _negotiate_protocol(self, signal_conn: socket.socket) -> ProtocolOptions:
+        """Wait for the signal to reply to the protocol offer with the options it chose
+
+        :raises SignalConnectionError: if the signal doesn't reply, or chooses options we didn't offer
+        """
+        signal_conn.settimeout(SOCKET_TIMEOUT_SECONDS)
+        try:
+            response = recv_frame(signal_conn)
+        except socket.timeout as e:
+            raise SignalConnectionError("Signal did not reply to the protocol offer") from e
+        finally:
+            signal_conn.settimeout(None)
+
+        protocol = ProtocolOptions(
+            version=response.payload.get("version"),
+            encoding=response.payload.get("encoding", ENCODING_JSON),
+            timeseries_layout=response.payload.get("timeseries_layout", TIMESERIES_ROWS),
+            delta_metrics=bool(response.payload.get("delta_metrics", False)),
+        )
+        if (
+            protocol.version != self.protocol_version
+            or protocol.encoding not in available_encodings()
+            or protocol.timeseries_layout not in SUPPORTED_TIMESERIES_LAYOUTS
+        ):
+            raise SignalConnectionError(f"Signal chose unsupported protocol options {response.payload}")
+        return protocol
+
 
 def setup_signals_environment(pool: str, scheduler: str) -> Tuple[int, int]:
     app_namespace = POOL_NAMESPACE.format(pool=pool, scheduler=scheduler)
@@ -190,6 +287,8 @@ def setup_signals_environment(pool: str, scheduler: str) -> Tuple[int, int]:
         )
         app_names.append(pool)
 
+    # the app name is only used by the signal process to name its socket
+    app_names = [app_name + _signal_socket_suffix() for app_name in app_names]
     versions_to_fetch = set(signal_versions)
     os.environ["CMAN_VERSIONS_TO_FETCH"] = " ".join(versions_to_fetch)
     os.environ["CMAN_SIGNAL_VERSIONS"] = " ".join(signal_versions)
@@ -201,3 +300,8 @@ def setup_signals_environment(pool: str, scheduler: str) -> Tuple[int, int]:
     os.environ["CMAN_SIGNALS_BUCKET"] = staticconf.read_string("aws.signals_bucket", default=DEFAULT_SIGNALS_BUCKET)
 
     return len(versions_to_fetch), len(signal_versions)
+
+
+def _signal_socket_suffix() -> str:
+    # set when several simulations run at once, so that each one talks to its own signal processes
+    return staticconf.read_string("signal_socket_suffix", default="")
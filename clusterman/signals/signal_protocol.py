@@ -0,0 +1,306 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+import struct
+from collections import deque
+from decimal import Decimal
+from typing import Any
+from typing import Deque
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+import simplejson as json
+from simplejson.errors import JSONDecodeError
+
+from clusterman.exceptions import ClustermanSignalError
+from clusterman.exceptions import SignalConnectionError
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+SIGNAL_PROTOCOL_V1 = 1  # length, ACK, chunked JSON data, ACK, JSON response
+SIGNAL_PROTOCOL_V2 = 2  # one framed request and one framed response, matched up by request id
+SUPPORTED_PROTOCOL_VERSIONS = [SIGNAL_PROTOCOL_V2, SIGNAL_PROTOCOL_V1]  # in order of preference
+
+# Every v2 frame starts with a fixed-size header: magic bytes, protocol version, payload encoding, request id, and
+# the length of the payload (all big-endian)
+FRAME_MAGIC = b"CS"
+FRAME_HEADER = struct.Struct(">2sBBII")
+MAX_REQUEST_ID = 2**32 - 1
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+_ENCODING_IDS = {ENCODING_JSON: 0, ENCODING_MSGPACK: 1}
+_ENCODING_NAMES = {encoding_id: name for name, encoding_id in _ENCODING_IDS.items()}
+
+TIMESERIES_ROWS = "rows"  # {metric: [[timestamp, value], ...]}, like the v1 protocol
+TIMESERIES_COLUMNAR = "columnar"  # {metric: {"timestamps": [...], "values": [...]}}
+SUPPORTED_TIMESERIES_LAYOUTS = [TIMESERIES_COLUMNAR, TIMESERIES_ROWS]
+
+
+class Frame(NamedTuple):
+    request_id: int
+    encoding: str
+    payload: Any
+
+
+class ProtocolOptions(NamedTuple):
+    version: int = SIGNAL_PROTOCOL_V1
+    encoding: str = ENCODING_JSON
+    timeseries_layout: str = TIMESERIES_ROWS
+    delta_metrics: bool = False  # only send datapoints the signal hasn't seen yet (see MetricsSession)
+
+
+class ResyncRequired(Exception):
+    """Raised on the signal side when a delta can't be applied to the metrics the signal has"""
+
+    pass
+
+
+def available_encodings() -> List[str]:
+    """:returns: the payload encodings we can use, in order of preference (msgpack is only used if it's installed)"""
+    return [ENCODING_MSGPACK, ENCODING_JSON] if msgpack else [ENCODING_JSON]
+
+
+def protocol_offer(versions: Sequence[int] = SUPPORTED_PROTOCOL_VERSIONS) -> Dict[str, Any]:
+    """:returns: the protocol options the autoscaler supports, to be sent along with the signal parameters"""
+    return {
+        "versions": [version for version in SUPPORTED_PROTOCOL_VERSIONS if version in versions],
+        "encodings": available_encodings(),
+        "timeseries_layouts": SUPPORTED_TIMESERIES_LAYOUTS,
+        "delta_metrics": True,
+    }
+
+
+def choose_protocol(offer: Mapping[str, Sequence]) -> ProtocolOptions:
+    """Pick the most-preferred options out of an offer from the autoscaler (used by the signal side of the socket)
+
+    :param offer: the "protocol" object the autoscaler sent with the signal parameters
+    :returns: the options that the signal will use for the rest of the connection
+    """
+
+    def first_supported(offered: Sequence, supported: Sequence, default: Any) -> Any:
+        return next((option for option in offered if option in supported), default)
+
+    version = first_supported(offer.get("versions", []), SUPPORTED_PROTOCOL_VERSIONS, SIGNAL_PROTOCOL_V1)
+    return ProtocolOptions(
+        version=version,
+        encoding=first_supported(offer.get("encodings", []), available_encodings(), ENCODING_JSON),
+        timeseries_layout=first_supported(
+            offer.get("timeseries_layouts", []), SUPPORTED_TIMESERIES_LAYOUTS, TIMESERIES_ROWS
+        ),
+        delta_metrics=bool(offer.get("delta_metrics")) and version == SIGNAL_PROTOCOL_V2,
+    )
+
+
+def encode_payload(payload: Any, encoding: str) -> bytes:
+    if encoding == ENCODING_MSGPACK:
+        # metric values coming out of DynamoDB are Decimals, which msgpack doesn't know about
+        return msgpack.packb(payload, default=_msgpack_default, use_bin_type=True)
+    return json.dumps(payload).encode()
+
+
+def decode_payload(data: bytes, encoding: str) -> Any:
+    try:
+        if encoding == ENCODING_MSGPACK:
+            return msgpack.unpackb(data, raw=False)
+        return json.loads(data)
+    except (JSONDecodeError, ValueError) as e:
+        raise ClustermanSignalError(f"Could not decode {encoding} payload") from e
+
+
+def send_frame(conn: socket.socket, request_id: int, payload: Any, encoding: str) -> None:
+    data = encode_payload(payload, encoding)
+    header = FRAME_HEADER.pack(FRAME_MAGIC, SIGNAL_PROTOCOL_V2, _ENCODING_IDS[encoding], request_id, len(data))
+    conn.sendall(header + data)
+
+
+def recv_frame(conn: socket.socket) -> Frame:
+    """Read a single frame from the socket
+
+    :raises BrokenPipeError: if the other end closed the connection
+    :raises SignalConnectionError: if the data on the socket isn't a valid frame
+    """
+    magic, version, encoding_id, request_id, length = FRAME_HEADER.unpack(_recv_exactly(conn, FRAME_HEADER.size))
+    if magic != FRAME_MAGIC or version != SIGNAL_PROTOCOL_V2:
+        raise SignalConnectionError(f"Received an invalid frame header (magic={magic!r}, version={version})")
+    if encoding_id not in _ENCODING_NAMES:
+        raise SignalConnectionError(f"Received a frame with unknown encoding {encoding_id}")
+
+    encoding = _ENCODING_NAMES[encoding_id]
+    return Frame(request_id, encoding, decode_payload(_recv_exactly(conn, length), encoding))
+
+
+def to_columnar(metrics: Mapping[str, Sequence[Tuple[Any, Any]]]) -> Dict[str, Dict[str, List]]:
+    columnar: Dict[str, Dict[str, List]] = {}
+    for metric_name, timeseries in metrics.items():
+        timestamps, values = (list(column) for column in zip(*timeseries)) if timeseries else ([], [])
+        columnar[metric_name] = {"timestamps": timestamps, "values": values}
+    return columnar
+
+
+def from_columnar(metrics: Mapping[str, Mapping[str, Sequence]]) -> Dict[str, List[Tuple[Any, Any]]]:
+    return {
+        metric_name: list(zip(columns["timestamps"], columns["values"])) for metric_name, columns in metrics.items()
+    }
+
+
+class MetricsSession:
+    """Tracks which datapoints the signal already has, so that each request only needs to carry the new ones
+
+    Each request carries a "session" object along with the metrics:
+
+        {
+            "base_request_id": the request whose metrics this request builds on (None for a full resync),
+            "window_start": {metric: timestamp of the oldest datapoint in the window, or None if it's empty},
+            "replace": [metrics whose whole window is included, instead of just the new datapoints],
+        }
+
+    The signal applies a request on top of the metrics from the base request, and then drops anything older than
+    window_start (see MetricsWindow).  Metrics are only considered acknowledged once the signal has responded to the
+    request; if the datapoints we already sent no longer match the current window (for example, because of backfilled
+    data) the metric is re-sent in full.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget what the signal has seen, e.g. after reconnecting; the next request will be a full resync"""
+        self._acked_request_id: Optional[int] = None
+        self._acked_metrics: Mapping[str, Sequence[Tuple[Any, Any]]] = {}
+        self._pending: Optional[Tuple[int, Mapping[str, Sequence[Tuple[Any, Any]]]]] = None
+
+    def build_request(
+        self,
+        request_id: int,
+        metrics: Mapping[str, Sequence[Tuple[Any, Any]]],
+    ) -> Tuple[Dict[str, Any], Dict[str, Sequence[Tuple[Any, Any]]]]:
+        """:returns: a tuple of (session object, metrics to send) for the request with the given id"""
+        to_send: Dict[str, Sequence[Tuple[Any, Any]]] = {}
+        replace = []
+        for metric_name, timeseries in metrics.items():
+            delta = self._get_delta(metric_name, timeseries)
+            if delta is None:
+                to_send[metric_name] = timeseries
+                replace.append(metric_name)
+            elif delta:
+                to_send[metric_name] = delta
+
+        self._pending = (request_id, metrics)
+        session = {
+            "base_request_id": self._acked_request_id,
+            "window_start": {
+                metric_name: (timeseries[0][0] if timeseries else None) for metric_name, timeseries in metrics.items()
+            },
+            "replace": replace,
+        }
+        return session, to_send
+
+    def acknowledge(self, request_id: int) -> None:
+        if self._pending and self._pending[0] == request_id:
+            self._acked_request_id, self._acked_metrics = self._pending
+        self._pending = None
+
+    def _get_delta(
+        self,
+        metric_name: str,
+        timeseries: Sequence[Tuple[Any, Any]],
+    ) -> Optional[Sequence[Tuple[Any, Any]]]:
+        """:returns: the datapoints the signal hasn't seen, or None if the whole timeseries needs to be sent"""
+        if self._acked_request_id is None or metric_name not in self._acked_metrics:
+            return None
+
+        acked = self._acked_metrics[metric_name]
+        if not acked:
+            return timeseries
+
+        # Everything up to the watermark should be exactly what the signal has (minus whatever fell out of the window).
+        # The two scans below only walk over the datapoints that were added or dropped, but the overlap is compared in
+        # full, so that a datapoint which was rewritten in the metrics store still forces a full resend; that's one
+        # list comparison per metric per tick, which is much cheaper than serializing the whole window, but it isn't
+        # free
+        watermark = acked[-1][0]
+        split = len(timeseries)
+        while split > 0 and timeseries[split - 1][0] > watermark:
+            split -= 1
+
+        window_start = timeseries[0][0] if timeseries else None
+        first_kept = 0
+        while first_kept < len(acked) and (window_start is None or acked[first_kept][0] < window_start):
+            first_kept += 1
+
+        if len(acked) - first_kept != split or acked[first_kept:] != timeseries[:split]:
+            return None
+        return timeseries[split:]
+
+
+class MetricsWindow:
+    """The signal side of a MetricsSession: keeps a buffer of the datapoints in each metric's window
+
+    :raises ResyncRequired: (from apply) if the request doesn't build on the last request applied to this window
+    """
+
+    def __init__(self) -> None:
+        self.request_id: Optional[int] = None
+        self.buffers: Dict[str, Deque] = {}
+
+    def apply(
+        self,
+        request_id: int,
+        session: Mapping[str, Any],
+        metrics: Mapping[str, Sequence[Tuple[Any, Any]]],
+    ) -> Dict[str, List[Tuple[Any, Any]]]:
+        """:returns: the full window for each metric after applying the request"""
+        base_request_id = session["base_request_id"]
+        if base_request_id is not None and base_request_id != self.request_id:
+            raise ResyncRequired(f"Request {request_id} builds on {base_request_id}, but we have {self.request_id}")
+
+        replace = set(session["replace"])
+        buffers = {}
+        for metric_name, window_start in session["window_start"].items():
+            if metric_name in replace or base_request_id is None:
+                buffer: Deque = deque()
+            else:
+                buffer = self.buffers.get(metric_name, deque())
+            buffer.extend(metrics.get(metric_name, []))
+            while buffer and (window_start is None or buffer[0][0] < window_start):
+                buffer.popleft()
+            buffers[metric_name] = buffer
+
+        self.request_id, self.buffers = request_id, buffers
+        return {metric_name: list(buffer) for metric_name, buffer in buffers.items()}
+
+
+def _recv_exactly(conn: socket.socket, num_bytes: int) -> bytes:
+    data = bytearray()
+    while len(data) < num_bytes:
+        chunk = conn.recv(num_bytes - len(data))
+        if not chunk:
+            raise BrokenPipeError("Signal connection closed")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Cannot serialize {type(value)} with msgpack")
@@ -12,19 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import gzip
+import math
+import os
+from collections.abc import MutableMapping
 
 import arrow
 import jsonpickle
+import numpy as np
 import simplejson as json
 from sortedcontainers import SortedDict
 
+from clusterman.math.piecewise_array import PiecewiseConstantArray
+from clusterman.simulator.util import from_timestamp_micros
+from clusterman.simulator.util import SimulationMetadata
+from clusterman.simulator.util import timestamp_micros
 
-def _python_encode(obj):
-    return json.loads(jsonpickle.encode(obj))
-
-
-def _python_decode(obj):
-    return jsonpickle.decode(json.dumps(obj))
+COLUMNAR_FORMAT_VERSION = 1
+SIMULATION_TIMESERIES = ("cost_per_hour", "aws_cpus", "mesos_cpus", "mesos_cpus_allocated")
+_ZIP_MAGIC = b"PK\x03\x04"  # npz files are zip archives; the old format is gzipped JSON
 
 
 class ArrowSerializer(jsonpickle.handlers.BaseHandler):
@@ -33,16 +38,22 @@ class ArrowSerializer(jsonpickle.handlers.BaseHandler):
         return data
 
     def restore(self, data):
+        if getattr(self.context, "raw_timestamps", False):
+            return data["timestamp"]
         return arrow.get(data["timestamp"])
 
 
 class SortedDictSerializer(jsonpickle.handlers.BaseHandler):
     def flatten(self, obj, data):
-        data["items"] = [(_python_encode(k), _python_encode(v)) for k, v in obj.items()]
+        data["items"] = [
+            (self.context.flatten(k, reset=False), self.context.flatten(v, reset=False)) for k, v in obj.items()
+        ]
         return data
 
     def restore(self, data):
-        return SortedDict((_python_decode(k), _python_decode(v)) for k, v in data["items"])
+        return SortedDict(
+            (self.context.restore(k, reset=False), self.context.restore(v, reset=False)) for k, v in data["items"]
+        )
 
 
 def _register_handlers():
@@ -52,16 +63,15 @@ def _register_handlers():
 
 
 def read_object_from_compressed_json(filename, raw_timestamps=False):
-    """Read a Python object from a gzipped JSON file"""
+    """Read a Python object from a gzipped JSON file
+
+    :param raw_timestamps: if True, leave timestamps as integers instead of converting them to arrow objects
+    """
     _register_handlers()
+    unpickler = jsonpickle.unpickler.Unpickler()
+    unpickler.raw_timestamps = raw_timestamps  # checked by ArrowSerializer
     with gzip.open(filename) as f:
-        if raw_timestamps:
-            old_arrow = arrow.get
-            arrow.get = int
-        data = jsonpickle.decode(f.read().decode())
-        if raw_timestamps:
-            arrow.get = old_arrow
-        return data
+        return jsonpickle.decode(f.read().decode(), context=unpickler)
 
 
 def write_object_to_compressed_json(obj, filename):
@@ -73,3 +83,223 @@ def write_object_to_compressed_json(obj, filename):
     _register_handlers()
     with gzip.open(filename, "w") as f:
         f.write(jsonpickle.encode(obj).encode())
+
+
+class _NpzReader:
+    """Opens an npz file the first time an array is read from it, and keeps it open for the arrays that come after
+
+    Forked processes (like the simulate-sweep workers) open the file again, since reading through the parent's handle
+    would move the file offset that they share with it.
+    """
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._npz = None
+        self._pid = None
+
+    def __getitem__(self, name):
+        if self._npz is None or self._pid != os.getpid():
+            self._npz = np.load(self._filename)
+            self._pid = os.getpid()
+        return self._npz[name]
+
+
+class ColumnarTimeseries(MutableMapping):
+    """The timeseries for one metric type in a columnar metrics file, keyed by metric key
+
+    Each timeseries is only read from the file (and converted to a list of (timestamp, value) tuples) the first time
+    it's accessed.
+    """
+
+    def __init__(self, npz, index):
+        """
+        :param npz: the columnar metrics file, shared by the ColumnarTimeseries for each metric type in it
+        :param index: metric key -> (position of its arrays in the file, column names for dict-valued timeseries)
+        """
+        self._npz = npz
+        self._index = index
+        self._timeseries = {}
+
+    def __getitem__(self, key):
+        if key not in self._timeseries:
+            position, columns, has_nones = self._index[key]
+            self._timeseries[key] = _decode_timeseries(
+                self._npz[f"timestamps_{position}"],
+                self._npz[f"values_{position}"],
+                columns,
+                self._npz[f"nones_{position}"] if has_nones else None,
+            )
+        return self._timeseries[key]
+
+    def __setitem__(self, key, timeseries):
+        self._timeseries[key] = timeseries
+
+    def __delitem__(self, key):
+        if key not in self._index and key not in self._timeseries:
+            raise KeyError(key)
+        self._index.pop(key, None)
+        self._timeseries.pop(key, None)
+
+    def __iter__(self):
+        return iter({**dict.fromkeys(self._index), **dict.fromkeys(self._timeseries)})
+
+    def __len__(self):
+        return len({**dict.fromkeys(self._index), **dict.fromkeys(self._timeseries)})
+
+
+def read_metrics_file(filename):
+    """Read the metrics data for a simulation, from either a columnar metrics file or an older compressed JSON file
+
+    :returns: a dictionary of metric_type -> (metric_key -> [(timestamp, value), ...]), with integer timestamps; the
+        timeseries in a columnar file are read lazily (see ColumnarTimeseries)
+    """
+    header = _read_columnar_header(filename, "metrics")
+    if header is None:
+        return read_object_from_compressed_json(filename, raw_timestamps=True)
+
+    npz = _NpzReader(filename)
+    positions_with_nones = set(header.get("nones", []))
+    indices = {}
+    for position, (metric_type, key, columns) in enumerate(header["timeseries"]):
+        indices.setdefault(metric_type, {})[key] = (position, columns, position in positions_with_nones)
+    return {metric_type: ColumnarTimeseries(npz, index) for metric_type, index in indices.items()}
+
+
+def write_metrics_file(metrics, filename):
+    """Write metrics data for a simulation to a columnar (compressed npz) file
+
+    Each timeseries is stored as an int64 array of timestamps and a float64 array of values; if the values are dicts
+    (e.g., one value per market), the array has one column per dict key, with NaN wherever a key is missing.  Values
+    that are None are stored as NaN too, along with a boolean array marking where they are, so that they're read back
+    as None.
+
+    :param metrics: a dictionary of metric_type -> (metric_key -> [(timestamp, value), ...]); the timestamps can be
+        arrow objects or integers
+    :param filename: the file to write to
+    """
+    timeseries_header, positions_with_nones, arrays = [], [], {}
+    for metric_type, timeseries_by_key in metrics.items():
+        for key, timeseries in timeseries_by_key.items():
+            position = len(timeseries_header)
+            timestamps, values, columns, nones = _encode_timeseries(key, timeseries)
+            timeseries_header.append((metric_type, key, columns))
+            arrays[f"timestamps_{position}"], arrays[f"values_{position}"] = timestamps, values
+            if nones.any():
+                positions_with_nones.append(position)
+                arrays[f"nones_{position}"] = nones
+
+    _write_columnar_file(filename, "metrics", {"timeseries": timeseries_header, "nones": positions_with_nones}, arrays)
+
+
+def read_simulation_file(filename):
+    """Read the results of a simulation, from either a columnar simulation file or an older compressed JSON file
+
+    :returns: a Simulator object with the timeseries needed for reports and comparisons (see SIMULATION_TIMESERIES)
+    """
+    header = _read_columnar_header(filename, "simulation")
+    if header is None:
+        return read_object_from_compressed_json(filename)
+
+    from clusterman.simulator.simulator import Simulator  # the simulator imports most of clusterman, so wait until now
+
+    start_time = from_timestamp_micros(header["start_time"])
+    end_time = from_timestamp_micros(header["end_time"])
+    simulator = Simulator(SimulationMetadata(**header["metadata"]), start_time, end_time)
+    simulator.current_time = end_time
+    with np.load(filename) as npz:
+        for name, initial_value in header["initial_values"].items():
+            array_fn = PiecewiseConstantArray(npz[f"{name}_xvals"], npz[f"{name}_yvals"], initial_value)
+            setattr(simulator, name, array_fn.to_piecewise(from_timestamp_micros))
+    return simulator
+
+
+def write_simulation_file(simulator, filename):
+    """Write the results of a simulation to a columnar (compressed npz) file
+
+    Only the timeseries needed for reports and comparisons are saved (see SIMULATION_TIMESERIES), as parallel arrays of
+    breakpoint times (in microseconds) and values.
+    """
+    initial_values, arrays = {}, {}
+    for name in SIMULATION_TIMESERIES:
+        array_fn = PiecewiseConstantArray.from_piecewise(getattr(simulator, name), timestamp_micros)
+        initial_values[name] = array_fn.initial_value
+        arrays[f"{name}_xvals"], arrays[f"{name}_yvals"] = array_fn.xvals, array_fn.yvals
+
+    metadata = simulator.metadata
+    header = {
+        "metadata": {
+            "name": metadata.name,
+            "cluster": metadata.cluster,
+            "pool": metadata.pool,
+            "scheduler": metadata.scheduler,
+        },
+        "start_time": timestamp_micros(simulator.start_time),
+        "end_time": timestamp_micros(simulator.end_time),
+        "initial_values": initial_values,
+    }
+    _write_columnar_file(filename, "simulation", header, arrays)
+
+
+def _read_columnar_header(filename, kind):
+    """:returns: the header of a columnar file, or None if the file is in the older compressed JSON format"""
+    with open(filename, "rb") as f:
+        if f.read(len(_ZIP_MAGIC)) != _ZIP_MAGIC:
+            return None
+
+    with np.load(filename) as npz:
+        header = json.loads(str(npz["header"]))
+    if header["kind"] != kind:
+        raise ValueError(f"{filename} is a {header['kind']} file, not a {kind} file")
+    elif header["version"] > COLUMNAR_FORMAT_VERSION:
+        raise ValueError(f"{filename} was written by a newer version of clusterman (format {header['version']})")
+    return header
+
+
+def _write_columnar_file(filename, kind, header, arrays):
+    header = {"kind": kind, "version": COLUMNAR_FORMAT_VERSION, **header}
+    # np.savez_compressed adds a .npz extension to filenames that don't have one, so give it the file object instead
+    with open(filename, "wb") as f:
+        np.savez_compressed(f, header=np.array(json.dumps(header)), **arrays)
+
+
+def _encode_timeseries(key, timeseries):
+    timeseries = sorted(timeseries, key=lambda point: _raw_timestamp(point[0]))
+    timestamps = np.array([_raw_timestamp(timestamp) for timestamp, __ in timeseries], dtype=np.int64)
+    is_dict = [isinstance(value, dict) for __, value in timeseries]
+    if not any(is_dict):
+        values = np.array([value for __, value in timeseries], dtype=np.float64)  # None becomes NaN
+        nones = np.array([value is None for __, value in timeseries], dtype=bool)
+        return timestamps, values, None, nones
+    elif not all(is_dict):
+        raise ValueError(f"Timeseries {key} has a mix of dict and scalar values")
+
+    columns = sorted({column for __, value in timeseries for column in value})
+    column_positions = {column: i for i, column in enumerate(columns)}
+    values = np.full((len(timeseries), len(columns)), np.nan)
+    nones = np.zeros((len(timeseries), len(columns)), dtype=bool)
+    for row, (__, value) in enumerate(timeseries):
+        for column, column_value in value.items():
+            if column_value is None:
+                nones[row, column_positions[column]] = True
+            else:
+                values[row, column_positions[column]] = column_value
+    return timestamps, values, columns, nones
+
+
+def _decode_timeseries(timestamps, values, columns, nones=None):
+    # None values were stored as NaN, like missing dict keys, so they're put back before the NaNs are dropped
+    values = values.tolist() if nones is None else np.where(nones, None, values.astype(object)).tolist()
+    if columns is None:
+        return list(zip(timestamps.tolist(), values))
+    return [
+        (timestamp, {column: value for column, value in zip(columns, row) if value is None or not math.isnan(value)})
+        for timestamp, row in zip(timestamps.tolist(), values)
+    ]
+
+
+def _raw_timestamp(timestamp):
+    if isinstance(timestamp, arrow.Arrow):
+        return timestamp.timestamp
+    elif isinstance(timestamp, str):
+        return arrow.get(timestamp).timestamp
+    return int(timestamp)
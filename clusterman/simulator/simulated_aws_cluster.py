@@ -17,6 +17,12 @@ from ipaddress import ip_address
 
 from clusterman.aws.markets import get_market_resources
 
+_RESOURCE_NAMES = ("cpus", "mem", "disk")
+# Resource values that are whole multiples of 1 / _EXACT_RESOURCE_SCALE (like 15.25 GiB of memory) add up exactly in
+# floating point, in any order, as long as the total stays below _MAX_EXACT_RESOURCE_TOTAL
+_EXACT_RESOURCE_SCALE = 4
+_MAX_EXACT_RESOURCE_TOTAL = 2**50
+
 
 class Instance:
     id = itertools.count()
@@ -43,8 +49,16 @@ class SimulatedAWSCluster:
     def __init__(self, simulator):
         self.simulator = simulator
         self.instances = {}
-        self.instance_ids_by_market = defaultdict(list)
+        # The IDs of the instances in each market, in launch order; the values are unused, so that these work like
+        # ordered sets (and instances can be removed in constant time)
+        self.instance_ids_by_market = defaultdict(dict)
         self.ebs_storage = 0
+        # Running totals of the instance resources (in units of 1 / _EXACT_RESOURCE_SCALE), along with the number of
+        # instances that have each resource and the number of those whose value can't be added up exactly
+        self._scaled_resource_totals = dict.fromkeys(_RESOURCE_NAMES, 0)
+        self._resource_counts = dict.fromkeys(_RESOURCE_NAMES, 0)
+        self._inexact_resource_counts = dict.fromkeys(_RESOURCE_NAMES, 0)
+        self._resource_sums = {}  # cached sums over the instances, for when the running totals aren't exact
 
     def __len__(self):
         return len(self.instances)
@@ -65,20 +79,24 @@ class SimulatedAWSCluster:
 
             if delta > 0:
                 instances = [Instance(market, self.simulator.current_time) for i in range(delta)]
-                self.instance_ids_by_market[market].extend([instance.id for instance in instances])
+                self.instance_ids_by_market[market].update(dict.fromkeys(instance.id for instance in instances))
                 added_instances.extend(instances)
 
             if delta < 0:
                 to_del = abs(delta)
-                for id in self.instance_ids_by_market[market][:to_del]:
+                market_instance_ids = self.instance_ids_by_market[market]
+                for id in list(itertools.islice(market_instance_ids, to_del)):
                     self.instances[id].end_time = self.simulator.current_time
                     removed_instances.append(self.instances[id])
+                    self._update_resource_totals(self.instances[id], -1)
                     del self.instances[id]
-                del self.instance_ids_by_market[market][:to_del]
-                if not self.instance_ids_by_market[market]:
+                    del market_instance_ids[id]
+                if not market_instance_ids:
                     del self.instance_ids_by_market[market]
 
         self.instances.update({instance.id: instance for instance in added_instances})
+        for instance in added_instances:
+            self._update_resource_totals(instance, 1)
         return added_instances, removed_instances
 
     def terminate_instances_by_id(self, ids, batch_size=-1):
@@ -90,23 +108,57 @@ class SimulatedAWSCluster:
         for terminate_id in ids:
             instance = self.instances[terminate_id]
             market = instance.market
+            self._update_resource_totals(instance, -1)
             del self.instances[terminate_id]
-            self.instance_ids_by_market[market].remove(terminate_id)
+            del self.instance_ids_by_market[market][terminate_id]
 
     def market_size(self, market):
         return len(self.instance_ids_by_market[market])
 
     @property
     def cpus(self):
-        return sum(instance.resources.cpus for instance in self.instances.values())
+        return self._resource_total("cpus")
 
     @property
     def mem(self):
-        return sum(instance.resources.mem for instance in self.instances.values())
+        return self._resource_total("mem")
 
     @property
     def disk(self):
         # Not all instance types have storage and require a mounted EBS volume
-        return self.ebs_storage + sum(
-            instance.resources.disk for instance in self.instances.values() if instance.resources.disk is not None
-        )
+        return self.ebs_storage + self._resource_total("disk")
+
+    def _update_resource_totals(self, instance, sign):
+        self._resource_sums.clear()
+        for resource_name in _RESOURCE_NAMES:
+            value = getattr(instance.resources, resource_name)
+            if value is None:
+                continue
+
+            self._resource_counts[resource_name] += sign
+            scaled_value = value * _EXACT_RESOURCE_SCALE
+            if float(scaled_value).is_integer():
+                self._scaled_resource_totals[resource_name] += sign * int(scaled_value)
+            else:
+                self._inexact_resource_counts[resource_name] += sign
+
+    def _resource_total(self, resource_name):
+        """Add up a resource over all of the instances
+
+        The result is the same as summing the instance values in order: when every value is exact the running total
+        is returned, otherwise the instances are summed (once per change to the instances).
+        """
+        if not self._resource_counts[resource_name]:
+            return 0
+
+        scaled_total = self._scaled_resource_totals[resource_name]
+        if not self._inexact_resource_counts[resource_name] and scaled_total < _MAX_EXACT_RESOURCE_TOTAL:
+            return scaled_total / _EXACT_RESOURCE_SCALE
+
+        if resource_name not in self._resource_sums:
+            self._resource_sums[resource_name] = sum(
+                getattr(instance.resources, resource_name)
+                for instance in self.instances.values()
+                if getattr(instance.resources, resource_name) is not None
+            )
+        return self._resource_sums[resource_name]
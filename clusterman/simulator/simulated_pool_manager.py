@@ -21,7 +21,6 @@ import staticconf
 from clusterman.autoscaler.pool_manager import MAX_MIN_NODE_SCALEIN_UPTIME_SECONDS
 from clusterman.autoscaler.pool_manager import PoolManager
 from clusterman.config import POOL_NAMESPACE
-from clusterman.interfaces.types import ClusterNodeMetadata
 from clusterman.interfaces.types import InstanceMetadata
 from clusterman.monitoring_lib import get_monitoring_client
 from clusterman.simulator import simulator
@@ -68,18 +67,14 @@ class SimulatedPoolManager(PoolManager):
     def reload_state(self, **cluster_connector_kwargs) -> None:
         pass
 
-    def get_node_metadatas(
-        self,
-        aws_state_filter: Optional[Collection[str]] = None,
-    ) -> Sequence[ClusterNodeMetadata]:
-        agent_metadatas = []
+    def _get_instance_metadatas(self, state_filter: Optional[Collection[str]] = None) -> Sequence[InstanceMetadata]:
+        instance_metadatas = []
         for group in self.resource_groups.values():
             for instance in cast(SimulatedAWSCluster, group).instances.values():
-                if aws_state_filter and "running" not in aws_state_filter:
+                if state_filter and "running" not in state_filter:
                     continue
 
-                metadata = ClusterNodeMetadata(
-                    self.cluster_connector.get_agent_metadata(instance.ip_address),
+                instance_metadatas.append(
                     InstanceMetadata(
                         group_id=group.id,
                         hostname=f"{instance.id}.com",
@@ -90,11 +85,10 @@ class SimulatedPoolManager(PoolManager):
                         state="running",
                         uptime=(self.simulator.current_time - instance.start_time),
                         weight=group.market_weight(instance.market),
-                    ),
+                    )
                 )
-                agent_metadatas.append(metadata)
 
-        return agent_metadatas
+        return instance_metadatas
 
     @property
     def non_orphan_fulfilled_capacity(self):
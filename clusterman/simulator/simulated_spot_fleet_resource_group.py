@@ -179,11 +179,12 @@ class SimulatedSpotFleetResourceGroup(SimulatedAWSCluster, AWSResourceGroup):
         :returns: a list of (market, residual) tuples, sorted first by lowest capacity and next by lowest spot price
         """
         target_capacity_per_market = target_capacity / len(markets) if len(markets) != 0 else 0
+        market_capacities = self.market_capacities
 
         # Some helper closures for computing residuals and sorting;
         @lru_cache()  # memoize the results
         def residual(market):
-            return target_capacity_per_market - self.market_capacities.get(market, 0)
+            return target_capacity_per_market - market_capacities.get(market, 0)
 
         def residual_sort_key(value_tuple):
             market, residual = value_tuple
@@ -221,11 +222,7 @@ class SimulatedSpotFleetResourceGroup(SimulatedAWSCluster, AWSResourceGroup):
 
     @property
     def market_capacities(self):
-        return {
-            market: len(instance_ids) * self.market_weight(market)
-            for market, instance_ids in self.instance_ids_by_market.items()
-            if market.az
-        }
+        return dict(self._iter_market_capacities())
 
     @property
     def _target_capacity(self):
@@ -238,7 +235,12 @@ class SimulatedSpotFleetResourceGroup(SimulatedAWSCluster, AWSResourceGroup):
         Note that the actual capacity may be greater than the target capacity if instance weights do not evenly divide
         the given target capacity
         """
-        return sum(self.market_capacities.values())
+        return sum(capacity for __, capacity in self._iter_market_capacities())
+
+    def _iter_market_capacities(self):
+        for market, instance_ids in self.instance_ids_by_market.items():
+            if market.az:
+                yield market, len(instance_ids) * self.market_weight(market)
 
     @property
     def status(self):
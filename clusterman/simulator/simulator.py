@@ -11,6 +11,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import itertools
 import operator
 import os
 import random
@@ -19,17 +20,20 @@ from collections import defaultdict
 from datetime import timedelta
 from heapq import heappop
 from heapq import heappush
+from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Mapping
 from typing import Optional
 from typing import Set
+from typing import Tuple
 
 import colorlog
 import staticconf
 import yaml
 from arrow import Arrow
 from clusterman_metrics import METADATA
-from sortedcontainers import SortedDict  # noqa
+from sortedcontainers import SortedDict
 
 from clusterman.autoscaler.autoscaler import Autoscaler
 from clusterman.aws.client import ec2
@@ -37,19 +41,29 @@ from clusterman.aws.markets import get_instance_market
 from clusterman.aws.markets import InstanceMarket
 from clusterman.math.piecewise import hour_transform
 from clusterman.math.piecewise import piecewise_breakpoint_generator
-from clusterman.math.piecewise import piecewise_max
 from clusterman.math.piecewise import PiecewiseConstantFunction
+from clusterman.math.piecewise_array import piecewise_array_max
+from clusterman.math.piecewise_array import PiecewiseConstantArray
 from clusterman.signals.external_signal import setup_signals_environment
 from clusterman.simulator.event import Event
+from clusterman.simulator.event import EVENT_PRIORITIES
+from clusterman.simulator.io import SIMULATION_TIMESERIES
 from clusterman.simulator.simulated_aws_cluster import SimulatedAWSCluster
 from clusterman.simulator.simulated_pool_manager import SimulatedPoolManager
 from clusterman.simulator.util import patch_join_delay
 from clusterman.simulator.util import SimulationMetadata
+from clusterman.simulator.util import timestamp_micros
 from clusterman.util import get_cluster_dimensions
 
 
 logger = colorlog.getLogger(__name__)
 SimFn = PiecewiseConstantFunction[Arrow]
+SIGNAL_DIR = os.path.join(os.path.expanduser("~"), ".cache", "clusterman")
+MICROSECONDS_PER_HOUR = 3600 * 10**6
+
+# (time in microseconds since the epoch, priority, sequence number, event, source the event was read from (if any));
+# the sequence number breaks ties between simultaneous events, so the events themselves are never compared
+QueuedEvent = Tuple[int, int, int, Event, Optional[Iterator[Event]]]
 
 
 class Simulator:
@@ -62,6 +76,7 @@ class Simulator:
         metrics_client=None,
         billing_frequency=timedelta(seconds=1),
         refund_outbid=True,
+        fetch_signals=True,
     ) -> None:
         """Maintains all of the state for a clusterman simulation
 
@@ -71,6 +86,7 @@ class Simulator:
         :param autoscaler_config_file: a filename specifying a list of existing SFRs or SFR configs
         :param billing_frequency: a timedelta object indicating how often to charge for an instance
         :param refund_outbid: if True, do not incur any cost for an instance lost to an outbid event
+        :param fetch_signals: if False, the signal code is assumed to already be downloaded (see fetch_signals)
         """
         self.autoscaler: Optional[Autoscaler] = None
         self.metadata = metadata
@@ -90,9 +106,10 @@ class Simulator:
 
         self.billing_frequency = billing_frequency
         self.refund_outbid = refund_outbid
+        self._signal_processes: List[subprocess.Popen] = []
 
         if autoscaler_config_file:
-            self._make_autoscaler(autoscaler_config_file)
+            self._make_autoscaler(autoscaler_config_file, fetch_signals)
             self.aws_clusters = self.autoscaler.pool_manager.resource_groups.values()  # type: ignore
             period = self.autoscaler.signal.period_minutes  # type: ignore
             print(f"Autoscaler configured; will run every {period} minutes")
@@ -100,26 +117,30 @@ class Simulator:
             self.aws_clusters = [SimulatedAWSCluster(self)]
             print("No autoscaler configured; using metrics for cluster size")
 
-        # The event queue holds all of the simulation events, ordered by time
-        self.event_queue: List[Event] = []
+        # The event queue holds all of the simulation events, ordered by time and then priority; events from an event
+        # source are read one at a time, so that the queue only holds the next event from each source
+        self.event_queue: List[QueuedEvent] = []
+        self._event_sequence = itertools.count()
 
         # Don't use add_event here or the end_time event will get discarded
-        heappush(self.event_queue, Event(self.start_time, msg="Simulation begins"))
-        heappush(self.event_queue, Event(self.end_time, msg="Simulation ends"))
+        self._push_event(Event(self.start_time, msg="Simulation begins"))
+        self._push_event(Event(self.end_time, msg="Simulation ends"))
 
     def add_event(self, evt):
         """Add a new event to the queue; events outside the simulation time bounds will be ignored
 
         :param evt: an Event object or subclass
         """
-        if evt.time >= self.end_time:
-            logger.info(f"Adding event after simulation end time ({evt.time}); event ignored")
-            return
-        elif evt.time < self.current_time:
-            logger.info(f"Adding event before self.current_time ({evt.time}); event ignored")
-            return
+        if self._check_event_time(evt):
+            self._push_event(evt)
 
-        heappush(self.event_queue, evt)
+    def add_event_source(self, events: Iterable[Event]) -> None:
+        """Add a stream of events to the queue; the events are read one at a time as the simulation reaches them, so
+        the source can be a generator that only creates each event when it is needed
+
+        :param events: Event objects, sorted by time; events outside the simulation time bounds will be ignored
+        """
+        self._push_next_event(iter(events))
 
     def run(self):
         """Run the simulation until the end, processing each event in the queue one-at-a-time in priority order"""
@@ -127,8 +148,10 @@ class Simulator:
 
         with self.metadata:
             while self.event_queue:
-                evt = heappop(self.event_queue)
+                __, __, __, evt, source = heappop(self.event_queue)
                 self.current_time = evt.time
+                if source:
+                    self._push_next_event(source, evt.time)
                 logger.event(evt)
                 evt.handle(self)
 
@@ -166,6 +189,14 @@ class Simulator:
             instance.join_time = None
         self._compute_instance_cost(instance)
 
+    def stop_signals(self) -> None:
+        """Stop the signal processes started for the autoscaler"""
+        for process in self._signal_processes:
+            process.terminate()
+        for process in self._signal_processes:
+            process.wait()
+        self._signal_processes = []
+
     @property
     def total_cost(self):
         return self.get_data("cost").values()[0]
@@ -193,25 +224,113 @@ class Simulator:
             return self.mesos_cpus_allocated.values(start_time, end_time, step)
         elif key == "unused_cpus":
             # If an agent hasn't joined the cluster yet, we'll treat it as "unused" in the simulation
-            unused_cpus = self.aws_cpus - self.mesos_cpus_allocated
-            return unused_cpus.values(start_time, end_time, step)
+            unused_cpus = self._as_array(self.aws_cpus) - self._as_array(self.mesos_cpus_allocated)
+            return self._array_values(unused_cpus, start_time, end_time, step)
         elif key == "cost":
             return self.cost_per_hour.integrals(start_time, end_time, step, transform=hour_transform)
         elif key == "unused_cpus_cost":
             # Here we treat CPUs that haven't joined the Mesos cluster as un-allocated.  It's arguable
             # if that's the right way to do this or not.
-            percent_unallocated = (self.aws_cpus - self.mesos_cpus_allocated) / self.aws_cpus
-            percent_cost = percent_unallocated * self.cost_per_hour
-            return percent_cost.integrals(start_time, end_time, step, transform=hour_transform)
+            aws_cpus = self._as_array(self.aws_cpus)
+            percent_unallocated = (aws_cpus - self._as_array(self.mesos_cpus_allocated)) / aws_cpus
+            percent_cost = percent_unallocated * self._as_array(self.cost_per_hour)
+            return self._array_integrals(percent_cost, start_time, end_time, step)
         elif key == "cost_per_cpu":
-            cost_per_cpu = self.cost_per_hour / self.aws_cpus
-            return cost_per_cpu.values(start_time, end_time, step)
+            cost_per_cpu = self._as_array(self.cost_per_hour) / self._as_array(self.aws_cpus)
+            return self._array_values(cost_per_cpu, start_time, end_time, step)
         elif key == "oversubscribed":
-            max_fn = piecewise_max(self.mesos_cpus_allocated - self.aws_cpus, PiecewiseConstantFunction())
-            return max_fn.values(start_time, end_time, step)
+            oversubscribed = self._as_array(self.mesos_cpus_allocated) - self._as_array(self.aws_cpus)
+            max_fn = piecewise_array_max(oversubscribed, PiecewiseConstantArray([], []))
+            return self._array_values(max_fn, start_time, end_time, step)
         else:
             raise ValueError(f"Data key {key} is not recognized")
 
+    def get_cpu_hours(self, key: str) -> float:
+        """Integrate one of the CPU timeseries over the whole simulation
+
+        :param key: one of "cpus", "cpus_allocated", "unused_cpus", or "oversubscribed" (see get_data)
+        :returns: the total, in CPU-hours
+        """
+        if key == "cpus":
+            cpus = self._as_array(self.mesos_cpus)
+        elif key == "cpus_allocated":
+            cpus = self._as_array(self.mesos_cpus_allocated)
+        elif key == "unused_cpus":
+            cpus = self._as_array(self.aws_cpus) - self._as_array(self.mesos_cpus_allocated)
+        elif key == "oversubscribed":
+            oversubscribed = self._as_array(self.mesos_cpus_allocated) - self._as_array(self.aws_cpus)
+            cpus = piecewise_array_max(oversubscribed, PiecewiseConstantArray([], []))
+        else:
+            raise ValueError(f"Data key {key} is not recognized")
+        return cpus.integral(
+            timestamp_micros(self.start_time),
+            timestamp_micros(self.end_time),
+            transform=lambda widths: widths / MICROSECONDS_PER_HOUR,
+        )
+
+    def _check_event_time(self, evt: Event) -> bool:
+        if evt.time >= self.end_time:
+            logger.info(f"Adding event after simulation end time ({evt.time}); event ignored")
+            return False
+        elif evt.time < self.current_time:
+            logger.info(f"Adding event before self.current_time ({evt.time}); event ignored")
+            return False
+        return True
+
+    def _push_event(self, evt: Event, source: Optional[Iterator[Event]] = None) -> None:
+        timestamp = timestamp_micros(evt.time)
+        heappush(self.event_queue, (timestamp, EVENT_PRIORITIES[type(evt)], next(self._event_sequence), evt, source))
+
+    def _push_next_event(self, source: Iterator[Event], previous_time: Optional[Arrow] = None) -> None:
+        for evt in source:
+            # only the next event from each source is in the queue, so the source has to be sorted
+            if previous_time and evt.time < previous_time:
+                raise ValueError(f"Event source is not sorted by time ({evt.time} is before {previous_time})")
+            if self._check_event_time(evt):
+                self._push_event(evt, source)
+                return
+            elif evt.time >= self.end_time:
+                return  # the rest of the events are after the end of the simulation too, so stop reading the source
+            previous_time = evt.time
+
+    def _as_array(self, fn: SimFn) -> PiecewiseConstantArray:
+        # Combining the simulation curves is much faster in array form than breakpoint-by-breakpoint
+        return PiecewiseConstantArray.from_piecewise(fn, timestamp_micros)
+
+    def _array_values(
+        self,
+        array_fn: PiecewiseConstantArray,
+        start_time: Arrow,
+        end_time: Arrow,
+        step: Optional[timedelta],
+    ) -> "SortedDict[Arrow, float]":
+        # Evaluate the grid on the arrays directly; only the grid points (not the breakpoints) are turned back into
+        # arrow objects, and they're keyed the same way PiecewiseConstantFunction.values keys them
+        step = step or (end_time - start_time)
+        _, values = array_fn.values(
+            timestamp_micros(start_time),
+            timestamp_micros(end_time),
+            step // timedelta(microseconds=1),
+        )
+        return SortedDict(zip((start_time + step * i for i in range(len(values))), values.tolist()))
+
+    def _array_integrals(
+        self,
+        array_fn: PiecewiseConstantArray,
+        start_time: Arrow,
+        end_time: Arrow,
+        step: Optional[timedelta],
+    ) -> "SortedDict[Arrow, float]":
+        # Like _array_values, but for PiecewiseConstantFunction.integrals(..., transform=hour_transform)
+        step = step or (end_time - start_time)
+        _, integrals = array_fn.integrals(
+            timestamp_micros(start_time),
+            timestamp_micros(end_time),
+            step // timedelta(microseconds=1),
+            transform=lambda widths: widths / MICROSECONDS_PER_HOUR,
+        )
+        return SortedDict(zip((start_time + step * i for i in range(len(integrals))), integrals.tolist()))
+
     def _compute_instance_cost(self, instance):
         """Adjust the cost-per-hour function to account for the specified instance
 
@@ -261,19 +380,13 @@ class Simulator:
             curr_timestamp += self.billing_frequency
         self.cost_per_hour.add_delta(curr_timestamp, -last_billed_price)
 
-    def _make_autoscaler(self, autoscaler_config_file: str) -> None:
-        fetch_count, signal_count = setup_signals_environment(self.metadata.pool, self.metadata.scheduler)
-        signal_dir = os.path.join(os.path.expanduser("~"), ".cache", "clusterman")
-
-        endpoint_url = staticconf.read_string("aws.endpoint_url", "").format(svc="s3")
-        env = os.environ.copy()
-        if endpoint_url:
-            env["AWS_ENDPOINT_URL_ARGS"] = f"--endpoint-url {endpoint_url}"
-
-        for i in range(fetch_count):
-            subprocess.run(["fetch_clusterman_signal", str(i), signal_dir], check=True, env=env)
+    def _make_autoscaler(self, autoscaler_config_file: str, fetch: bool = True) -> None:
+        if fetch:
+            fetch_signals(self.metadata.pool, self.metadata.scheduler)
+        __, signal_count = setup_signals_environment(self.metadata.pool, self.metadata.scheduler)
+        env = _signals_env()
         for i in range(signal_count):
-            subprocess.Popen(["run_clusterman_signal", str(i), signal_dir], env=env)
+            self._signal_processes.append(subprocess.Popen(["run_clusterman_signal", str(i), SIGNAL_DIR], env=env))
 
         with open(autoscaler_config_file) as f:
             autoscaler_config = yaml.safe_load(f)
@@ -326,18 +439,31 @@ class Simulator:
         return _make_comparison_sim(self, other, operator.truediv, opcode)
 
     def __getstate__(self):
-        serialized_keys = ["metadata", "start_time", "current_time", "end_time"] + [
-            "instance_prices",
-            "cost_per_hour",
-            "cpus",
-            "cpus_allocated",
-        ]
+        serialized_keys = ["metadata", "start_time", "current_time", "end_time", "instance_prices"] + list(
+            SIMULATION_TIMESERIES
+        )
         states = {}
         for key in serialized_keys:
             states[key] = self.__dict__[key]
         return states
 
 
+def fetch_signals(pool: str, scheduler: str) -> None:
+    """Download the signal code used by the pool's autoscaler to SIGNAL_DIR"""
+    fetch_count, __ = setup_signals_environment(pool, scheduler)
+    env = _signals_env()
+    for i in range(fetch_count):
+        subprocess.run(["fetch_clusterman_signal", str(i), SIGNAL_DIR], check=True, env=env)
+
+
+def _signals_env() -> Mapping[str, str]:
+    endpoint_url = staticconf.read_string("aws.endpoint_url", "").format(svc="s3")
+    env = os.environ.copy()
+    if endpoint_url:
+        env["AWS_ENDPOINT_URL_ARGS"] = f"--endpoint-url {endpoint_url}"
+    return env
+
+
 def _make_comparison_sim(sim1, sim2, op, opcode):
     metadata = SimulationMetadata(
         f"[{sim1.metadata.name}] {opcode} [{sim2.metadata.name}]",
@@ -357,6 +483,6 @@ def _make_comparison_sim(sim1, sim2, op, opcode):
         logger.warn(f"{sim2.metadata.name}: [{sim2.start_time}, {sim2.end_time}]")
 
     comp_sim = Simulator(metadata, sim1.start_time, sim1.end_time)
-    comp_sim.cost_per_hour = op(sim1.cost_per_hour, sim2.cost_per_hour)
-    comp_sim.cpus = op(sim1.cpus, sim2.cpus)
+    for name in SIMULATION_TIMESERIES:
+        setattr(comp_sim, name, op(getattr(sim1, name), getattr(sim2, name)))
     return comp_sim
@@ -0,0 +1,109 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import itertools
+from typing import Any
+from typing import List
+from typing import Mapping
+from typing import NamedTuple
+from typing import Sequence
+
+from clusterman.simulator.simulator import Simulator
+
+
+class SweepVariant(NamedTuple):
+    name: str
+    overrides: Mapping[str, Any]  # pool config key (e.g. "autoscaling.setpoint") -> value
+
+
+class SweepResult(NamedTuple):
+    name: str
+    overrides: Mapping[str, Any]
+    cost: float
+    unused_cpu_hours: float
+    oversubscribed_cpu_hours: float
+    elapsed_seconds: float
+
+
+def get_sweep_variants(sweep_config: Mapping[str, Any]) -> List[SweepVariant]:
+    """Expand a parameter sweep into the list of simulations to run
+
+    The sweep config can have a list of named variants, and/or a grid of values to try for some config keys; every
+    variant (or just the pool's own config, if there are none) is run with every combination of values in the grid:
+
+        variants:
+          - name: conservative
+            overrides: {autoscaling.setpoint: 0.6, scaling_limits.max_weight_to_add: 50}
+        grid:
+          autoscaling.target_capacity_margin: [0.05, 0.1]
+
+    :param sweep_config: the parsed sweep config
+    :returns: the variants to simulate, in a stable order
+    """
+    base_variants = [
+        SweepVariant(variant.get("name", f"variant{i}"), variant.get("overrides", {}))
+        for i, variant in enumerate(sweep_config.get("variants", []))
+    ] or [SweepVariant("baseline", {})]
+
+    grid = sweep_config.get("grid", {})
+    for key, values in grid.items():
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"Grid values for {key} must be a non-empty list (got {values})")
+
+    # with no named variants, the grid values alone are enough to tell the simulations apart
+    use_base_names = bool(sweep_config.get("variants")) or not grid
+    variants = []
+    for base in base_variants:
+        for grid_values in itertools.product(*grid.values()):
+            grid_overrides = dict(zip(grid.keys(), grid_values))
+            name_parts = ([base.name] if use_base_names else []) + [f"{k}={v}" for k, v in grid_overrides.items()]
+            variants.append(SweepVariant(" ".join(name_parts), {**base.overrides, **grid_overrides}))
+
+    names = [variant.name for variant in variants]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Sweep variant names must be unique: {names}")
+    return variants
+
+
+def summarize_simulation(variant: SweepVariant, simulator: Simulator, elapsed_seconds: float) -> SweepResult:
+    return SweepResult(
+        name=variant.name,
+        overrides=variant.overrides,
+        cost=simulator.total_cost,
+        unused_cpu_hours=simulator.get_cpu_hours("unused_cpus"),
+        oversubscribed_cpu_hours=simulator.get_cpu_hours("oversubscribed"),
+        elapsed_seconds=elapsed_seconds,
+    )
+
+
+def format_sweep_results(results: Sequence[SweepResult]) -> str:
+    """:returns: a table with one row per variant, sorted by cost"""
+    headers = ["variant", "cost", "unused cpu-hours", "oversubscribed cpu-hours", "elapsed"]
+    rows = [
+        [
+            result.name,
+            f"${result.cost:,.2f}",
+            f"{result.unused_cpu_hours:,.1f}",
+            f"{result.oversubscribed_cpu_hours:,.1f}",
+            f"{result.elapsed_seconds:.1f}s",
+        ]
+        for result in sorted(results, key=lambda result: result.cost)
+    ]
+    widths = [max(len(row[i]) for row in [headers] + rows) for i in range(len(headers))]
+
+    def format_row(row: Sequence[str]) -> str:
+        # the variant names are left-aligned, and the numbers are right-aligned
+        return "  ".join([row[0].ljust(widths[0])] + [cell.rjust(width) for cell, width in zip(row[1:], widths[1:])])
+
+    separator = "  ".join("-" * width for width in widths)
+    return "\n".join([format_row(headers), separator] + [format_row(row) for row in rows])
@@ -11,10 +11,17 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from datetime import timedelta
+
 import arrow
+from arrow import Arrow
 from staticconf.testing import PatchConfiguration
 
 
+_EPOCH = arrow.get(0)
+_MICROSECOND = timedelta(microseconds=1)
+
+
 def patch_join_delay(mean=0, stdev=0):
     return PatchConfiguration(
         {
@@ -24,6 +31,16 @@ def patch_join_delay(mean=0, stdev=0):
     )
 
 
+def timestamp_micros(time: Arrow) -> int:
+    """Convert an arrow object to an integer number of microseconds since the epoch (without losing precision)"""
+    return (time - _EPOCH) // _MICROSECOND
+
+
+def from_timestamp_micros(micros: int) -> Arrow:
+    """Convert an integer number of microseconds since the epoch back to an arrow object"""
+    return _EPOCH.shift(microseconds=micros)
+
+
 class SimulationMetadata:  # pragma: no cover
     def __init__(self, name, cluster, pool, scheduler):
         self.name = name
@@ -0,0 +1,51 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import argparse
+import os
+
+from clusterman.simulator.io import read_metrics_file
+from clusterman.simulator.io import write_metrics_file
+
+
+def main(args):
+    """Convert a simulator metrics file from the old compressed JSON format to the columnar format."""
+    metrics = read_metrics_file(args.src_file)
+    num_timeseries = sum(len(timeseries_by_key) for timeseries_by_key in metrics.values())
+    write_metrics_file(metrics, args.dest_file)
+
+    src_size, dest_size = os.path.getsize(args.src_file), os.path.getsize(args.dest_file)
+    print(f"Wrote {num_timeseries} timeseries to {args.dest_file} ({src_size} bytes -> {dest_size} bytes)")
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    required_named_args = parser.add_argument_group("required arguments")
+    required_named_args.add_argument(
+        "--src-file",
+        metavar="filename",
+        required=True,
+        help="metrics file to convert (in either format)",
+    )
+    required_named_args.add_argument(
+        "--dest-file",
+        metavar="filename",
+        required=True,
+        help="file to write the converted metrics to",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    main(args)
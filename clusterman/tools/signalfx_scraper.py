@@ -19,7 +19,7 @@ from clusterman_metrics.util.constants import METRIC_TYPES
 from clusterman.args import add_start_end_args
 from clusterman.common.sfx import Aggregation
 from clusterman.common.sfx import basic_sfx_query
-from clusterman.simulator.io import write_object_to_compressed_json
+from clusterman.simulator.io import write_metrics_file
 from clusterman.util import ask_for_choice
 from clusterman.util import parse_time_string
 
@@ -81,7 +81,7 @@ def main(args):
             **kwargs,
         )
 
-    write_object_to_compressed_json(dict(values), args.dest_file)
+    write_metrics_file(values, args.dest_file)
 
 
 def get_parser():
@@ -101,7 +101,7 @@ def get_parser():
         metavar="filename",
         required=True,
         help=(
-            "Filename to append the data to, in compressed JSON format. If the destination metric name "
+            "Filename to append the data to, in the simulator's metrics file format. If the destination metric name "
             "already exists, you have the option to overwrite it."
         ),
     )
@@ -11,25 +11,33 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import itertools
 import logging
 import random
 import re
+import threading
 import time
-from bisect import bisect
+from bisect import bisect_left
+from bisect import bisect_right
 from collections import defaultdict
+from collections import OrderedDict
+from concurrent.futures import Future  # noqa (only used in type-checking)
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 from contextlib import contextmanager
 from datetime import timedelta
 from decimal import Decimal  # noqa (only used in type-checking)
+from typing import Any
 from typing import DefaultDict
 from typing import Dict
 from typing import List
-from typing import MutableMapping
 from typing import Optional
 from typing import Set
 from typing import Tuple
 
 import boto3  # noqa (only used in type-checking)
 import staticconf
+from boto3.dynamodb.conditions import Attr
 from boto3.dynamodb.conditions import Key
 from clusterman_metrics.util.aws import get_metrics_session
 from clusterman_metrics.util.constants import APP_METRICS
@@ -50,20 +58,312 @@ GSI_SORT = "app_timestamp"
 RESERVED_KEYS = frozenset(["key", "timestamp", "expiration_timestamp", GSI_PK, GSI_SORT])
 _APP_KEY_PREFIX = "{app_identifier},"
 _GSI_PARTITIONS = 10
+_GSI_QUERY_WORKERS = 10
 _CACHE_DELAY = 300  # Don't store anything in the cache newer than 5 minutes
+_CACHE_MAX_DATAPOINTS = 2000000  # about a week of minutely data for 200 keys
+_KEY_CACHE_TTL = 3600  # Rescan the whole range for regex queries at least this often, in case we've missed something
+_BATCH_WRITE_SIZE = 25  # The most items DynamoDB accepts in one BatchWriteItem request
+_WRITER_WORKERS = 4
+_MAX_WRITE_ATTEMPTS = 8
+_WRITE_BACKOFF_SECONDS = 0.05
+_WRITE_BACKOFF_MAX_SECONDS = 5
+_REGEX_METACHARACTERS = frozenset(".^$*+?{}[]\\|()")
 MetricsValuesDict = DefaultDict[str, List[Tuple[int, float]]]
 
 
-class CacheEntry:  # pragma: no cover
-    def __init__(self, time_start: int = 0, data: Optional[MetricsValuesDict] = None):
-        self.time_start: int = time_start
-        self.data: MetricsValuesDict = data or defaultdict(list)
+class TimeseriesCacheEntry:
+    """Locally-cached data for a single metrics query, stored column-wise for each key that the query matched
 
-    def __eq__(self, other):
-        return (self.time_start == other.time_start) and (self.data == other.data)
+    The entry covers a contiguous range of timestamps, [covered_start, covered_end]: every datapoint in the datastore
+    in that range is in the entry, so a request that overlaps the range only has to fetch the part before
+    covered_start and/or the part after covered_end.
+    """
+
+    def __init__(self) -> None:
+        self._clear()
 
     def __repr__(self):
-        return "<{start}, {data}>".format(start=self.time_start, data=self.data)
+        return "<[{start}, {end}], {n} datapoints>".format(
+            start=self.covered_start,
+            end=self.covered_end,
+            n=self.num_datapoints,
+        )
+
+    def missing_ranges(self, time_start: int, time_end: int) -> List[Tuple[int, int]]:
+        """:returns: the (inclusive) ranges between time_start and time_end that aren't covered, in order"""
+        if self.covered_start is None or self.covered_end is None:
+            return [(time_start, time_end)]
+        elif time_end < self.covered_start or time_start > self.covered_end:
+            return [(time_start, time_end)]
+
+        ranges = []
+        if time_start < self.covered_start:
+            ranges.append((time_start, self.covered_start - 1))
+        if time_end > self.covered_end:
+            ranges.append((self.covered_end + 1, time_end))
+        return ranges
+
+    def get(self, time_start: int, time_end: int) -> MetricsValuesDict:
+        """:returns: the cached datapoints between time_start and time_end (inclusive) for each key"""
+        data: MetricsValuesDict = defaultdict(list)
+        for metric_key, timestamps in self.timestamps.items():
+            first, last = bisect_left(timestamps, time_start), bisect_right(timestamps, time_end)
+            data[metric_key] = list(zip(timestamps[first:last], self.values[metric_key][first:last]))
+        return data
+
+    def store(self, range_start: int, range_end: int, data: MetricsValuesDict) -> None:
+        """Add everything we got from the datastore between range_start and range_end (inclusive) to the entry
+
+        If the range doesn't overlap or touch the current coverage, we can't know what's in between, so we throw out
+        the existing data and start over from this range.
+        """
+        if range_start > range_end:
+            return
+        elif (
+            self.covered_start is None
+            or self.covered_end is None
+            or range_end < self.covered_start - 1
+            or range_start > self.covered_end + 1
+        ):
+            self._clear()
+            self.covered_start, self.covered_end = range_start, range_end
+            covered_start, covered_end = range_end + 1, range_end  # i.e., keep everything we were given
+        else:
+            covered_start, covered_end = self.covered_start, self.covered_end
+            self.covered_start, self.covered_end = min(covered_start, range_start), max(covered_end, range_end)
+
+        for metric_key, timeseries in data.items():
+            timestamps = self.timestamps.setdefault(metric_key, [])
+            values = self.values.setdefault(metric_key, [])
+            new_timestamps = [ts for ts, __ in timeseries if range_start <= ts <= range_end]
+            new_values = [value for ts, value in timeseries if range_start <= ts <= range_end]
+
+            # Only keep the parts that are outside of what we already had; the cached data stays sorted because
+            # everything we add goes on one end or the other
+            before = bisect_left(new_timestamps, covered_start)
+            after = bisect_right(new_timestamps, covered_end)
+            timestamps[:0], values[:0] = new_timestamps[:before], new_values[:before]
+            timestamps.extend(new_timestamps[after:])
+            values.extend(new_values[after:])
+            self.num_datapoints += before + len(new_timestamps) - after
+
+    def prune(self, time_start: int) -> None:
+        """Drop everything before time_start, on the assumption that queries for the same data move forward in time"""
+        if self.covered_start is None or self.covered_end is None or time_start <= self.covered_start:
+            return
+        elif time_start > self.covered_end:
+            self._clear()
+            return
+
+        self.covered_start = time_start
+        for metric_key in list(self.timestamps):
+            num_to_prune = bisect_left(self.timestamps[metric_key], time_start)
+            del self.timestamps[metric_key][:num_to_prune]
+            del self.values[metric_key][:num_to_prune]
+            self.num_datapoints -= num_to_prune
+            if not self.timestamps[metric_key]:
+                del self.timestamps[metric_key], self.values[metric_key]
+
+    def _clear(self) -> None:
+        self.covered_start: Optional[int] = None
+        self.covered_end: Optional[int] = None
+        self.timestamps: Dict[str, List[int]] = {}
+        self.values: Dict[str, List[Any]] = {}
+        self.num_datapoints = 0
+
+
+class KeyCacheEntry:
+    def __init__(self, created: float) -> None:
+        self.created = created
+        # the range of GSI sort-key timestamps we've scanned; all keys with a datapoint in this range are in self.keys
+        self.covered_start: Optional[int] = None
+        self.covered_end: Optional[int] = None
+        self.keys: Dict[str, int] = {}  # key -> timestamp of the latest datapoint we've seen for it
+
+
+class UnprocessedItemsError(Exception):
+    """Raised when DynamoDB still hasn't accepted some items after all of our retries"""
+
+    pass
+
+
+class WriterStats:
+    def __init__(self) -> None:
+        self.start_time = time.monotonic()
+        self.items_received = 0
+        self.items_deduplicated = 0  # items replaced by a later write to the same key and timestamp before being sent
+        self.items_written = 0
+        self.batches_written = 0
+        self.retries = 0  # requests re-sent because DynamoDB returned UnprocessedItems
+        self.flushes = 0
+        self.flush_seconds = 0.0  # time spent waiting for in-flight batches while flushing
+
+    @property
+    def items_per_second(self) -> float:
+        elapsed = time.monotonic() - self.start_time
+        return self.items_written / elapsed if elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return (
+            "Wrote {written} of {received} items in {batches} batches ({dedup} deduplicated, {retries} retries); "
+            "{flushes} flushes took {flush_seconds:.2f}s, {rate:.1f} items/s".format(
+                written=self.items_written,
+                received=self.items_received,
+                batches=self.batches_written,
+                dedup=self.items_deduplicated,
+                retries=self.retries,
+                flushes=self.flushes,
+                flush_seconds=self.flush_seconds,
+                rate=self.items_per_second,
+            )
+        )
+
+
+class MetricsBatchWriter:
+    """Groups items for any number of tables into BatchWriteItem requests, which are sent from a small thread pool
+
+    Items for the same key and timestamp are de-duplicated (the last one wins) until they're sent, since DynamoDB
+    rejects batches with duplicate keys; a batch is never sent while an earlier batch with any of the same keys is
+    still in flight, so writes to the same item land in the order they were made.
+    """
+
+    def __init__(self, ddb: "boto3.resources.base.ServiceResource", max_workers: int = _WRITER_WORKERS) -> None:
+        self.ddb = ddb
+        self.stats = WriterStats()
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str, int], Dict[str, Any]] = {}  # (table, key, timestamp) -> item, in order
+        self._in_flight: List[Tuple["Future[None]", Set[Tuple[str, str, int]]]] = []
+        self._max_in_flight = 2 * max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def put_item(self, table_name: str, item: Dict[str, Any]) -> None:
+        item_id = (table_name, item["key"], item["timestamp"])
+        with self._lock:
+            if item_id in self._pending:
+                self._update_stats(items_deduplicated=1)
+            self._pending[item_id] = item
+            self._update_stats(items_received=1)
+            if len(self._pending) >= _BATCH_WRITE_SIZE:
+                self._submit_batch()
+
+    def flush(self) -> None:
+        """Send everything that's pending and wait for it to be written
+
+        :raises UnprocessedItemsError: if some items couldn't be written (or any error from BatchWriteItem)
+        """
+        flush_start = time.monotonic()
+        with self._lock:
+            while self._pending:
+                self._submit_batch()
+            in_flight, self._in_flight = self._in_flight, []
+
+        try:
+            # let every batch finish before raising the first error, so that none of them are left running untracked
+            wait([future for future, __ in in_flight])
+            for future, __ in in_flight:
+                future.result()
+        finally:
+            self._update_stats(flushes=1, flush_seconds=time.monotonic() - flush_start)
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown()
+
+    def _submit_batch(self) -> None:
+        """Send the oldest pending items; must be called with the lock held
+
+        :raises UnprocessedItemsError: (or any error from BatchWriteItem) if an earlier batch failed; each failed batch
+            is only reported once, and the pending items are sent on the next call
+        """
+        item_ids = list(itertools.islice(self._pending, _BATCH_WRITE_SIZE))
+        batch_ids = set(item_ids)
+
+        finished: List["Future[None]"] = []
+        still_in_flight: List[Tuple["Future[None]", Set[Tuple[str, str, int]]]] = []
+        for future, in_flight_ids in self._in_flight:
+            if in_flight_ids & batch_ids:
+                wait([future])  # earlier writes to the same items have to land first
+            if future.done():
+                finished.append(future)
+            else:
+                still_in_flight.append((future, in_flight_ids))
+
+        # Don't let an unbounded number of batches pile up if we're getting items faster than we can write them
+        while len(still_in_flight) >= self._max_in_flight:
+            future, __ = still_in_flight.pop(0)
+            wait([future])
+            finished.append(future)
+
+        # Forget about the finished batches before raising any of their errors (now, instead of waiting for the flush),
+        # or every later call would raise the same error again
+        self._in_flight = still_in_flight
+        for future in finished:
+            future.result()
+
+        batch = [(item_id[0], self._pending.pop(item_id)) for item_id in item_ids]
+        self._in_flight.append((self._executor.submit(self._write_batch, batch), batch_ids))
+
+    def _write_batch(self, batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+        request_items: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for table_name, item in batch:
+            request_items[table_name].append({"PutRequest": {"Item": item}})
+
+        for attempt in range(_MAX_WRITE_ATTEMPTS):
+            # the low-level client is thread-safe, unlike the service resource
+            response = self.ddb.meta.client.batch_write_item(RequestItems=request_items)
+            request_items = response.get("UnprocessedItems") or {}
+            if not request_items:
+                self._update_stats(items_written=len(batch), batches_written=1)
+                return
+
+            num_unprocessed = sum(len(requests) for requests in request_items.values())
+            if attempt == _MAX_WRITE_ATTEMPTS - 1:
+                self._update_stats(items_written=len(batch) - num_unprocessed, batches_written=1)
+                raise UnprocessedItemsError(
+                    f"{num_unprocessed} items were still unprocessed after {_MAX_WRITE_ATTEMPTS} attempts"
+                )
+
+            # "Full jitter" exponential backoff, so that all the writer threads don't retry at the same time
+            self._update_stats(retries=1)
+            time.sleep(random.uniform(0, min(_WRITE_BACKOFF_MAX_SECONDS, _WRITE_BACKOFF_SECONDS * 2**attempt)))
+
+    def _update_stats(self, **increments: float) -> None:
+        with self._stats_lock:
+            for name, increment in increments.items():
+                setattr(self.stats, name, getattr(self.stats, name) + increment)
+
+
+class MetricsWriter:
+    """The object returned by ClustermanMetricsBotoClient.get_writer; it turns datapoints into items for one table"""
+
+    def __init__(
+        self,
+        client: "ClustermanMetricsBotoClient",
+        batch_writer: MetricsBatchWriter,
+        metric_type: str,
+        key_prefix: str,
+        table_name: str,
+    ) -> None:
+        self.client = client
+        self.batch_writer = batch_writer
+        self.metric_type = metric_type
+        self.key_prefix = key_prefix
+        self.table_name = table_name
+
+    @property
+    def stats(self) -> WriterStats:
+        return self.batch_writer.stats
+
+    def send(self, datapoint: Tuple[str, int, Any]) -> None:
+        metric_name, timestamp, value = datapoint
+        item = self.client._make_item(self.metric_type, self.key_prefix, metric_name, timestamp, value)
+        self.batch_writer.put_item(self.table_name, item)
+
+    def flush(self) -> None:
+        self.batch_writer.flush()
 
 
 class ClustermanMetricsBotoClient(object):
@@ -71,11 +371,15 @@ class ClustermanMetricsBotoClient(object):
     Client for interacting with Clusterman metrics directly through the AWS boto API.
     """
 
+    # reads go through the low-level DynamoDB client and the caches are locked, so one client can be shared by threads
+    thread_safe = True
+
     def __init__(
         self,
         region_name: str,
         app_identifier: Optional[str] = None,
         ttl_days: Optional[int] = None,
+        cache_max_datapoints: int = _CACHE_MAX_DATAPOINTS,
     ) -> None:
         """
         :param region_name: name of AWS region to use instead of the default.
@@ -83,6 +387,8 @@ class ClustermanMetricsBotoClient(object):
             Required from client applications to avoid name collisions.
         :param ttl_days: number of days after which data written by this client should expire.
             Use -1 if data should never expire, and leave as None to use the default value.
+        :param cache_max_datapoints: the most datapoints to keep in the local metrics cache; the least-recently-used
+            queries are evicted from the cache when it gets bigger than this
         """
         self.region_name = region_name
         ttl_days = ttl_days or staticconf.read_int("dynamodb.ttl_days", namespace=CONFIG_NAMESPACE)
@@ -98,16 +404,24 @@ class ClustermanMetricsBotoClient(object):
         else:
             self.ttl_seconds = int(timedelta(days=ttl_days).total_seconds())
 
-        self._cache: MutableMapping[str, CacheEntry] = defaultdict(CacheEntry)
+        self.cache_max_datapoints = cache_max_datapoints
+        self._cache: OrderedDict[str, TimeseriesCacheEntry] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._key_cache: Dict[Tuple[str, str], KeyCacheEntry] = {}
+        self._key_cache_lock = threading.Lock()
+        self._batch_writer: Optional[MetricsBatchWriter] = None
+        self._num_open_writers = 0
+        self._writer_lock = threading.Lock()
 
     @contextmanager
-    def get_writer(self, metric_type: str):
-        """Returns a co-routine for writing metrics data.
+    def get_writer(self, metric_type: str, aggregate_meteorite_dims: bool = False):
+        """Returns a writer for metrics data.
 
         :param metric_type: string, must be one of :ref:`Metric Types`
+        :param aggregate_meteorite_dims: only used by clients that also send metrics to meteorite; ignored here
         :raises: ``ValueError`` if the metric type is not one of :ref:`Metric Types`
 
-        To write data timeseries data with the co-routine, call ``send`` with tuples of the form ``(metric_name,
+        To write data timeseries data with the writer, call ``send`` with tuples of the form ``(metric_name,
         timestamp, value)``, where
 
           - ``metric_name`` is a string representing the timeseries name
@@ -120,68 +434,83 @@ class ClustermanMetricsBotoClient(object):
             with get_writer(...) as writer:
                 writer.send(('metric_a', 1501872445, 3))
 
+        Items are written in batches in the background; all writers that are open at the same time (for any metric
+        type) share batches, and everything is flushed when the last of them is closed.  ``writer.stats`` has
+        counters for how much has been written.
         """
         key_prefix = self._get_key_prefix(metric_type)
         table_name = self._get_table_name(metric_type)
-        table = self.ddb.Table(table_name)
-
-        def write_batch(self):
-            with table.batch_writer() as batch:
-                while True:
-                    (metric_name, timestamp, value) = yield
-
-                    metric_key = key_prefix + metric_name
-                    timestamp = int(timestamp)
-                    # these keys should be included in RESERVED_KEYS
-                    item = {
-                        "key": metric_key,
-                        "timestamp": timestamp,
-                    }
-
-                    # We only support regex metric requirements for application metrics, so
-                    # don't pollute the other tables with useless keys
-                    if metric_type == APP_METRICS:
-                        item.update(
-                            {
-                                GSI_PK: random.randrange(_GSI_PARTITIONS),
-                                GSI_SORT: key_prefix + str(timestamp),
-                            }
-                        )
-                    if self.ttl_seconds is not None:
-                        item["expiration_timestamp"] = timestamp + self.ttl_seconds
-
-                    # Only numeric values (int, float, Decimal, or numeric string) are valid,
-                    # or a dict of numeric values for metadata.
-                    # Convert to Decimal because DynamoDB only accepts Decimal instead of floats,
-                    # and meteorite doesn't like numeric strings.
-                    #
-                    # TODO (CLUSTERMAN-115) split out the dictionary writer to a separate function
-                    if metric_type == METADATA and isinstance(value, dict):
-                        for val_key, val_num in value.items():
-                            if val_key not in RESERVED_KEYS:
-                                item[val_key] = convert_decimal(val_num)
-                            else:
-                                logger.warning(
-                                    'Column "{name}" is reserved; skipping "{name}" with value '
-                                    '"{val}" in metric "{key}" at time {ts}'.format(
-                                        name=val_key,
-                                        val=val_num,
-                                        key=metric_key,
-                                        ts=timestamp,
-                                    )
-                                )
-                    else:
-                        value = convert_decimal(value)
-                        item["value"] = value
-
-                    batch.put_item(Item=item)
-
-        coroutine = write_batch(self)
+
+        with self._writer_lock:
+            if self._batch_writer is None:
+                self._batch_writer = MetricsBatchWriter(self.ddb)
+            batch_writer = self._batch_writer
+            self._num_open_writers += 1
+
         try:
-            next(coroutine)
-            yield coroutine
+            yield MetricsWriter(self, batch_writer, metric_type, key_prefix, table_name)
         finally:
-            coroutine.close()
+            with self._writer_lock:
+                self._num_open_writers -= 1
+                is_last_writer = self._num_open_writers == 0
+                if is_last_writer:
+                    self._batch_writer = None
+            if is_last_writer:
+                batch_writer.close()
+                logger.info(str(batch_writer.stats))
+
+    def _make_item(
+        self,
+        metric_type: str,
+        key_prefix: str,
+        metric_name: str,
+        timestamp: int,
+        value: Any,
+    ) -> Dict[str, Any]:
+        metric_key = key_prefix + metric_name
+        timestamp = int(timestamp)
+        # these keys should be included in RESERVED_KEYS
+        item = {
+            "key": metric_key,
+            "timestamp": timestamp,
+        }
+
+        # We only support regex metric requirements for application metrics, so
+        # don't pollute the other tables with useless keys
+        if metric_type == APP_METRICS:
+            item.update(
+                {
+                    GSI_PK: random.randrange(_GSI_PARTITIONS),
+                    GSI_SORT: key_prefix + str(timestamp),
+                }
+            )
+        if self.ttl_seconds is not None:
+            item["expiration_timestamp"] = timestamp + self.ttl_seconds
+
+        # Only numeric values (int, float, Decimal, or numeric string) are valid,
+        # or a dict of numeric values for metadata.
+        # Convert to Decimal because DynamoDB only accepts Decimal instead of floats,
+        # and meteorite doesn't like numeric strings.
+        #
+        # TODO (CLUSTERMAN-115) split out the dictionary writer to a separate function
+        if metric_type == METADATA and isinstance(value, dict):
+            for val_key, val_num in value.items():
+                if val_key not in RESERVED_KEYS:
+                    item[val_key] = convert_decimal(val_num)
+                else:
+                    logger.warning(
+                        'Column "{name}" is reserved; skipping "{name}" with value '
+                        '"{val}" in metric "{key}" at time {ts}'.format(
+                            name=val_key,
+                            val=val_num,
+                            key=metric_key,
+                            ts=timestamp,
+                        )
+                    )
+        else:
+            value = convert_decimal(value)
+            item["value"] = value
+        return item
 
     def get_metric_values(
         self,
@@ -220,14 +549,18 @@ class ClustermanMetricsBotoClient(object):
             app_identifier = app_identifier or self.app_identifier
             assert app_identifier  # make mypy happy
         key_prefix = self._get_key_prefix(metric_type, app_identifier)
-        query_with_dims = key_prefix + generate_key_with_dimensions(metric_query, extra_dimensions)
 
-        cached_data: MetricsValuesDict = defaultdict(list)
         if use_cache:
-            cached_data, time_start, time_end = self._cache_lookup(query_with_dims, time_start, time_end)
-
-        new_data: MetricsValuesDict = defaultdict(list)
-        if time_start < time_end:  # Skip querying dynamodb if all the metrics were in the cache
+            new_data = self._get_cached_metric_values(
+                key_prefix,
+                metric_query,
+                metric_type,
+                time_start,
+                time_end,
+                is_regex,
+                extra_dimensions,
+            )
+        else:
             new_data = self._get_new_metric_values(
                 key_prefix,
                 metric_query,
@@ -238,16 +571,102 @@ class ClustermanMetricsBotoClient(object):
                 extra_dimensions,
             )
 
-        if new_data and use_cache:
-            self._cache_store(query_with_dims, time_start, new_data)
-
         data: MetricsValuesDict = defaultdict(list)
-        for metric_key in set(cached_data) | set(new_data):
-            ts = cached_data[metric_key] + new_data[metric_key]
+        for metric_key, ts in new_data.items():
             metric_key_without_app = metric_key[len(app_identifier) + 1 :] if metric_type == APP_METRICS else metric_key
             data[metric_key_without_app] = ts
         return data
 
+    def _get_cached_metric_values(
+        self,
+        key_prefix: str,
+        metric_query: str,
+        metric_type: str,
+        time_start: int,
+        time_end: int,
+        is_regex: bool = False,
+        extra_dimensions: Optional[Dict[str, str]] = None,
+    ) -> MetricsValuesDict:
+        """Look up metrics values in the local cache, and only query the datastore for the parts that aren't there
+
+        The cache has an entry per query (including the app identifier and any extra dimensions), which keeps each
+        timeseries as separate, sorted timestamp and value lists, along with the range of time that the entry covers.
+        A request that overlaps the covered range, like the sliding windows that the autoscaler asks for, only needs
+        to fetch the missing prefix and/or suffix from the datastore.
+
+        Note that we assume that writes to the metric store happen sequentially.  In other words, we aren't going
+        back to fill in values "after the fact", because this could result in a cache with incomplete entries.  There
+        *could* be cases where writes to the datastore haven't completed when we read the cache, but this will only
+        result in incomplete information if write 1 finishes after write 2, but write 1 has an earlier timestamp.  To
+        protect against this case, we don't cache data that's newer than 5 minutes.
+
+        Arguments/return value are the same as for `get_metrics_values`
+        """
+        if time_start >= time_end:
+            raise ValueError("time_start must be earlier than time_end")
+
+        cache_key = key_prefix + generate_key_with_dimensions(metric_query, extra_dimensions)
+        with self._cache_lock:
+            entry = self._cache.pop(cache_key, None) or TimeseriesCacheEntry()
+            self._cache[cache_key] = entry  # most-recently used entries go at the end
+            entry.prune(time_start)
+            missing_ranges = entry.missing_ranges(time_start, time_end)
+            segments: List[Tuple[int, MetricsValuesDict]] = []
+            if entry.covered_start is not None and missing_ranges != [(time_start, time_end)]:
+                segments.append((max(time_start, entry.covered_start), entry.get(time_start, time_end)))
+                logger.info(
+                    "Using cached metrics for {key} from {start} to {end}".format(
+                        key=cache_key,
+                        start=entry.covered_start,
+                        end=entry.covered_end,
+                    )
+                )
+
+        fetched_data = [
+            (
+                range_start,
+                range_end,
+                self._get_new_metric_values(
+                    key_prefix,
+                    metric_query,
+                    metric_type,
+                    range_start,
+                    range_end,
+                    is_regex,
+                    extra_dimensions,
+                ),
+            )
+            for range_start, range_end in missing_ranges
+        ]
+
+        # The missing ranges come before and/or after the cached data, so we can stitch everything together in order
+        segments.extend((range_start, new_data) for range_start, __, new_data in fetched_data)
+        data: MetricsValuesDict = defaultdict(list)
+        for __, segment_data in sorted(segments, key=lambda segment: segment[0]):
+            for metric_key, ts in segment_data.items():
+                data[metric_key].extend(ts)
+
+        five_minutes_ago = int(time.time()) - _CACHE_DELAY
+        with self._cache_lock:
+            for range_start, range_end, new_data in fetched_data:
+                # Don't cache anything from the last five minutes, or the element exactly 5 minutes ago
+                entry.store(range_start, min(range_end, five_minutes_ago - 1), new_data)
+            self._evict_cache_entries()
+        return data
+
+    def _evict_cache_entries(self) -> None:
+        """Remove the least-recently-used entries from the cache until it fits; must be called with the lock held"""
+        num_datapoints = sum(entry.num_datapoints for entry in self._cache.values())
+        while num_datapoints > self.cache_max_datapoints and self._cache:
+            cache_key, entry = self._cache.popitem(last=False)
+            num_datapoints -= entry.num_datapoints
+            logger.info(
+                "Evicting {n} cached datapoints for {key}".format(
+                    n=entry.num_datapoints,
+                    key=cache_key,
+                )
+            )
+
     def _get_new_metric_values(
         self,
         key_prefix: str,
@@ -276,10 +695,13 @@ class ClustermanMetricsBotoClient(object):
         )
         new_data: MetricsValuesDict = defaultdict(list)
         table_name = self._get_table_name(metric_type)
-        table = self.ddb.Table(table_name)
+        # Callers may query from several threads at once with the same client (e.g., get_metrics_for_signal), and
+        # boto3 resources (and the Table objects made from them) aren't thread-safe, so go through the resource's
+        # low-level client instead, which is
+        ddb_client = self.ddb.meta.client
 
         if is_regex:
-            metric_keys = self._get_keys_from_query(key_prefix, metric_query, time_start, time_end, table)
+            metric_keys = self._get_keys_from_query(key_prefix, metric_query, time_start, time_end, table_name)
         else:
             metric_keys = {key_prefix + metric_query}
         time_start = convert_decimal(time_start)
@@ -289,17 +711,22 @@ class ClustermanMetricsBotoClient(object):
         for metric_key in metric_keys:
             full_query_key = generate_key_with_dimensions(metric_key, extra_dimensions)
             query_condition = Key("key").eq(full_query_key) & Key("timestamp").between(time_start, time_end)
-            response = table.query(KeyConditionExpression=query_condition)
+            response = ddb_client.query(TableName=table_name, KeyConditionExpression=query_condition)
 
-            new_data[metric_key] = self._extract_timestamp_and_value_from_items(response["Items"])
+            values = self._extract_timestamp_and_value_from_items(response["Items"])
 
             # Results are possibly paginated if too large.
             while response.get("LastEvaluatedKey") is not None:
-                response = table.query(
+                response = ddb_client.query(
+                    TableName=table_name,
                     ExclusiveStartKey=response.get("LastEvaluatedKey"),
                     KeyConditionExpression=query_condition,
                 )
-                new_data[metric_key].extend(self._extract_timestamp_and_value_from_items(response["Items"]))
+                values.extend(self._extract_timestamp_and_value_from_items(response["Items"]))
+
+            # Keys discovered through the key cache may not have any data in this particular time range
+            if values or not is_regex:
+                new_data[metric_key] = values
 
         return new_data
 
@@ -337,155 +764,123 @@ class ClustermanMetricsBotoClient(object):
         metric_query: str,
         time_start: int,
         time_end: int,
-        table: "boto3.dynamodb.Table",
+        table_name: str,
     ) -> Set[str]:
-        """Query the global secondary index for any keys matching the metric query"""
-        metric_keys: Set[str] = set()
-
-        for i in range(_GSI_PARTITIONS):
-            query_condition = Key(GSI_PK).eq(i) & Key(GSI_SORT).between(
-                key_prefix + str(time_start),
-                key_prefix + str(time_end),
-            )
-            response = table.query(
-                IndexName=GSI_NAME,
-                KeyConditionExpression=query_condition,
-            )
-            metric_keys |= {item["key"] for item in response["Items"] if re.search(metric_query, item["key"])}
+        """Query the global secondary index for any keys matching the metric query
 
-        return metric_keys
-
-    def _cache_lookup(self, metric_query: str, time_start: int, time_end: int) -> Tuple[MetricsValuesDict, int, int]:
-        """Look up an range of items in the locally-stored metrics cache
-
-        The cache is stored as a mapping of dictionary -> timeseries lists (i.e., a sorted list of tuples [(time1,
-        value1), (time2, value2), ...]), indexed by a metrics query.
-
-        Note that we assume that writes to the metric store happen sequentially.  In other words, we aren't going
-        back to fill in values "after the fact", because this could result in a cache with incomplete entries.  There
-        *could* be cases where writes to the datastore haven't completed when we read the cache, but this will only
-        result in incomplete information if write 1 finishes after write 2, but write 1 has an earlier timestamp.  To
-        protect against this case, we don't store data that's newer than 5 minutes (see self._cache_store, below).
-
-        :param metric_query: the name of the metric
-        :param time_start: int, unix timestamp of first requested time to look up
-        :param time_end: int, unix timestamp of last requested time to look up
-        :returns: (cached_data, new_start, new_end) tuple -- [new_start, new_end] is the range of timestamps we need
-            to look up in the datastore
+        Keys that we've already discovered are cached (per app and query), so that we only need to scan the parts of
+        the time range we haven't seen before; the returned keys may include some that don't have data between
+        time_start and time_end.
         """
-        centry = self._cache[metric_query]
-        cache_size = len(centry.data)
-
-        if time_start >= time_end:
-            raise ValueError("time_start must be earlier than time_end")
-        elif cache_size == 0:
-            return defaultdict(list), time_start, time_end
-        elif time_start < centry.time_start:
-            # If the start time is before the beginning of the cache, we return nothing, since otherwise we'd
-            # need more complicated logic to know what to fetch from the datastore.  The cache will then get
-            # invalidated when we try to store the data back in.
-            #
-            # In normal circumstances this should never happen because we assume the requests are monotonically
-            # increasing in time_start
-            logger.warning(
-                "time_start was before the first cached value; this should not happen ({ts} < {c})".format(
-                    ts=time_start,
-                    c=centry.time_start,
-                )
-            )
-            return defaultdict(list), time_start, time_end
-        else:
-            cached_metrics: MetricsValuesDict = defaultdict(list)
-            min_time, max_time = float("inf"), 0
-            for metric_name, ts in centry.data.items():
-                # using -inf and inf here ensures that cache_start and cache_end are inclusive
-                cache_start = bisect(ts, (time_start, float("-inf")))
-                cache_end = bisect(ts, (time_end, float("inf")))
-                if len(ts) > 0 and cache_start < len(ts):
-                    cached_metrics[metric_name] = ts[cache_start:cache_end]
-                    min_time = min(ts[cache_start][0], min_time)
-                    max_time = max(ts[cache_end - 1][0], max_time)
-
-                # Prune off everything before the original time_start request to keep the cache small-ish
-                num_cache_entries_to_prune = len(centry.data[metric_name][:cache_start])
-                if num_cache_entries_to_prune > 0:
-                    logger.info(
-                        "Removing {num} cache entries before {t} for {key}".format(
-                            num=num_cache_entries_to_prune,
-                            t=time_start,
-                            key=metric_name,
-                        )
-                    )
-                    del centry.data[metric_name][:cache_start]
-
-            centry.data = defaultdict(list, {metric_name: ts for metric_name, ts in centry.data.items() if ts})
+        cache_key = (key_prefix, metric_query)
+        now = time.time()
+        with self._key_cache_lock:
+            entry = self._key_cache.get(cache_key)
+            if entry is None or now - entry.created > _KEY_CACHE_TTL:
+                entry = self._key_cache[cache_key] = KeyCacheEntry(now)
+
+            if entry.covered_start is None or entry.covered_end is None:
+                ranges_to_scan = [(time_start, time_end)]
+            else:
+                ranges_to_scan = []
+                if time_start < entry.covered_start:
+                    ranges_to_scan.append((time_start, entry.covered_start - 1))
+                if time_end > entry.covered_end:
+                    ranges_to_scan.append((entry.covered_end + 1, time_end))
+
+        def scan_partition(scan: Tuple[int, int, int]) -> Dict[str, int]:
+            partition, range_start, range_end = scan
+            return self._scan_key_partition(key_prefix, metric_query, partition, range_start, range_end, table_name)
+
+        # The partitions are independent, so scan them all at once instead of one after another
+        scans = [(i, start, end) for start, end in ranges_to_scan for i in range(_GSI_PARTITIONS)]
+        scan_results: List[Dict[str, int]] = []
+        if scans:
+            with ThreadPoolExecutor(max_workers=min(_GSI_QUERY_WORKERS, len(scans))) as executor:
+                scan_results = list(executor.map(scan_partition, scans))
+
+        with self._key_cache_lock:
+            for discovered_keys in scan_results:
+                for metric_key, timestamp in discovered_keys.items():
+                    entry.keys[metric_key] = max(timestamp, entry.keys.get(metric_key, timestamp))
+
+            # Like the metrics cache, we don't trust the last few minutes to be complete, so those get re-scanned every
+            # time; anything before time_start gets dropped, on the assumption that queries move forward in time.
+            entry.covered_start = time_start
+            entry.covered_end = max(entry.covered_end or 0, min(time_end, int(now) - _CACHE_DELAY))
+            entry.keys = {metric_key: ts for metric_key, ts in entry.keys.items() if ts >= time_start}
+            if entry.covered_end < entry.covered_start:
+                entry.covered_start = entry.covered_end = None
+            return set(entry.keys)
+
+    def _scan_key_partition(
+        self,
+        key_prefix: str,
+        metric_query: str,
+        partition: int,
+        time_start: int,
+        time_end: int,
+        table_name: str,
+    ) -> Dict[str, int]:
+        """:returns: a mapping from each key in the partition matching the metric query to its latest timestamp"""
+        query_kwargs = {
+            "TableName": table_name,
+            "IndexName": GSI_NAME,
+            "KeyConditionExpression": Key(GSI_PK).eq(partition)
+            & Key(GSI_SORT).between(key_prefix + str(time_start), key_prefix + str(time_end)),
+        }
+        # Let DynamoDB throw out as many non-matching items as it can before sending them to us
+        literal, anchored = _get_regex_literal_prefix(metric_query)
+        if literal:
+            key_attr = Attr("key")
+            query_kwargs["FilterExpression"] = key_attr.begins_with(literal) if anchored else key_attr.contains(literal)
+
+        # This runs on several threads at once; boto3 resources (and the Table objects made from them) aren't
+        # thread-safe, but clients are, so query through the resource's client
+        ddb_client = self.ddb.meta.client
+        discovered_keys: Dict[str, int] = {}
+        response = ddb_client.query(**query_kwargs)
+        while True:
+            for item in response["Items"]:
+                if re.search(metric_query, item["key"]):
+                    timestamp = int(item[GSI_SORT][len(key_prefix) :])
+                    discovered_keys[item["key"]] = max(timestamp, discovered_keys.get(item["key"], timestamp))
 
-            if cached_metrics:
-                logger.info(
-                    "Using cached metrics from {start} to {end}".format(
-                        start=min_time,
-                        end=max_time,
-                    )
-                )
+            # Results are possibly paginated if too large.
+            if response.get("LastEvaluatedKey") is None:
+                return discovered_keys
+            response = ddb_client.query(ExclusiveStartKey=response["LastEvaluatedKey"], **query_kwargs)
 
-                # The first time we need to look up in the datastore is 1 second after the last thing
-                # we retreived from the cache
-                next_uncached_time = max_time + 1
-            else:
-                logger.info(
-                    "No cached metrics found in range {start} to {end} for {query}".format(
-                        start=time_start,
-                        end=time_end,
-                        query=metric_query,
-                    )
-                )
-                next_uncached_time = time_start
 
-            centry.time_start = time_start
-            return cached_metrics, next_uncached_time, time_end
+def _get_regex_literal_prefix(pattern: str) -> Tuple[str, bool]:
+    """Find a literal string that every match of the regex has to start with
 
-    def _cache_store(self, metric_query: str, time_start: int, data: MetricsValuesDict) -> None:
-        """Store items in the metrics cache; as discussed above, items newer than "five minutes ago" are not stored
+    This is intentionally conservative: it gives up on alternations and inline flags, and stops at the first
+    metacharacter (so, e.g., ``cpus_.*_total`` gives ``cpus_``).
 
-        :param metric_query: the metric query to index data by
-        :param items: mapping from metric name -> timeseries data, corresponding to the given query
-        """
-        centry = self._cache[metric_query]
-        cache_size = len(centry.data)
-        if cache_size == 0:
-            centry.time_start = time_start
-
-        min_time, max_time = float("inf"), 0
-        five_minutes_ago = time.time() - _CACHE_DELAY
-        should_invalidate = False
-        stored_data: MetricsValuesDict = defaultdict(list)
-        for metric_name, ts in data.items():
-            cache_end = bisect(ts, (five_minutes_ago, float("-inf")))  # Don't cache the element exactly 5 minutes ago
-            stored_data[metric_name] = ts[:cache_end]
-
-            if ts:
-                min_time = min(ts[0][0], min_time)
-                max_time = max(ts[cache_end - 1][0], max_time)
-
-                if len(centry.data[metric_name]) > 0 and ts[0][0] <= centry.data[metric_name][-1][0]:
-                    logger.warning(
-                        "First new item time {first} is before the last cache entry {last}; ".format(
-                            first=ts[0][0],
-                            last=centry.data[metric_name][-1][0],
-                        )
-                        + "invalidating the cache"
-                    )
-                    should_invalidate = True
+    :returns: a tuple of (literal prefix, True if the regex is anchored to the start of the string)
+    """
+    if "|" in pattern or pattern.startswith("(?"):
+        return "", False
+
+    anchored = pattern.startswith("^")
+    literal: List[str] = []
+    i = 1 if anchored else 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            escaped = pattern[i + 1 : i + 2]
+            if not escaped or escaped.isalnum():  # \d, \w, \b, etc. aren't literals
+                break
+            literal.append(escaped)
+            i += 2
+        elif char in _REGEX_METACHARACTERS:
+            break
+        else:
+            literal.append(char)
+            i += 1
 
-        if should_invalidate:
-            self._cache[metric_query] = CacheEntry(time_start, stored_data)
-        elif min_time <= max_time:
-            logger.info(
-                "Caching entries for {key} between {s} and {t}".format(
-                    key=metric_query,
-                    s=min_time,
-                    t=max_time,
-                )
-            )
-            for metric_name, ts in stored_data.items():
-                centry.data[metric_name] += ts
+    # a quantifier that allows zero repetitions makes the last character optional
+    if i < len(pattern) and pattern[i] in "*?{" and literal:
+        literal.pop()
+    return "".join(literal), anchored
@@ -19,6 +19,8 @@ from contextlib import contextmanager
 from numbers import Number
 from typing import Mapping
 from typing import Optional
+from typing import Set
+from typing import Tuple
 
 from clusterman_metrics.boto_client import ClustermanMetricsBotoClient
 from clusterman_metrics.boto_client import MetricsValuesDict  # noqa (just used for type-checking)
@@ -42,16 +44,17 @@ def _validate_metrics_object(obj):
             )
         )
 
-    for metric in obj.values():
-        for key in metric:
-            timestamps = [t for t, __ in metric[key]]
-            if len(set(timestamps)) != len(timestamps):
-                raise ValueError("Duplicate timestamps detected in {key}".format(key=metric[key]))
-            if any([not isinstance(timestamp, Number) for timestamp, __ in metric[key]]):
-                raise ValueError("Invalid timestamp values for {key}".format(key=metric[key]))
-            if any([not isinstance(value, Number) and not isinstance(value, dict) for __, value in metric[key]]):
-                raise ValueError("Invalid metric values for {key}".format(key=metric[key]))
-            metric[key] = sorted(metric[key])
+
+def _validate_timeseries(timeseries):
+    """:returns: the timeseries, sorted by timestamp"""
+    timestamps = [t for t, __ in timeseries]
+    if len(set(timestamps)) != len(timestamps):
+        raise ValueError("Duplicate timestamps detected in {key}".format(key=timeseries))
+    if any([not isinstance(timestamp, Number) for timestamp in timestamps]):
+        raise ValueError("Invalid timestamp values for {key}".format(key=timeseries))
+    if any([not isinstance(value, Number) and not isinstance(value, dict) for __, value in timeseries]):
+        raise ValueError("Invalid metric values for {key}".format(key=timeseries))
+    return sorted(timeseries)
 
 
 class ClustermanMetricsSimulationClient(ClustermanMetricsBotoClient):
@@ -76,6 +79,26 @@ class ClustermanMetricsSimulationClient(ClustermanMetricsBotoClient):
         super(ClustermanMetricsSimulationClient, self).__init__(*args, **kwargs)
         _validate_metrics_object(generated_metrics)
         self.generated_metrics = generated_metrics
+        # Each timeseries is validated the first time it's queried, so that the ones that are read lazily from a
+        # metrics file aren't all read up front
+        self._validated_keys: Set[Tuple[str, str]] = set()
+
+    def load_generated_metrics(self) -> None:
+        """Read and validate every generated timeseries now, instead of the first time each one is queried
+
+        This is useful before forking processes that all query the same metrics, so that they share the timeseries
+        instead of each reading them again.
+        """
+        for metric_type, generated_timeseries in list(self.generated_metrics.items()):
+            self.generated_metrics[metric_type] = {
+                metric_key: (
+                    timeseries
+                    if (metric_type, metric_key) in self._validated_keys
+                    else _validate_timeseries(timeseries)
+                )
+                for metric_key, timeseries in generated_timeseries.items()
+            }
+            self._validated_keys.update((metric_type, metric_key) for metric_key in generated_timeseries)
 
     @contextmanager
     def get_writer(*args, **kwargs):
@@ -113,10 +136,14 @@ class ClustermanMetricsSimulationClient(ClustermanMetricsBotoClient):
 
         for metric_key in generated_keys:
             full_query_key = generate_key_with_dimensions(metric_key, extra_dimensions)
+            generated_timeseries = self.generated_metrics.get(metric_type, {})
             try:
-                full_timeseries = self.generated_metrics.get(metric_type, {})[full_query_key]
+                full_timeseries = generated_timeseries[full_query_key]
             except KeyError:
                 continue
+            if (metric_type, full_query_key) not in self._validated_keys:
+                full_timeseries = generated_timeseries[full_query_key] = _validate_timeseries(full_timeseries)
+                self._validated_keys.add((metric_type, full_query_key))
 
             start_index = bisect.bisect_left(full_timeseries, (time_start,))
             end_index = bisect.bisect_right(full_timeseries, (time_end,))
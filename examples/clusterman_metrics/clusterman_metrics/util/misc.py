@@ -11,28 +11,26 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from decimal import Context
 from decimal import Decimal
-from decimal import getcontext
-from decimal import localcontext
 from decimal import ROUND_HALF_UP
 
 MAX_DECIMAL_PLACES = 20
 _PLACES_VALUE = Decimal(10) ** (-1 * MAX_DECIMAL_PLACES)
+# quantize can raise `decimal.InvalidOperation` if the result has more digits than the context precision, which is 28
+# by default.  The result never has more digits than its input, and the exact decimal expansion of a float has at most
+# 767 significant digits, so with this context quantize always succeeds (and rounds the same way it would with just
+# enough precision).  Building it once up front is a lot cheaper than setting up a localcontext for every value.
+_QUANTIZE_CONTEXT = Context(prec=1000, rounding=ROUND_HALF_UP)
 
 
 def convert_decimal(numeric):
+    if isinstance(numeric, int):
+        return Decimal(numeric)  # integers never have anything after the decimal point
+
     full_decimal = Decimal(numeric)
-    _, digits, exponent = full_decimal.as_tuple()
     # Round to MAX_DECIMAL_PLACES, if result has more places than that.
-    if exponent < -MAX_DECIMAL_PLACES:
-        # quantize can raise `decimal.InvalidOperation` if result is greater
-        # than context precision, which is 28 by default. to get around this,
-        # temporarily set a new precision up to the max number of sig figs  of
-        # `full_decimal`, which is also the max for the result of `quantize`.
-        # this ensures that the result of `quantize` will be within the precision
-        # limit, and not raise the error.
-        with localcontext() as ctx:
-            ctx.prec = max(len(digits), getcontext().prec)
-            return full_decimal.quantize(_PLACES_VALUE, rounding=ROUND_HALF_UP)
+    if full_decimal.as_tuple().exponent < -MAX_DECIMAL_PLACES:
+        return full_decimal.quantize(_PLACES_VALUE, context=_QUANTIZE_CONTEXT)
     else:
         return full_decimal
@@ -110,10 +110,15 @@ def termination_queue_process(context):
 
 @behave.when("the warning queue is processed")
 def warning_queue_process(context):
-    with mock.patch("clusterman.draining.queue.socket.gethostbyaddr", return_value=("the-host", "", ""),), mock.patch(
+    with mock.patch(
+        "clusterman.aws.hostname_resolver.socket.gethostbyaddr",
+        return_value=("the-host", "", ""),
+    ), mock.patch(
         "clusterman.aws.spot_fleet_resource_group.SpotFleetResourceGroup.load",
         return_value={context.sfr_id: SpotFleetResourceGroup(context.sfr_id)},
-    ), mock.patch("clusterman.aws.spot_fleet_resource_group.load_spot_fleets_from_s3",), mock.patch(
+    ), mock.patch(
+        "clusterman.aws.spot_fleet_resource_group.load_spot_fleets_from_s3",
+    ), mock.patch(
         "clusterman.draining.queue.get_pool_name_list",
         return_value=["bar"],
     ):
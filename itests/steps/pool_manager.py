@@ -26,6 +26,8 @@ from clusterman.aws.client import autoscaling
 from clusterman.aws.client import ec2
 from clusterman.aws.spot_fleet_resource_group import SpotFleetResourceGroup
 from clusterman.exceptions import ResourceGroupError
+from clusterman.mesos.mesos_cluster_connector import MesosAgent
+from clusterman.util import ClustermanResources
 from itests.environment import boto_patches
 from itests.environment import make_asg
 from itests.environment import make_sfr
@@ -84,24 +86,24 @@ def mock_agents_by_ip_and_tasks(context):
         for reservation in ec2.describe_instances()["Reservations"]:
             for instance in reservation["Instances"]:
                 ip_addr = instance["PrivateIpAddress"]
-                agents[ip_addr] = {
-                    "pid": f"slave(1)@{ip_addr}:1",
-                    "id": f'{instance["InstanceId"]}',
-                    "hostname": "host1",
-                }
+                agents[ip_addr] = MesosAgent(
+                    agent_id=f'{instance["InstanceId"]}',
+                    allocated_resources=ClustermanResources(),
+                    total_resources=ClustermanResources(),
+                )
         return agents
 
     with mock.patch(
         "clusterman.mesos.mesos_cluster_connector.MesosClusterConnector._get_agents_by_ip",
         side_effect=get_agents_by_ip,
     ), mock.patch(
-        "clusterman.mesos.mesos_cluster_connector.MesosClusterConnector._get_tasks_and_frameworks",
-        return_value=([], []),
+        "clusterman.mesos.mesos_cluster_connector.MesosClusterConnector._get_running_tasks_per_framework",
+        return_value=[],
     ), staticconf.testing.PatchConfiguration(
         {"scaling_limits": {"max_weight_to_remove": 1000}},
         namespace="bar.mesos_config",
     ), mock.patch(
-        "clusterman.aws.aws_resource_group.gethostbyaddr",
+        "clusterman.aws.hostname_resolver.socket.gethostbyaddr",
         return_value=("the-host", "", ""),
     ):
         yield
@@ -11,6 +11,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from collections import Counter
 from unittest import mock
 
 import behave
@@ -76,25 +77,17 @@ def max_weight_to_remove(context, weight):
 
 @behave.given("the killable instance has (?P<tasks>\d+) tasks")
 def killable_instance_with_tasks(context, tasks):
-    def get_tasks_and_frameworks():
+    def get_running_tasks_per_framework():
         rg = context.pool_manager.resource_groups[context.rg_ids[0]]
         instances = ec2_describe_instances(instance_ids=rg.instance_ids[:1])
-        return (
-            [
-                {
-                    "slave_id": instances[0]["InstanceId"],
-                    "state": "TASK_RUNNING",
-                    "framework_id": "framework_a",
-                }
-            ]
-            * int(tasks),
-            {"framework_a": {"name": "framework_a_name"}},
-        )
+        return [("framework_a_name", Counter({instances[0]["InstanceId"]: int(tasks)}))]
 
-    context.pool_manager.cluster_connector._get_tasks_and_frameworks.side_effect = get_tasks_and_frameworks
+    context.pool_manager.cluster_connector._get_running_tasks_per_framework.side_effect = (
+        get_running_tasks_per_framework
+    )
     context.pool_manager.cluster_connector.reload_state()
     context.pool_manager.cluster_connector._batch_tasks_per_mesos_agent = {
-        i["id"]: 0 for i in context.pool_manager.cluster_connector._agents_by_ip.values()
+        agent.agent_id: 0 for agent in context.pool_manager.cluster_connector._agents_by_ip.values()
     }
     context.pool_manager._get_prioritized_killable_nodes = mock.Mock(
         return_value=[
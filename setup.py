@@ -23,7 +23,7 @@ setup(
     author="Compute Infrastructure",
     author_email="compute-infra+github@yelp.com",
     description="Distributed cluster scaling and management tools",
-    packages=find_packages(exclude=["tests"]),
+    packages=find_packages(exclude=["tests", "benchmarks"]),
     setup_requires=["setuptools"],
     include_package_data=True,
     install_requires=[],
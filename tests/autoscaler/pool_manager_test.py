@@ -11,6 +11,8 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import math
+import random
 from unittest import mock
 
 import arrow
@@ -264,9 +266,10 @@ class TestReloadResourceGroups:
         assert "Unknown resource group" in mock_logger.error.call_args[0][0]
 
     def test_successful(self, mock_logger, mock_pool_manager):
+        mock_load = mock.Mock(return_value={"rg1": mock.Mock()})
         with mock.patch.dict(
             "clusterman.autoscaler.pool_manager.RESOURCE_GROUPS",
-            {"sfr": mock.Mock(load=mock.Mock(return_value={"rg1": mock.Mock()}))},
+            {"sfr": mock.Mock(load=mock_load)},
         ), staticconf.testing.PatchConfiguration(
             {"resource_groups": [{"sfr": {"tag": "puppet:role::paasta"}}]},
             namespace="bar.mesos_config",
@@ -275,6 +278,14 @@ class TestReloadResourceGroups:
 
         assert len(mock_pool_manager.resource_groups) == 1
         assert "rg1" in mock_pool_manager.resource_groups
+        assert mock_load.call_args[1]["instance_snapshot"] is mock_pool_manager.instance_snapshot
+        assert mock_load.call_args[1]["hostname_resolver"] is mock_pool_manager.hostname_resolver
+
+
+def test_close(mock_pool_manager):
+    with mock.patch.object(mock_pool_manager.hostname_resolver, "shutdown") as mock_shutdown:
+        mock_pool_manager.close()
+    mock_shutdown.assert_called_once_with(wait=False)
 
 
 @mock.patch("clusterman.autoscaler.pool_manager.logger")
@@ -564,6 +575,56 @@ def test_compute_new_resource_group_targets_scale_up_stale_pools_0(non_stale_cap
     }
 
 
+def _compute_new_resource_group_targets_one_step_at_a_time(pool_manager, new_target_capacity):
+    # The original, step-by-step implementation of _compute_new_resource_group_targets
+    stale_groups = [group for group in pool_manager.resource_groups.values() if group.is_stale]
+    non_stale_groups = [group for group in pool_manager.resource_groups.values() if not group.is_stale]
+    coeff = -1 if new_target_capacity < pool_manager.target_capacity else 1
+    targets = {g.id: g.target_capacity for g in non_stale_groups}
+    for stale_group in stale_groups:
+        targets[stale_group.id] = 0
+
+    def is_constrained(group):
+        if coeff > 0:
+            return targets[group.id] + coeff > group.max_capacity
+        else:
+            return targets[group.id] + coeff < group.min_capacity
+
+    while sum(targets.values()) * coeff < math.ceil(new_target_capacity) * coeff:
+        unconstrained_groups = [g for g in non_stale_groups if not is_constrained(g)]
+        if not unconstrained_groups:
+            break
+        group = sorted(unconstrained_groups, key=lambda g: (coeff * targets[g.id], g.id))[0]
+        targets[group.id] += coeff
+    return targets
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_compute_new_resource_group_targets_matches_one_step_at_a_time(seed, mock_pool_manager):
+    rng = random.Random(seed)
+    num_groups = rng.randint(1, 12)
+    mock_pool_manager.resource_groups = {}
+    for i in range(num_groups):
+        group_id = f"sfr-{rng.randint(0, 99):02}-{i}"
+        target_capacity = rng.choice([rng.randint(0, 40), rng.randint(0, 80) / 2])
+        mock_pool_manager.resource_groups[group_id] = mock.Mock(
+            id=group_id,
+            target_capacity=target_capacity,
+            is_stale=(i > 0 and rng.random() < 0.2),
+            min_capacity=rng.choice([0, 0, rng.randint(0, 30), rng.randint(0, 60) / 2]),
+            max_capacity=rng.choice([float("inf"), float("inf"), rng.randint(0, 60), rng.randint(0, 120) / 2]),
+        )
+    # make sure we get some ties
+    if num_groups > 1 and rng.random() < 0.3:
+        for group in mock_pool_manager.resource_groups.values():
+            group.target_capacity = 10
+    new_target_capacity = rng.choice([rng.randint(0, 500), rng.uniform(0, 500)])
+
+    assert mock_pool_manager._compute_new_resource_group_targets(
+        new_target_capacity
+    ) == _compute_new_resource_group_targets_one_step_at_a_time(mock_pool_manager, new_target_capacity)
+
+
 def test_compute_target_capacity_no_resource_groups_found(mock_pool_manager):
     mock_pool_manager.resource_groups = {}
     with pytest.raises(NoResourceGroupsFoundError):
@@ -589,6 +650,20 @@ def test_fulfilled_capacity(mock_pool_manager):
     assert mock_pool_manager.fulfilled_capacity == sum(i * 6 for i in range(7))
 
 
+def test_calculate_non_orphan_fulfilled_capacity(mock_pool_manager):
+    agent_states = [AgentState.RUNNING, AgentState.ORPHANED, AgentState.IDLE, AgentState.UNKNOWN]
+    for i, group in enumerate(mock_pool_manager.resource_groups.values()):
+        group.get_instance_metadatas.return_value = [
+            _make_metadata(group.id, f"i-{i}", weight=i + 1, agent_state=agent_states[i % 4]).instance
+        ]
+    mock_pool_manager.cluster_connector = mock.Mock()
+    mock_pool_manager.cluster_connector.get_agent_state.side_effect = agent_states * 2
+
+    # Only RUNNING and IDLE agents count (sfr-0, sfr-2, sfr-4, and sfr-6)
+    assert mock_pool_manager._calculate_non_orphan_fulfilled_capacity() == 1 + 3 + 5 + 7
+    assert mock_pool_manager.cluster_connector.get_agent_metadata.call_count == 0
+
+
 def test_instance_kill_order(mock_pool_manager):
     mock_pool_manager.get_node_metadatas = mock.Mock(
         return_value=[
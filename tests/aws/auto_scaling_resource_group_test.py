@@ -274,9 +274,9 @@ def test_get_asg_tags(mock_asrg, mock_asg_config):
 def test_load_from_cache_data(mock_get_obj):
     mock_data = {"g1": {}, "g2": {}}
     mock_get_obj.return_value = S3ObjectWrapper(json.dumps(mock_data).encode(), arrow.utcnow())
-    with mock.patch.object(AutoScalingResourceGroup, "_get_instances_by_market"), mock.patch.object(
-        AutoScalingResourceGroup, "_reload_resource_group"
-    ):
+    with mock.patch.object(
+        AutoScalingResourceGroup, "instance_ids", new_callable=mock.PropertyMock, return_value=[]
+    ), mock.patch.object(AutoScalingResourceGroup, "_reload_resource_group"):
         groups = AutoScalingResourceGroup.load("foo", "bar", {"aws_api_cache_bucket": "some-bucket"})
     assert all(k in groups and k == groups[k].group_id for k in mock_data)
     mock_get_obj.assert_called_once_with("some-bucket", "asg/foo/bar.json")
@@ -286,9 +286,9 @@ def test_load_from_cache_data(mock_get_obj):
 def test_get_auto_scaling_group_config_cached(mock_get_obj):
     mock_data = {"some-name": {"foo": 123}}
     mock_get_obj.return_value = S3ObjectWrapper(json.dumps(mock_data).encode(), arrow.utcnow())
-    with mock.patch.object(AutoScalingResourceGroup, "_get_instances_by_market"), mock.patch.object(
-        AutoScalingResourceGroup, "_reload_resource_group"
-    ):
+    with mock.patch.object(
+        AutoScalingResourceGroup, "instance_ids", new_callable=mock.PropertyMock, return_value=[]
+    ), mock.patch.object(AutoScalingResourceGroup, "_reload_resource_group"):
         asg = AutoScalingResourceGroup(
             "some-name", aws_api_cache_bucket="some-bucket", aws_api_cache_key="some-key.json"
         )
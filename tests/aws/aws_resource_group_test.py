@@ -22,6 +22,7 @@ from clusterman.aws.aws_resource_group import AWSAPICacheStale
 from clusterman.aws.aws_resource_group import AWSResourceGroup
 from clusterman.aws.client import ec2
 from clusterman.aws.client import S3ObjectWrapper
+from clusterman.aws.hostname_resolver import get_default_hostname_resolver
 from clusterman.aws.markets import InstanceMarket
 from clusterman.interfaces.types import ClusterNodeMetadata
 
@@ -229,7 +230,7 @@ def test_target_capacity(mock_resource_group, is_stale):
 
 def test_get_node_metadatas(mock_resource_group):
     ips = [i["PrivateIpAddress"] for i in mock_resource_group.instances]
-    with mock.patch("clusterman.aws.aws_resource_group.gethostbyaddr") as mock_get_host:
+    with mock.patch("clusterman.aws.hostname_resolver.socket.gethostbyaddr") as mock_get_host:
         mock_get_host.side_effect = lambda ip: {ips[i]: (f"host{i}",) for i in range(5)}[ip]
         instance_metadatas = mock_resource_group.get_instance_metadatas()
         cancelled_metadatas = mock_resource_group.get_instance_metadatas({"cancelled"})
@@ -247,6 +248,30 @@ def test_get_node_metadatas(mock_resource_group):
         assert instance_metadata.weight == 1
 
 
+def test_default_hostname_resolver(mock_resource_groups):
+    resolvers = {id(group._hostname_resolver) for group in mock_resource_groups.values()}
+    assert resolvers == {id(get_default_hostname_resolver())}
+
+
+def test_reload_sees_new_instances(mock_resource_group):
+    with mock.patch("clusterman.aws.hostname_resolver.socket.gethostbyaddr", side_effect=lambda ip: (ip,)):
+        assert len(mock_resource_group.get_instance_metadatas()) == 5
+
+        mock_resource_group.instances += ec2.run_instances(
+            InstanceType="c3.4xlarge",
+            MinCount=1,
+            MaxCount=1,
+            SubnetId=mock_resource_group.instances[0]["SubnetId"],
+            ImageId="ami-785db401",
+        )["Instances"]
+        ec2.stop_instances(InstanceIds=[mock_resource_group.instances[0]["InstanceId"]])
+        mock_resource_group.reload()
+        instance_metadatas = mock_resource_group.get_instance_metadatas()
+
+    assert [metadata.instance_id for metadata in instance_metadatas] == mock_resource_group.instance_ids
+    assert instance_metadatas[0].state != "running"
+
+
 @mock.patch("clusterman.aws.aws_resource_group.cached_s3_get_object")
 def test_get_aws_api_cache_data_stale(mock_get_obj):
     mock_get_obj.return_value = S3ObjectWrapper(json.dumps({}).encode(), arrow.utcnow().shift(days=1))
@@ -0,0 +1,128 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+import threading
+import time
+
+import pytest
+
+from clusterman.aws.hostname_resolver import get_default_hostname_resolver
+from clusterman.aws.hostname_resolver import HostnameResolver
+
+
+class FakeResolver:
+    def __init__(self, hostnames, latency=0, slow_ips=()):
+        self.hostnames = hostnames
+        self.latency = latency
+        self.slow_ips = slow_ips
+        self.calls = []
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, ip):
+        with self._lock:
+            self.calls.append(ip)
+        if ip in self.slow_ips:
+            self.release.wait()
+        time.sleep(self.latency)
+        if ip not in self.hostnames:
+            raise socket.herror("Unknown host")
+        return self.hostnames[ip]
+
+
+@pytest.fixture
+def ips():
+    return [f"10.0.{i // 256}.{i % 256}" for i in range(100)]
+
+
+@pytest.fixture
+def fake_resolver(ips):
+    return FakeResolver({ip: f"host-{ip}" for ip in ips})
+
+
+def test_resolve_cached(fake_resolver, ips):
+    resolver = HostnameResolver(fake_resolver)
+    assert resolver.resolve(ips[0]) == f"host-{ips[0]}"
+    assert resolver.resolve(ips[0]) == f"host-{ips[0]}"
+    assert fake_resolver.calls == [ips[0]]
+
+
+def test_resolve_negative_cached(fake_resolver):
+    resolver = HostnameResolver(fake_resolver)
+    assert resolver.resolve("10.1.1.1") is None
+    assert resolver.resolve("10.1.1.1") is None
+    assert fake_resolver.calls == ["10.1.1.1"]
+
+
+def test_resolve_all_parallel(ips):
+    fake_resolver = FakeResolver({ip: f"host-{ip}" for ip in ips}, latency=0.1)
+    resolver = HostnameResolver(fake_resolver, max_workers=len(ips))
+
+    start = time.time()
+    hostnames = resolver.resolve_all(ips)
+    assert time.time() - start < len(ips) * fake_resolver.latency / 4
+    assert hostnames == {ip: f"host-{ip}" for ip in ips}
+
+    # everything should be cached the second time around
+    assert resolver.resolve_all(ips) == hostnames
+    assert sorted(fake_resolver.calls) == sorted(ips)
+
+
+def test_resolve_all_duplicates(fake_resolver, ips):
+    resolver = HostnameResolver(fake_resolver)
+    assert resolver.resolve_all([ips[0], ips[0], ips[1]]) == {ips[0]: f"host-{ips[0]}", ips[1]: f"host-{ips[1]}"}
+    assert sorted(fake_resolver.calls) == sorted(ips[:2])
+
+
+def test_resolve_all_fallback(fake_resolver, ips):
+    resolver = HostnameResolver(fake_resolver)
+    fallbacks = {ips[0]: "ip-0.ec2.internal", "10.1.1.1": "ip-1.ec2.internal"}
+    hostnames = resolver.resolve_all([ips[0], "10.1.1.1", "10.1.1.2"], fallbacks=fallbacks)
+    assert hostnames == {ips[0]: f"host-{ips[0]}", "10.1.1.1": "ip-1.ec2.internal", "10.1.1.2": None}
+
+    # the failure is cached, but the fallback is still used
+    assert resolver.resolve_all(["10.1.1.1"], fallbacks=fallbacks) == {"10.1.1.1": "ip-1.ec2.internal"}
+    assert fake_resolver.calls.count("10.1.1.1") == 1
+
+
+def test_resolve_all_deadline(ips):
+    fake_resolver = FakeResolver({ip: f"host-{ip}" for ip in ips}, slow_ips=[ips[0]])
+    resolver = HostnameResolver(fake_resolver)
+
+    start = time.time()
+    hostnames = resolver.resolve_all(ips[:3], fallbacks={ips[0]: "ip-0.ec2.internal"}, timeout=0.1)
+    assert time.time() - start < 1
+    assert hostnames == {ips[0]: "ip-0.ec2.internal", ips[1]: f"host-{ips[1]}", ips[2]: f"host-{ips[2]}"}
+
+    # the slow lookup keeps going in the background; asking again waits for it instead of starting a new one
+    fake_resolver.release.set()
+    assert resolver.resolve_all([ips[0]]) == {ips[0]: f"host-{ips[0]}"}
+    assert fake_resolver.calls.count(ips[0]) == 1
+
+
+def test_shutdown(fake_resolver, ips):
+    with HostnameResolver(fake_resolver) as resolver:
+        assert resolver.resolve_all(ips[:2]) == {ips[0]: f"host-{ips[0]}", ips[1]: f"host-{ips[1]}"}
+        lookup_threads = list(resolver._executor._threads)
+        assert lookup_threads
+    assert not any(thread.is_alive() for thread in lookup_threads)
+
+    # the cache survives the shutdown, and new lookups start new threads
+    assert resolver.resolve_all(ips[:3]) == {ip: f"host-{ip}" for ip in ips[:3]}
+    assert sorted(fake_resolver.calls) == sorted(ips[:3])
+    resolver.shutdown()
+
+
+def test_default_hostname_resolver():
+    assert get_default_hostname_resolver() is get_default_hostname_resolver()
@@ -0,0 +1,106 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from unittest import mock
+
+import pytest
+
+from clusterman.aws.client import ec2
+from clusterman.aws.client import ec2_describe_instances
+from clusterman.aws.instance_snapshot import InstanceSnapshot
+from clusterman.aws.markets import InstanceMarket
+
+
+@pytest.fixture
+def instance_ids(mock_subnet):
+    def run_instances(instance_type, count):
+        return [
+            instance["InstanceId"]
+            for instance in ec2.run_instances(
+                InstanceType=instance_type,
+                MinCount=count,
+                MaxCount=count,
+                SubnetId=mock_subnet["Subnet"]["SubnetId"],
+                ImageId="ami-785db401",  # this AMI is hard-coded into moto, represents ubuntu xenial
+            )["Instances"]
+        ]
+
+    return {"sfr-1": run_instances("c3.4xlarge", 3), "sfr-2": run_instances("m5.large", 2)}
+
+
+@pytest.fixture
+def snapshot(instance_ids):
+    snapshot = InstanceSnapshot()
+    for group_id, group_instance_ids in instance_ids.items():
+        snapshot.register_group(group_id, group_instance_ids)
+    return snapshot
+
+
+def test_one_describe_for_all_groups(snapshot, instance_ids):
+    with mock.patch(
+        "clusterman.aws.instance_snapshot.ec2_describe_instances",
+        wraps=ec2_describe_instances,
+    ) as mock_describe:
+        sfr1_instances = snapshot.get_instances("sfr-1")
+        sfr2_instances = snapshot.get_instances("sfr-2")
+        snapshot.get_instances_by_market("sfr-1")
+        snapshot.get_instances("sfr-1")
+
+    assert mock_describe.call_count == 1
+    assert [i["InstanceId"] for i in sfr1_instances] == instance_ids["sfr-1"]
+    assert [i["InstanceId"] for i in sfr2_instances] == instance_ids["sfr-2"]
+
+
+def test_get_instances_by_market(snapshot, instance_ids):
+    market = InstanceMarket("m5.large", "us-west-2a")
+    instances_by_market = snapshot.get_instances_by_market("sfr-2")
+    assert list(instances_by_market) == [market]
+    assert [i["InstanceId"] for i in instances_by_market[market]] == instance_ids["sfr-2"]
+
+
+def test_register_group_after_describe(instance_ids):
+    snapshot = InstanceSnapshot()
+    snapshot.register_group("sfr-1", instance_ids["sfr-1"])
+    snapshot.get_instances("sfr-1")
+    with mock.patch(
+        "clusterman.aws.instance_snapshot.ec2_describe_instances",
+        wraps=ec2_describe_instances,
+    ) as mock_describe:
+        snapshot.register_group("sfr-3", instance_ids["sfr-1"][:1] + instance_ids["sfr-2"][:1])
+        instances = snapshot.get_instances("sfr-3")
+
+    # only the instance which hasn't been seen before gets described
+    assert mock_describe.call_args == mock.call([instance_ids["sfr-2"][0]])
+    assert [i["InstanceId"] for i in instances] == [instance_ids["sfr-1"][0], instance_ids["sfr-2"][0]]
+
+
+def test_register_group_refresh(instance_ids):
+    snapshot = InstanceSnapshot()
+    snapshot.register_group("sfr-1", instance_ids["sfr-1"])
+    snapshot.get_instances_by_market("sfr-1")
+    with mock.patch(
+        "clusterman.aws.instance_snapshot.ec2_describe_instances",
+        wraps=ec2_describe_instances,
+    ) as mock_describe:
+        snapshot.register_group("sfr-1", instance_ids["sfr-1"][1:] + instance_ids["sfr-2"][:1], refresh=True)
+        instances = snapshot.get_instances("sfr-1")
+        instances_by_market = snapshot.get_instances_by_market("sfr-1")
+
+    assert mock_describe.call_args == mock.call(instance_ids["sfr-1"][1:] + instance_ids["sfr-2"][:1])
+    assert [i["InstanceId"] for i in instances] == instance_ids["sfr-1"][1:] + instance_ids["sfr-2"][:1]
+    assert sum(len(market_instances) for market_instances in instances_by_market.values()) == len(instances)
+
+
+def test_unknown_group(snapshot):
+    assert snapshot.get_instances("sfr-unknown") == []
+    assert snapshot.get_instances_by_market("sfr-unknown") == {}
@@ -13,10 +13,14 @@
 # limitations under the License.
 import argparse
 import socket
+import threading
 from unittest import mock
 
 import pytest
 from clusterman_metrics import ClustermanMetricsBotoClient
+from clusterman_metrics import generate_key_with_dimensions
+from clusterman_metrics import METADATA
+from clusterman_metrics import SYSTEM_METRICS
 
 from clusterman.autoscaler.pool_manager import PoolManager
 from clusterman.mesos.metrics_generators import ClusterMetric
@@ -25,7 +29,7 @@ from clusterman.util import splay_event_time
 
 try:
     from clusterman.batch.cluster_metrics_collector import ClusterMetricsCollector
-    from clusterman.batch.cluster_metrics_collector import METRICS_TO_WRITE
+    from clusterman.batch.cluster_metrics_collector import MetricToWrite
 except ImportError:
     pytest.mark.skip("Could not import the batch; are you in a Yelp-y environment?")
 
@@ -39,6 +43,11 @@ def batch(args=None):
     batch.options = parser.parse_args(args)
     batch.options.instance_name = "foo"
     batch.version_checker = mock.Mock(watchers=[])
+    batch.max_workers = 4
+    batch.pool_timeout_seconds = 10
+    batch._executor = None
+    batch._pool_futures = {}
+    batch._pool_start_times = {}
     return batch
 
 
@@ -72,32 +81,85 @@ def test_configure_initial(mock_ls, mock_mesos_pool_manager, mock_client_class,
     assert len(batch.pools["kubernetes"]) == 1
 
 
-def test_write_metrics(batch):
-    batch.pool_managers = {
+@pytest.fixture
+def pool_managers():
+    pool_managers = {
         "pool_A.mesos": mock.Mock(autospec=PoolManager, pool="pool_A", scheduler="mesos"),
         "pool_B.mesos": mock.Mock(autospec=PoolManager, pool="pool_B", scheduler="mesos"),
         "pool_B.kubernetes": mock.Mock(autospec=PoolManager, pool="pool_B", scheduler="kubernetes"),
     }
-    batch.pool_managers["pool_A.mesos"].cluster_connector = mock.Mock()
-    batch.pool_managers["pool_B.mesos"].cluster_connector = mock.Mock()
-    batch.pool_managers["pool_B.kubernetes"].cluster_connector = mock.Mock()
+    for manager in pool_managers.values():
+        manager.cluster_connector = mock.Mock()
+    return pool_managers
+
+
+def metric_generator(manager, snapshot):
+    yield ClusterMetric("allocated", snapshot.allocated.cpus, {"pool": f"{manager.pool}.{manager.scheduler}"})
+
+
+@pytest.fixture
+def mock_metrics_to_write():
+    metrics_to_write = [
+        MetricToWrite(metric_generator, SYSTEM_METRICS, False, All, ["mesos", "kubernetes"]),
+        MetricToWrite(metric_generator, METADATA, False, ["pool_B.kubernetes"], ["kubernetes"]),
+    ]
+    with mock.patch("clusterman.batch.cluster_metrics_collector.METRICS_TO_WRITE", metrics_to_write):
+        yield metrics_to_write
+
+
+@pytest.fixture
+def mock_get_snapshot():
+    with mock.patch(
+        "clusterman.batch.cluster_metrics_collector.get_pool_metrics_snapshot",
+        autospec=True,
+    ) as mock_get_snapshot:
+        yield mock_get_snapshot
+
+
+def test_write_metrics(batch):
     writer = mock.Mock()
+    cluster_metrics = [
+        ClusterMetric("allocated", 3, {"pool": "pool_A.mesos"}),
+        ClusterMetric("allocated", 5, {"pool": "pool_B.mesos"}),
+    ]
+
+    batch.write_metrics(writer, cluster_metrics, 1000)
+
+    assert writer.send.call_args_list == [
+        mock.call(("allocated|pool=pool_A.mesos", 1000, 3)),
+        mock.call(("allocated|pool=pool_B.mesos", 1000, 5)),
+    ]
+
+
+def test_collect_pool_metrics(batch, pool_managers, mock_metrics_to_write, mock_get_snapshot):
+    mesos_metrics = batch.collect_pool_metrics("pool_B.mesos", pool_managers["pool_B.mesos"])
+    kubernetes_metrics = batch.collect_pool_metrics("pool_B.kubernetes", pool_managers["pool_B.kubernetes"])
 
-    def metric_generator(manager):
-        yield ClusterMetric(
-            "allocated",
-            manager.cluster_connector.get_resource_allocation("cpus"),
-            {"pool": f"{manager.pool}.{manager.scheduler}"},
-        )
+    for pool in ("pool_B.mesos", "pool_B.kubernetes"):
+        assert pool_managers[pool].reload_state.call_count == 1
+    # One snapshot per pool, shared by all of the pool's generators
+    assert mock_get_snapshot.call_args_list == [
+        mock.call(pool_managers["pool_B.mesos"]),
+        mock.call(pool_managers["pool_B.kubernetes"]),
+    ]
+    assert kubernetes_metrics[0][0].value == kubernetes_metrics[1][0].value
+    assert [len(cluster_metrics) for cluster_metrics in mesos_metrics] == [1, 0]
+    assert [len(cluster_metrics) for cluster_metrics in kubernetes_metrics] == [1, 1]
+    assert kubernetes_metrics[1][0].dimensions == {"pool": "pool_B.kubernetes"}
 
-    batch.write_metrics(writer, metric_generator, pools=All, schedulers=["mesos", "kubernetes"])
 
-    for pool, manager in batch.pool_managers.items():
-        assert manager.cluster_connector.get_resource_allocation.call_args_list == [mock.call("cpus")]
+def test_collect_all_metrics(batch, pool_managers, mock_metrics_to_write, mock_get_snapshot):
+    batch.pool_managers = pool_managers
 
-    assert writer.send.call_count == 3
+    pool_metrics, successful = batch.collect_all_metrics()
 
-    metric_names = [call[0][0][0] for call in writer.send.call_args_list]
+    assert successful
+    assert set(pool_metrics) == set(pool_managers)
+    metric_names = [
+        generate_key_with_dimensions(cluster_metric.metric_name, cluster_metric.dimensions)
+        for cluster_metrics_by_type in pool_metrics.values()
+        for cluster_metric in cluster_metrics_by_type[0]
+    ]
     assert sorted(metric_names) == sorted(
         [
             "allocated|pool=pool_A.mesos",
@@ -107,6 +169,89 @@ def test_write_metrics(batch):
     )
 
 
+def test_collect_all_metrics_isolates_failures(batch, pool_managers, mock_metrics_to_write, mock_get_snapshot):
+    batch.pool_managers = pool_managers
+    batch.pool_timeout_seconds = 0.1
+    release_slow_pool = threading.Event()
+    pool_managers["pool_A.mesos"].reload_state.side_effect = socket.timeout("timed out")
+    pool_managers["pool_B.mesos"].reload_state.side_effect = lambda: release_slow_pool.wait(5)
+
+    with mock.patch("clusterman.batch.cluster_metrics_collector.logger") as mock_logger:
+        pool_metrics, successful = batch.collect_all_metrics()
+        assert mock_logger.warning.call_count == 2
+
+        # The slow pool is still running, so it gets skipped on the next round
+        pool_metrics_2, successful_2 = batch.collect_all_metrics()
+        assert mock_logger.warning.call_count == 4
+        release_slow_pool.set()
+
+    assert not successful and not successful_2
+    assert list(pool_metrics) == list(pool_metrics_2) == ["pool_B.kubernetes"]
+    assert pool_managers["pool_B.mesos"].reload_state.call_count == 1
+
+
+def test_shutdown_executor(batch, pool_managers, mock_metrics_to_write, mock_get_snapshot):
+    batch.pool_managers = pool_managers
+    batch.pool_timeout_seconds = 0.1
+    release_slow_pool = threading.Event()
+    pool_managers["pool_B.mesos"].reload_state.side_effect = lambda: release_slow_pool.wait(5)
+    batch.collect_all_metrics()
+    executor = batch.executor
+
+    with mock.patch("clusterman.batch.cluster_metrics_collector.logger") as mock_logger, mock.patch.object(
+        executor, "shutdown", wraps=executor.shutdown
+    ) as mock_shutdown:
+        batch.shutdown_executor()
+        release_slow_pool.set()
+
+    assert mock_shutdown.call_args == mock.call(wait=False)
+    assert mock_logger.warning.call_args == mock.call(
+        "Exit will wait for metrics collection to finish for pools: pool_B.mesos"
+    )
+    assert batch.executor is not executor
+
+
+@mock.patch("time.time", mock.Mock(return_value=1000.5))
+def test_write_all_metrics(batch, mock_metrics_to_write):
+    batch.metrics_client = mock.MagicMock(spec_set=ClustermanMetricsBotoClient)
+    writer = batch.metrics_client.get_writer.return_value.__enter__.return_value
+    pool_metrics = {
+        "pool_A.mesos": [[ClusterMetric("allocated", 3, {})], []],
+        "pool_B.kubernetes": [[ClusterMetric("allocated", 5, {})], [ClusterMetric("allocated", 7, {})]],
+    }
+    with mock.patch.object(batch, "collect_all_metrics", return_value=(pool_metrics, False)), mock.patch.object(
+        batch, "write_metrics", autospec=True
+    ) as mock_write_metrics:
+        assert not batch.write_all_metrics()
+
+    # Open all of the writers up front so they can share batches
+    assert batch.metrics_client.get_writer.call_args_list == [
+        mock.call(SYSTEM_METRICS, False),
+        mock.call(METADATA, False),
+    ]
+    assert batch.metrics_client.get_writer.return_value.__exit__.call_count == 2
+    assert mock_write_metrics.call_args_list == [
+        mock.call(writer, pool_metrics["pool_A.mesos"][0], 1000),
+        mock.call(writer, [], 1000),
+        mock.call(writer, pool_metrics["pool_B.kubernetes"][0], 1000),
+        mock.call(writer, pool_metrics["pool_B.kubernetes"][1], 1000),
+    ]
+
+
+@pytest.mark.parametrize("error", [socket.timeout("timed out"), Exception("ProvisionedThroughputExceededException")])
+def test_write_all_metrics_write_fails(batch, mock_metrics_to_write, error):
+    batch.metrics_client = mock.MagicMock(spec_set=ClustermanMetricsBotoClient)
+    batch.metrics_client.get_writer.return_value.__exit__.side_effect = [error, None]
+    pool_metrics = {"pool_A.mesos": [[ClusterMetric("allocated", 3, {})], []]}
+    with mock.patch.object(batch, "collect_all_metrics", return_value=(pool_metrics, True)), mock.patch.object(
+        batch, "write_metrics", autospec=True
+    ):
+        assert not batch.write_all_metrics()
+
+    # the other writer still gets closed
+    assert batch.metrics_client.get_writer.return_value.__exit__.call_count == 2
+
+
 @mock.patch("time.sleep")
 @mock.patch("time.time")
 @mock.patch(
@@ -118,12 +263,8 @@ def test_run(mock_sensu, mock_running, mock_time, mock_sleep, batch):
     mock_running.side_effect = [True, True, True, True, False]
     mock_time.side_effect = [101, 113, 148, 188]
     batch.run_interval = 10
-    batch.metrics_client = mock.MagicMock(spec_set=ClustermanMetricsBotoClient)
     batch.pools = {"mesos": ["pool-1", "pool-2"]}
 
-    writer_context = batch.metrics_client.get_writer.return_value
-    writer = writer_context.__enter__.return_value
-
     # modify splay_event_time to avoid any splaying
     def mock_splay_event_time(frequency, key):
         fake_key = mock.Mock(__hash__=lambda x: 0)
@@ -132,45 +273,16 @@ def test_run(mock_sensu, mock_running, mock_time, mock_sleep, batch):
     with mock.patch(
         "clusterman.batch.cluster_metrics_collector.splay_event_time",
         mock_splay_event_time,
-    ), mock.patch.object(batch, "write_metrics", autospec=True) as write_metrics, mock.patch(
+    ), mock.patch.object(
+        batch, "write_all_metrics", autospec=True, side_effect=[True, True, True, False]
+    ) as write_all_metrics, mock.patch(
         "clusterman.batch.cluster_metrics_collector.PoolManager", autospec=True
-    ), mock.patch(
-        "clusterman.batch.cluster_metrics_collector.logger"
-    ) as mock_logger:
-
-        def mock_write_metrics(writer, generator, pools, schedulers):
-            if mock_time.call_count == 4:
-                raise socket.timeout("timed out")
-            else:
-                return
-
-        write_metrics.side_effect = mock_write_metrics
+    ):
         batch.run()
 
-        # Writing should have happened 3 times, for each metric type.
-        # Each time, we create a new writer context and call write_metrics.
-        assert sorted(batch.metrics_client.get_writer.call_args_list) == sorted(
-            [
-                mock.call(metric_to_write.type, metric_to_write.aggregate_meteorite_dims)
-                for metric_to_write in METRICS_TO_WRITE
-            ]
-            * 4
-        )
-
-        expected_write_metrics_calls = [
-            mock.call(
-                writer,
-                metric_to_write.generator,
-                metric_to_write.pools,
-                metric_to_write.schedulers,
-            )
-            for metric_to_write in METRICS_TO_WRITE
-        ] * 4
-        assert write_metrics.call_args_list == expected_write_metrics_calls
-
-        assert writer_context.__exit__.call_count == len(METRICS_TO_WRITE) * 4
+        assert write_all_metrics.call_count == 4
         assert mock_sensu.call_count == 3
-        assert mock_logger.warn.call_count == len(METRICS_TO_WRITE)
+        assert batch._executor is None
 
     assert mock_sleep.call_args_list == [
         mock.call(9),
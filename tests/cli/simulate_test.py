@@ -11,13 +11,27 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import json
+import os
+import random
 from argparse import ArgumentError
 from argparse import Namespace
 from unittest import mock
 
+import arrow
 import pytest
+import staticconf
+from numpy import load as np_load
 
+from clusterman_metrics import SYSTEM_METRICS
+
+from clusterman.aws.markets import InstanceMarket
+from clusterman.cli.simulate import _load_metrics
+from clusterman.cli.simulate import _populate_price_changes
 from clusterman.cli.simulate import main
+from clusterman.cli.simulate import main_sweep
+from clusterman.simulator.io import _decode_timeseries
+from clusterman.simulator.io import write_metrics_file
 
 
 @pytest.fixture
@@ -47,8 +61,8 @@ def test_main_too_many_compares(args):
 @pytest.mark.parametrize("compare", [[], ["sim1"], ["sim1", "sim2"]])
 def test_main_compare_param(compare, args):
     args.compare = compare
-    with mock.patch("clusterman.cli.simulate.read_object_from_compressed_json") as mock_read, mock.patch(
-        "clusterman.cli.simulate.write_object_to_compressed_json"
+    with mock.patch("clusterman.cli.simulate.read_simulation_file") as mock_read, mock.patch(
+        "clusterman.cli.simulate.write_simulation_file"
     ) as mock_write, mock.patch("clusterman.cli.simulate._load_metrics") as mock_load_metrics, mock.patch(
         "clusterman.cli.simulate._run_simulation"
     ) as mock_run_simulation, mock.patch(
@@ -63,3 +77,112 @@ def test_main_compare_param(compare, args):
         assert mock_read.call_count == len(compare)
         assert mock_write.call_count == 0
         assert mock_operator.div.call_count == (len(compare) > 0)
+
+
+@pytest.fixture
+def sweep_args(args, tmp_path):
+    sweep_config = tmp_path / "sweep.yaml"
+    sweep_config.write_text("grid:\n  autoscaling.setpoint: [0.5, 0.7, 0.9]\n")
+    args.scheduler = "mesos"
+    args.autoscaler_config = None
+    args.discount = None
+    args.sweep_config = str(sweep_config)
+    args.max_workers = 2
+    args.seed = 12345
+    args.json = True
+    return args
+
+
+def _fake_run_simulation(args, metrics_client, fetch_signals, stop_signals):
+    assert metrics_client == "the metrics"
+    setpoint = staticconf.read_float("autoscaling.setpoint", namespace="bar.mesos_config")
+    return mock.Mock(
+        total_cost=setpoint * 100 + random.random(),
+        # each simulation should talk to its own signal processes
+        get_cpu_hours=mock.Mock(return_value=float(staticconf.read_string("signal_socket_suffix")[len("-sweep") :])),
+    )
+
+
+def test_main_sweep(sweep_args, capsys):
+    with mock.patch("clusterman.cli.simulate._load_metrics", return_value="the metrics"), mock.patch(
+        "clusterman.cli.simulate._run_simulation", side_effect=_fake_run_simulation
+    ), mock.patch("clusterman.cli.simulate.fetch_signals") as mock_fetch_signals:
+        main_sweep(sweep_args)
+
+    results = sorted(json.loads(capsys.readouterr().out.split("\n")[-2]), key=lambda result: result["cost"])
+    random.seed(12345)
+    noise = random.random()
+    assert [(result["name"], result["cost"]) for result in results] == [
+        ("autoscaling.setpoint=0.5", 50 + noise),
+        ("autoscaling.setpoint=0.7", 70 + noise),
+        ("autoscaling.setpoint=0.9", 90 + noise),
+    ]
+    assert sorted(result["unused_cpu_hours"] for result in results) == [0, 1, 2]
+    assert mock_fetch_signals.call_count == 0
+
+
+def test_load_metrics(tmp_path):
+    old_file, new_file = str(tmp_path / "old.npz"), str(tmp_path / "new.npz")
+    write_metrics_file({SYSTEM_METRICS: {"cpus_allocated": [(10, 1.0)], "mem_allocated": [(10, 2.0)]}}, old_file)
+    write_metrics_file({SYSTEM_METRICS: {"cpus_allocated": [(10, 3.0), (20, 4.0)]}}, new_file)
+
+    with mock.patch("clusterman.simulator.io._decode_timeseries", wraps=_decode_timeseries) as mock_decode, mock.patch(
+        "clusterman_metrics.boto_client.get_metrics_session"
+    ), staticconf.testing.MockConfiguration({"dynamodb": {"ttl_days": 1}}, namespace="clusterman_metrics"):
+        metrics_client = _load_metrics([old_file, new_file], "bar")
+        assert mock_decode.call_count == 0
+
+        values = metrics_client.get_metric_values("cpus_allocated", SYSTEM_METRICS, 0, 15, use_cache=False)
+        assert values == {"cpus_allocated": [(10, 3.0)]}  # the later file wins
+        assert mock_decode.call_count == 1
+
+
+def test_main_sweep_shares_metrics(sweep_args, tmp_path):
+    sweep_args.metrics_data_files = [str(tmp_path / "metrics.npz")]
+    write_metrics_file({SYSTEM_METRICS: {"cpus_allocated": [(20, 2.0), (10, 1.0)]}}, sweep_args.metrics_data_files[0])
+    parent_pid = os.getpid()
+
+    def load_in_parent(*args, **kwargs):
+        assert os.getpid() == parent_pid, "a sweep worker read the metrics file"
+        return np_load(*args, **kwargs)
+
+    def run_simulation(args, metrics_client, fetch_signals, stop_signals):
+        values = metrics_client.get_metric_values("cpus_allocated", SYSTEM_METRICS, 0, 30, use_cache=False)
+        assert values == {"cpus_allocated": [(10, 1.0), (20, 2.0)]}
+        return mock.Mock(total_cost=1.0, get_cpu_hours=mock.Mock(return_value=0.0))
+
+    with mock.patch("clusterman.simulator.io.np.load", side_effect=load_in_parent), mock.patch(
+        "clusterman.cli.simulate._run_simulation", side_effect=run_simulation
+    ), mock.patch("clusterman.cli.simulate.logger") as mock_logger, mock.patch(
+        "clusterman_metrics.boto_client.get_metrics_session"
+    ), staticconf.testing.MockConfiguration({"dynamodb": {"ttl_days": 1}}, namespace="clusterman_metrics"):
+        main_sweep(sweep_args)
+
+    assert mock_logger.exception.call_count == 0
+    assert mock_logger.error.call_count == 0
+
+
+def test_populate_price_changes():
+    market_1 = InstanceMarket("m4.4xlarge", "us-west-1a")
+    market_2 = InstanceMarket("r4.2xlarge", "us-west-1b")
+    prices = {
+        market_1: [(100, "0.5"), (200, "0.6"), (400, "0.4")],
+        market_2: [(200, "1.5"), (300, "1.2")],
+    }
+
+    def get_metric_values(*args, extra_dimensions, **kwargs):
+        market = InstanceMarket(extra_dimensions["aws_instance_type"], extra_dimensions["aws_availability_zone"])
+        return {"spot_prices": prices[market]}
+
+    simulator = mock.Mock(markets={market_1, market_2})
+    simulator.metrics_client.get_metric_values.side_effect = get_metric_values
+
+    _populate_price_changes(simulator, arrow.get(0), arrow.get(1000), 0.5)
+
+    (events,), __ = simulator.add_event_source.call_args
+    assert [(evt.time, evt.prices) for evt in events] == [
+        (arrow.get(100), {market_1: 0.25}),
+        (arrow.get(200), {market_1: 0.3, market_2: 0.75}),
+        (arrow.get(300), {market_2: 0.6}),
+        (arrow.get(400), {market_1: 0.2}),
+    ]
@@ -0,0 +1,223 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import suppress
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from unittest import mock
+
+import pytest
+
+from clusterman.draining.mesos import down
+from clusterman.draining.mesos import drain
+from clusterman.draining.mesos import get_credentials
+from clusterman.draining.mesos import load_credentials
+from clusterman.draining.mesos import MesosOperatorClient
+from clusterman.draining.mesos import up
+
+
+class StubMesosMaster:
+    """A local HTTP server that answers the operator API calls used for draining, and counts them
+
+    If redirect_to is set, this master isn't the leader, and redirects every request to that one instead.
+    """
+
+    def __init__(self, redirect_to=None, update_latency=0):
+        self.redirect_to = redirect_to
+        self.update_latency = update_latency
+        self.requests = []
+        self.auth_headers = set()
+        self.connections = []
+        self.schedule = {}
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def setup(self):
+                super().setup()
+                stub.connections.append(self.connection)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests.append(request["type"])
+                stub.auth_headers.add(self.headers.get("Authorization"))
+                if stub.redirect_to:
+                    self.send_response(307)
+                    self.send_header("Location", f"//127.0.0.1:{stub.redirect_to.port}{self.path}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                response = {}
+                if request["type"] == "GET_MAINTENANCE_SCHEDULE":
+                    response = {"get_maintenance_schedule": {"schedule": stub.schedule}}
+                elif request["type"] == "UPDATE_MAINTENANCE_SCHEDULE":
+                    time.sleep(stub.update_latency)
+                    stub.schedule = request["update_maintenance_schedule"]["schedule"]
+                body = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for connection in self.connections:  # like the master going away, not just refusing new connections
+            with suppress(OSError):  # already closed
+                connection.shutdown(socket.SHUT_RDWR)
+
+
+@pytest.fixture(autouse=True)
+def clear_credentials_cache():
+    with mock.patch.dict("clusterman.draining.mesos._credentials_cache", clear=True):
+        yield
+
+
+@pytest.fixture
+def leader():
+    leader = StubMesosMaster()
+    yield leader
+    leader.stop()
+
+
+@pytest.fixture
+def secret_path(tmp_path):
+    secret_path = tmp_path / "mesos-secret.json"
+    secret_path.write_text(json.dumps({"principal": "clusterman", "secret": "hunter2"}))
+    return str(secret_path)
+
+
+def test_operator_client_reuses_connection(leader, secret_path):
+    client = MesosOperatorClient("127.0.0.1", secret_path, port=leader.port)
+    for i in range(5):
+        down(client, [f"host{i}|10.1.1.{i}"])
+    up(client, ["host0|10.1.1.0"])
+
+    assert leader.requests == ["START_MAINTENANCE"] * 5 + ["STOP_MAINTENANCE"]
+    assert len(leader.connections) == 1
+    assert len(leader.auth_headers) == 1 and None not in leader.auth_headers
+
+
+def test_operator_client_caches_leader(leader, secret_path):
+    follower = StubMesosMaster(redirect_to=leader)
+    client = MesosOperatorClient("127.0.0.1", secret_path, port=follower.port)
+    for i in range(3):
+        down(client, [f"host{i}|10.1.1.{i}"])
+    follower.stop()
+
+    # only the first request goes through the redirect, and the credentials aren't dropped when it's followed
+    assert follower.requests == ["START_MAINTENANCE"]
+    assert leader.requests == ["START_MAINTENANCE"] * 3
+    assert client.leader_url == f"http://127.0.0.1:{leader.port}"
+    assert None not in leader.auth_headers
+
+
+def test_operator_client_finds_new_leader(leader, secret_path):
+    follower = StubMesosMaster(redirect_to=leader)
+    client = MesosOperatorClient("127.0.0.1", secret_path, port=follower.port)
+    down(client, ["host1|10.1.1.1"])
+
+    leader.stop()
+    new_leader = StubMesosMaster()
+    follower.redirect_to = new_leader
+    down(client, ["host2|10.1.1.2"])
+    follower.stop()
+    new_leader.stop()
+
+    assert follower.requests == ["START_MAINTENANCE"] * 2
+    assert new_leader.requests == ["START_MAINTENANCE"]
+    assert client.leader_url == f"http://127.0.0.1:{new_leader.port}"
+
+
+def test_drain_batches_schedule_updates(leader, secret_path):
+    leader.update_latency = 0.1
+    leader.schedule = {
+        "windows": [
+            {"machine_ids": [{"hostname": "host0", "ip": "10.1.1.0"}, {"hostname": "other", "ip": "10.2.2.2"}]},
+        ]
+    }
+    client = MesosOperatorClient("127.0.0.1", secret_path, port=leader.port)
+    threads = [
+        threading.Thread(target=drain, args=(client, [f"host{i}|10.1.1.{i}"], 1000 + i, 600)) for i in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # each update has to wait for the previous one, so the drains that queue up behind it share the next update
+    num_updates = leader.requests.count("UPDATE_MAINTENANCE_SCHEDULE")
+    assert num_updates < 10
+    assert leader.requests.count("GET_MAINTENANCE_SCHEDULE") == num_updates
+
+    windows = leader.schedule["windows"]
+    assert windows[0]["machine_ids"] == [{"hostname": "other", "ip": "10.2.2.2"}]
+    assert sorted(window["unavailability"]["start"]["nanoseconds"] for window in windows[1:]) == list(
+        range(1000, 1010)
+    )
+    assert sorted(window["machine_ids"][0]["hostname"] for window in windows[1:]) == sorted(
+        f"host{i}" for i in range(10)
+    )
+
+
+def test_get_credentials_reloads_modified_file(secret_path):
+    with mock.patch("clusterman.draining.mesos.load_credentials", wraps=load_credentials) as mock_load_credentials:
+        assert get_credentials(secret_path).principal == "clusterman"
+        assert get_credentials(secret_path).principal == "clusterman"
+        assert mock_load_credentials.call_count == 1
+
+        with open(secret_path, "w") as f:
+            json.dump({"principal": "clusterman2", "secret": "hunter3"}, f)
+        mtime = os.stat(secret_path).st_mtime_ns + 1000000000
+        os.utime(secret_path, ns=(mtime, mtime))
+
+        assert get_credentials(secret_path).principal == "clusterman2"
+        assert mock_load_credentials.call_count == 2
+
+
+def test_concurrent_drains_keep_every_window():
+    schedule = {}
+
+    def operator_client(data):
+        if data["type"] == "GET_MAINTENANCE_SCHEDULE":
+            current = {"windows": [dict(window) for window in schedule.get("windows", [])]}
+            time.sleep(0.01)  # give other drains a chance to read the same schedule
+            return mock.Mock(json=mock.Mock(return_value={"get_maintenance_schedule": {"schedule": current}}))
+        schedule.update(data["update_maintenance_schedule"]["schedule"])
+        return mock.Mock(text="ok")
+
+    threads = [
+        threading.Thread(target=drain, args=(operator_client, [f"host{i}|10.0.0.{i}"], 1000, 2000)) for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    drained_hosts = {machine_id["hostname"] for window in schedule["windows"] for machine_id in window["machine_ids"]}
+    assert drained_hosts == {f"host{i}" for i in range(8)}
@@ -11,13 +11,17 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import json
 import socket
+import threading
+import time
 from unittest import mock
 
 import arrow
 import pytest
 from botocore.exceptions import ClientError
 
+from clusterman.aws.hostname_resolver import HostnameResolver
 from clusterman.aws.spot_fleet_resource_group import SpotFleetResourceGroup
 from clusterman.draining.queue import DrainingClient
 from clusterman.draining.queue import Host
@@ -30,7 +34,8 @@ def mock_draining_client():
     with mock.patch("clusterman.draining.queue.sqs", autospec=True) as mock_sqs:
         mock_sqs.send_message = mock.Mock()
         mock_sqs.receive_message = mock.Mock()
-        mock_sqs.delete_message = mock.Mock()
+        mock_sqs.delete_message_batch = mock.Mock(return_value={})
+        mock_sqs.change_message_visibility_batch = mock.Mock(return_value={})
         return DrainingClient("mesos-test")
 
 
@@ -137,7 +142,7 @@ def test_submit_host_for_draining(mock_draining_client):
         )
 
 
-def test_get_warned_host(mock_draining_client):
+def test_get_warned_hosts(mock_draining_client):
     with mock.patch(
         "clusterman.draining.queue.host_from_instance_id",
         autospec=True,
@@ -150,22 +155,25 @@ def test_get_warned_host(mock_draining_client):
                 }
             ]
         }
-        assert mock_draining_client.get_warned_host() is mock_host_from_instance_id.return_value
+        assert mock_draining_client.get_warned_hosts() == [mock_host_from_instance_id.return_value]
         mock_host_from_instance_id.assert_called_with(
             receipt_handle="rcpt",
             instance_id="i-123",
+            hostname_resolver=mock_draining_client.hostname_resolver,
         )
-        assert not mock_draining_client.client.delete_message.called
+        assert not mock_draining_client.client.delete_message_batch.called
 
         mock_host_from_instance_id.return_value = None
-        assert mock_draining_client.get_warned_host() is None
-        assert mock_draining_client.client.delete_message.called
+        assert mock_draining_client.get_warned_hosts() == []
+        mock_draining_client.client.delete_message_batch.assert_called_once_with(
+            QueueUrl=mock_draining_client.warning_queue_url,
+            Entries=[{"Id": "0", "ReceiptHandle": "rcpt"}],
+        )
 
 
-def test_get_warned_host_no_warning_queue_url(mock_draining_client):
+def test_get_warned_hosts_no_warning_queue_url(mock_draining_client):
     mock_draining_client.warning_queue_url = None
-    host = mock_draining_client.get_warned_host()
-    assert host is None
+    assert mock_draining_client.get_warned_hosts() == []
     assert mock_draining_client.client.receive_message.call_count == 0
 
 
@@ -251,14 +259,14 @@ def test_submit_host_for_termination(mock_draining_client):
         )
 
 
-def test_get_host_to_drain(mock_draining_client):
+def test_get_hosts_to_drain(mock_draining_client):
     now = arrow.now()
     with mock.patch(
         "clusterman.draining.queue.json",
         autospec=True,
     ) as mock_json:
         mock_draining_client.client.receive_message.return_value = {"Messages": []}
-        assert mock_draining_client.get_host_to_drain() is None
+        assert mock_draining_client.get_hosts_to_drain() == []
         mock_draining_client.client.receive_message.return_value = {
             "Messages": [
                 {
@@ -278,33 +286,37 @@ def test_get_host_to_drain(mock_draining_client):
             "draining_start_time": now.for_json(),
         }
 
-        assert mock_draining_client.get_host_to_drain() == Host(
-            sender="clusterman",
-            receipt_handle="receipt_id",
-            instance_id="i123",
-            ip="10.1.1.1",
-            hostname="host123",
-            group_id="sfr123",
-            agent_id="agt123",
-            pool="default",
-            draining_start_time=now.for_json(),
-        )
+        assert mock_draining_client.get_hosts_to_drain() == [
+            Host(
+                sender="clusterman",
+                receipt_handle="receipt_id",
+                instance_id="i123",
+                ip="10.1.1.1",
+                hostname="host123",
+                group_id="sfr123",
+                agent_id="agt123",
+                pool="default",
+                draining_start_time=now.for_json(),
+            )
+        ]
         mock_json.loads.assert_called_with("Helloworld")
         mock_draining_client.client.receive_message.assert_called_with(
             QueueUrl=mock_draining_client.drain_queue_url,
             MessageAttributeNames=["Sender"],
-            MaxNumberOfMessages=1,
+            MaxNumberOfMessages=10,
+            WaitTimeSeconds=mock_draining_client.receive_wait_time_seconds,
+            VisibilityTimeout=mock_draining_client.visibility_timeout_seconds,
         )
 
 
-def test_get_host_to_terminate(mock_draining_client):
+def test_get_hosts_to_terminate(mock_draining_client):
     now = arrow.now()
     with mock.patch(
         "clusterman.draining.queue.json",
         autospec=True,
     ) as mock_json:
         mock_draining_client.client.receive_message.return_value = {"Messages": []}
-        assert mock_draining_client.get_host_to_terminate() is None
+        assert mock_draining_client.get_hosts_to_terminate() == []
         mock_draining_client.client.receive_message.return_value = {
             "Messages": [
                 {
@@ -324,62 +336,60 @@ def test_get_host_to_terminate(mock_draining_client):
             "draining_start_time": now.for_json(),
         }
 
-        assert mock_draining_client.get_host_to_terminate() == Host(
-            sender="clusterman",
-            receipt_handle="receipt_id",
-            instance_id="i123",
-            ip="10.1.1.1",
-            hostname="host123",
-            group_id="sfr123",
-            agent_id="agt123",
-            pool="default",
-            draining_start_time=now.for_json(),
-        )
+        assert mock_draining_client.get_hosts_to_terminate() == [
+            Host(
+                sender="clusterman",
+                receipt_handle="receipt_id",
+                instance_id="i123",
+                ip="10.1.1.1",
+                hostname="host123",
+                group_id="sfr123",
+                agent_id="agt123",
+                pool="default",
+                draining_start_time=now.for_json(),
+            )
+        ]
         mock_json.loads.assert_called_with("Helloworld")
         mock_draining_client.client.receive_message.assert_called_with(
             QueueUrl=mock_draining_client.termination_queue_url,
             MessageAttributeNames=["Sender"],
-            MaxNumberOfMessages=1,
+            MaxNumberOfMessages=10,
+            WaitTimeSeconds=mock_draining_client.receive_wait_time_seconds,
+            VisibilityTimeout=mock_draining_client.visibility_timeout_seconds,
         )
 
 
 def test_delete_drain_message(mock_draining_client):
-    mock_hosts = [
-        mock.Mock(receipt_handle=1),
-        mock.Mock(receipt_handle=2),
-    ]
+    mock_hosts = [mock.Mock(receipt_handle=i) for i in range(12)]
 
     mock_draining_client.delete_drain_messages(mock_hosts)
-    mock_draining_client.client.delete_message.assert_has_calls(
+    mock_draining_client.client.delete_message_batch.assert_has_calls(
         [
             mock.call(
                 QueueUrl=mock_draining_client.drain_queue_url,
-                ReceiptHandle=1,
+                Entries=[{"Id": str(i), "ReceiptHandle": i} for i in range(10)],
             ),
             mock.call(
                 QueueUrl=mock_draining_client.drain_queue_url,
-                ReceiptHandle=2,
+                Entries=[{"Id": "0", "ReceiptHandle": 10}, {"Id": "1", "ReceiptHandle": 11}],
             ),
         ]
     )
 
 
 def test_delete_warning_message(mock_draining_client):
-    mock_hosts = [
-        mock.Mock(receipt_handle=1),
-        mock.Mock(receipt_handle=2),
-    ]
+    mock_hosts = [mock.Mock(receipt_handle=i) for i in range(12)]
 
     mock_draining_client.delete_warning_messages(mock_hosts)
-    mock_draining_client.client.delete_message.assert_has_calls(
+    mock_draining_client.client.delete_message_batch.assert_has_calls(
         [
             mock.call(
                 QueueUrl=mock_draining_client.warning_queue_url,
-                ReceiptHandle=1,
+                Entries=[{"Id": str(i), "ReceiptHandle": i} for i in range(10)],
             ),
             mock.call(
                 QueueUrl=mock_draining_client.warning_queue_url,
-                ReceiptHandle=2,
+                Entries=[{"Id": "0", "ReceiptHandle": 10}, {"Id": "1", "ReceiptHandle": 11}],
             ),
         ]
     )
@@ -388,25 +398,22 @@ def test_delete_warning_message(mock_draining_client):
 def test_delete_warning_message_no_warning_queue_url(mock_draining_client):
     mock_draining_client.warning_queue_url = None
     mock_draining_client.delete_warning_messages(["host"])
-    assert mock_draining_client.client.delete_message.call_count == 0
+    assert mock_draining_client.client.delete_message_batch.call_count == 0
 
 
 def test_delete_terminate_message(mock_draining_client):
-    mock_hosts = [
-        mock.Mock(receipt_handle=1),
-        mock.Mock(receipt_handle=2),
-    ]
+    mock_hosts = [mock.Mock(receipt_handle=i) for i in range(12)]
 
     mock_draining_client.delete_terminate_messages(mock_hosts)
-    mock_draining_client.client.delete_message.assert_has_calls(
+    mock_draining_client.client.delete_message_batch.assert_has_calls(
         [
             mock.call(
                 QueueUrl=mock_draining_client.termination_queue_url,
-                ReceiptHandle=1,
+                Entries=[{"Id": str(i), "ReceiptHandle": i} for i in range(10)],
             ),
             mock.call(
                 QueueUrl=mock_draining_client.termination_queue_url,
-                ReceiptHandle=2,
+                Entries=[{"Id": "0", "ReceiptHandle": 10}, {"Id": "1", "ReceiptHandle": 11}],
             ),
         ]
     )
@@ -417,25 +424,25 @@ def test_process_termination_queue(mock_draining_client):
         "clusterman.draining.queue.down",
         autospec=True,
     ) as mock_down, mock.patch("clusterman.draining.queue.up", autospec=True,) as mock_up, mock.patch(
-        "clusterman.draining.queue.DrainingClient.get_host_to_terminate",
+        "clusterman.draining.queue.DrainingClient.get_hosts_to_terminate",
         autospec=True,
-    ) as mock_get_host_to_terminate, mock.patch(
+    ) as mock_get_hosts_to_terminate, mock.patch(
         "clusterman.draining.queue.DrainingClient.delete_terminate_messages",
         autospec=True,
     ) as mock_delete_terminate_messages:
         mock_mesos_client = mock.Mock()
         mock_kubernetes_client = mock.Mock()
-        mock_get_host_to_terminate.return_value = None
+        mock_get_hosts_to_terminate.return_value = []
         mock_draining_client.process_termination_queue(mock_mesos_client, mock_kubernetes_client)
-        assert mock_draining_client.get_host_to_terminate.called
+        assert mock_draining_client.get_hosts_to_terminate.called
         assert not mock_terminate.called
         assert not mock_delete_terminate_messages.called
 
         mock_host = mock.Mock(hostname="", instance_id="i123")
         mock_draining_client.draining_host_ttl_cache[mock_host.instance_id] = arrow.now()
-        mock_get_host_to_terminate.return_value = mock_host
+        mock_get_hosts_to_terminate.return_value = [mock_host]
         mock_draining_client.process_termination_queue(mock_mesos_client, mock_kubernetes_client)
-        assert mock_draining_client.get_host_to_terminate.called
+        assert mock_draining_client.get_hosts_to_terminate.called
         mock_terminate.assert_called_with(mock_host)
         assert not mock_down.called
         assert not mock_up.called
@@ -443,9 +450,9 @@ def test_process_termination_queue(mock_draining_client):
 
         mock_host = mock.Mock(hostname="host1", ip="10.1.1.1", instance_id="i123", scheduler="mesos")
         mock_draining_client.draining_host_ttl_cache[mock_host.instance_id] = arrow.now()
-        mock_get_host_to_terminate.return_value = mock_host
+        mock_get_hosts_to_terminate.return_value = [mock_host]
         mock_draining_client.process_termination_queue(mock_mesos_client, mock_kubernetes_client)
-        assert mock_draining_client.get_host_to_terminate.called
+        assert mock_draining_client.get_hosts_to_terminate.called
         mock_terminate.assert_called_with(mock_host)
         mock_down.assert_called_with(mock_mesos_client, ["host1|10.1.1.1"])
         mock_up.assert_called_with(mock_mesos_client, ["host1|10.1.1.1"])
@@ -459,9 +466,9 @@ def test_process_termination_queue(mock_draining_client):
             draining_start_time=arrow.now().for_json(),
         )
         mock_draining_client.draining_host_ttl_cache[mock_host.instance_id] = arrow.now()
-        mock_get_host_to_terminate.return_value = mock_host
+        mock_get_hosts_to_terminate.return_value = [mock_host]
         mock_draining_client.process_termination_queue(mock_mesos_client, mock_kubernetes_client)
-        assert mock_draining_client.get_host_to_terminate.called
+        assert mock_draining_client.get_hosts_to_terminate.called
         mock_terminate.assert_called_with(mock_host)
         mock_delete_terminate_messages.assert_called_with(mock_draining_client, [mock_host])
 
@@ -469,15 +476,15 @@ def test_process_termination_queue(mock_draining_client):
 def test_process_drain_queue(mock_draining_client):
     now = arrow.now()
     with mock.patch("clusterman.draining.queue.mesos_drain", autospec=True,) as mock_mesos_drain, mock.patch(
-        "clusterman.draining.queue.k8s_drain",
+        "clusterman.draining.queue.k8s_drain_nodes",
         autospec=True,
-    ) as mock_k8s_drain, mock.patch(
+    ) as mock_k8s_drain_nodes, mock.patch(
         "clusterman.draining.queue.k8s_uncordon",
         autospec=True,
     ) as mock_k8s_uncordon, mock.patch(
-        "clusterman.draining.queue.DrainingClient.get_host_to_drain",
+        "clusterman.draining.queue.DrainingClient.get_hosts_to_drain",
         autospec=True,
-    ) as mock_get_host_to_drain, mock.patch(
+    ) as mock_get_hosts_to_drain, mock.patch(
         "clusterman.draining.queue.DrainingClient.delete_drain_messages",
         autospec=True,
     ) as mock_delete_drain_messages, mock.patch(
@@ -499,14 +506,15 @@ def test_process_drain_queue(mock_draining_client):
         mock_arrow.now = mock.Mock(return_value=mock.Mock(timestamp=1))
         mock_mesos_client = mock.Mock()
         mock_kubernetes_client = mock.Mock()
-        mock_get_host_to_drain.return_value = None
+        mock_k8s_drain_nodes.return_value = {"agt123": True}
+        mock_get_hosts_to_drain.return_value = []
         mock_draining_client.process_drain_queue(mock_mesos_client, mock_kubernetes_client)
-        assert mock_draining_client.get_host_to_drain.called
+        assert mock_draining_client.get_hosts_to_drain.called
         assert not mock_mesos_drain.called
         assert not mock_submit_host_for_termination.called
 
         mock_host = mock.Mock(hostname="")
-        mock_get_host_to_drain.return_value = mock_host
+        mock_get_hosts_to_drain.return_value = [mock_host]
         mock_draining_client.process_drain_queue(mock_mesos_client, mock_kubernetes_client)
         mock_submit_host_for_termination.assert_called_with(mock_draining_client, mock_host, delay=0)
         mock_delete_drain_messages.assert_called_with(mock_draining_client, [mock_host])
@@ -523,9 +531,9 @@ def test_process_drain_queue(mock_draining_client):
             sender="mmb",
             receipt_handle="aaaaa",
         )
-        mock_get_host_to_drain.return_value = mock_host
+        mock_get_hosts_to_drain.return_value = [mock_host]
         mock_draining_client.process_drain_queue(mock_mesos_client, mock_kubernetes_client)
-        assert mock_draining_client.get_host_to_drain.called
+        assert mock_draining_client.get_hosts_to_drain.called
         mock_mesos_drain.assert_called_with(
             mock_mesos_client,
             ["host1|10.1.1.1"],
@@ -549,9 +557,9 @@ def test_process_drain_queue(mock_draining_client):
         )
         mock_mesos_drain.reset_mock()
         mock_submit_host_for_termination.reset_mock()
-        mock_get_host_to_drain.return_value = mock_host
+        mock_get_hosts_to_drain.return_value = [mock_host]
         mock_draining_client.process_drain_queue(mock_mesos_client, mock_kubernetes_client)
-        assert mock_draining_client.get_host_to_drain.called
+        assert mock_draining_client.get_hosts_to_drain.called
         assert not mock_mesos_drain.called
         assert not mock_submit_host_for_termination.called
         mock_delete_drain_messages.assert_called_with(mock_draining_client, [mock_host])
@@ -569,22 +577,22 @@ def test_process_drain_queue(mock_draining_client):
             sender="mmb",
             receipt_handle="aaaaa",
         )
-        mock_get_host_to_drain.return_value = mock_host
+        mock_get_hosts_to_drain.return_value = [mock_host]
         mock_arrow.now.return_value = arrow.get(mock_host.draining_start_time)
         mock_arrow.get.return_value = arrow.get(mock_host.draining_start_time)
         mock_draining_client.process_drain_queue(mock_mesos_client, mock_kubernetes_client)
-        assert mock_draining_client.get_host_to_drain.called
+        assert mock_draining_client.get_hosts_to_drain.called
         assert not mock_submit_host_for_draining.called
         assert not mock_k8s_uncordon.called
-        mock_k8s_drain.assert_called_with(
+        mock_k8s_drain_nodes.assert_called_with(
             mock_kubernetes_client,
-            "agt123",
+            ["agt123"],
             False,
         )
         mock_submit_host_for_termination.assert_called_with(mock_draining_client, mock_host, delay=0)
         mock_delete_drain_messages.assert_called_with(mock_draining_client, [mock_host])
 
-        # test kubernetes scheduler for failed k8s_drain
+        # test kubernetes scheduler for failed k8s_drain_nodes
         mock_host = Host(
             hostname="host1",
             ip="10.1.1.1",
@@ -598,17 +606,17 @@ def test_process_drain_queue(mock_draining_client):
             receipt_handle="aaaaa",
         )
         mock_submit_host_for_termination.reset_mock()
-        mock_k8s_drain.reset_mock()
-        mock_k8s_drain.return_value = False
-        mock_get_host_to_drain.return_value = mock_host
+        mock_k8s_drain_nodes.reset_mock()
+        mock_k8s_drain_nodes.return_value = {"agt123": False}
+        mock_get_hosts_to_drain.return_value = [mock_host]
         mock_arrow.now.return_value = now
         mock_draining_client.process_drain_queue(mock_mesos_client, mock_kubernetes_client)
-        assert mock_k8s_drain.called
+        assert mock_k8s_drain_nodes.called
         assert mock_submit_host_for_draining.called
         assert not mock_k8s_uncordon.called
         mock_delete_drain_messages.assert_called_with(mock_draining_client, [mock_host])
 
-        # test again for same host. let's assume there is no blocks for PDB, then mock_k8s_drain returns true
+        # test again for same host. let's assume there is no blocks for PDB, then the node is drained
         mock_host = Host(
             hostname="host1",
             ip="10.1.1.1",
@@ -622,18 +630,18 @@ def test_process_drain_queue(mock_draining_client):
             receipt_handle="aaaaa",
             attempt=2,
         )
-        mock_k8s_drain.reset_mock()
-        mock_k8s_drain.return_value = True
+        mock_k8s_drain_nodes.reset_mock()
+        mock_k8s_drain_nodes.return_value = {"agt123": True}
         mock_submit_host_for_draining.reset_mock()
-        mock_get_host_to_drain.return_value = mock_host
+        mock_get_hosts_to_drain.return_value = [mock_host]
         mock_arrow.now.return_value = now
         mock_draining_client.process_drain_queue(mock_mesos_client, mock_kubernetes_client)
-        assert mock_draining_client.get_host_to_drain.called
+        assert mock_draining_client.get_hosts_to_drain.called
         assert not mock_submit_host_for_draining.called
         assert not mock_k8s_uncordon.called
-        mock_k8s_drain.assert_called_with(
+        mock_k8s_drain_nodes.assert_called_with(
             mock_kubernetes_client,
-            "agt123",
+            ["agt123"],
             False,
         )
         mock_submit_host_for_termination.assert_called_with(mock_draining_client, mock_host, delay=0)
@@ -653,13 +661,13 @@ def test_process_drain_queue(mock_draining_client):
             receipt_handle="aaaaa",
         )
         mock_submit_host_for_termination.reset_mock()
-        mock_k8s_drain.reset_mock()
+        mock_k8s_drain_nodes.reset_mock()
         mock_submit_host_for_draining.reset_mock()
-        mock_get_host_to_drain.return_value = mock_host
+        mock_get_hosts_to_drain.return_value = [mock_host]
         mock_arrow.now.return_value = arrow.get(mock_host.draining_start_time).shift(hours=100)
         mock_arrow.get.return_value = arrow.get(mock_host.draining_start_time)
         mock_draining_client.process_drain_queue(mock_mesos_client, mock_kubernetes_client)
-        assert not mock_k8s_drain.called
+        assert not mock_k8s_drain_nodes.called
         assert mock_k8s_uncordon.called
         mock_delete_drain_messages.assert_called_with(mock_draining_client, [mock_host])
 
@@ -677,15 +685,15 @@ def test_process_drain_queue(mock_draining_client):
             receipt_handle="aaaaa",
         )
         mock_submit_host_for_termination.reset_mock()
-        mock_k8s_drain.reset_mock()
+        mock_k8s_drain_nodes.reset_mock()
         mock_k8s_uncordon.reset_mock()
         mock_submit_host_for_draining.reset_mock()
-        mock_get_host_to_drain.return_value = mock_host
+        mock_get_hosts_to_drain.return_value = [mock_host]
         mock_arrow.now.return_value = arrow.get(mock_host.draining_start_time).shift(hours=100)
         mock_arrow.get.return_value = arrow.get(mock_host.draining_start_time)
         with mock.patch("clusterman.draining.queue.DEFAULT_FORCE_TERMINATION", new=True):
             mock_draining_client.process_drain_queue(mock_mesos_client, mock_kubernetes_client)
-        assert not mock_k8s_drain.called
+        assert not mock_k8s_drain_nodes.called
         assert not mock_k8s_uncordon.called
         mock_submit_host_for_termination.assert_called_with(mock_draining_client, mock_host, delay=0)
         mock_delete_drain_messages.assert_called_with(mock_draining_client, [mock_host])
@@ -704,16 +712,16 @@ def test_process_drain_queue(mock_draining_client):
             receipt_handle="aaaaa",
         )
         mock_k8s_uncordon.reset_mock()
-        mock_get_host_to_drain.return_value = mock_host
+        mock_get_hosts_to_drain.return_value = [mock_host]
         mock_arrow.now.return_value = arrow.get(mock_host.draining_start_time)
         mock_arrow.get.return_value = arrow.get(mock_host.draining_start_time)
         mock_draining_client.process_drain_queue(mock_mesos_client, mock_kubernetes_client)
-        assert mock_draining_client.get_host_to_drain.called
+        assert mock_draining_client.get_hosts_to_drain.called
         assert not mock_submit_host_for_draining.called
         assert not mock_k8s_uncordon.called
-        mock_k8s_drain.assert_called_with(
+        mock_k8s_drain_nodes.assert_called_with(
             mock_kubernetes_client,
-            "agt123",
+            ["agt123"],
             False,
         )
         mock_submit_host_for_termination.assert_called_with(mock_draining_client, mock_host, delay=0)
@@ -732,17 +740,17 @@ def test_process_drain_queue(mock_draining_client):
             sender="mmb",
             receipt_handle="aaaaa",
         )
-        mock_k8s_drain.reset_mock()
+        mock_k8s_drain_nodes.reset_mock()
         mock_submit_host_for_draining.reset_mock()
-        mock_get_host_to_drain.return_value = mock_host
+        mock_get_hosts_to_drain.return_value = [mock_host]
         mock_arrow.now.return_value = arrow.get(mock_host.draining_start_time)
         mock_arrow.get.return_value = arrow.get(mock_host.draining_start_time)
         mock_host_from_instance_id.return_value = None
         mock_draining_client.process_drain_queue(mock_mesos_client, mock_kubernetes_client)
-        assert mock_draining_client.get_host_to_drain.called
+        assert mock_draining_client.get_hosts_to_drain.called
         assert not mock_submit_host_for_draining.called
         assert not mock_k8s_uncordon.called
-        assert not mock_k8s_drain.called
+        assert not mock_k8s_drain_nodes.called
         #  mock_submit_host_for_termination.assert_called_with(mock_draining_client, mock_host, delay=0)
         mock_delete_drain_messages.assert_called_with(mock_draining_client, [mock_host])
 
@@ -760,17 +768,17 @@ def test_process_drain_queue(mock_draining_client):
             receipt_handle="aaaaa",
         )
 
-        mock_k8s_drain.reset_mock()
+        mock_k8s_drain_nodes.reset_mock()
         mock_submit_host_for_termination.reset_mock()
-        mock_get_host_to_drain.return_value = mock_host
+        mock_get_hosts_to_drain.return_value = [mock_host]
         mock_arrow.now.return_value = arrow.get(mock_host.draining_start_time)
         mock_arrow.get.return_value = arrow.get(mock_host.draining_start_time)
         mock_host_from_instance_id.return_value = mock_host
         mock_draining_client.process_drain_queue(mock_mesos_client, mock_kubernetes_client)
-        assert mock_draining_client.get_host_to_drain.called
+        assert mock_draining_client.get_hosts_to_drain.called
         assert not mock_submit_host_for_draining.called
         assert not mock_k8s_uncordon.called
-        assert not mock_k8s_drain.called
+        assert not mock_k8s_drain_nodes.called
         mock_submit_host_for_termination.assert_called_with(mock_draining_client, mock_host, delay=0)
         mock_delete_drain_messages.assert_called_with(mock_draining_client, [mock_host])
 
@@ -801,17 +809,17 @@ def test_process_drain_queue(mock_draining_client):
             receipt_handle="aaaaa",
         )
 
-        mock_k8s_drain.reset_mock()
+        mock_k8s_drain_nodes.reset_mock()
         mock_submit_host_for_termination.reset_mock()
         mock_submit_host_for_draining.reset_mock()
-        mock_get_host_to_drain.return_value = mock_host
+        mock_get_hosts_to_drain.return_value = [mock_host]
         mock_arrow.now.return_value = arrow.get(mock_host.draining_start_time)
         mock_arrow.get.return_value = arrow.get(mock_host.draining_start_time)
         mock_host_from_instance_id.return_value = mock_host_fresh
         mock_draining_client.process_drain_queue(mock_mesos_client, mock_kubernetes_client)
-        assert mock_draining_client.get_host_to_drain.called
+        assert mock_draining_client.get_hosts_to_drain.called
         assert not mock_k8s_uncordon.called
-        assert not mock_k8s_drain.called
+        assert not mock_k8s_drain_nodes.called
         assert not mock_submit_host_for_termination.called
         mock_submit_host_for_draining.assert_called_with(mock_draining_client, mock_host_fresh, attempt=2)
         mock_delete_drain_messages.assert_called_with(mock_draining_client, [mock_host])
@@ -846,14 +854,14 @@ def test_process_warning_queue(mock_draining_client):
         mock_asg_load_spot.return_value = {}
         mock_get_pools.return_value = ["bar"]
         mock_host = mock.Mock(group_id="sfr-123")
-        mock_draining_client.get_warned_host = mock.Mock(return_value=mock_host)
+        mock_draining_client.get_warned_hosts = mock.Mock(return_value=[mock_host])
         mock_draining_client.process_warning_queue()
         assert not mock_submit_host_for_draining.called
         mock_delete_warning_messages.assert_called_with(mock_draining_client, [mock_host])
 
         mock_srf_load_spot.return_value = {"sfr-123": {}}
         mock_host = mock.Mock(group_id="sfr-123")
-        mock_draining_client.get_warned_host = mock.Mock(return_value=mock_host)
+        mock_draining_client.get_warned_hosts = mock.Mock(return_value=[mock_host])
         mock_draining_client.process_warning_queue()
         mock_submit_host_for_draining.assert_called_with(mock_draining_client, mock_host)
         mock_delete_warning_messages.assert_called_with(mock_draining_client, [mock_host])
@@ -862,7 +870,7 @@ def test_process_warning_queue(mock_draining_client):
         mock_asg_load_spot.return_value = {"sfr-123": {}}
         mock_host = mock.Mock(group_id="sfr-123", agent_id="agt123")
         mock_submit_host_for_draining.reset_mock()
-        mock_draining_client.get_warned_host = mock.Mock(return_value=mock_host)
+        mock_draining_client.get_warned_hosts = mock.Mock(return_value=[mock_host])
         mock_draining_client.process_warning_queue()
         mock_submit_host_for_draining.assert_called_with(mock_draining_client, mock_host)
         mock_delete_warning_messages.assert_called_with(mock_draining_client, [mock_host])
@@ -884,7 +892,11 @@ def test_host_from_instance_id():
         autospec=True,
     ) as mock_ec2_describe, mock.patch("socket.gethostbyaddr", autospec=True,) as mock_gethostbyaddr, mock.patch(
         "clusterman.draining.queue.arrow", autospec=False
-    ) as mock_arrow:
+    ) as mock_arrow, mock.patch(
+        # don't let the shared resolver's cache carry lookups over from one call to the next
+        "clusterman.draining.queue.get_default_hostname_resolver",
+        side_effect=HostnameResolver,
+    ):
         mock_ec2_describe.return_value = []
         assert (
             host_from_instance_id(
@@ -986,3 +998,225 @@ def test_host_from_instance_id():
             )
             is None
         )
+
+
+class FakeSQS:
+    """Just enough of the SQS API for the DrainingClient, keeping every queue in memory"""
+
+    def __init__(self):
+        self.queues = {}
+        self.in_flight = {}
+        self.receive_calls = 0
+        self.visibility_changes = []
+        self._lock = threading.Lock()
+
+    def send_message(self, QueueUrl, MessageBody, MessageAttributes, DelaySeconds=0):
+        with self._lock:
+            message = {
+                "Body": MessageBody,
+                "MessageAttributes": MessageAttributes,
+                "ReceiptHandle": f"rcpt-{len(self.in_flight) + sum(len(q) for q in self.queues.values())}",
+            }
+            self.queues.setdefault(QueueUrl, []).append(message)
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, **kwargs):
+        with self._lock:
+            self.receive_calls += 1
+            queue = self.queues.setdefault(QueueUrl, [])
+            messages, self.queues[QueueUrl] = queue[:MaxNumberOfMessages], queue[MaxNumberOfMessages:]
+            for message in messages:
+                self.in_flight[message["ReceiptHandle"]] = message
+            return {"Messages": messages} if messages else {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        assert len(Entries) <= 10
+        with self._lock:
+            for entry in Entries:
+                del self.in_flight[entry["ReceiptHandle"]]
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        assert len(Entries) <= 10
+        with self._lock:
+            self.visibility_changes.extend(entry["ReceiptHandle"] for entry in Entries)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+
+@pytest.fixture
+def fake_sqs_draining_client():
+    with mock.patch("clusterman.draining.queue.sqs", FakeSQS()):
+        draining_client = DrainingClient("mesos-test")
+    for i in range(40):
+        draining_client.submit_host_for_draining(
+            Host(
+                instance_id=f"i-{i}",
+                hostname=f"host{i}",
+                group_id="asg-1",
+                ip=f"10.1.1.{i}",
+                sender="asg",
+                receipt_handle="",
+                agent_id=f"agt{i}",
+                pool="bar",
+                scheduler="kubernetes",
+                draining_start_time=arrow.now().for_json(),
+            )
+        )
+    return draining_client
+
+
+def test_process_drain_queue_concurrently(fake_sqs_draining_client):
+    fake_sqs = fake_sqs_draining_client.client
+    drain_latency = 0.05
+
+    def slow_drain(kube_operator_client, node_names, disable_eviction):
+        time.sleep(drain_latency)
+        return {node_name: True for node_name in node_names}
+
+    with mock.patch("clusterman.draining.queue.k8s_drain_nodes", side_effect=slow_drain) as mock_k8s_drain_nodes:
+        start = time.time()
+        while fake_sqs_draining_client.process_drain_queue(None, mock.Mock()):
+            pass
+        elapsed = time.time() - start
+
+    # 40 messages in batches of 10, plus one more receive to find out that the queue is empty
+    assert fake_sqs.receive_calls == 5
+    # each batch's nodes are drained together
+    assert [len(call[0][1]) for call in mock_k8s_drain_nodes.call_args_list] == [10] * 4
+    assert elapsed < 40 * drain_latency / 4
+    assert not fake_sqs.queues[fake_sqs_draining_client.drain_queue_url]
+    assert not fake_sqs.in_flight
+    assert len(fake_sqs.queues[fake_sqs_draining_client.termination_queue_url]) == 40
+
+
+def test_process_drain_queue_batches_by_eviction(fake_sqs_draining_client):
+    fake_sqs = fake_sqs_draining_client.client
+    queue = fake_sqs.queues[fake_sqs_draining_client.drain_queue_url][:4]
+    for message in queue[2:]:
+        message["Body"] = json.dumps(
+            {**json.loads(message["Body"]), "termination_reason": TerminationReason.SPOT_INTERRUPTION.value}
+        )
+    fake_sqs.queues[fake_sqs_draining_client.drain_queue_url] = queue
+
+    with mock.patch(
+        "clusterman.draining.queue.k8s_drain_nodes",
+        side_effect=lambda client, node_names, disable_eviction: {node_name: True for node_name in node_names},
+    ) as mock_k8s_drain_nodes:
+        assert fake_sqs_draining_client.process_drain_queue(None, mock.Mock())
+
+    # spot interruptions have their pods deleted rather than evicted, so they're drained separately
+    assert sorted((call[0][2], sorted(call[0][1])) for call in mock_k8s_drain_nodes.call_args_list) == [
+        (False, ["agt0", "agt1"]),
+        (True, ["agt2", "agt3"]),
+    ]
+    assert not fake_sqs.in_flight
+
+
+def test_process_drain_queue_extends_visibility(fake_sqs_draining_client):
+    fake_sqs = fake_sqs_draining_client.client
+    fake_sqs_draining_client.visibility_timeout_seconds = 0.1
+    fake_sqs.queues[fake_sqs_draining_client.drain_queue_url] = fake_sqs.queues[
+        fake_sqs_draining_client.drain_queue_url
+    ][:2]
+
+    def drain(kube_operator_client, node_names, disable_eviction):
+        time.sleep(0.3)
+        return {node_name: True for node_name in node_names}
+
+    with mock.patch("clusterman.draining.queue.k8s_drain_nodes", side_effect=drain):
+        assert fake_sqs_draining_client.process_drain_queue(None, mock.Mock())
+
+    # both hosts are drained in the same batch, so both of their messages needed to be kept invisible
+    assert set(fake_sqs.visibility_changes) == {"rcpt-0", "rcpt-1"}
+    assert not fake_sqs.in_flight
+
+
+def test_process_drain_queue_not_drained(fake_sqs_draining_client):
+    fake_sqs = fake_sqs_draining_client.client
+    fake_sqs.queues[fake_sqs_draining_client.drain_queue_url] = fake_sqs.queues[
+        fake_sqs_draining_client.drain_queue_url
+    ][:3]
+
+    with mock.patch(
+        "clusterman.draining.queue.k8s_drain_nodes",
+        return_value={"agt0": True, "agt1": False, "agt2": True},
+    ):
+        assert fake_sqs_draining_client.process_drain_queue(None, mock.Mock())
+
+    # the host that couldn't be drained is sent back to be re-drained later
+    assert not fake_sqs.in_flight
+    assert len(fake_sqs.queues[fake_sqs_draining_client.termination_queue_url]) == 2
+    (redrain_message,) = fake_sqs.queues[fake_sqs_draining_client.drain_queue_url]
+    assert json.loads(redrain_message["Body"])["agent_id"] == "agt1"
+    assert json.loads(redrain_message["Body"])["attempt"] == 2
+
+
+def test_process_drain_queue_worker_failure(fake_sqs_draining_client):
+    fake_sqs = fake_sqs_draining_client.client
+    fake_sqs.queues[fake_sqs_draining_client.drain_queue_url] = fake_sqs.queues[
+        fake_sqs_draining_client.drain_queue_url
+    ][:3]
+
+    with mock.patch("clusterman.draining.queue.k8s_drain_nodes", side_effect=Exception("something went wrong")):
+        assert fake_sqs_draining_client.process_drain_queue(None, mock.Mock())
+
+    # the batch's messages stay in flight, so SQS will hand them to us again once the visibility timeout expires
+    assert sorted(fake_sqs.in_flight) == ["rcpt-0", "rcpt-1", "rcpt-2"]
+    assert fake_sqs_draining_client.termination_queue_url not in fake_sqs.queues
+
+
+def test_process_drain_queue_duplicates_in_batch(fake_sqs_draining_client):
+    fake_sqs = fake_sqs_draining_client.client
+    queue = fake_sqs.queues[fake_sqs_draining_client.drain_queue_url]
+    fake_sqs.queues[fake_sqs_draining_client.drain_queue_url] = [queue[0], {**queue[0], "ReceiptHandle": "rcpt-dup"}]
+
+    with mock.patch("clusterman.draining.queue.k8s_drain_nodes", return_value={"agt0": True}) as mock_k8s_drain_nodes:
+        assert fake_sqs_draining_client.process_drain_queue(None, mock.Mock())
+
+    assert mock_k8s_drain_nodes.call_args_list == [mock.call(mock.ANY, ["agt0"], False)]
+    assert not fake_sqs.in_flight
+
+
+def test_process_drain_queue_retries_failed_drain(fake_sqs_draining_client):
+    fake_sqs = fake_sqs_draining_client.client
+    fake_sqs.queues[fake_sqs_draining_client.drain_queue_url] = fake_sqs.queues[
+        fake_sqs_draining_client.drain_queue_url
+    ][:2]
+
+    with mock.patch(
+        "clusterman.draining.queue.k8s_drain_nodes",
+        side_effect=[Exception("something went wrong"), {"agt0": True, "agt1": True}],
+    ) as mock_k8s_drain_nodes, mock.patch.object(fake_sqs_draining_client, "duplicate_counter") as mock_duplicates:
+        assert fake_sqs_draining_client.process_drain_queue(None, mock.Mock())
+
+        # the visibility timeout expires and SQS redelivers the messages, which are still on their first attempt
+        fake_sqs.queues[fake_sqs_draining_client.drain_queue_url] = list(fake_sqs.in_flight.values())
+        fake_sqs.in_flight.clear()
+        assert fake_sqs_draining_client.process_drain_queue(None, mock.Mock())
+
+    assert mock_k8s_drain_nodes.call_count == 2
+    assert mock_duplicates.count.call_count == 0
+    assert not fake_sqs.in_flight
+    assert len(fake_sqs.queues[fake_sqs_draining_client.termination_queue_url]) == 2
+
+
+def test_process_drain_queue_retries_failed_worker(fake_sqs_draining_client):
+    fake_sqs = fake_sqs_draining_client.client
+    fake_sqs.queues[fake_sqs_draining_client.drain_queue_url] = fake_sqs.queues[
+        fake_sqs_draining_client.drain_queue_url
+    ][:1]
+
+    with mock.patch(
+        "clusterman.draining.queue.k8s_drain_nodes", return_value={"agt0": True}
+    ) as mock_k8s_drain_nodes, mock.patch.object(
+        fake_sqs_draining_client, "_emit_draining_metrics", side_effect=[Exception("something went wrong"), None]
+    ):
+        assert fake_sqs_draining_client.process_drain_queue(None, mock.Mock())
+        assert sorted(fake_sqs.in_flight) == ["rcpt-0"]
+
+        fake_sqs.queues[fake_sqs_draining_client.drain_queue_url] = list(fake_sqs.in_flight.values())
+        fake_sqs.in_flight.clear()
+        assert fake_sqs_draining_client.process_drain_queue(None, mock.Mock())
+
+    assert mock_k8s_drain_nodes.call_args_list == [mock.call(mock.ANY, ["agt0"], False)]
+    assert not fake_sqs.in_flight
+    assert len(fake_sqs.queues[fake_sqs_draining_client.termination_queue_url]) == 1
@@ -1,3 +1,5 @@
+import threading
+import time
 from unittest import mock
 
 import arrow
@@ -11,6 +13,24 @@ from clusterman.exceptions import MetricsError
 from clusterman.interfaces.signal import get_metrics_for_signal
 
 
+class FakeMetricsClient:
+    """Returns canned timeseries for each (metric name, dimensions) pair after a fixed delay"""
+
+    def __init__(self, timeseries, latency=0, thread_safe=True):
+        self.timeseries = timeseries
+        self.latency = latency
+        self.thread_safe = thread_safe
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get_metric_values(self, metric_query, metric_type, time_start, time_end, **kwargs):
+        with self._lock:
+            self.calls.append(mock.call(metric_query, metric_type, time_start, time_end, **kwargs))
+        time.sleep(self.latency)
+        dims = tuple(sorted(kwargs["extra_dimensions"].items()))
+        return self.timeseries.get((metric_query, dims), {})
+
+
 @pytest.mark.parametrize("end_time", [arrow.get(3600), arrow.get(10000), arrow.get(35000)])
 def test_get_metrics(end_time):
 
@@ -18,14 +38,16 @@ def test_get_metrics(end_time):
         "autoscale_signal.required_metrics",
         namespace="bar.mesos_config",
     )
-    metrics_client = mock.Mock()
-    metrics_client.get_metric_values.side_effect = [
-        {"cpus_allocated": [(1, 2), (3, 4)]},
-        {"cpus_allocated": [(5, 6), (7, 8)]},
-        {"app1,cost": [(1, 2.5), (3, 4.5)]},
-    ]
+    metrics_client = FakeMetricsClient(
+        {
+            ("cpus_allocated", (("cluster", "foo"), ("pool", "bar"))): {"cpus_allocated": [(1, 2), (5, 6)]},
+            ("cpus_allocated", (("cluster", "foo"), ("pool", "bar.mesos"))): {"cpus_allocated": [(3, 4), (7, 8)]},
+            ("cost", ()): {"app1,cost": [(1, 2.5), (3, 4.5)]},
+        }
+    )
     metrics = get_metrics_for_signal("foo", "bar", "mesos", "app1", metrics_client, required_metrics, end_time)
-    assert metrics_client.get_metric_values.call_args_list == [
+    assert len(metrics_client.calls) == 3
+    for expected_call in [
         mock.call(
             "cpus_allocated",
             SYSTEM_METRICS,
@@ -53,9 +75,67 @@ def test_get_metrics(end_time):
             extra_dimensions={},
             is_regex=False,
         ),
+    ]:
+        assert expected_call in metrics_client.calls
+    assert metrics == {
+        "cpus_allocated": [(1, 2), (3, 4), (5, 6), (7, 8)],
+        "app1,cost": [(1, 2.5), (3, 4.5)],
+    }
+
+
+def test_get_metrics_deduplicated():
+    required_metrics = [
+        {"name": "cpus_allocated", "type": SYSTEM_METRICS, "minute_range": 10},
+        {"name": "cpus_allocated", "type": SYSTEM_METRICS, "minute_range": 10},
+        {"name": "cpus_allocated", "type": SYSTEM_METRICS, "minute_range": 20},
     ]
-    assert "cpus_allocated" in metrics
-    assert "app1,cost" in metrics
+    end_time = mock.Mock(timestamp=3600)
+    end_time.shift.side_effect = lambda minutes: mock.Mock(timestamp=3600 + minutes * 60)
+    metrics_client = FakeMetricsClient({})
+    get_metrics_for_signal("foo", "bar", "kubernetes", "app1", metrics_client, required_metrics, end_time)
+    assert len(metrics_client.calls) == 2
+
+
+def test_get_metrics_merges_identical_timestamps_in_query_order():
+    required_metrics = [{"name": "cpus_allocated", "type": SYSTEM_METRICS, "minute_range": 10}]
+    metrics_client = FakeMetricsClient(
+        {
+            ("cpus_allocated", (("cluster", "foo"), ("pool", "bar"))): {"cpus_allocated": [(1, {"old": 1})]},
+            ("cpus_allocated", (("cluster", "foo"), ("pool", "bar.mesos"))): {"cpus_allocated": [(1, {"new": 1})]},
+        }
+    )
+    metrics = get_metrics_for_signal("foo", "bar", "mesos", "app1", metrics_client, required_metrics, arrow.get(3600))
+    assert metrics == {"cpus_allocated": [(1, {"old": 1}), (1, {"new": 1})]}
+
+
+def test_get_metrics_concurrently():
+    required_metrics = [
+        {"name": f"metric{i}", "type": APP_METRICS, "minute_range": 10, "regex": False} for i in range(8)
+    ]
+    metrics_client = FakeMetricsClient({(f"metric{i}", ()): {f"metric{i}": [(i, i)]} for i in range(8)}, latency=0.1)
+
+    start = time.time()
+    metrics = get_metrics_for_signal(
+        "foo", "bar", "kubernetes", "app1", metrics_client, required_metrics, arrow.get(3600), max_workers=8
+    )
+    assert time.time() - start < 8 * metrics_client.latency / 2
+    assert metrics == {f"metric{i}": [(i, i)] for i in range(8)}
+
+
+def test_get_metrics_not_thread_safe():
+    required_metrics = [
+        {"name": f"metric{i}", "type": APP_METRICS, "minute_range": 10, "regex": False} for i in range(8)
+    ]
+    metrics_client = FakeMetricsClient(
+        {(f"metric{i}", ()): {f"metric{i}": [(i, i)]} for i in range(8)}, thread_safe=False
+    )
+
+    with mock.patch("clusterman.interfaces.signal.ThreadPoolExecutor") as mock_executor:
+        metrics = get_metrics_for_signal(
+            "foo", "bar", "kubernetes", "app1", metrics_client, required_metrics, arrow.get(3600), max_workers=8
+        )
+    assert mock_executor.call_count == 0
+    assert metrics == {f"metric{i}": [(i, i)] for i in range(8)}
 
 
 def test_get_metadata_metrics():
@@ -0,0 +1,176 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from unittest import mock
+
+import pytest
+from kubernetes.client import V1ListMeta
+from kubernetes.client import V1ObjectMeta
+from kubernetes.client import V1Pod
+from kubernetes.client import V1PodList
+from kubernetes.client import V1PodStatus
+from kubernetes.client.rest import ApiException
+
+from clusterman.kubernetes.informer import ResourceInformer
+from clusterman.kubernetes.informer import ResourceVersionExpired
+
+
+def _pod(name, host_ip, phase="Running", resource_version="1"):
+    return V1Pod(
+        metadata=V1ObjectMeta(name=name, namespace="paasta", resource_version=resource_version),
+        status=V1PodStatus(phase=phase, host_ip=host_ip),
+    )
+
+
+class FakeWatch:
+    """Stands in for kubernetes.watch.Watch().stream; each call replays the next batch of events"""
+
+    def __init__(self, *batches):
+        self.batches = list(batches)
+        self.calls = []
+
+    def __call__(self, list_fn, **kwargs):
+        self.calls.append(kwargs)
+        batch = self.batches.pop(0) if self.batches else []
+        for event in batch:
+            if isinstance(event, Exception):
+                raise event
+            yield event
+
+
+def _event(event_type, obj):
+    return {"type": event_type, "object": obj, "raw_object": {}}
+
+
+def _expired_event():
+    return {"type": "ERROR", "object": None, "raw_object": {"kind": "Status", "code": 410, "message": "too old"}}
+
+
+@pytest.fixture
+def mock_list_fn():
+    list_fn = mock.Mock(__name__="list_pod_for_all_namespaces")
+    list_fn.return_value = V1PodList(
+        items=[_pod("pod1", "10.0.0.1"), _pod("pod2", "10.0.0.1"), _pod("pod3", None, phase="Pending")],
+        metadata=V1ListMeta(resource_version="10"),
+    )
+    return list_fn
+
+
+@pytest.fixture
+def indexers():
+    return {
+        "node_ip": lambda pod: pod.status.host_ip,
+        "phase": lambda pod: pod.status.phase,
+    }
+
+
+def _names(pods):
+    return sorted(pod.metadata.name for pod in pods)
+
+
+def test_relist(mock_list_fn, indexers):
+    informer = ResourceInformer(mock_list_fn, indexers, watch_fn=FakeWatch(), label_selector="foo=bar")
+    informer.relist()
+    snapshot = informer.snapshot()
+
+    mock_list_fn.assert_called_once_with(label_selector="foo=bar")
+    assert snapshot.resource_version == "10"
+    assert {ip: _names(pods) for ip, pods in snapshot.indexes["node_ip"].items()} == {"10.0.0.1": ["pod1", "pod2"]}
+    assert _names(snapshot.indexes["phase"]["Pending"]) == ["pod3"]
+
+
+def test_watch_applies_events(mock_list_fn, indexers):
+    fake_watch = FakeWatch(
+        [
+            _event("ADDED", _pod("pod4", "10.0.0.2", resource_version="11")),
+            _event("MODIFIED", _pod("pod3", "10.0.0.2", resource_version="12")),
+            _event("DELETED", _pod("pod1", "10.0.0.1", resource_version="13")),
+            _event("BOOKMARK", V1Pod(metadata=V1ObjectMeta(resource_version="14"))),
+        ]
+    )
+    informer = ResourceInformer(mock_list_fn, indexers, watch_fn=fake_watch, watch_timeout_seconds=30)
+    informer.relist()
+    first_snapshot = informer.snapshot()
+    informer.watch()
+    second_snapshot = informer.snapshot()
+
+    assert fake_watch.calls == [{"resource_version": "10", "timeout_seconds": 30}]
+    assert second_snapshot.resource_version == "14"
+    assert {ip: _names(pods) for ip, pods in second_snapshot.indexes["node_ip"].items()} == {
+        "10.0.0.1": ["pod2"],
+        "10.0.0.2": ["pod3", "pod4"],
+    }
+    assert list(second_snapshot.indexes["phase"]) == ["Running"]
+    assert _names(second_snapshot.indexes["phase"]["Running"]) == ["pod2", "pod3", "pod4"]
+
+    # the earlier snapshot is unaffected by the events
+    assert {ip: _names(pods) for ip, pods in first_snapshot.indexes["node_ip"].items()} == {
+        "10.0.0.1": ["pod1", "pod2"]
+    }
+
+
+def test_snapshot_reuses_unchanged_buckets(mock_list_fn, indexers):
+    fake_watch = FakeWatch([_event("ADDED", _pod("pod4", "10.0.0.2", resource_version="11"))])
+    informer = ResourceInformer(mock_list_fn, indexers, watch_fn=fake_watch)
+    informer.relist()
+    first_snapshot = informer.snapshot()
+    informer.watch()
+    second_snapshot = informer.snapshot()
+
+    assert second_snapshot.indexes["node_ip"]["10.0.0.1"] is first_snapshot.indexes["node_ip"]["10.0.0.1"]
+    assert second_snapshot.indexes["phase"]["Pending"] is first_snapshot.indexes["phase"]["Pending"]
+
+
+@pytest.mark.parametrize("error", [_expired_event(), ApiException(status=410, reason="Gone")])
+def test_watch_expired(mock_list_fn, indexers, error):
+    fake_watch = FakeWatch([_event("ADDED", _pod("pod4", "10.0.0.2", resource_version="11")), error])
+    informer = ResourceInformer(mock_list_fn, indexers, watch_fn=fake_watch)
+    informer.relist()
+    with pytest.raises(ResourceVersionExpired):
+        informer.watch()
+
+
+def test_watch_error(mock_list_fn, indexers):
+    error_event = {"type": "ERROR", "object": None, "raw_object": {"kind": "Status", "code": 500}}
+    informer = ResourceInformer(mock_list_fn, indexers, watch_fn=FakeWatch([error_event]))
+    informer.relist()
+    with pytest.raises(ApiException):
+        informer.watch()
+
+
+def test_relist_on_expired(mock_list_fn, indexers):
+    mock_list_fn.side_effect = [
+        mock_list_fn.return_value,
+        V1PodList(
+            items=[_pod("pod1", "10.0.0.1"), _pod("pod2", "10.0.0.1")], metadata=V1ListMeta(resource_version="20")
+        ),
+    ]
+    fake_watch = FakeWatch(
+        [_event("ADDED", _pod("pod4", "10.0.0.2", resource_version="11")), _expired_event()],
+        [_event("DELETED", _pod("pod2", "10.0.0.1", resource_version="21"))],
+    )
+
+    def watch_then_stop(list_fn, **kwargs):
+        yield from fake_watch(list_fn, **kwargs)
+        if not fake_watch.batches:
+            informer.stop()
+
+    informer = ResourceInformer(mock_list_fn, indexers, watch_fn=watch_then_stop)
+    informer.relist()
+    informer._run()
+    snapshot = informer.snapshot()
+
+    assert mock_list_fn.call_count == 2
+    assert [call["resource_version"] for call in fake_watch.calls] == ["10", "20"]
+    assert snapshot.resource_version == "21"
+    assert {ip: _names(pods) for ip, pods in snapshot.indexes["node_ip"].items()} == {"10.0.0.1": ["pod1"]}
@@ -11,11 +11,14 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import threading
+import time
 from unittest import mock
 
 import arrow
 import pytest
 from kubernetes.client import V1Container
+from kubernetes.client import V1NodeSpec
 from kubernetes.client import V1NodeStatus
 from kubernetes.client import V1ObjectMeta
 from kubernetes.client import V1OwnerReference
@@ -32,10 +35,12 @@ from kubernetes.client.models.v1_node_selector import V1NodeSelector
 from kubernetes.client.models.v1_node_selector_requirement import V1NodeSelectorRequirement
 from kubernetes.client.models.v1_node_selector_term import V1NodeSelectorTerm
 from kubernetes.client.models.v1_preferred_scheduling_term import V1PreferredSchedulingTerm
+from kubernetes.client.rest import ApiException
 from staticconf.testing import PatchConfiguration
 
 from clusterman.config import POOL_NAMESPACE
 from clusterman.interfaces.types import AgentState
+from clusterman.kubernetes.informer import ResourceInformer
 from clusterman.kubernetes.kubernetes_cluster_connector import KubernetesClusterConnector
 from clusterman.migration.event import MigrationCondition
 from clusterman.migration.event import MigrationEvent
@@ -342,7 +347,7 @@ def mock_cluster_connector(
                 ),
             ),
             KubernetesNode(
-                metadata=V1ObjectMeta(name="node2", labels={"clusterman.com/pool": "bar"}),
+                metadata=V1ObjectMeta(name="node3", labels={"clusterman.com/pool": "bar"}),
                 status=V1NodeStatus(
                     allocatable={"cpu": "1"},
                     capacity={"cpu": "8"},
@@ -393,6 +398,25 @@ def test_get_agent_metadata(mock_cluster_connector, ip_address, expected_state):
         assert agent_metadata.state == expected_state
 
 
+@pytest.mark.parametrize(
+    "ip_address,expected_state",
+    [
+        (None, AgentState.UNKNOWN),
+        ("1.2.3.4", AgentState.ORPHANED),
+        ("10.10.10.1", AgentState.IDLE),
+        ("10.10.10.2", AgentState.RUNNING),
+    ],
+)
+def test_get_agent_state(mock_cluster_connector, ip_address, expected_state):
+    with PatchConfiguration(
+        {"exclude_daemonset_pods": True},
+        namespace=POOL_NAMESPACE.format(pool=mock_cluster_connector.pool, scheduler=mock_cluster_connector.SCHEDULER),
+    ):
+        mock_cluster_connector.reload_state()
+        assert mock_cluster_connector.get_agent_state(ip_address) == expected_state
+        assert mock_cluster_connector.get_agent_metadata(ip_address).state == expected_state
+
+
 def test_get_nodes_by_ip(mock_cluster_connector):
     mock_cluster_connector._core_api.list_node.reset_mock()
     mock_cluster_connector.set_label_selectors(["foobar.clusterman.com/something=stuff"], add_to_existing=True)
@@ -440,6 +464,12 @@ def test_pending_cpus(mock_cluster_connector):
     assert mock_cluster_connector.get_resource_pending("cpus") == 1.5
 
 
+def test_get_cluster_resources(mock_cluster_connector):
+    assert mock_cluster_connector.get_cluster_allocated_resources().cpus == 10.5
+    assert mock_cluster_connector.get_cluster_total_resources().cpus == 11.5
+    assert mock_cluster_connector.get_cluster_pending_resources().cpus == 1.5
+
+
 def test_pod_belongs_to_daemonset(mock_cluster_connector, running_pod_1, daemonset_pod_1):
     assert not mock_cluster_connector._pod_belongs_to_daemonset(running_pod_1)
     assert mock_cluster_connector._pod_belongs_to_daemonset(daemonset_pod_1)
@@ -558,3 +588,216 @@ def test_has_enough_capacity_for_pods(mock_cluster_connector, unschedulable, exp
     with mock.patch.object(mock_cluster_connector, "get_unschedulable_pods") as mock_get_unsched:
         mock_get_unsched.return_value = unschedulable
         assert mock_cluster_connector.has_enough_capacity_for_pods() is expected
+
+
+def test_reload_state_with_informers(mock_cluster_connector):
+    def pod_names(pods_by_ip):
+        return {ip: sorted(pod.metadata.name for pod in pods) for ip, pods in pods_by_ip.items() if pods}
+
+    expected_nodes_by_ip = mock_cluster_connector._nodes_by_ip
+    expected_pods_by_ip = pod_names(mock_cluster_connector._pods_by_ip)
+    expected_unschedulable_pods = mock_cluster_connector._unschedulable_pods
+    expected_allocation = mock_cluster_connector.get_resource_allocation("cpus")
+    expected_pending = mock_cluster_connector.get_resource_pending("cpus")
+
+    mock_core_api = mock_cluster_connector._core_api
+    mock_core_api.list_node.reset_mock()
+    mock_core_api.list_pod_for_all_namespaces.reset_mock()
+    with mock.patch(
+        "clusterman.kubernetes.kubernetes_cluster_connector.KubeApiClientWrapper",
+        return_value=mock_core_api,
+    ), mock.patch.object(ResourceInformer, "start", ResourceInformer.relist), mock.patch.object(
+        ResourceInformer, "is_alive", return_value=True
+    ):
+        mock_cluster_connector._informers_enabled = True
+        mock_cluster_connector.reload_state()
+        mock_cluster_connector.reload_state()
+
+    # the informers only list once, and then follow the watch streams
+    assert mock_core_api.list_node.call_count == 1
+    assert mock_core_api.list_pod_for_all_namespaces.call_count == 1
+    assert mock_cluster_connector._nodes_by_ip == expected_nodes_by_ip
+    assert pod_names(mock_cluster_connector._pods_by_ip) == expected_pods_by_ip
+    assert mock_cluster_connector._unschedulable_pods == expected_unschedulable_pods
+    assert mock_cluster_connector.get_resource_allocation("cpus") == expected_allocation
+    assert mock_cluster_connector.get_resource_pending("cpus") == expected_pending
+    assert mock_cluster_connector.get_num_removed_nodes_before_last_reload() == 0
+
+
+def test_reload_state_with_informers_exclude_daemonset_pods(mock_cluster_connector, daemonset_pod_1):
+    with mock.patch(
+        "clusterman.kubernetes.kubernetes_cluster_connector.KubeApiClientWrapper",
+        return_value=mock_cluster_connector._core_api,
+    ), mock.patch.object(ResourceInformer, "start", ResourceInformer.relist), mock.patch.object(
+        ResourceInformer, "is_alive", return_value=True
+    ), mock.patch.object(
+        mock_cluster_connector, "_list_all_pods_on_node", return_value=[daemonset_pod_1]
+    ):
+        mock_cluster_connector._informers_enabled = True
+        mock_cluster_connector.reload_state()
+        pod_informer = mock_cluster_connector._pod_informer
+        assert daemonset_pod_1 in mock_cluster_connector._pods_by_ip["10.10.10.1"]
+
+        # the existing informer is kept, but the new setting applies to it
+        with PatchConfiguration(
+            {"exclude_daemonset_pods": True},
+            namespace=POOL_NAMESPACE.format(
+                pool=mock_cluster_connector.pool, scheduler=mock_cluster_connector.SCHEDULER
+            ),
+        ):
+            mock_cluster_connector.reload_state()
+        assert mock_cluster_connector._pod_informer is pod_informer
+        assert daemonset_pod_1 not in mock_cluster_connector._pods_by_ip["10.10.10.1"]
+        assert mock_cluster_connector.get_resource_allocation("cpus") == 6
+
+
+class FakeCoreV1Api:
+    """Just enough of the CoreV1Api to drain nodes, with some latency and PodDisruptionBudget rejections"""
+
+    def __init__(self, nodes, pods_by_node, pdb_rejections=None, latency=0.01):
+        self.nodes = {node.metadata.name: node for node in nodes}
+        self.pods_by_node = pods_by_node
+        self.pdb_rejections = dict(pdb_rejections or {})  # pod name -> how many times its eviction is rejected
+        self.latency = latency
+        self.patched_nodes = {}
+        self.removed_pods = []
+        self.read_node = mock.Mock(side_effect=self._read_node)
+        self.list_pod_for_all_namespaces = mock.Mock(side_effect=self._list_pod_for_all_namespaces)
+        self._lock = threading.Lock()
+
+    def _read_node(self, name):
+        time.sleep(self.latency)
+        return self.nodes.get(name)
+
+    def patch_node(self, name, body):
+        time.sleep(self.latency)
+        resource_version = body.get("metadata", {}).get("resourceVersion")
+        if resource_version and resource_version != self.nodes[name].metadata.resource_version:
+            raise ApiException(status=409, reason="Conflict")
+        with self._lock:
+            self.patched_nodes[name] = body
+
+    def _list_pod_for_all_namespaces(self, field_selector):
+        time.sleep(self.latency)
+        return mock.Mock(items=self.pods_by_node[field_selector.split("=")[1]])
+
+    def create_namespaced_pod_eviction(self, name, namespace, body):
+        time.sleep(self.latency)
+        with self._lock:
+            if self.pdb_rejections.get(name, 0) > 0:
+                self.pdb_rejections[name] -= 1
+                raise ApiException(status=429, reason="Too Many Requests")
+            self.removed_pods.append(name)
+
+    def delete_namespaced_pod(self, name, namespace, propagation_policy):
+        time.sleep(self.latency)
+        with self._lock:
+            self.removed_pods.append(name)
+
+
+def _make_drain_pod(name, daemonset=False):
+    owner_references = (
+        [V1OwnerReference(kind="DaemonSet", api_version="foo", name="daemonset", uid="bar")] if daemonset else None
+    )
+    return V1Pod(metadata=V1ObjectMeta(name=name, namespace="paasta", owner_references=owner_references))
+
+
+@pytest.fixture
+def drain_pods_by_node():
+    return {
+        f"node{i}": [_make_drain_pod(f"node{i}-pod{j}") for j in range(5)]
+        + [_make_drain_pod(f"node{i}-daemonset", daemonset=True)]
+        for i in range(1, 4)
+    }
+
+
+@pytest.fixture
+def fake_core_api(mock_cluster_connector, drain_pods_by_node):
+    nodes = [
+        KubernetesNode(metadata=V1ObjectMeta(name=f"node{i}", resource_version="5"), spec=V1NodeSpec())
+        for i in range(1, 4)
+    ]
+    mock_cluster_connector._core_api = FakeCoreV1Api(nodes, drain_pods_by_node, pdb_rejections={"node1-pod0": 2})
+    mock_cluster_connector._pods_loaded = False  # list the pods from the fake API, rather than the last reload
+    with mock.patch("clusterman.kubernetes.kubernetes_cluster_connector.EVICTION_RETRY_BACKOFF_SECONDS", 0.01):
+        yield mock_cluster_connector._core_api
+
+
+def _drainable_pod_names(pods_by_node, node_names):
+    return sorted(pod.metadata.name for node_name in node_names for pod in pods_by_node[node_name][:-1])
+
+
+@pytest.mark.parametrize("disable_eviction", [True, False])
+def test_drain_nodes(mock_cluster_connector, fake_core_api, drain_pods_by_node, disable_eviction):
+    node_names = ["node1", "node2", "node3"]
+    assert mock_cluster_connector.drain_nodes(node_names, disable_eviction) == {name: True for name in node_names}
+
+    # node1-pod0's evictions are retried until the PodDisruptionBudget allows them (deletes don't care)
+    assert fake_core_api.pdb_rejections["node1-pod0"] == (2 if disable_eviction else 0)
+    assert sorted(fake_core_api.removed_pods) == _drainable_pod_names(drain_pods_by_node, node_names)
+    assert set(fake_core_api.patched_nodes) == set(node_names)
+    for body in fake_core_api.patched_nodes.values():
+        assert body["spec"]["taints"][0]["key"] == "clusterman.yelp.com/terminating"
+
+
+def test_drain_nodes_deadline(mock_cluster_connector, fake_core_api, drain_pods_by_node):
+    fake_core_api.pdb_rejections["node1-pod0"] = 1000
+    mock_cluster_connector._drain_timeout_seconds = 0.1
+
+    assert mock_cluster_connector.drain_nodes(["node1", "node2"], False) == {"node1": False, "node2": True}
+    assert "node1-pod0" not in fake_core_api.removed_pods
+    assert len(fake_core_api.removed_pods) == 9
+
+
+def test_drain_nodes_with_loaded_pods(mock_cluster_connector, fake_core_api, drain_pods_by_node):
+    pods_by_node = {"node1": drain_pods_by_node["node1"][1:]}
+
+    assert mock_cluster_connector.drain_nodes(["node1", "node2"], True, pods_by_node) == {"node1": True, "node2": True}
+    assert fake_core_api.list_pod_for_all_namespaces.call_args_list == [mock.call(field_selector="spec.nodeName=node2")]
+    assert "node1-pod0" not in fake_core_api.removed_pods
+
+
+def test_drain_nodes_with_reloaded_pods(mock_cluster_connector, fake_core_api):
+    mock_cluster_connector._pods_loaded = True
+    loaded_pod_names = sorted(
+        pod.metadata.name
+        for ip in ["10.10.10.2", "10.10.10.3"]
+        for pod in mock_cluster_connector._pods_by_ip[ip]
+        if not mock_cluster_connector._pod_belongs_to_daemonset(pod)
+    )
+
+    assert mock_cluster_connector.drain_nodes(["node2", "node3"], True) == {"node2": True, "node3": True}
+    assert fake_core_api.list_pod_for_all_namespaces.call_count == 0
+    assert sorted(fake_core_api.removed_pods) == loaded_pod_names
+
+
+def test_drain_nodes_concurrently(mock_cluster_connector, fake_core_api, drain_pods_by_node):
+    fake_core_api.latency = 0.05
+    fake_core_api.pdb_rejections = {}
+
+    start = time.monotonic()
+    mock_cluster_connector.drain_nodes(["node1", "node2", "node3"], False)
+
+    # 3 nodes * (read, patch, list, 5 evictions) would take 1.2s one at a time
+    assert time.monotonic() - start < 0.6
+
+
+def test_drain_node(mock_cluster_connector, fake_core_api):
+    assert mock_cluster_connector.drain_node("node2", False)
+    assert sorted(fake_core_api.removed_pods) == [f"node2-pod{j}" for j in range(5)]
+
+
+def test_cordon_node_with_loaded_node(mock_cluster_connector, fake_core_api):
+    loaded_node = fake_core_api.nodes["node1"]
+
+    assert mock_cluster_connector.cordon_node("node1", loaded_node)
+    assert fake_core_api.read_node.call_count == 0
+    assert fake_core_api.patched_nodes["node1"]["metadata"] == {"resourceVersion": "5"}
+
+
+def test_cordon_node_with_stale_loaded_node(mock_cluster_connector, fake_core_api):
+    stale_node = KubernetesNode(metadata=V1ObjectMeta(name="node1", resource_version="4"), spec=V1NodeSpec())
+
+    assert mock_cluster_connector.cordon_node("node1", stale_node)
+    assert fake_core_api.read_node.call_args_list == [mock.call("node1")]
+    assert "metadata" not in fake_core_api.patched_nodes["node1"]
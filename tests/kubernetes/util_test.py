@@ -3,15 +3,28 @@ from argparse import Namespace
 from unittest import mock
 
 import pytest
+from humanfriendly import parse_size
+from kubernetes.client import V1Container
+from kubernetes.client import V1Node
+from kubernetes.client import V1NodeStatus
+from kubernetes.client import V1ObjectMeta
+from kubernetes.client import V1Pod
+from kubernetes.client import V1PodSpec
+from kubernetes.client import V1ResourceRequirements
 from kubernetes.client.models.v1_node_selector_requirement import V1NodeSelectorRequirement
 from kubernetes.client.models.v1_node_selector_term import V1NodeSelectorTerm
 
+from clusterman.kubernetes.util import _parse_bytes
+from clusterman.kubernetes.util import _total_pod_resources
 from clusterman.kubernetes.util import CachedCoreV1Api
 from clusterman.kubernetes.util import ConciseCRDApi
 from clusterman.kubernetes.util import get_node_kernel_version
 from clusterman.kubernetes.util import get_node_lsbrelease
 from clusterman.kubernetes.util import ResourceParser
 from clusterman.kubernetes.util import selector_term_matches_requirement
+from clusterman.kubernetes.util import total_node_resources
+from clusterman.kubernetes.util import total_pod_resources
+from clusterman.util import ClustermanResources
 
 
 @pytest.fixture
@@ -73,6 +86,13 @@ def test_resource_parser_mem():
     assert ResourceParser.mem({"memory": "1000000000m"}) == 1.0
 
 
+@pytest.mark.parametrize(
+    "quantity", ["0", "123", "1.5", "128974848", "129M", "123Mi", "1.5Gi", "2G", "64k", "1Ki", "5Ti", "100MB", "1GiB"]
+)
+def test_parse_bytes_matches_humanfriendly(quantity):
+    assert _parse_bytes(quantity) == parse_size(quantity)
+
+
 def test_resource_parser_disk():
     assert ResourceParser.disk({"ephemeral-storage": "1Gi"}) == 1000.0
 
@@ -86,6 +106,41 @@ def test_resource_parser_gpus_non_integer():
         ResourceParser.gpus({"nvidia.com/gpu": "3.5"})
 
 
+def _pod(uid, resource_version, cpu):
+    return V1Pod(
+        metadata=V1ObjectMeta(uid=uid, resource_version=resource_version),
+        spec=V1PodSpec(containers=[V1Container(name="main", resources=V1ResourceRequirements(requests={"cpu": cpu}))]),
+    )
+
+
+def test_total_pod_resources_cached():
+    with mock.patch(
+        "clusterman.kubernetes.util._total_pod_resources", wraps=_total_pod_resources
+    ) as mock_total_pod_resources:
+        assert total_pod_resources(_pod("uid-1", "1", "2")).cpus == 2
+        assert total_pod_resources(_pod("uid-1", "1", "2")).cpus == 2
+        assert mock_total_pod_resources.call_count == 1
+
+        # a new resourceVersion means the pod might have changed
+        assert total_pod_resources(_pod("uid-1", "2", "3")).cpus == 3
+        assert mock_total_pod_resources.call_count == 2
+
+        # objects without a uid/resourceVersion aren't cached
+        assert total_pod_resources(_pod(None, None, "4")).cpus == 4
+        assert total_pod_resources(_pod(None, None, "5")).cpus == 5
+        assert mock_total_pod_resources.call_count == 4
+
+
+def test_total_node_resources():
+    node = V1Node(
+        metadata=V1ObjectMeta(uid="node-uid-1", resource_version="1"),
+        status=V1NodeStatus(allocatable={"cpu": "4", "memory": "2Gi"}),
+    )
+    assert total_node_resources(node, [_pod("uid-2", "1", "500m"), _pod("uid-3", "1", "1")]) == ClustermanResources(
+        cpus=2.5, mem=1600.0
+    )
+
+
 def test_selector_term_matches_requirement():
     selector_term = [
         V1NodeSelectorTerm(
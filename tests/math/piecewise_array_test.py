@@ -0,0 +1,112 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import operator
+
+import numpy as np
+import pytest
+
+from clusterman.math.piecewise import piecewise_max
+from clusterman.math.piecewise import PiecewiseConstantFunction
+from clusterman.math.piecewise_array import piecewise_array_max
+from clusterman.math.piecewise_array import PiecewiseConstantArray
+
+
+@pytest.fixture
+def fn1():
+    fn = PiecewiseConstantFunction(1)
+    fn.add_breakpoint(2, 7)
+    fn.add_breakpoint(4, 4)
+    fn.add_breakpoint(7, 0)
+    return fn
+
+
+@pytest.fixture
+def fn2():
+    fn = PiecewiseConstantFunction(2)
+    fn.add_delta(-1, 2)
+    fn.add_delta(7, -3)
+    fn.add_delta(8, -1)
+    return fn
+
+
+def test_round_trip(fn1, fn2):
+    for fn in (fn1, fn2):
+        new_fn = PiecewiseConstantArray.from_piecewise(fn).to_piecewise()
+        assert new_fn._initial_value == fn._initial_value
+        assert list(new_fn.breakpoints.items()) == list(fn.breakpoints.items())
+
+
+def test_call(fn1):
+    array_fn = PiecewiseConstantArray.from_piecewise(fn1)
+    xvals = np.arange(-2, 10)
+    assert array_fn.call(xvals).tolist() == [fn1.call(x) for x in xvals.tolist()]
+
+
+def test_call_no_breakpoints():
+    array_fn = PiecewiseConstantArray([], [], 3)
+    assert array_fn.call(np.arange(3)).tolist() == [3, 3, 3]
+
+
+@pytest.mark.parametrize("start,stop,step", [(0, 10, 1), (-3, 11, 2), (0, 11, 0)])
+def test_values(fn2, start, stop, step):
+    xvals, yvals = PiecewiseConstantArray.from_piecewise(fn2).values(start, stop, step)
+    expected = fn2.values(start, stop, step)
+    assert xvals.tolist() == list(expected.keys())
+    assert yvals.tolist() == list(expected.values())
+
+
+@pytest.mark.parametrize("start,stop,step", [(0, 10, 1), (-3, 11, 2), (1, 11, 3), (0, 11, 0)])
+def test_integrals(fn1, start, stop, step):
+    xvals, integrals = PiecewiseConstantArray.from_piecewise(fn1).integrals(start, stop, step)
+    expected = fn1.integrals(start, stop, step)
+    assert xvals.tolist() == list(expected.keys())
+    assert integrals.tolist() == pytest.approx(list(expected.values()))
+
+
+def test_integral_with_transform(fn1):
+    array_fn = PiecewiseConstantArray.from_piecewise(fn1)
+    assert array_fn.integral(0, 10, transform=lambda x: x / 2) == pytest.approx(fn1.integral(0, 10) / 2)
+
+
+@pytest.mark.parametrize("op", [operator.add, operator.sub, operator.mul, operator.truediv])
+def test_combine(fn1, fn2, op):
+    expected = op(fn1, fn2)
+    array_fn = op(PiecewiseConstantArray.from_piecewise(fn1), PiecewiseConstantArray.from_piecewise(fn2))
+
+    assert array_fn.initial_value == expected._initial_value
+    assert array_fn.to_piecewise().values(-2, 10, 1) == expected.values(-2, 10, 1)
+
+
+def test_combine_squashes_breakpoints():
+    fn = PiecewiseConstantArray([1, 3], [2, 1], 1) - PiecewiseConstantArray([1, 2], [1, 0], 0)
+    assert fn.xvals.tolist() == [2, 3]
+    assert fn.yvals.tolist() == [2, 1]
+
+
+def test_divide_by_zero():
+    fn = PiecewiseConstantArray([1, 2], [2, 4], 1) / PiecewiseConstantArray([1, 2], [0, 2], 0)
+    assert fn.initial_value == 0
+    assert fn.xvals.tolist() == [2]
+    assert fn.yvals.tolist() == [2]
+
+
+def test_piecewise_array_max(fn1, fn2):
+    expected = piecewise_max(fn1, fn2)
+    array_fn = piecewise_array_max(
+        PiecewiseConstantArray.from_piecewise(fn1),
+        PiecewiseConstantArray.from_piecewise(fn2),
+    )
+
+    assert array_fn.initial_value == expected._initial_value
+    assert array_fn.to_piecewise().values(-2, 10, 1) == expected.values(-2, 10, 1)
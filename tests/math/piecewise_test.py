@@ -12,12 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import operator
+import random
 from datetime import timedelta
 from functools import lru_cache
 from unittest import mock
 
 import arrow
 import pytest
+from sortedcontainers import SortedDict
 
 from clusterman.math.piecewise import hour_transform
 from clusterman.math.piecewise import piecewise_max
@@ -236,3 +238,100 @@ def test_piecewise_max():
     assert fn3.breakpoints[2] == 7
     assert fn3.breakpoints[4] == 4
     assert fn3.breakpoints[7] == 1
+
+
+def test_add_breakpoint_after_add_delta(fn):
+    fn.add_delta(2, 2)
+    fn.add_delta(5, 1)
+    fn.add_breakpoint(3, 7)
+    fn.add_breakpoint(5, 6)
+    fn.add_delta(4, -1)
+
+    assert fn.call(1) == 1
+    assert fn.call(2) == 3
+    assert fn.call(3) == 7
+    assert fn.call(4) == 6
+    assert fn.call(5) == 5
+    assert list(fn.breakpoints.items()) == [(2, 3), (3, 7), (4, 6), (5, 5)]
+
+
+def test_add_delta_many_blocks(fn):
+    with mock.patch("clusterman.math.piecewise._DELTA_BLOCK_SIZE", 2):
+        for x in [5, 1, 9, 3, 7, 2, 8, 4, 6, 0]:
+            fn.add_delta(x, x + 1)
+
+    expected_value = 1
+    for x in range(10):
+        expected_value += x + 1
+        assert fn.call(x) == expected_value
+        assert fn.breakpoints[x] == expected_value
+
+
+def test_serialize_state(fn):
+    fn.add_delta(2, 2)
+    fn.add_breakpoint(4, 4)
+    new_fn = PiecewiseConstantFunction()
+    new_fn.__setstate__(fn.__getstate__())
+
+    assert new_fn._initial_value == 1
+    assert list(new_fn.breakpoints.items()) == [(2, 3), (4, 4)]
+    new_fn.add_delta(3, 1)
+    assert new_fn.call(3) == 4
+    assert new_fn.call(4) == 5
+
+
+class OldPiecewiseConstantFunction:
+    """The breakpoint arithmetic of PiecewiseConstantFunction from before the delta encoding was introduced"""
+
+    def __init__(self, initial_value=0):
+        self.breakpoints = SortedDict()
+        self._initial_value = initial_value
+
+    def add_breakpoint(self, xval, yval):
+        if self.call(xval) != yval:
+            self.breakpoints[xval] = yval
+
+    def add_delta(self, xval, delta):
+        if delta == 0:
+            return
+        if xval not in self.breakpoints:
+            self.breakpoints[xval] = self.call(xval)
+        for x in self.breakpoints.irange(xval):
+            self.breakpoints[x] += delta
+
+    def call(self, xval):
+        if len(self.breakpoints) == 0 or xval < self.breakpoints.keys()[0]:
+            return self._initial_value
+        return self.breakpoints.values()[self.breakpoints.bisect(xval) - 1]
+
+
+@pytest.mark.parametrize(
+    "random_value",
+    [
+        lambda rng: rng.randint(-64, 64),
+        lambda rng: float(rng.randint(-64, 64)),
+        lambda rng: rng.uniform(-64, 64),
+        lambda rng: rng.randint(-64, 64) if rng.random() < 0.95 else rng.uniform(-64, 64),
+    ],
+    ids=["int", "integral_float", "float", "mostly_int"],
+)
+def test_matches_old_implementation(random_value):
+    rng = random.Random(1234)
+    fn, old_fn = PiecewiseConstantFunction(1), OldPiecewiseConstantFunction(1)
+    with mock.patch("clusterman.math.piecewise._DELTA_BLOCK_SIZE", 4):
+        for __ in range(500):
+            xval, value = rng.randint(1, 200), random_value(rng)
+            if rng.random() < 0.8:
+                fn.add_delta(xval, value)
+                old_fn.add_delta(xval, value)
+            else:
+                fn.add_breakpoint(xval, value)
+                old_fn.add_breakpoint(xval, value)
+
+    assert list(fn.breakpoints.items()) == list(old_fn.breakpoints.items())
+    assert [fn.call(xval) for xval in range(-1, 202)] == [old_fn.call(xval) for xval in range(-1, 202)]
+    assert list(fn.values(-1, 202, 1).values()) == [old_fn.call(xval) for xval in range(-1, 202)]
+    # integrals are computed from the breakpoint values the same way as before, so they're identical too
+    old_values_fn = PiecewiseConstantFunction(1)
+    old_values_fn.breakpoints = SortedDict(old_fn.breakpoints)
+    assert fn.integrals(0, 200, 7) == old_values_fn.integrals(0, 200, 7)
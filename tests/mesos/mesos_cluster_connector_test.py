@@ -0,0 +1,190 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import io
+import json
+import random
+import tracemalloc
+from collections import defaultdict
+from unittest import mock
+
+import pytest
+import requests
+from staticconf.testing import PatchConfiguration
+
+from clusterman.interfaces.types import AgentState
+from clusterman.mesos.mesos_cluster_connector import ijson
+from clusterman.mesos.mesos_cluster_connector import MesosClusterConnector
+from clusterman.mesos.util import agent_pid_to_ip
+from clusterman.mesos.util import allocated_agent_resources
+from clusterman.mesos.util import total_agent_resources
+
+requires_ijson = pytest.mark.skipif(ijson is None, reason="ijson is not installed")
+
+
+def _make_mesos_state(num_agents, num_tasks, seed=0):
+    rng = random.Random(seed)
+    agents = [
+        {
+            "id": f"agent-{i}",
+            "pid": f"slave(1)@10.0.{i // 256}.{i % 256}:5051",
+            "hostname": f"host{i}",
+            "attributes": {"pool": rng.choice(["bar", "bar", "other"])} if i % 10 else {},
+            "resources": {"cpus": 16, "mem": 65536, "disk": 100000, "gpus": 0, "ports": "[31000-32000]"},
+            "used_resources": (
+                {"cpus": rng.randint(0, 16) * 0.5, "mem": rng.randint(0, 64) * 1024.0, "disk": 10, "gpus": 0}
+                if i % 7
+                else {}
+            ),
+        }
+        for i in range(num_agents)
+    ]
+    frameworks = [
+        {"id": f"framework-{name}", "name": name, "active": True, "tasks": []}
+        for name in ["marathon", "marathon-user", "chronos", "jenkins", "batch-marathon"]
+    ]
+    for i in range(num_tasks):
+        framework = rng.choice(frameworks)
+        framework["tasks"].append(
+            {
+                "id": f"task-{i}",
+                "name": f"service.instance.{i}",
+                "framework_id": framework["id"],
+                "slave_id": rng.choice(agents)["id"],
+                "state": rng.choice(["TASK_RUNNING", "TASK_RUNNING", "TASK_RUNNING", "TASK_STAGING", "TASK_KILLED"]),
+                "resources": {"cpus": 0.5, "mem": 1024.0, "disk": 0, "gpus": 0},
+                "statuses": [{"state": "TASK_STAGING", "timestamp": 1.0}, {"state": "TASK_RUNNING", "timestamp": 2.0}],
+                "labels": [{"key": "tron", "value": "x" * 100}],
+            }
+        )
+    return {"slaves": agents}, {"frameworks": frameworks, "completed_frameworks": []}
+
+
+def _reference_agent_metadata(agents, frameworks, pool, non_batch_framework_prefixes):
+    """What reload_state and get_agent_metadata used to compute, starting from the full JSON responses"""
+    agents_by_ip = {
+        agent_pid_to_ip(agent["pid"]): agent
+        for agent in agents["slaves"]
+        if agent.get("attributes", {}).get("pool", "default") == pool
+    }
+    framework_names = {framework["id"]: framework["name"] for framework in frameworks["frameworks"]}
+    task_counts = defaultdict(lambda: [0, 0])
+    for framework in frameworks["frameworks"]:
+        for task in framework["tasks"]:
+            if task["state"] == "TASK_RUNNING":
+                task_counts[task["slave_id"]][0] += 1
+                name = framework_names[task["framework_id"]]
+                if not any(name.startswith(prefix) for prefix in non_batch_framework_prefixes):
+                    task_counts[task["slave_id"]][1] += 1
+
+    return {
+        ip: (
+            agent["id"],
+            allocated_agent_resources(agent),
+            total_agent_resources(agent),
+            task_counts[agent["id"]][0],
+            task_counts[agent["id"]][1],
+        )
+        for ip, agent in agents_by_ip.items()
+    }
+
+
+def _make_response(data):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = data
+    response.raw = io.BytesIO(data)
+    return response
+
+
+@pytest.fixture(params=[pytest.param("ijson", marks=requires_ijson), "json"])
+def mock_parser(request):
+    if request.param == "ijson":
+        yield
+    else:
+        with mock.patch("clusterman.mesos.mesos_cluster_connector.ijson", None):
+            yield
+
+
+@pytest.fixture
+def mesos_state():
+    return _make_mesos_state(num_agents=300, num_tasks=3000)
+
+
+@pytest.fixture
+def mock_mesos_post(mesos_state):
+    agents, frameworks = mesos_state
+    responses = {"slaves": json.dumps(agents).encode(), "master/frameworks": json.dumps(frameworks).encode()}
+    with mock.patch(
+        "clusterman.mesos.mesos_cluster_connector.mesos_post",
+        side_effect=lambda url, endpoint, stream=False: _make_response(responses[endpoint]),
+    ) as mock_mesos_post:
+        yield mock_mesos_post
+
+
+@pytest.fixture
+def connector():
+    return MesosClusterConnector("mesos-test", "bar")
+
+
+@pytest.mark.parametrize("non_batch_framework_prefixes", [["marathon"], ["marathon", "jenk"], []])
+def test_reload_state(mock_parser, mesos_state, mock_mesos_post, non_batch_framework_prefixes):
+    with PatchConfiguration(
+        {"non_batch_framework_prefixes": non_batch_framework_prefixes}, namespace="bar.mesos_config"
+    ):
+        connector = MesosClusterConnector("mesos-test", "bar")
+    connector.reload_state()
+
+    expected = _reference_agent_metadata(*mesos_state, "bar", non_batch_framework_prefixes)
+    assert expected and set(connector._agents_by_ip) == set(expected)
+    for ip, (agent_id, allocated, total, task_count, batch_task_count) in expected.items():
+        metadata = connector.get_agent_metadata(ip)
+        assert metadata.agent_id == agent_id
+        assert metadata.allocated_resources == allocated
+        assert metadata.total_resources == total
+        assert metadata.task_count == task_count
+        assert metadata.batch_task_count == batch_task_count
+        assert metadata.state == (AgentState.RUNNING if any(allocated) else AgentState.IDLE)
+    assert connector.get_agent_metadata("10.255.255.255").state == AgentState.ORPHANED
+
+    assert connector.get_cluster_allocated_resources() == sum(
+        (allocated for __, allocated, *___ in expected.values()), type(allocated)()
+    )
+    assert connector.get_resource_total("cpus") == sum(total.cpus for __, ___, total, *____ in expected.values())
+
+
+@requires_ijson
+def test_reload_state_streams_responses(mock_mesos_post, connector):
+    connector.reload_state()
+    assert all(call[1]["stream"] for call in mock_mesos_post.call_args_list)
+
+
+@requires_ijson
+def test_reload_state_peak_memory(mesos_state, mock_mesos_post, connector):
+    agents, frameworks = mesos_state
+    agents_data, frameworks_data = json.dumps(agents).encode(), json.dumps(frameworks).encode()
+
+    def peak_memory(fn):
+        tracemalloc.start()
+        try:
+            fn()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    # the old implementation: download and parse both responses, and keep all of the agents and tasks
+    old_peak = peak_memory(
+        lambda: _reference_agent_metadata(json.loads(agents_data), json.loads(frameworks_data), "bar", ["marathon"])
+    )
+    new_peak = peak_memory(connector.reload_state)
+    assert new_peak < old_peak / 3
@@ -0,0 +1,79 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+from unittest import mock
+
+import pytest
+import requests
+
+from clusterman.exceptions import PoolConnectionError
+from clusterman.mesos.util import _get_session
+from clusterman.mesos.util import mesos_post
+
+
+@pytest.fixture(autouse=True)
+def mock_session():
+    with mock.patch("clusterman.mesos.util._get_session") as mock_get_session, mock.patch.dict(
+        "clusterman.mesos.util._leader_urls", clear=True
+    ):
+        yield mock_get_session.return_value
+
+
+def _response(url, is_redirect=False):
+    return mock.Mock(url=url, is_redirect=is_redirect)
+
+
+def test_mesos_post_caches_leader(mock_session):
+    mock_session.post.side_effect = [
+        _response("http://leader:5050"),
+        _response("http://leader:5050/state"),
+        _response("http://leader:5050/state"),
+    ]
+    mesos_post("http://master:5050/", "state")
+    mesos_post("http://master:5050/", "state")
+
+    assert [c[0][0] for c in mock_session.post.call_args_list] == [
+        "http://master:5050/redirect",
+        "http://leader:5050/state",
+        "http://leader:5050/state",
+    ]
+
+
+@pytest.mark.parametrize("leader_response", [_response("http://leader:5050/state", True), requests.ConnectionError()])
+def test_mesos_post_leader_changed(mock_session, leader_response):
+    mock_session.post.side_effect = [
+        _response("http://leader:5050"),
+        _response("http://leader:5050/state"),
+        leader_response,
+        _response("http://leader2:5050"),
+        _response("http://leader2:5050/state"),
+    ]
+    mesos_post("http://master:5050/", "state")
+    assert mesos_post("http://master:5050/", "state").url == "http://leader2:5050/state"
+    assert mock_session.post.call_args_list[3][0][0] == "http://master:5050/redirect"
+
+
+def test_mesos_post_unreachable(mock_session):
+    mock_session.post.side_effect = requests.ConnectionError()
+    with pytest.raises(PoolConnectionError):
+        mesos_post("http://master:5050/", "state")
+
+
+def test_get_session_per_thread():
+    sessions = []
+    thread = threading.Thread(target=lambda: sessions.append(_get_session()))
+    thread.start()
+    thread.join()
+    assert _get_session() is _get_session()
+    assert sessions[0] is not _get_session()
@@ -0,0 +1,453 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from clusterman_metrics import APP_METRICS
+from clusterman_metrics import ClustermanMetricsBotoClient
+from clusterman_metrics import SYSTEM_METRICS
+
+# these tests are for the example metrics client in examples/clusterman_metrics (installed by `tox -e external`); other
+# clusterman_metrics packages, like the one installed by `tox -e yelp`, don't have its internals
+try:
+    from clusterman_metrics.boto_client import _get_regex_literal_prefix
+    from clusterman_metrics.boto_client import _KEY_CACHE_TTL
+    from clusterman_metrics.boto_client import _MAX_WRITE_ATTEMPTS
+    from clusterman_metrics.boto_client import GSI_NAME
+    from clusterman_metrics.boto_client import GSI_PK
+    from clusterman_metrics.boto_client import GSI_SORT
+    from clusterman_metrics.boto_client import MetricsBatchWriter
+    from clusterman_metrics.boto_client import TimeseriesCacheEntry
+    from clusterman_metrics.boto_client import UnprocessedItemsError
+except ImportError:
+    pytest.skip("requires the example clusterman_metrics package", allow_module_level=True)
+
+APP = "app"
+KEY_PREFIX = f"{APP},"
+NOW = 1600000000
+
+
+class FakeDynamoDB:
+    """Just enough of the DynamoDB service resource (and its client) to query the metrics tables and their index, and
+    to write batches of items
+    """
+
+    def __init__(self, latency=0):
+        self.meta = SimpleNamespace(client=self)
+        self.latency = latency
+        self.items = {}  # table name -> list of items
+        self.index_queries = []  # (partition, sort key start, sort key end) for each query against the index
+        self.table_queries = []  # (key, timestamp start, timestamp end) for each paginated query against a table
+        self.written = {}  # table name -> (key, timestamp) -> item, for every item written with BatchWriteItem
+        self.write_latencies = []  # latency for each BatchWriteItem request, in order (then self.latency)
+        self.write_errors = []  # errors to raise from the next BatchWriteItem requests (None to succeed)
+        self.unprocessed = {}  # (table name, key, timestamp) -> number of times to leave that item unprocessed
+        self._lock = threading.Lock()
+
+    def add_app_metric(self, name, partition, timestamp):
+        table_items = self.items.setdefault(f"clusterman_{APP_METRICS}", [])
+        table_items.append({"key": KEY_PREFIX + name, GSI_PK: partition, GSI_SORT: f"{KEY_PREFIX}{timestamp}"})
+
+    def add_datapoint(self, table_name, key, timestamp, value):
+        self.items.setdefault(table_name, []).append({"key": key, "timestamp": timestamp, "value": value})
+
+    def batch_write_item(self, RequestItems):
+        requests = [
+            (table_name, request) for table_name, table_requests in RequestItems.items() for request in table_requests
+        ]
+        items = [(table_name, request["PutRequest"]["Item"]) for table_name, request in requests]
+        item_ids = [(table_name, item["key"], item["timestamp"]) for table_name, item in items]
+        assert len(requests) <= 25, "too many items in one BatchWriteItem request"
+        assert len(set(item_ids)) == len(item_ids), "duplicate keys in one BatchWriteItem request"
+
+        with self._lock:
+            latency = self.write_latencies.pop(0) if self.write_latencies else self.latency
+            error = self.write_errors.pop(0) if self.write_errors else None
+        time.sleep(latency)
+        if error:
+            raise error
+
+        unprocessed = {}
+        with self._lock:
+            for item_id, (table_name, request) in zip(item_ids, requests):
+                if self.unprocessed.get(item_id):
+                    self.unprocessed[item_id] -= 1
+                    unprocessed.setdefault(table_name, []).append(request)
+                else:
+                    self.written.setdefault(table_name, {})[item_id[1:]] = request["PutRequest"]["Item"]
+        return {"UnprocessedItems": unprocessed}
+
+    def query(self, TableName, KeyConditionExpression, IndexName=None, FilterExpression=None, ExclusiveStartKey=None):
+        time.sleep(self.latency)
+        hash_condition, sort_condition = KeyConditionExpression.get_expression()["values"]
+        hash_key = hash_condition.get_expression()["values"][1]
+        __, low, high = sort_condition.get_expression()["values"]
+        if IndexName is None:
+            if ExclusiveStartKey is None:  # only count the first page
+                with self._lock:
+                    self.table_queries.append((hash_key, low, high))
+            items = [
+                item
+                for item in self.items.get(TableName, [])
+                if "timestamp" in item and item["key"] == hash_key and low <= item["timestamp"] <= high
+            ]
+        else:
+            assert IndexName == GSI_NAME
+            with self._lock:
+                self.index_queries.append((hash_key, low, high))
+            items = [
+                item
+                for item in self.items.get(TableName, [])
+                if item.get(GSI_PK) == hash_key and low <= item[GSI_SORT] <= high
+            ]
+        # one item per page, so that every query has to follow the pagination; like DynamoDB, the filter is applied
+        # to each page after it's read
+        start = ExclusiveStartKey or 0
+        response = {"Items": items[start : start + 1]}
+        if start + 1 < len(items):
+            response["LastEvaluatedKey"] = start + 1
+        if FilterExpression is not None:
+            expression = FilterExpression.get_expression()
+            literal = expression["values"][1]
+            if expression["operator"] == "begins_with":
+                response["Items"] = [item for item in response["Items"] if item["key"].startswith(literal)]
+            else:
+                response["Items"] = [item for item in response["Items"] if literal in item["key"]]
+        return response
+
+
+@pytest.fixture
+def fake_ddb():
+    return FakeDynamoDB()
+
+
+@pytest.fixture(autouse=True)
+def no_write_backoff():
+    with mock.patch("clusterman_metrics.boto_client._WRITE_BACKOFF_SECONDS", 0):
+        yield
+
+
+@pytest.fixture
+def metrics_client(fake_ddb):
+    with mock.patch("clusterman_metrics.boto_client.get_metrics_session") as mock_session:
+        mock_session.return_value.resource.return_value = fake_ddb
+        yield ClustermanMetricsBotoClient("us-west-2", app_identifier=APP, ttl_days=-1)
+
+
+def _scanned_ranges(fake_ddb):
+    ranges = {(int(low[len(KEY_PREFIX) :]), int(high[len(KEY_PREFIX) :])) for __, low, high in fake_ddb.index_queries}
+    fake_ddb.index_queries.clear()
+    return ranges
+
+
+@pytest.mark.parametrize(
+    "pattern,expected",
+    [
+        ("cpus_.*_total", ("cpus_", False)),
+        ("^cpus_allocated", ("cpus_allocated", True)),
+        ("^cpus$", ("cpus", True)),
+        (r"cpus\.total", ("cpus.total", False)),
+        (r"a\\b", ("a\\b", False)),
+        (r"cpus\d+", ("cpus", False)),
+        ("cpus?", ("cpu", False)),
+        ("cpus*", ("cpu", False)),
+        ("cpus{0,2}", ("cpu", False)),
+        ("cpus+", ("cpus", False)),
+        (r"^cpus\.?", ("cpus", True)),
+        ("cpus|mem", ("", False)),
+        ("^(cpus|mem)_total", ("", False)),
+        ("(?i)cpus", ("", False)),
+        (".*cpus", ("", False)),
+        ("", ("", False)),
+    ],
+)
+def test_get_regex_literal_prefix(pattern, expected):
+    assert _get_regex_literal_prefix(pattern) == expected
+
+
+@pytest.fixture
+def cache_entry():
+    entry = TimeseriesCacheEntry()
+    entry.store(100, 200, {"a": [(100, 1), (150, 2), (200, 3)], "b": [(120, 4)]})
+    return entry
+
+
+@pytest.mark.parametrize(
+    "time_start,time_end,expected",
+    [
+        (120, 180, []),
+        (50, 180, [(50, 99)]),
+        (120, 250, [(201, 250)]),
+        (50, 250, [(50, 99), (201, 250)]),
+        (10, 90, [(10, 90)]),
+        (210, 250, [(210, 250)]),
+    ],
+)
+def test_cache_entry_missing_ranges(cache_entry, time_start, time_end, expected):
+    assert cache_entry.missing_ranges(time_start, time_end) == expected
+
+
+def test_cache_entry_store_merges_coverage(cache_entry):
+    # the overlap with what's already cached is ignored, and everything else goes on the right end
+    cache_entry.store(150, 300, {"a": [(150, 20), (200, 30), (250, 4)], "c": [(300, 5)]})
+    cache_entry.store(50, 99, {"a": [(60, 0)]})
+
+    assert (cache_entry.covered_start, cache_entry.covered_end) == (50, 300)
+    assert cache_entry.get(0, 1000) == {
+        "a": [(60, 0), (100, 1), (150, 2), (200, 3), (250, 4)],
+        "b": [(120, 4)],
+        "c": [(300, 5)],
+    }
+    assert cache_entry.get(110, 200) == {"a": [(150, 2), (200, 3)], "b": [(120, 4)], "c": []}
+    assert cache_entry.num_datapoints == 7
+
+
+def test_cache_entry_store_disjoint_range(cache_entry):
+    # we don't know what's between the two ranges, so the old data is thrown out
+    cache_entry.store(202, 300, {"a": [(250, 4)]})
+
+    assert (cache_entry.covered_start, cache_entry.covered_end) == (202, 300)
+    assert cache_entry.get(0, 1000) == {"a": [(250, 4)]}
+    assert cache_entry.num_datapoints == 1
+
+
+def test_cache_entry_store_ignores_data_outside_range(cache_entry):
+    cache_entry.store(201, 250, {"a": [(200, 30), (240, 4), (260, 5)]})
+
+    assert cache_entry.get(0, 1000)["a"] == [(100, 1), (150, 2), (200, 3), (240, 4)]
+    assert cache_entry.num_datapoints == 5
+
+
+def test_cache_entry_prune(cache_entry):
+    cache_entry.prune(130)
+
+    assert (cache_entry.covered_start, cache_entry.covered_end) == (130, 200)
+    assert cache_entry.get(0, 1000) == {"a": [(150, 2), (200, 3)]}
+    assert cache_entry.num_datapoints == 2
+
+    cache_entry.prune(100)  # nothing to do
+    assert cache_entry.covered_start == 130
+
+    cache_entry.prune(201)
+    assert cache_entry.covered_start is None and cache_entry.num_datapoints == 0
+    assert cache_entry.missing_ranges(0, 1000) == [(0, 1000)]
+
+
+@mock.patch("clusterman_metrics.boto_client.time.time", return_value=NOW)
+def test_get_metric_values_uses_cache(mock_time, metrics_client, fake_ddb):
+    for timestamp in range(NOW - 3600, NOW, 60):
+        fake_ddb.add_datapoint("clusterman_system_metrics", "cpus", timestamp, timestamp)
+
+    metrics_client.get_metric_values("cpus", SYSTEM_METRICS, NOW - 3600, NOW - 1200)
+    fake_ddb.table_queries.clear()
+    result = metrics_client.get_metric_values("cpus", SYSTEM_METRICS, NOW - 3000, NOW - 1)
+
+    # the last five minutes aren't cached, and the rest of the new window is stitched together in order
+    assert result == {"cpus": [(timestamp, timestamp) for timestamp in range(NOW - 3000, NOW, 60)]}
+    assert fake_ddb.table_queries == [("cpus", NOW - 1199, NOW - 1)]
+    fake_ddb.table_queries.clear()
+
+    metrics_client.get_metric_values("cpus", SYSTEM_METRICS, NOW - 3000, NOW - 1)
+    assert fake_ddb.table_queries == [("cpus", NOW - 300, NOW - 1)]
+
+
+@mock.patch("clusterman_metrics.boto_client.time.time", return_value=NOW)
+def test_get_metric_values_evicts_least_recently_used(mock_time, metrics_client, fake_ddb):
+    for name in ["a", "b", "c"]:
+        for timestamp in range(NOW - 3600, NOW - 3000, 60):
+            fake_ddb.add_datapoint("clusterman_system_metrics", name, timestamp, 1)
+    metrics_client.cache_max_datapoints = 25
+
+    for name in ["a", "b", "a", "c"]:
+        metrics_client.get_metric_values(name, SYSTEM_METRICS, NOW - 3600, NOW - 3000)
+
+    # each entry has 10 datapoints, so there's only room for two of them, and "b" was used the longest time ago
+    assert list(metrics_client._cache) == ["a", "c"]
+    fake_ddb.table_queries.clear()
+    metrics_client.get_metric_values("b", SYSTEM_METRICS, NOW - 3600, NOW - 3000)
+    assert fake_ddb.table_queries == [("b", NOW - 3600, NOW - 3000)]
+    assert list(metrics_client._cache) == ["c", "b"]
+
+
+@mock.patch("clusterman_metrics.boto_client.time.time", return_value=NOW)
+def test_get_keys_from_query(mock_time, metrics_client, fake_ddb):
+    for partition in range(3):
+        fake_ddb.add_app_metric(f"cpus_{partition}", partition, NOW - 1000 + partition)
+        fake_ddb.add_app_metric(f"mem_{partition}", partition, NOW - 1000 + partition)
+    fake_ddb.add_app_metric("cpus_old", 4, NOW - 5000)
+
+    keys = metrics_client._get_keys_from_query(KEY_PREFIX, "cpus_.*", NOW - 3600, NOW, "clusterman_app_metrics")
+
+    assert keys == {f"{KEY_PREFIX}cpus_{partition}" for partition in range(3)}
+    assert len(fake_ddb.index_queries) == 10 + 3  # every partition, plus the second pages
+    assert _scanned_ranges(fake_ddb) == {(NOW - 3600, NOW)}
+
+
+@mock.patch("clusterman_metrics.boto_client.time.time", return_value=NOW)
+def test_get_keys_from_query_only_scans_new_ranges(mock_time, metrics_client, fake_ddb):
+    fake_ddb.add_app_metric("cpus_a", 0, NOW - 2000)
+    metrics_client._get_keys_from_query(KEY_PREFIX, "cpus_.*", NOW - 3600, NOW - 1000, "clusterman_app_metrics")
+    _scanned_ranges(fake_ddb)
+
+    # A window that moves forward only scans the new part; a window that starts earlier scans the old part too
+    fake_ddb.add_app_metric("cpus_b", 1, NOW - 900)
+    keys = metrics_client._get_keys_from_query(KEY_PREFIX, "cpus_.*", NOW - 3000, NOW - 800, "clusterman_app_metrics")
+    assert keys == {f"{KEY_PREFIX}cpus_a", f"{KEY_PREFIX}cpus_b"}
+    assert _scanned_ranges(fake_ddb) == {(NOW - 999, NOW - 800)}
+
+    keys = metrics_client._get_keys_from_query(KEY_PREFIX, "cpus_.*", NOW - 4000, NOW - 900, "clusterman_app_metrics")
+    assert keys == {f"{KEY_PREFIX}cpus_a", f"{KEY_PREFIX}cpus_b"}
+    assert _scanned_ranges(fake_ddb) == {(NOW - 4000, NOW - 3001)}
+
+    # keys that haven't been seen since the start of the window are dropped
+    keys = metrics_client._get_keys_from_query(KEY_PREFIX, "cpus_.*", NOW - 1500, NOW - 800, "clusterman_app_metrics")
+    assert keys == {f"{KEY_PREFIX}cpus_b"}
+    assert _scanned_ranges(fake_ddb) == set()
+
+
+@mock.patch("clusterman_metrics.boto_client.time.time", return_value=NOW)
+def test_get_keys_from_query_rescans_recent_data(mock_time, metrics_client, fake_ddb):
+    metrics_client._get_keys_from_query(KEY_PREFIX, "cpus_.*", NOW - 3600, NOW, "clusterman_app_metrics")
+    _scanned_ranges(fake_ddb)
+
+    # the last five minutes might not have been completely written yet, so they get scanned again
+    fake_ddb.add_app_metric("cpus_late", 2, NOW - 100)
+    keys = metrics_client._get_keys_from_query(KEY_PREFIX, "cpus_.*", NOW - 3600, NOW, "clusterman_app_metrics")
+    assert keys == {f"{KEY_PREFIX}cpus_late"}
+    assert _scanned_ranges(fake_ddb) == {(NOW - 299, NOW)}
+
+
+def test_get_keys_from_query_cache_expires(metrics_client, fake_ddb):
+    with mock.patch("clusterman_metrics.boto_client.time.time", return_value=NOW):
+        metrics_client._get_keys_from_query(KEY_PREFIX, "cpus_.*", NOW - 3600, NOW - 600, "clusterman_app_metrics")
+    _scanned_ranges(fake_ddb)
+
+    with mock.patch("clusterman_metrics.boto_client.time.time", return_value=NOW + 60):
+        metrics_client._get_keys_from_query(KEY_PREFIX, "cpus_.*", NOW - 3540, NOW - 540, "clusterman_app_metrics")
+    assert _scanned_ranges(fake_ddb) == {(NOW - 599, NOW - 540)}
+
+    with mock.patch("clusterman_metrics.boto_client.time.time", return_value=NOW + _KEY_CACHE_TTL + 1):
+        metrics_client._get_keys_from_query(KEY_PREFIX, "cpus_.*", NOW - 3480, NOW - 480, "clusterman_app_metrics")
+    assert _scanned_ranges(fake_ddb) == {(NOW - 3480, NOW - 480)}
+
+
+def test_get_keys_from_query_concurrent_partitions(metrics_client, fake_ddb):
+    fake_ddb.latency = 0.05
+    start_time = time.monotonic()
+    metrics_client._get_keys_from_query(KEY_PREFIX, "cpus_.*", NOW - 3600, NOW, "clusterman_app_metrics")
+    assert time.monotonic() - start_time < 10 * fake_ddb.latency
+
+
+def test_get_metric_values_from_several_threads(metrics_client, fake_ddb):
+    fake_ddb.latency = 0.01
+    for i in range(8):
+        for timestamp in range(NOW - 600, NOW, 60):
+            fake_ddb.add_datapoint("clusterman_system_metrics", f"metric_{i}", timestamp, i)
+
+    # the fake has no Table(), so this also checks that nothing goes through the (not thread-safe) resource
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(
+            executor.map(
+                lambda i: metrics_client.get_metric_values(f"metric_{i}", SYSTEM_METRICS, NOW - 600, NOW - 1),
+                range(8),
+            )
+        )
+
+    for i, result in enumerate(results):
+        assert result == {f"metric_{i}": [(timestamp, i) for timestamp in range(NOW - 600, NOW, 60)]}
+
+
+def _written_values(fake_ddb, table_name):
+    return {item_id: float(item["value"]) for item_id, item in fake_ddb.written[table_name].items()}
+
+
+def test_writer_deduplicates_items(metrics_client, fake_ddb):
+    with metrics_client.get_writer(SYSTEM_METRICS) as writer:
+        for value in range(3):
+            writer.send(("cpus", NOW, value))
+        writer.send(("cpus", NOW + 60, 5))
+
+    assert _written_values(fake_ddb, "clusterman_system_metrics") == {("cpus", NOW): 2, ("cpus", NOW + 60): 5}
+    assert writer.stats.items_deduplicated == 2
+    assert writer.stats.items_written == 2
+
+
+def test_writer_keeps_writes_to_the_same_item_in_order(metrics_client, fake_ddb):
+    # the first batch is much slower than the second, so the second would land first if it didn't wait
+    fake_ddb.write_latencies = [0.2]
+    with metrics_client.get_writer(SYSTEM_METRICS) as writer:
+        for value in range(2):
+            writer.send(("cpus", NOW, value))
+            for i in range(24):
+                writer.send((f"filler_{value}_{i}", NOW, 0))
+
+    assert writer.stats.batches_written == 2
+    assert _written_values(fake_ddb, "clusterman_system_metrics")[("cpus", NOW)] == 1
+
+
+def test_writer_shares_batches_between_tables(metrics_client, fake_ddb):
+    with metrics_client.get_writer(SYSTEM_METRICS) as system_writer, metrics_client.get_writer(
+        APP_METRICS
+    ) as app_writer:
+        for i in range(10):
+            system_writer.send((f"metric_{i}", NOW, i))
+            app_writer.send((f"metric_{i}", NOW, i))
+
+    assert system_writer.stats.batches_written == 1
+    assert len(fake_ddb.written["clusterman_system_metrics"]) == len(fake_ddb.written["clusterman_app_metrics"]) == 10
+
+
+def test_writer_retries_unprocessed_items(metrics_client, fake_ddb):
+    fake_ddb.unprocessed[("clusterman_system_metrics", "cpus", NOW)] = 2
+    with metrics_client.get_writer(SYSTEM_METRICS) as writer:
+        writer.send(("cpus", NOW, 1))
+        writer.send(("mem", NOW, 2))
+
+    assert _written_values(fake_ddb, "clusterman_system_metrics") == {("cpus", NOW): 1, ("mem", NOW): 2}
+    assert writer.stats.retries == 2
+    assert writer.stats.items_written == 2
+
+
+def test_batch_writer_reports_unprocessed_items_once(fake_ddb):
+    fake_ddb.unprocessed[("table", "a", NOW)] = _MAX_WRITE_ATTEMPTS
+    batch_writer = MetricsBatchWriter(fake_ddb)
+    batch_writer.put_item("table", {"key": "a", "timestamp": NOW, "value": 1})
+    with pytest.raises(UnprocessedItemsError):
+        batch_writer.flush()
+
+    batch_writer.put_item("table", {"key": "a", "timestamp": NOW, "value": 2})
+    batch_writer.close()
+    assert fake_ddb.written["table"] == {("a", NOW): {"key": "a", "timestamp": NOW, "value": 2}}
+
+
+def test_batch_writer_reports_failed_batch_once(fake_ddb):
+    fake_ddb.write_errors = [Exception("ProvisionedThroughputExceededException")]
+    batch_writer = MetricsBatchWriter(fake_ddb)
+    for i in range(25):
+        batch_writer.put_item("table", {"key": f"a{i}", "timestamp": NOW, "value": 1})
+    time.sleep(0.1)  # let the first batch fail
+
+    # the error comes out of the next batch that gets sent, and then never again
+    for i in range(24):
+        batch_writer.put_item("table", {"key": f"b{i}", "timestamp": NOW, "value": 1})
+    with pytest.raises(Exception, match="ProvisionedThroughputExceededException"):
+        batch_writer.put_item("table", {"key": "b24", "timestamp": NOW, "value": 1})
+    batch_writer.put_item("table", {"key": "c", "timestamp": NOW, "value": 1})
+    batch_writer.close()
+
+    assert set(fake_ddb.written["table"]) == {(f"b{i}", NOW) for i in range(25)} | {("c", NOW)}
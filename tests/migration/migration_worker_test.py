@@ -265,6 +265,7 @@ def test_uptime_migration_worker(mock_drain_selection, mock_manager_class, mock_
     selector = mock_drain_selection.call_args_list[0][0][1]
     assert selector(ClusterNodeMetadata(None, InstanceMetadata(None, None, uptime=timedelta(seconds=10001)))) is True
     assert selector(ClusterNodeMetadata(None, InstanceMetadata(None, None, uptime=timedelta(seconds=9999)))) is False
+    assert mock_manager.close.call_count == 1
 
 
 @pytest.mark.parametrize(
@@ -315,6 +316,7 @@ def test_event_migration_worker(
     mock_disable_scaling.assert_called_once_with("mesos-test", "bar", "kubernetes", 3)
     mock_enable_scaling.assert_called_once_with("mesos-test", "bar", "kubernetes")
     mock_drain_selection.assert_called_once_with(mock_manager, ANY, event_worker_setup)
+    mock_manager.close.assert_called_once_with()
     selector = mock_drain_selection.call_args_list[0][0][1]
     assert list(filter(selector, mock_manager.get_node_metadatas.return_value)) == [
         ClusterNodeMetadata(
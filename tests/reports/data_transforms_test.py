@@ -0,0 +1,183 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import datetime
+import random
+
+import arrow
+import numpy as np
+import pytest
+from sortedcontainers import SortedDict
+
+from clusterman.math.piecewise import PiecewiseConstantFunction
+from clusterman.math.piecewise_array import PiecewiseConstantArray
+from clusterman.reports.data_transforms import grouped_percentiles
+from clusterman.reports.data_transforms import transform_heatmap_data
+from clusterman.reports.data_transforms import transform_trend_data
+from clusterman.reports.data_transforms import utc_offsets
+from clusterman.reports.report_types import DEFAULT_TREND_ROLLUP
+from clusterman.simulator.util import timestamp_micros
+
+
+def _reference_transform_heatmap_data(data, error_threshold_fn, months, tz):
+    # the original, one-point-at-a-time implementation
+    data_by_month = {}
+    error_data_by_month = {}
+    min_val, max_val = float("inf"), float("-inf")
+    for mstart, mend in months:
+        mstart_index = data.bisect_left(mstart)
+        mend_index = data.bisect_right(mend)
+        mdates, mtimes, mvals = [], [], []
+        edates, etimes, evals = [], [], []
+        for i in range(mstart_index, mend_index):
+            utc_k, v = data.keys()[i], data.values()[i]
+            k = utc_k.to(tz)
+            date = k.replace(year=1970, month=1, day=1).datetime
+            time = k.replace(hour=0, minute=0, second=0, microsecond=0).datetime
+            if error_threshold_fn(utc_k, v):
+                edates.append(date), etimes.append(time), evals.append(v)
+            else:
+                mdates.append(date), mtimes.append(time), mvals.append(v)
+        p5, p95 = np.percentile([data.values()[i] for i in range(mstart_index, mend_index)], [5, 95])
+        min_val = min(min_val, p5)
+        max_val = max(max_val, p95)
+        data_by_month[mstart] = (mdates, mtimes, mvals)
+        error_data_by_month[mstart] = (edates, etimes, evals)
+    return data_by_month, error_data_by_month, min_val, max_val
+
+
+def _reference_transform_trend_data(data, months):
+    data_by_month = {}
+    min_val, max_val = 0, 0
+    for mstart, mend in months:
+        aggregated_daily_data = []
+        for dstart, dend in arrow.Arrow.span_range("day", mstart, mend):
+            day_slice = data.values()[data.bisect_left(dstart) : data.bisect_right(dend)]
+            if not day_slice:
+                continue
+            q1, q2, q3 = np.percentile(day_slice, [25, 50, 75])
+            min_val = min(min_val, q1, q2, q3)
+            max_val = max(max_val, q2, q3)
+            aggregated_daily_data.append((dstart.day, q1, q2, q3))
+        data_by_month[mstart] = list(zip(*aggregated_daily_data))
+    return data_by_month, min_val, max_val
+
+
+def _as_datetime64(datetimes):
+    return np.array(
+        [dt.astimezone(datetime.timezone.utc).replace(tzinfo=None) for dt in datetimes], dtype="datetime64[us]"
+    )
+
+
+@pytest.fixture
+def tz():
+    return arrow.parser.TzinfoParser.parse("US/Pacific")
+
+
+@pytest.fixture
+def months(tz):
+    # March has a daylight saving time change
+    return list(
+        arrow.Arrow.span_range("month", arrow.get("2018-02-20").replace(tzinfo=tz), arrow.get("2018-03-20"))
+    )
+
+
+@pytest.fixture
+def data():
+    rng = random.Random(1234)
+    start = arrow.get("2018-02-20T08:00:00+00:00")
+    # some timestamps fall between whole minutes, and some days have no data
+    return SortedDict(
+        (start.shift(seconds=i * 317), rng.uniform(-10, 100)) for i in range(9000) if not 3000 <= i < 3300
+    )
+
+
+@pytest.fixture
+def threshold_fn():
+    threshold = PiecewiseConstantFunction(50)
+    threshold.add_breakpoint(arrow.get("2018-03-01T00:00:00+00:00"), 20)
+    threshold.add_delta(arrow.get("2018-03-11T10:00:00+00:00"), 60)
+    return threshold
+
+
+def test_transform_heatmap_data(data, threshold_fn, months, tz):
+    threshold_array = PiecewiseConstantArray.from_piecewise(threshold_fn, timestamp_micros)
+    data_by_month, error_data_by_month, min_val, max_val = transform_heatmap_data(
+        data, lambda x, y: y > threshold_array.call(x), months, tz
+    )
+    expected_data, expected_error_data, expected_min, expected_max = _reference_transform_heatmap_data(
+        data, lambda x, y: y > threshold_fn.call(x), months, tz
+    )
+
+    assert (min_val, max_val) == (expected_min, expected_max)
+    for actual_by_month, expected_by_month in [
+        (data_by_month, expected_data),
+        (error_data_by_month, expected_error_data),
+    ]:
+        assert list(actual_by_month) == list(expected_by_month)
+        for mstart, (times, dates, values) in actual_by_month.items():
+            expected_times, expected_dates, expected_values = expected_by_month[mstart]
+            assert len(expected_values) > 0
+            assert np.array_equal(times, _as_datetime64(expected_times))
+            assert np.array_equal(dates, _as_datetime64(expected_dates))
+            assert np.array_equal(values, expected_values)
+
+
+def test_transform_trend_data(data, months, tz):
+    data_by_month, min_val, max_val = transform_trend_data(data, months, DEFAULT_TREND_ROLLUP, tz)
+    expected_data, expected_min, expected_max = _reference_transform_trend_data(data, months)
+
+    assert (min_val, max_val) == pytest.approx((expected_min, expected_max))
+    assert list(data_by_month) == list(expected_data)
+    for mstart, (days, q1, q2, q3) in data_by_month.items():
+        expected_days, *expected_qs = expected_data[mstart]
+        assert list(days) == list(expected_days)
+        for q, expected_q in zip((q1, q2, q3), expected_qs):
+            assert q == pytest.approx(expected_q)
+
+
+def test_transforms_with_empty_month(data, tz):
+    months = list(arrow.Arrow.span_range("month", arrow.get("2018-04-01").replace(tzinfo=tz), arrow.get("2018-04-20")))
+    data_by_month, error_data_by_month, min_val, max_val = transform_heatmap_data(
+        data, lambda x, y: y > 50, months, tz
+    )
+    trend_data_by_month, trend_min, trend_max = transform_trend_data(data, months, DEFAULT_TREND_ROLLUP, tz)
+
+    (mstart, _), = months
+    assert all(len(array) == 0 for array in data_by_month[mstart] + error_data_by_month[mstart])
+    assert (min_val, max_val) == (float("inf"), float("-inf"))
+    assert all(len(array) == 0 for array in trend_data_by_month[mstart])
+    assert (trend_min, trend_max) == (0, 0)
+
+
+def test_utc_offsets(tz):
+    timestamps = np.arange(
+        timestamp_micros(arrow.get("2018-03-10")), timestamp_micros(arrow.get("2018-11-06")), 599 * 10**6
+    )
+    expected = [
+        datetime.datetime.fromtimestamp(ts / 10**6, tz).utcoffset() // datetime.timedelta(microseconds=1)
+        for ts in timestamps
+    ]
+    assert np.array_equal(utc_offsets(timestamps, tz), expected)
+    assert len(utc_offsets(np.array([], dtype=np.int64), tz)) == 0
+
+
+def test_grouped_percentiles():
+    rng = np.random.default_rng(1234)
+    values = rng.uniform(size=100)
+    group_starts = np.array([0, 1, 3, 40, 99])
+    percentiles = grouped_percentiles(values, group_starts, [0, 25, 50, 90, 100])
+
+    groups = np.split(values, group_starts[1:])
+    for p, actual in zip([0, 25, 50, 90, 100], percentiles):
+        assert actual == pytest.approx([np.percentile(group, p) for group in groups])
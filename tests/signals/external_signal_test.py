@@ -13,6 +13,7 @@
 # limitations under the License.
 import math
 import os
+import socket
 from unittest import mock
 
 import arrow
@@ -26,6 +27,14 @@ from clusterman.exceptions import SignalConnectionError
 from clusterman.signals.external_signal import ACK
 from clusterman.signals.external_signal import ExternalSignal
 from clusterman.signals.external_signal import setup_signals_environment
+from clusterman.signals.signal_protocol import ENCODING_JSON
+from clusterman.signals.signal_protocol import ProtocolOptions
+from clusterman.signals.signal_protocol import recv_frame
+from clusterman.signals.signal_protocol import send_frame
+from clusterman.signals.signal_protocol import SIGNAL_PROTOCOL_V1
+from clusterman.signals.signal_protocol import SIGNAL_PROTOCOL_V2
+from clusterman.signals.signal_protocol import TIMESERIES_COLUMNAR
+from clusterman.signals.signal_protocol import TIMESERIES_ROWS
 from clusterman.util import SignalResourceRequest
 
 
@@ -136,3 +145,125 @@ def test_setup_signals_namespace():
     assert os.environ["CMAN_NUM_SIGNALS"] == "2"
     assert os.environ["CMAN_SIGNALS_BUCKET"] == "the_bucket"
     assert (fetch_num, signal_num) == (2, 2)
+
+
+def test_setup_signals_namespace_with_socket_suffix(mock_signal):
+    with staticconf.testing.PatchConfiguration({"signal_socket_suffix": "-sweep3"}), mock.patch(
+        "clusterman.signals.external_signal.socket.socket"
+    ) as mock_socket, mock.patch.object(mock_signal, "_negotiate_protocol"):
+        setup_signals_environment("bar", "mesos")
+        mock_signal._connect_to_signal_process()
+
+    assert sorted(os.environ["CMAN_SIGNAL_APPS"].split(" ")) == ["__default__-sweep3", "bar-sweep3"]
+    assert mock_socket.return_value.connect.call_args == mock.call("\0the_signal-BarSignal3-app1-sweep3-socket")
+
+
+@pytest.fixture
+def signal_socket(mock_signal):
+    mock_signal._signal_conn, signal_end = socket.socketpair(socket.AF_UNIX)
+    yield signal_end
+    signal_end.close()
+    mock_signal._signal_conn.close()
+
+
+@pytest.mark.parametrize("timeseries_layout", [TIMESERIES_ROWS, TIMESERIES_COLUMNAR])
+def test_evaluate_v2(mock_signal, signal_socket, timeseries_layout):
+    mock_signal._protocol = ProtocolOptions(SIGNAL_PROTOCOL_V2, ENCODING_JSON, timeseries_layout)
+    metrics = {"cpus_allocated": [[1234, 3.5], [1235, 6]]}
+    send_frame(signal_socket, 1, {"Resources": {"cpus": 5.2}}, ENCODING_JSON)
+    with mock.patch("clusterman.signals.external_signal.get_metrics_for_signal", return_value=metrics):
+        assert mock_signal.evaluate(arrow.get(12345678)) == SignalResourceRequest(cpus=5.2)
+
+    request = recv_frame(signal_socket)
+    assert request.request_id == 1
+    assert request.payload["timestamp"] == 12345678
+    if timeseries_layout == TIMESERIES_COLUMNAR:
+        assert request.payload["metrics"] == {"cpus_allocated": {"timestamps": [1234, 1235], "values": [3.5, 6]}}
+    else:
+        assert request.payload["metrics"] == metrics
+
+
+def test_evaluate_v2_discards_stale_responses(mock_signal, signal_socket):
+    mock_signal._protocol = ProtocolOptions(SIGNAL_PROTOCOL_V2, ENCODING_JSON, TIMESERIES_ROWS)
+    mock_signal._request_id = 4
+    send_frame(signal_socket, 4, {"Resources": {"cpus": 1}}, ENCODING_JSON)
+    send_frame(signal_socket, 5, {"Resources": {"cpus": 2}}, ENCODING_JSON)
+    with mock.patch("clusterman.signals.external_signal.get_metrics_for_signal", return_value={}):
+        assert mock_signal.evaluate(arrow.get(12345678)) == SignalResourceRequest(cpus=2)
+
+
+def test_evaluate_v2_signal_error(mock_signal, signal_socket):
+    mock_signal._protocol = ProtocolOptions(SIGNAL_PROTOCOL_V2, ENCODING_JSON, TIMESERIES_ROWS)
+    send_frame(signal_socket, 1, {"error": "something broke"}, ENCODING_JSON)
+    with mock.patch("clusterman.signals.external_signal.get_metrics_for_signal", return_value={}), pytest.raises(
+        ClustermanSignalError
+    ):
+        mock_signal.evaluate(arrow.get(12345678))
+
+
+@pytest.mark.parametrize("protocol_version", [SIGNAL_PROTOCOL_V1, SIGNAL_PROTOCOL_V2])
+def test_connect_to_signal_process_offer(mock_signal, protocol_version):
+    mock_signal.protocol_version = protocol_version
+    with mock.patch("clusterman.signals.external_signal.socket.socket") as mock_socket, mock.patch.object(
+        mock_signal, "_negotiate_protocol", return_value=ProtocolOptions(SIGNAL_PROTOCOL_V2)
+    ) as mock_negotiate_protocol:
+        mock_signal._connect_to_signal_process()
+
+    # signals that only speak v1 don't get a protocol offer, so there's no reply to wait for
+    signal_kwargs = json.loads(mock_socket.return_value.send.call_args[0][0])
+    if protocol_version == SIGNAL_PROTOCOL_V1:
+        assert "protocol" not in signal_kwargs
+        assert not mock_negotiate_protocol.called
+        assert mock_signal._protocol == ProtocolOptions()
+    else:
+        assert signal_kwargs["protocol"]["versions"] == [SIGNAL_PROTOCOL_V2]
+        assert mock_negotiate_protocol.called
+        assert mock_signal._protocol == ProtocolOptions(SIGNAL_PROTOCOL_V2)
+
+
+@mock.patch("clusterman.signals.external_signal.SOCKET_TIMEOUT_SECONDS", 0.01)
+def test_negotiate_protocol_no_reply(mock_signal, signal_socket):
+    mock_signal.protocol_version = SIGNAL_PROTOCOL_V2
+    with pytest.raises(SignalConnectionError):
+        mock_signal._negotiate_protocol(mock_signal._signal_conn)
+    assert mock_signal._signal_conn.gettimeout() is None
+
+
+def test_negotiate_protocol_v2(mock_signal, signal_socket):
+    mock_signal.protocol_version = SIGNAL_PROTOCOL_V2
+    send_frame(
+        signal_socket,
+        0,
+        {"version": SIGNAL_PROTOCOL_V2, "encoding": ENCODING_JSON, "timeseries_layout": TIMESERIES_COLUMNAR},
+        ENCODING_JSON,
+    )
+    assert mock_signal._negotiate_protocol(mock_signal._signal_conn) == ProtocolOptions(
+        SIGNAL_PROTOCOL_V2, ENCODING_JSON, TIMESERIES_COLUMNAR
+    )
+
+
+@pytest.mark.parametrize("version", [SIGNAL_PROTOCOL_V1, 42])
+def test_negotiate_protocol_unsupported(mock_signal, signal_socket, version):
+    mock_signal.protocol_version = SIGNAL_PROTOCOL_V2
+    send_frame(signal_socket, 0, {"version": version}, ENCODING_JSON)
+    with pytest.raises(SignalConnectionError):
+        mock_signal._negotiate_protocol(mock_signal._signal_conn)
+
+
+def test_evaluate_v2_delta_metrics_resync(mock_signal, signal_socket):
+    mock_signal._protocol = ProtocolOptions(SIGNAL_PROTOCOL_V2, ENCODING_JSON, TIMESERIES_ROWS, delta_metrics=True)
+    mock_signal._metrics_session.build_request(1, {"cpus_allocated": [[1234, 3.5]]})
+    mock_signal._metrics_session.acknowledge(1)
+    mock_signal._request_id = 1
+    send_frame(signal_socket, 2, {"Resync": True}, ENCODING_JSON)
+    send_frame(signal_socket, 3, {"Resources": {"cpus": 5.2}}, ENCODING_JSON)
+    metrics = {"cpus_allocated": [[1234, 3.5], [1235, 6]]}
+    with mock.patch("clusterman.signals.external_signal.get_metrics_for_signal", return_value=metrics):
+        assert mock_signal.evaluate(arrow.get(12345678)) == SignalResourceRequest(cpus=5.2)
+
+    delta_request = recv_frame(signal_socket)
+    assert delta_request.payload["session"]["base_request_id"] == 1
+    assert delta_request.payload["metrics"] == {"cpus_allocated": [[1235, 6]]}
+    full_request = recv_frame(signal_socket)
+    assert full_request.payload["session"]["base_request_id"] is None
+    assert full_request.payload["metrics"] == metrics
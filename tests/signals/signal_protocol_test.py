@@ -0,0 +1,136 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+from decimal import Decimal
+
+import pytest
+
+from clusterman.exceptions import SignalConnectionError
+from clusterman.signals.signal_protocol import choose_protocol
+from clusterman.signals.signal_protocol import ENCODING_JSON
+from clusterman.signals.signal_protocol import ENCODING_MSGPACK
+from clusterman.signals.signal_protocol import from_columnar
+from clusterman.signals.signal_protocol import MetricsSession
+from clusterman.signals.signal_protocol import MetricsWindow
+from clusterman.signals.signal_protocol import msgpack
+from clusterman.signals.signal_protocol import ProtocolOptions
+from clusterman.signals.signal_protocol import recv_frame
+from clusterman.signals.signal_protocol import ResyncRequired
+from clusterman.signals.signal_protocol import send_frame
+from clusterman.signals.signal_protocol import SIGNAL_PROTOCOL_V1
+from clusterman.signals.signal_protocol import SIGNAL_PROTOCOL_V2
+from clusterman.signals.signal_protocol import TIMESERIES_COLUMNAR
+from clusterman.signals.signal_protocol import TIMESERIES_ROWS
+from clusterman.signals.signal_protocol import to_columnar
+
+
+@pytest.fixture
+def socket_pair():
+    left, right = socket.socketpair(socket.AF_UNIX)
+    yield left, right
+    left.close()
+    right.close()
+
+
+@pytest.mark.parametrize(
+    "encoding",
+    [
+        ENCODING_JSON,
+        pytest.param(ENCODING_MSGPACK, marks=pytest.mark.skipif(msgpack is None, reason="msgpack is not installed")),
+    ],
+)
+def test_frame_round_trip(socket_pair, encoding):
+    left, right = socket_pair
+    send_frame(left, 3, {"metrics": {"cpus": [[1, Decimal("1.5")]]}, "timestamp": 2}, encoding)
+    send_frame(left, 4, {"Resources": {}}, encoding)
+
+    assert recv_frame(right) == (3, encoding, {"metrics": {"cpus": [[1, 1.5]]}, "timestamp": 2})
+    assert recv_frame(right) == (4, encoding, {"Resources": {}})
+
+
+def test_recv_frame_bad_header(socket_pair):
+    left, right = socket_pair
+    left.sendall(b"\x00\x00\x00\x05hello world")
+    with pytest.raises(SignalConnectionError):
+        recv_frame(right)
+
+
+def test_recv_frame_connection_closed(socket_pair):
+    left, right = socket_pair
+    left.sendall(b"CS")
+    left.close()
+    with pytest.raises(BrokenPipeError):
+        recv_frame(right)
+
+
+@pytest.mark.parametrize(
+    "offer,expected",
+    [
+        ({}, ProtocolOptions(SIGNAL_PROTOCOL_V1, ENCODING_JSON, TIMESERIES_ROWS)),
+        (
+            {"versions": [3, 2, 1], "encodings": ["foo", "json"], "timeseries_layouts": ["columnar", "rows"]},
+            ProtocolOptions(SIGNAL_PROTOCOL_V2, ENCODING_JSON, TIMESERIES_COLUMNAR),
+        ),
+        ({"versions": [1], "timeseries_layouts": ["rows"]}, ProtocolOptions(SIGNAL_PROTOCOL_V1, ENCODING_JSON)),
+    ],
+)
+def test_choose_protocol(offer, expected):
+    assert choose_protocol(offer) == expected
+
+
+def test_columnar_round_trip():
+    metrics = {"cpus": [(1, 2.0), (3, 4.0)], "mem": []}
+    columnar = to_columnar(metrics)
+    assert columnar == {"cpus": {"timestamps": [1, 3], "values": [2.0, 4.0]}, "mem": {"timestamps": [], "values": []}}
+    assert from_columnar(columnar) == metrics
+
+
+def test_metrics_session_sends_deltas():
+    session, window = MetricsSession(), MetricsWindow()
+    metrics = {"cpus": [(1, 1.0), (2, 2.0), (3, 3.0)], "mem": [(1, 4.0)]}
+    request, to_send = session.build_request(1, metrics)
+    assert request == {"base_request_id": None, "window_start": {"cpus": 1, "mem": 1}, "replace": ["cpus", "mem"]}
+    assert window.apply(1, request, to_send) == metrics
+    session.acknowledge(1)
+
+    metrics = {"cpus": [(2, 2.0), (3, 3.0), (4, 4.0)], "mem": []}
+    request, to_send = session.build_request(2, metrics)
+    assert request == {"base_request_id": 1, "window_start": {"cpus": 2, "mem": None}, "replace": []}
+    assert to_send == {"cpus": [(4, 4.0)]}
+    assert window.apply(2, request, to_send) == metrics
+
+
+def test_metrics_session_replaces_backfilled_metrics():
+    session = MetricsSession()
+    session.build_request(1, {"cpus": [(1, 1.0), (3, 3.0)]})
+    session.acknowledge(1)
+
+    request, to_send = session.build_request(2, {"cpus": [(1, 1.0), (2, 2.0), (3, 3.0), (4, 4.0)]})
+    assert request["replace"] == ["cpus"]
+    assert to_send == {"cpus": [(1, 1.0), (2, 2.0), (3, 3.0), (4, 4.0)]}
+
+
+def test_metrics_session_unacknowledged_request():
+    session = MetricsSession()
+    session.build_request(1, {"cpus": [(1, 1.0)]})
+    request, to_send = session.build_request(2, {"cpus": [(1, 1.0), (2, 2.0)]})
+    assert request["base_request_id"] is None
+    assert to_send == {"cpus": [(1, 1.0), (2, 2.0)]}
+
+
+def test_metrics_window_resync_required():
+    window = MetricsWindow()
+    window.apply(1, {"base_request_id": None, "window_start": {"cpus": 1}, "replace": ["cpus"]}, {"cpus": [(1, 1.0)]})
+    with pytest.raises(ResyncRequired):
+        window.apply(3, {"base_request_id": 2, "window_start": {"cpus": 1}, "replace": []}, {"cpus": [(2, 2.0)]})
@@ -11,15 +11,26 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import math
+import os
 from unittest import mock
 
 import arrow
 import jsonpickle
+import numpy as np
 import pytest
+from clusterman_metrics import METADATA
 from clusterman_metrics import SYSTEM_METRICS
 
+from clusterman.simulator.io import read_metrics_file
 from clusterman.simulator.io import read_object_from_compressed_json
+from clusterman.simulator.io import read_simulation_file
+from clusterman.simulator.io import SIMULATION_TIMESERIES
+from clusterman.simulator.io import write_metrics_file
 from clusterman.simulator.io import write_object_to_compressed_json
+from clusterman.simulator.io import write_simulation_file
+from clusterman.simulator.simulator import Simulator
+from clusterman.simulator.util import SimulationMetadata
 
 
 @pytest.fixture
@@ -49,3 +60,112 @@ def test_read_new_object(raw_ts, mock_ts_1, mock_open):
     }
     mock_open.read.return_value = jsonpickle.encode(expected_return).encode()
     assert read_object_from_compressed_json("foo", raw_timestamps=raw_ts) == expected_return
+
+
+@pytest.fixture
+def metrics():
+    return {
+        SYSTEM_METRICS: {
+            "cpus_allocated": [(arrow.get(20), 2), (arrow.get(10), 1.5), (arrow.get(30), None)],
+        },
+        METADATA: {
+            "fulfilled_capacity|cluster=foo,pool=bar": [
+                (10, {"c3.8xlarge,us-west-2a": 3, "c3.8xlarge,us-west-2b": 4}),
+                (20, {"c3.8xlarge,us-west-2b": 5, "m5.large,us-west-2a": None}),
+            ],
+            "spot_prices|aws_availability_zone=us-west-2a,aws_instance_type=c3.8xlarge": [],
+        },
+    }
+
+
+def test_metrics_file_round_trip(metrics, tmp_path):
+    filename = str(tmp_path / "metrics")
+    write_metrics_file(metrics, filename)
+    data = read_metrics_file(filename)
+
+    assert os.listdir(tmp_path) == ["metrics"]
+    assert list(data) == [SYSTEM_METRICS, METADATA]
+    assert list(data[METADATA]) == list(metrics[METADATA])
+    cpus_allocated = data[SYSTEM_METRICS]["cpus_allocated"]
+    assert cpus_allocated == [(10, 1.5), (20, 2.0), (30, None)]
+    assert data[METADATA]["fulfilled_capacity|cluster=foo,pool=bar"] == [
+        (10, {"c3.8xlarge,us-west-2a": 3.0, "c3.8xlarge,us-west-2b": 4.0}),
+        (20, {"c3.8xlarge,us-west-2b": 5.0, "m5.large,us-west-2a": None}),
+    ]
+    assert data[METADATA]["spot_prices|aws_availability_zone=us-west-2a,aws_instance_type=c3.8xlarge"] == []
+
+
+def test_metrics_file_is_read_lazily(metrics, tmp_path):
+    filename = str(tmp_path / "metrics.npz")
+    write_metrics_file(metrics, filename)
+
+    with mock.patch("clusterman.simulator.io.np.load", wraps=np.load) as mock_load:
+        data = read_metrics_file(filename)
+        assert mock_load.call_count == 1  # just the header
+        data[SYSTEM_METRICS]["cpus_allocated"]
+        data[SYSTEM_METRICS]["cpus_allocated"]
+        data[METADATA]["fulfilled_capacity|cluster=foo,pool=bar"]
+        assert mock_load.call_count == 2  # the file is opened once, and shared by every metric type
+
+        # a forked process can't share the file offset with its parent, so it opens the file again
+        with mock.patch("clusterman.simulator.io.os.getpid", return_value=-1):
+            data[METADATA]["spot_prices|aws_availability_zone=us-west-2a,aws_instance_type=c3.8xlarge"]
+        assert mock_load.call_count == 3
+
+    data[SYSTEM_METRICS]["cpus_allocated"] = [(10, 1)]
+    del data[METADATA]["fulfilled_capacity|cluster=foo,pool=bar"]
+    assert data[SYSTEM_METRICS]["cpus_allocated"] == [(10, 1)]
+    assert len(data[METADATA]) == 1
+    with pytest.raises(KeyError):
+        data[METADATA]["fulfilled_capacity|cluster=foo,pool=bar"]
+
+
+def test_metrics_file_keeps_nan(tmp_path):
+    filename = str(tmp_path / "metrics.npz")
+    write_metrics_file({SYSTEM_METRICS: {"cpus_allocated": [(10, float("nan")), (20, None)]}}, filename)
+
+    (nan_point, none_point) = read_metrics_file(filename)[SYSTEM_METRICS]["cpus_allocated"]
+    assert nan_point[0] == 10 and math.isnan(nan_point[1])
+    assert none_point == (20, None)
+
+
+def test_metrics_file_reads_old_format(mock_ts_1, tmp_path):
+    filename = str(tmp_path / "metrics.json.gz")
+    write_object_to_compressed_json(mock_ts_1, filename)
+
+    assert read_metrics_file(filename) == {SYSTEM_METRICS: {"metric_1": [(1, 1.0), (2, 2.0), (3, 3.0)]}}
+    assert arrow.get is arrow.api.get
+
+
+def test_metrics_file_mixed_values(tmp_path):
+    with pytest.raises(ValueError):
+        write_metrics_file({METADATA: {"foo": [(1, 1.0), (2, {"bar": 1.0})]}}, str(tmp_path / "metrics.npz"))
+
+
+def test_read_newer_file(metrics, tmp_path):
+    filename = str(tmp_path / "metrics.npz")
+    with mock.patch("clusterman.simulator.io.COLUMNAR_FORMAT_VERSION", 2):
+        write_metrics_file(metrics, filename)
+
+    with pytest.raises(ValueError):
+        read_metrics_file(filename)
+
+
+def test_simulation_file_round_trip(tmp_path):
+    metadata = SimulationMetadata("test", "testing", "mesos", "test-tag")
+    simulator = Simulator(metadata, arrow.get(0), arrow.get(7200), None, None)
+    simulator.aws_cpus.add_delta(arrow.get(0), 10)
+    simulator.mesos_cpus.add_delta(arrow.get(12.345678), 10)
+    simulator.mesos_cpus_allocated.add_breakpoint(arrow.get(3600), 15)
+    simulator.cost_per_hour.add_delta(arrow.get(0), 1.5)
+    filename = str(tmp_path / "simulation")
+    write_simulation_file(simulator, filename)
+
+    with pytest.raises(ValueError):
+        read_metrics_file(filename)
+    simulator_2 = read_simulation_file(filename)
+    assert (simulator_2.metadata.name, simulator_2.metadata.scheduler) == ("test", "test-tag")
+    assert (simulator_2.start_time, simulator_2.end_time) == (arrow.get(0), arrow.get(7200))
+    for name in SIMULATION_TIMESERIES:
+        assert getattr(simulator_2, name).breakpoints == getattr(simulator, name).breakpoints
+    assert simulator_2.total_cost == simulator.total_cost == 3
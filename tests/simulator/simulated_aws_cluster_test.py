@@ -11,6 +11,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import random
 from unittest import mock
 
 import pytest
@@ -101,3 +102,50 @@ def test_terminate_instances_by_id(cluster):
         assert id not in cluster.instances
     for id in remaining_instances_ids:
         assert id in cluster.instances
+
+
+def test_terminate_then_modify_size(cluster):
+    market = InstanceMarket("m4.4xlarge", "us-west-1a")
+    first, second, third, fourth = cluster.instance_ids_by_market[market]
+    cluster.terminate_instances_by_id([second])
+
+    # the oldest instances in a market are removed first
+    __, removed_instances = cluster.modify_size({market: 1, InstanceMarket("i2.8xlarge", "us-west-1a"): 2})
+    assert [instance.id for instance in removed_instances if instance.market == market] == [first, third]
+    assert list(cluster.instance_ids_by_market[market]) == [fourth]
+    assert cluster.cpus == sum(instance.resources.cpus for instance in cluster.instances.values())
+    assert cluster.mem == sum(instance.resources.mem for instance in cluster.instances.values())
+    assert cluster.disk == 3000 + sum(instance.resources.disk or 0 for instance in cluster.instances.values())
+
+
+def test_resource_totals_match_instance_sums(cluster):
+    market = InstanceMarket("i3.large", "us-west-1a")
+    assert cluster.disk == 22200
+    cluster.modify_size({**{m: len(ids) for m, ids in cluster.instance_ids_by_market.items()}, market: 7})
+    terminate_ids = list(cluster.instance_ids_by_market[market])[1:6:2]
+    cluster.terminate_instances_by_id(terminate_ids)
+
+    # the totals add up the (inexact) per-instance values in order, just like summing over the instances does
+    assert cluster.disk == 3000 + sum(instance.resources.disk or 0 for instance in cluster.instances.values())
+    assert cluster.disk != 3000 + 3 * 6400 + 4 * 0.475
+
+
+def test_resource_totals_after_changes(cluster):
+    markets = [
+        InstanceMarket("m4.4xlarge", "us-west-1a"),
+        InstanceMarket("i2.8xlarge", "us-west-1a"),
+        InstanceMarket("i3.large", "us-west-1a"),
+        InstanceMarket("r4.large", "us-west-2a"),
+    ]
+    rng = random.Random(0)
+    for __ in range(50):
+        cluster.modify_size({market: rng.randrange(8) for market in markets if rng.random() < 0.8})
+        cluster.terminate_instances_by_id(rng.sample(list(cluster.instances), len(cluster.instances) // 3))
+
+        for resource in ("cpus", "mem", "disk"):
+            total = sum(
+                getattr(instance.resources, resource)
+                for instance in cluster.instances.values()
+                if getattr(instance.resources, resource) is not None
+            )
+            assert repr(getattr(cluster, resource)) == repr(total + (3000 if resource == "disk" else 0))
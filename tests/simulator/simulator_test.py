@@ -18,8 +18,11 @@ import arrow
 import pytest
 
 from clusterman.aws.markets import InstanceMarket
+from clusterman.math.piecewise import hour_transform
 from clusterman.reports.report_types import REPORT_TYPES
+from clusterman.simulator.event import AutoscalingEvent
 from clusterman.simulator.event import Event
+from clusterman.simulator.event import InstancePriceChangeEvent
 from clusterman.simulator.simulated_aws_cluster import Instance
 from clusterman.simulator.simulator import SimulationMetadata
 from clusterman.simulator.simulator import Simulator
@@ -52,6 +55,46 @@ def test_add_event_outside(mock_logger, simulator, evt_time):
     assert len(simulator.event_queue) == 2
 
 
+def test_add_event_source(simulator):
+    read_times = []
+
+    def events(times, make_event):
+        for time in times:
+            read_times.append(time)
+            yield make_event(arrow.get(time))
+
+    simulator.add_event(InstancePriceChangeEvent(arrow.get(300), {}))
+    simulator.add_event_source(events([-10, 100, 300, 300, 3600, 4000], AutoscalingEvent))
+    simulator.add_event_source(events([100, 200], lambda time: InstancePriceChangeEvent(time, {})))
+    # the sources are only read up to the next event that's in the simulation time bounds
+    assert read_times == [-10, 100, 100]
+    assert len(simulator.event_queue) == 5
+
+    simulator.autoscaler = mock.Mock()
+    with mock.patch("clusterman.simulator.simulator.logger") as mock_logger:
+        simulator.run()
+
+    assert [(type(evt), evt.time.timestamp) for (evt,), __ in mock_logger.event.call_args_list] == [
+        (Event, 0),
+        (AutoscalingEvent, 100),
+        (InstancePriceChangeEvent, 100),
+        (InstancePriceChangeEvent, 200),
+        (AutoscalingEvent, 300),
+        (AutoscalingEvent, 300),
+        (InstancePriceChangeEvent, 300),
+        (Event, 3600),
+    ]
+    # once a source gets to the simulation end time, the rest of it isn't read
+    assert sorted(read_times) == [-10, 100, 100, 200, 300, 300, 3600]
+
+
+def test_add_event_source_unsorted(simulator):
+    simulator.autoscaler = mock.Mock()
+    simulator.add_event_source(AutoscalingEvent(arrow.get(time)) for time in [100, 200, 150])
+    with mock.patch("clusterman.simulator.simulator.logger"), pytest.raises(ValueError):
+        simulator.run()
+
+
 def test_compute_instance_cost_no_breakpoints(simulator, mock_instance, fn):
     simulator.instance_prices[mock_instance.market] = fn
     simulator._compute_instance_cost(mock_instance)
@@ -124,6 +167,41 @@ def test_get_data(simulator, report_type):
     simulator.get_data(report_type)
 
 
+def test_get_data_matches_piecewise(simulator):
+    simulator.aws_cpus.add_delta(arrow.get(0), 10)
+    simulator.aws_cpus.add_delta(arrow.get(1000), 5)
+    simulator.mesos_cpus_allocated.add_delta(arrow.get(500), 12)
+    simulator.cost_per_hour.add_delta(arrow.get(0), 3)
+    simulator.cost_per_hour.add_delta(arrow.get(2500), -1)
+    step = timedelta(seconds=700)
+
+    assert simulator.get_data("unused_cpus", step=step) == (simulator.aws_cpus - simulator.mesos_cpus_allocated).values(
+        simulator.start_time, simulator.end_time, step
+    )
+    assert simulator.get_data("unused_cpus_cost", step=step) == pytest.approx(
+        (
+            (simulator.aws_cpus - simulator.mesos_cpus_allocated) / simulator.aws_cpus * simulator.cost_per_hour
+        ).integrals(simulator.start_time, simulator.end_time, step, transform=hour_transform)
+    )
+    assert simulator.get_data("oversubscribed") == {arrow.get(0): 0}
+
+
 def test_get_data_invalid(simulator):
     with pytest.raises(ValueError):
         simulator.get_data("asdf")
+
+
+def test_get_cpu_hours():
+    metadata = SimulationMetadata("test", "testing", "mesos", "test-tag")
+    simulator = Simulator(metadata, arrow.get(0), arrow.get(7200), None, None)
+    simulator.aws_cpus.add_delta(arrow.get(0), 10)
+    simulator.mesos_cpus_allocated.add_delta(arrow.get(3600), 15)
+
+    assert simulator.get_cpu_hours("cpus_allocated") == 15
+    assert simulator.get_cpu_hours("unused_cpus") == 10 - 5
+    assert simulator.get_cpu_hours("oversubscribed") == 5
+
+
+def test_get_cpu_hours_invalid(simulator):
+    with pytest.raises(ValueError):
+        simulator.get_cpu_hours("asdf")
@@ -0,0 +1,90 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from unittest import mock
+
+import pytest
+
+from clusterman.simulator.sweep import format_sweep_results
+from clusterman.simulator.sweep import get_sweep_variants
+from clusterman.simulator.sweep import summarize_simulation
+from clusterman.simulator.sweep import SweepResult
+from clusterman.simulator.sweep import SweepVariant
+
+
+def test_get_sweep_variants_empty():
+    assert get_sweep_variants({}) == [SweepVariant("baseline", {})]
+
+
+def test_get_sweep_variants_grid():
+    variants = get_sweep_variants({"grid": {"autoscaling.setpoint": [0.6, 0.8], "max_weight": [10, 20]}})
+    assert variants == [
+        SweepVariant("autoscaling.setpoint=0.6 max_weight=10", {"autoscaling.setpoint": 0.6, "max_weight": 10}),
+        SweepVariant("autoscaling.setpoint=0.6 max_weight=20", {"autoscaling.setpoint": 0.6, "max_weight": 20}),
+        SweepVariant("autoscaling.setpoint=0.8 max_weight=10", {"autoscaling.setpoint": 0.8, "max_weight": 10}),
+        SweepVariant("autoscaling.setpoint=0.8 max_weight=20", {"autoscaling.setpoint": 0.8, "max_weight": 20}),
+    ]
+
+
+def test_get_sweep_variants_crossed_with_grid():
+    variants = get_sweep_variants(
+        {
+            "variants": [
+                {"name": "low", "overrides": {"autoscaling.setpoint": 0.6, "max_weight_to_add": 10}},
+                {"overrides": {"autoscaling.setpoint": 0.8}},
+            ],
+            "grid": {"max_weight_to_add": [20, 30]},
+        }
+    )
+    assert variants == [
+        SweepVariant("low max_weight_to_add=20", {"autoscaling.setpoint": 0.6, "max_weight_to_add": 20}),
+        SweepVariant("low max_weight_to_add=30", {"autoscaling.setpoint": 0.6, "max_weight_to_add": 30}),
+        SweepVariant("variant1 max_weight_to_add=20", {"autoscaling.setpoint": 0.8, "max_weight_to_add": 20}),
+        SweepVariant("variant1 max_weight_to_add=30", {"autoscaling.setpoint": 0.8, "max_weight_to_add": 30}),
+    ]
+
+
+@pytest.mark.parametrize(
+    "sweep_config",
+    [
+        {"grid": {"autoscaling.setpoint": 0.6}},
+        {"grid": {"autoscaling.setpoint": []}},
+        {"variants": [{"name": "foo"}, {"name": "foo"}]},
+    ],
+)
+def test_get_sweep_variants_invalid(sweep_config):
+    with pytest.raises(ValueError):
+        get_sweep_variants(sweep_config)
+
+
+def test_summarize_simulation():
+    simulator = mock.Mock(total_cost=12.5)
+    simulator.get_cpu_hours.side_effect = lambda key: {"unused_cpus": 3.0, "oversubscribed": 1.0}[key]
+
+    result = summarize_simulation(SweepVariant("foo", {"a": 1}), simulator, 4.2)
+    assert result == SweepResult("foo", {"a": 1}, 12.5, 3.0, 1.0, 4.2)
+
+
+def test_format_sweep_results():
+    table = format_sweep_results(
+        [
+            SweepResult("expensive", {}, 1234.5, 10, 0, 61.25),
+            SweepResult("cheap", {}, 99, 1.25, 300, 5),
+        ]
+    )
+    assert table.split("\n") == [
+        "variant         cost  unused cpu-hours  oversubscribed cpu-hours  elapsed",
+        "---------  ---------  ----------------  ------------------------  -------",
+        "cheap         $99.00               1.2                     300.0     5.0s",
+        "expensive  $1,234.50              10.0                       0.0    61.2s",
+    ]
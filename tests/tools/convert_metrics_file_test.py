@@ -0,0 +1,32 @@
+# Copyright 2019 Yelp Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import arrow
+from clusterman_metrics import SYSTEM_METRICS
+
+from clusterman.simulator.io import read_metrics_file
+from clusterman.simulator.io import write_object_to_compressed_json
+from clusterman.tools.convert_metrics_file import get_parser
+from clusterman.tools.convert_metrics_file import main
+
+
+def test_main(tmp_path):
+    src_file, dest_file = str(tmp_path / "metrics.json.gz"), str(tmp_path / "metrics.npz")
+    metrics = {SYSTEM_METRICS: {"metric_1": [(arrow.get(1), 1.0), (arrow.get(2), 2.0)]}}
+    write_object_to_compressed_json(metrics, src_file)
+
+    main(get_parser().parse_args(["--src-file", src_file, "--dest-file", dest_file]))
+
+    with open(dest_file, "rb") as f:
+        assert f.read(2) == b"PK"
+    assert dict(read_metrics_file(dest_file)[SYSTEM_METRICS]) == {"metric_1": [(1, 1.0), (2, 2.0)]}
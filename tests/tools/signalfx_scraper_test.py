@@ -21,7 +21,7 @@ from clusterman.tools.signalfx_scraper import main
 
 
 @mock.patch("clusterman.tools.signalfx_scraper.basic_sfx_query", autospec=True)
-@mock.patch("clusterman.tools.signalfx_scraper.write_object_to_compressed_json", autospec=True)
+@mock.patch("clusterman.tools.signalfx_scraper.write_metrics_file", autospec=True)
 @mock.patch("clusterman.tools.signalfx_scraper.ask_for_choice", autospec=True)
 def test_main(mock_metric_choice, mock_write, mock_query):
     mock_metric_choice.side_effect = ["system_metrics", "app_metrics"]